@@ -825,6 +825,34 @@ android.nonFinalResIds=false
         Returns:
             Tuple (success, apk_bytes, error_msg)
         """
+        success, apk_path, error_msg = self.build_apk_file(project_zip, project_name, max_retries)
+        if not success:
+            return False, None, error_msg
+        try:
+            return True, apk_path.read_bytes(), None
+        finally:
+            apk_path.unlink(missing_ok=True)
+    
+    def build_apk_file(
+        self,
+        project_zip: bytes,
+        project_name: str,
+        max_retries: int = 2,
+        output_dir: Optional[Path] = None
+    ) -> Tuple[bool, Optional[Path], Optional[str]]:
+        """
+        Compile un projet Android et déplace l'APK hors du répertoire de build
+        (l'APK n'est pas chargé en mémoire; l'appelant est responsable du fichier)
+        
+        Args:
+            project_zip: Bytes du ZIP contenant le projet Android
+            project_name: Nom du projet
+            max_retries: Nombre maximum de tentatives
+            output_dir: Répertoire de l'APK (répertoire temporaire système par défaut)
+        
+        Returns:
+            Tuple (success, apk_path, error_msg)
+        """
         last_error = None
         
         # Vérifier dépendances AVANT toute tentative
@@ -926,15 +954,17 @@ android.nonFinalResIds=false
                     except zipfile.BadZipFile:
                         raise Exception("APK corrompu: structure ZIP invalide")
                     
-                    # Lire APK
-                    with open(apk_path, 'rb') as f:
-                        apk_bytes = f.read()
+                    # Sortir l'APK du répertoire temporaire (supprimé dans le finally)
+                    safe_name = "".join(c.lower() if c.isalnum() else '' for c in project_name) or 'app'
+                    fd, output_path = tempfile.mkstemp(suffix='.apk', prefix=f'{safe_name}_', dir=output_dir)
+                    os.close(fd)
+                    shutil.move(str(apk_path), output_path)
                     
                     logger.info(f"🎉 APK généré avec succès!")
-                    logger.info(f"📊 Taille: {len(apk_bytes) / 1024 / 1024:.2f} MB")
+                    logger.info(f"📊 Taille: {apk_size / 1024 / 1024:.2f} MB")
                     logger.info(f"📲 Prêt pour installation")
                     
-                    return True, apk_bytes, None
+                    return True, Path(output_path), None
                     
                 except Exception as e:
                     last_error = str(e)
@@ -994,4 +1024,18 @@ android.nonFinalResIds=false
         # Échec final
         final_error = last_error or "Erreur inconnue lors de la compilation"
         logger.error(f"❌ Échec après {max_retries + 1} tentatives")
-        return False, None, final_error
\ No newline at end of file
+        return False, None, final_error
+
+
+def build_apk_file_task(
+    project_root: str,
+    project_zip: bytes,
+    project_name: str,
+    max_retries: int = 2
+) -> Tuple[bool, Optional[Path], Optional[str]]:
+    """
+    Compilation exécutée dans un processus dédié (voir task_executor.TaskExecutor.run_isolated)
+    Le builder est instancié dans le processus enfant; seul le chemin de l'APK est renvoyé.
+    """
+    builder = AndroidBuilder(Path(project_root))
+    return builder.build_apk_file(project_zip, project_name, max_retries)
@@ -0,0 +1,249 @@
+"""
+Upload des APK vers Supabase Storage en streaming depuis le disque
+Protocole TUS (upload résumable) de Supabase: l'APK est envoyé par blocs de 6 MiB,
+chaque bloc est réessayé individuellement et l'upload reprend à l'offset confirmé
+par le serveur. Le fichier n'est jamais chargé entièrement en mémoire.
+"""
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Union
+
+import httpx
+
+from artifact_index import APK_BUCKET
+from download_responses import APK_MEDIA_TYPE
+
+logger = logging.getLogger(__name__)
+
+TUS_VERSION = "1.0.0"
+
+# Supabase impose des blocs de 6 MiB pour les uploads résumables (sauf le dernier)
+UPLOAD_CHUNK_SIZE = 6 * 1024 * 1024
+UPLOAD_MAX_RETRIES = int(os.environ.get("UPLOAD_MAX_RETRIES", "5"))
+# Uploads simultanés (chaque upload garde au plus deux blocs en mémoire)
+UPLOAD_CONCURRENCY = int(os.environ.get("UPLOAD_CONCURRENCY", "3"))
+UPLOAD_TIMEOUT_SECONDS = float(os.environ.get("UPLOAD_TIMEOUT_SECONDS", "120"))
+
+_RETRYABLE_STATUS = {408, 423, 429, 500, 502, 503, 504}
+
+
+class UploadError(Exception):
+    """Échec définitif d'un upload"""
+
+
+class _RetryableUploadError(Exception):
+    """Échec transitoire: le bloc peut être renvoyé"""
+
+
+@dataclass
+class UploadResult:
+    storage_path: str
+    size: int
+    sha256: str
+
+
+def _encode_metadata(metadata: Dict[str, str]) -> str:
+    return ",".join(
+        f"{key} {base64.b64encode(value.encode('utf-8')).decode('ascii')}"
+        for key, value in metadata.items()
+    )
+
+
+def _read_and_hash(file: BinaryIO, digest: "hashlib._Hash", size: int) -> bytes:
+    """Lit un bloc et met à jour le hash (exécuté dans un thread)"""
+    chunk = file.read(size)
+    if chunk:
+        digest.update(chunk)
+    return chunk
+
+
+class ResumableUploader:
+    """Client d'upload résumable (TUS) vers un bucket Supabase Storage"""
+
+    def __init__(
+        self,
+        supabase_url: str,
+        api_key: str,
+        bucket: str = APK_BUCKET,
+        chunk_size: int = UPLOAD_CHUNK_SIZE,
+        max_retries: int = UPLOAD_MAX_RETRIES,
+        concurrency: int = UPLOAD_CONCURRENCY,
+        timeout: float = UPLOAD_TIMEOUT_SECONDS,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.endpoint = f"{supabase_url.rstrip('/')}/storage/v1/upload/resumable"
+        self.api_key = api_key
+        self.bucket = bucket
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._transport = transport
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    def _headers(self, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "apikey": self.api_key,
+            "Tus-Resumable": TUS_VERSION,
+        }
+        if extra:
+            headers.update(extra)
+        return headers
+
+    async def _backoff(self, attempt: int, error: Exception, what: str):
+        if attempt > self.max_retries:
+            raise UploadError(f"{what}: {error}") from error
+        delay = min(0.5 * (2 ** (attempt - 1)), 10)
+        logger.warning(f"⚠️ {what} échoué ({error}), nouvel essai {attempt}/{self.max_retries} dans {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    @staticmethod
+    def _check_status(response: httpx.Response, expected: tuple, what: str):
+        if response.status_code in expected:
+            return
+        if response.status_code in _RETRYABLE_STATUS:
+            raise _RetryableUploadError(f"HTTP {response.status_code}")
+        raise UploadError(f"{what}: HTTP {response.status_code} {response.text[:200]}")
+
+    async def _create_upload(
+        self,
+        http: httpx.AsyncClient,
+        storage_path: str,
+        size: int,
+        content_type: str,
+        cache_control: str,
+        upsert: bool
+    ) -> str:
+        headers = self._headers({
+            "Upload-Length": str(size),
+            "Upload-Metadata": _encode_metadata({
+                "bucketName": self.bucket,
+                "objectName": storage_path,
+                "contentType": content_type,
+                "cacheControl": cache_control,
+            }),
+            "x-upsert": "true" if upsert else "false",
+        })
+        attempt = 0
+        while True:
+            try:
+                response = await http.post(self.endpoint, headers=headers)
+                self._check_status(response, (200, 201), "Création de l'upload")
+                location = response.headers.get("location")
+                if not location:
+                    raise UploadError("Création de l'upload: en-tête Location absent")
+                return str(httpx.URL(self.endpoint).join(location))
+            except (httpx.TransportError, _RetryableUploadError) as e:
+                attempt += 1
+                await self._backoff(attempt, e, "Création de l'upload")
+
+    async def _current_offset(self, http: httpx.AsyncClient, upload_url: str) -> int:
+        """Offset confirmé par le serveur (reprise après une erreur)"""
+        response = await http.head(upload_url, headers=self._headers())
+        self._check_status(response, (200, 204), "Lecture de l'offset")
+        return int(response.headers["upload-offset"])
+
+    async def _send_chunk(self, http: httpx.AsyncClient, upload_url: str, start: int, chunk: bytes) -> int:
+        """Envoie un bloc; en cas d'échec, reprend à l'offset confirmé par le serveur"""
+        end = start + len(chunk)
+        offset = start
+        attempt = 0
+        while offset < end:
+            try:
+                response = await http.patch(
+                    upload_url,
+                    content=chunk[offset - start:],
+                    headers=self._headers({
+                        "Upload-Offset": str(offset),
+                        "Content-Type": "application/offset+octet-stream",
+                    })
+                )
+                if response.status_code == 409:
+                    raise _RetryableUploadError("offset désynchronisé")
+                self._check_status(response, (200, 204), f"Envoi du bloc {start}-{end}")
+                offset = int(response.headers["upload-offset"])
+            except (httpx.TransportError, _RetryableUploadError) as e:
+                attempt += 1
+                await self._backoff(attempt, e, f"Envoi du bloc {start}-{end}")
+                try:
+                    offset = await self._current_offset(http, upload_url)
+                except (httpx.TransportError, _RetryableUploadError):
+                    # Offset inconnu: renvoyer le bloc depuis le dernier offset connu
+                    continue
+                if offset < start or offset > end:
+                    raise UploadError(f"Offset serveur inattendu ({offset}) pour le bloc {start}-{end}")
+        return offset
+
+    async def upload_file(
+        self,
+        path: Union[str, Path],
+        storage_path: str,
+        content_type: str = APK_MEDIA_TYPE,
+        cache_control: str = "3600",
+        upsert: bool = True
+    ) -> UploadResult:
+        """
+        Upload un fichier local vers le bucket
+
+        Args:
+            path: Fichier à envoyer (lu par blocs)
+            storage_path: Chemin de l'objet dans le bucket
+            content_type: Type MIME de l'objet
+            cache_control: Durée de cache de l'objet (secondes)
+            upsert: Remplacer l'objet s'il existe
+
+        Returns:
+            UploadResult (chemin, taille, SHA-256 calculé pendant l'envoi)
+
+        Raises:
+            UploadError: échec définitif après les nouvelles tentatives
+        """
+        size = os.stat(path).st_size
+        if size == 0:
+            raise UploadError(f"Fichier vide: {path}")
+
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            digest = hashlib.sha256()
+            async with httpx.AsyncClient(timeout=self.timeout, transport=self._transport) as http:
+                upload_url = await self._create_upload(http, storage_path, size, content_type, cache_control, upsert)
+
+                with open(path, "rb") as file:
+                    # Le bloc suivant est lu (et hashé) pendant l'envoi du bloc courant
+                    pending = loop.run_in_executor(None, _read_and_hash, file, digest, self.chunk_size)
+                    offset = 0
+                    try:
+                        while True:
+                            chunk = await pending
+                            if not chunk:
+                                break
+                            pending = loop.run_in_executor(None, _read_and_hash, file, digest, self.chunk_size)
+                            offset = await self._send_chunk(http, upload_url, offset, chunk)
+                    finally:
+                        # Ne pas fermer le fichier pendant une lecture en cours
+                        await asyncio.gather(pending, return_exceptions=True)
+
+        if offset != size:
+            raise UploadError(f"Upload incomplet: {offset}/{size} octets")
+        return UploadResult(storage_path=storage_path, size=size, sha256=digest.hexdigest())
+
+
+# Instance globale
+_apk_uploader: Optional[ResumableUploader] = None
+
+
+def get_apk_uploader() -> ResumableUploader:
+    """Récupère l'uploader APK (singleton, configuré depuis l'environnement)"""
+    global _apk_uploader
+    if _apk_uploader is None:
+        supabase_url = os.environ.get("SUPABASE_URL", "")
+        api_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ.get("SUPABASE_ANON_KEY", "")
+        if not supabase_url or not api_key:
+            raise UploadError("Supabase Storage non configuré")
+        _apk_uploader = ResumableUploader(supabase_url, api_key)
+    return _apk_uploader
@@ -0,0 +1,175 @@
+"""
+Index local des artefacts APK stockés sur Supabase Storage
+Évite de lister le bucket à chaque téléchargement: les métadonnées (existence, taille,
+hash, dernière vérification) sont gardées en mémoire avec un TTL, et les téléchargements
+sont redirigés vers des URLs signées à durée limitée, réutilisées tant qu'elles sont valides.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+APK_BUCKET = "apks"
+
+# Durée pendant laquelle une entrée est considérée vérifiée sans relire la DB
+ARTIFACT_INDEX_TTL_SECONDS = int(os.environ.get("ARTIFACT_INDEX_TTL_SECONDS", "300"))
+# Durée de validité des URLs signées envoyées aux clients
+ARTIFACT_SIGNED_URL_TTL_SECONDS = int(os.environ.get("ARTIFACT_SIGNED_URL_TTL_SECONDS", "3600"))
+ARTIFACT_INDEX_MAX_ENTRIES = int(os.environ.get("ARTIFACT_INDEX_MAX_ENTRIES", "10000"))
+
+# Une URL signée n'est plus réutilisée quand il lui reste moins que cette marge
+_SIGNED_URL_MIN_REMAINING = 300
+
+
+@dataclass
+class ArtifactRecord:
+    """Métadonnées d'un APK présent dans le bucket"""
+    build_id: str
+    user_id: str
+    project_id: str
+    storage_path: str
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+    verified_at: float = 0.0
+    signed_url: Optional[str] = None
+    signed_url_expires_at: float = 0.0
+
+
+class ArtifactIndex:
+    """Cache TTL + LRU des artefacts, partagé par toutes les requêtes du processus"""
+
+    def __init__(
+        self,
+        ttl_seconds: int = ARTIFACT_INDEX_TTL_SECONDS,
+        signed_url_ttl_seconds: int = ARTIFACT_SIGNED_URL_TTL_SECONDS,
+        max_entries: int = ARTIFACT_INDEX_MAX_ENTRIES
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.signed_url_ttl_seconds = signed_url_ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, ArtifactRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, build_id: str) -> Optional[ArtifactRecord]:
+        """Entrée encore fraîche pour ce build, sinon None"""
+        with self._lock:
+            record = self._entries.get(build_id)
+            if record is None:
+                return None
+            if time.monotonic() - record.verified_at > self.ttl_seconds:
+                del self._entries[build_id]
+                return None
+            self._entries.move_to_end(build_id)
+            return record
+
+    def put(self, record: ArtifactRecord) -> ArtifactRecord:
+        record.verified_at = time.monotonic()
+        with self._lock:
+            previous = self._entries.get(record.build_id)
+            if previous and previous.storage_path == record.storage_path and record.signed_url is None:
+                # Même objet: garder l'URL signée déjà émise
+                record.signed_url = previous.signed_url
+                record.signed_url_expires_at = previous.signed_url_expires_at
+            self._entries[record.build_id] = record
+            self._entries.move_to_end(record.build_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return record
+
+    def record_upload(
+        self,
+        build_id: str,
+        user_id: str,
+        project_id: str,
+        storage_path: str,
+        size: int,
+        sha256: Optional[str] = None
+    ) -> ArtifactRecord:
+        """Enregistre un APK qui vient d'être uploadé (existence garantie)"""
+        return self.put(ArtifactRecord(
+            build_id=build_id,
+            user_id=user_id,
+            project_id=project_id,
+            storage_path=storage_path,
+            size=size,
+            sha256=sha256
+        ))
+
+    def record_from_build(self, build: Dict[str, Any]) -> Optional[ArtifactRecord]:
+        """Indexe une ligne `builds` lue en DB si elle référence un objet du bucket"""
+        storage_path = build.get("storage_path")
+        if not storage_path or not build.get("download_url"):
+            return None
+        return self.put(ArtifactRecord(
+            build_id=build["id"],
+            user_id=build.get("user_id"),
+            project_id=build.get("project_id"),
+            storage_path=storage_path,
+            size=build.get("file_size"),
+            sha256=build.get("file_sha256")
+        ))
+
+    def invalidate(self, build_id: str):
+        with self._lock:
+            self._entries.pop(build_id, None)
+
+    def invalidate_where(self, user_id: Optional[str] = None, project_id: Optional[str] = None):
+        """Retire toutes les entrées d'un utilisateur et/ou d'un projet"""
+        with self._lock:
+            stale = [
+                build_id for build_id, record in self._entries.items()
+                if (user_id is None or record.user_id == user_id)
+                and (project_id is None or record.project_id == project_id)
+            ]
+            for build_id in stale:
+                del self._entries[build_id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def signed_url(self, client, record: ArtifactRecord) -> str:
+        """
+        URL signée de téléchargement pour l'artefact, réutilisée tant qu'elle reste valide
+
+        Raises:
+            Exception: l'objet n'existe plus ou la signature a échoué (l'entrée est retirée)
+        """
+        now = time.time()
+        if record.signed_url and record.signed_url_expires_at - now > _SIGNED_URL_MIN_REMAINING:
+            return record.signed_url
+
+        try:
+            result = client.storage.from_(APK_BUCKET).create_signed_url(
+                record.storage_path,
+                self.signed_url_ttl_seconds
+            )
+        except Exception:
+            self.invalidate(record.build_id)
+            raise
+
+        url = result.get("signedURL") or result.get("signedUrl") if isinstance(result, dict) else None
+        if not url:
+            self.invalidate(record.build_id)
+            raise ValueError(f"Signed URL unavailable for {record.storage_path}")
+
+        record.signed_url = url
+        record.signed_url_expires_at = now + self.signed_url_ttl_seconds
+        return url
+
+
+# Instance globale
+_artifact_index: Optional[ArtifactIndex] = None
+
+
+def get_artifact_index() -> ArtifactIndex:
+    """Récupère l'index des artefacts (singleton)"""
+    global _artifact_index
+    if _artifact_index is None:
+        _artifact_index = ArtifactIndex()
+    return _artifact_index
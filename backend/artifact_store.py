@@ -0,0 +1,251 @@
+"""
+Stockage local durable des APK compilés (fallback quand Supabase Storage est indisponible)
+Les fichiers vivent dans un répertoire partagé par tous les workers uvicorn de la machine,
+indexés dans SQLite (taille, SHA-256, dernier accès). Un budget disque borne le stockage:
+les artefacts les moins récemment téléchargés sont évincés en premier.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_STORE_DIR = os.environ.get(
+    "ARTIFACT_STORE_DIR",
+    str(Path(tempfile.gettempdir()) / "nativiweb_artifacts")
+)
+# Budget disque du stockage local (2 GiB par défaut)
+ARTIFACT_STORE_MAX_BYTES = int(os.environ.get("ARTIFACT_STORE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+# Paramètres par requête IN (...) (limite SQLite historique: 999)
+_SQL_IN_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    build_id TEXT PRIMARY KEY,
+    project_id TEXT,
+    user_id TEXT,
+    file_name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_last_access ON artifacts(last_access);
+CREATE INDEX IF NOT EXISTS idx_artifacts_project ON artifacts(project_id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_user ON artifacts(user_id);
+"""
+
+
+@dataclass
+class StoredArtifact:
+    build_id: str
+    path: Path
+    size: int
+    sha256: str
+    project_id: Optional[str] = None
+    user_id: Optional[str] = None
+
+
+def _sha256_file(path: Union[str, Path]) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """Stockage disque + index SQLite, sûr entre processus (WAL, verrou SQLite)"""
+
+    def __init__(self, root: Union[str, Path] = ARTIFACT_STORE_DIR, max_bytes: int = ARTIFACT_STORE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.files_dir = self.root / "files"
+        self.files_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "index.sqlite3"
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Une connexion par opération: utilisable depuis n'importe quel thread ou worker
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _to_artifact(self, row: sqlite3.Row) -> StoredArtifact:
+        return StoredArtifact(
+            build_id=row["build_id"],
+            path=self.files_dir / row["file_name"],
+            size=row["size"],
+            sha256=row["sha256"],
+            project_id=row["project_id"],
+            user_id=row["user_id"]
+        )
+
+    def put(
+        self,
+        build_id: str,
+        source_path: Union[str, Path],
+        project_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> StoredArtifact:
+        """
+        Déplace un APK dans le stockage et l'indexe (bloquant: hash du fichier)
+
+        Returns:
+            StoredArtifact avec le chemin définitif et le SHA-256
+        """
+        sha256 = _sha256_file(source_path)
+        size = os.path.getsize(source_path)
+        file_name = f"{build_id}.apk"
+        destination = self.files_dir / file_name
+
+        # Copie temporaire dans le même répertoire puis renommage atomique
+        staging = self.files_dir / f".{file_name}.{os.getpid()}.tmp"
+        shutil.move(str(source_path), staging)
+        os.replace(staging, destination)
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO artifacts
+                    (build_id, project_id, user_id, file_name, size, sha256, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (build_id, project_id, user_id, file_name, size, sha256, now, now)
+            )
+        logger.info(f"💾 APK stocké localement: {build_id} ({size / 1024 / 1024:.2f} MB)")
+
+        self.evict(keep=build_id)
+        return StoredArtifact(build_id, destination, size, sha256, project_id, user_id)
+
+    def get(self, build_id: str, verify: bool = False) -> Optional[StoredArtifact]:
+        """
+        Artefact local d'un build (None si absent, disparu du disque ou corrompu)
+
+        Args:
+            build_id: ID du build
+            verify: Recalculer le SHA-256 et le comparer à l'index
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM artifacts WHERE build_id = ?", (build_id,)).fetchone()
+            if row is None:
+                return None
+            artifact = self._to_artifact(row)
+
+            if not artifact.path.exists() or (
+                verify and _sha256_file(artifact.path) != artifact.sha256
+            ):
+                logger.warning(f"⚠️ Artefact local invalide, retiré de l'index: {build_id}")
+                conn.execute("DELETE FROM artifacts WHERE build_id = ?", (build_id,))
+                artifact.path.unlink(missing_ok=True)
+                return None
+
+            conn.execute("UPDATE artifacts SET last_access = ? WHERE build_id = ?", (time.time(), build_id))
+        return artifact
+
+    def remove(self, build_id: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT file_name FROM artifacts WHERE build_id = ?", (build_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM artifacts WHERE build_id = ?", (build_id,))
+        (self.files_dir / row["file_name"]).unlink(missing_ok=True)
+        return True
+
+    def remove_many(self, build_ids: Iterable[str]) -> int:
+        """Supprime les artefacts de plusieurs builds (une connexion, DELETE ... IN); retourne le nombre supprimé"""
+        build_ids = list(build_ids)
+        file_names = []
+        with self._connect() as conn:
+            for start in range(0, len(build_ids), _SQL_IN_CHUNK):
+                chunk = build_ids[start:start + _SQL_IN_CHUNK]
+                placeholders = ", ".join("?" for _ in chunk)
+                file_names += [row["file_name"] for row in conn.execute(
+                    f"SELECT file_name FROM artifacts WHERE build_id IN ({placeholders})", chunk
+                )]
+                conn.execute(f"DELETE FROM artifacts WHERE build_id IN ({placeholders})", chunk)
+        for file_name in file_names:
+            (self.files_dir / file_name).unlink(missing_ok=True)
+        return len(file_names)
+
+    def remove_where(self, project_id: Optional[str] = None, user_id: Optional[str] = None) -> int:
+        """Supprime les artefacts d'un projet et/ou d'un utilisateur; retourne le nombre supprimé"""
+        clauses, params = [], []
+        if project_id is not None:
+            clauses.append("project_id = ?")
+            params.append(project_id)
+        if user_id is not None:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if not clauses:
+            raise ValueError("project_id or user_id required")
+
+        where = " AND ".join(clauses)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT file_name FROM artifacts WHERE {where}", params).fetchall()
+            conn.execute(f"DELETE FROM artifacts WHERE {where}", params)
+        for row in rows:
+            (self.files_dir / row["file_name"]).unlink(missing_ok=True)
+        return len(rows)
+
+    def usage(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Évince les artefacts les moins récemment utilisés au-delà du budget disque"""
+        evicted = []
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+                if total > self.max_bytes:
+                    for row in conn.execute(
+                        "SELECT build_id, file_name, size FROM artifacts ORDER BY last_access ASC"
+                    ).fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        if row["build_id"] == keep:
+                            continue
+                        conn.execute("DELETE FROM artifacts WHERE build_id = ?", (row["build_id"],))
+                        evicted.append(row["file_name"])
+                        total -= row["size"]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        for file_name in evicted:
+            (self.files_dir / file_name).unlink(missing_ok=True)
+        if evicted:
+            logger.info(f"🧹 {len(evicted)} APK local(aux) évincé(s) (budget {self.max_bytes / 1024 ** 3:.1f} GiB)")
+        return len(evicted)
+
+
+# Instance globale
+_artifact_store: Optional[ArtifactStore] = None
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Récupère le stockage local des artefacts (singleton par processus, index partagé)"""
+    global _artifact_store
+    if _artifact_store is None:
+        _artifact_store = ArtifactStore()
+    return _artifact_store
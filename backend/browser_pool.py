@@ -0,0 +1,221 @@
+"""
+Pool de navigateurs Chromium (Playwright) partagé par les générations de screenshots
+Playwright est démarré une seule fois; chaque job loue un navigateur du pool et y crée ses
+contextes. Un navigateur déconnecté est relancé, et il est recyclé après N pages.
+Quand tous les navigateurs sont occupés, les jobs attendent dans une file bornée.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+try:
+    from playwright.async_api import async_playwright
+    HAS_PLAYWRIGHT = True
+except ImportError:
+    HAS_PLAYWRIGHT = False
+
+logger = logging.getLogger(__name__)
+
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "2"))
+# Pages (contextes) servies par un navigateur avant son recyclage (fuites mémoire Chromium)
+BROWSER_MAX_PAGES = int(os.environ.get("BROWSER_MAX_PAGES", "200"))
+# Jobs en attente d'un navigateur au-delà desquels la demande est refusée
+BROWSER_QUEUE_MAX = int(os.environ.get("BROWSER_QUEUE_MAX", "8"))
+BROWSER_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("BROWSER_QUEUE_TIMEOUT_SECONDS", "120"))
+# Lancer les navigateurs au démarrage de l'application plutôt qu'au premier job
+BROWSER_POOL_PREWARM = os.environ.get("BROWSER_POOL_PREWARM", "false").lower() == "true"
+
+CHROMIUM_ARGS = ['--no-sandbox', '--disable-setuid-sandbox']
+
+
+class BrowserPoolBusy(Exception):
+    """Tous les navigateurs sont occupés et la file d'attente est pleine"""
+
+
+@dataclass
+class _BrowserSlot:
+    index: int
+    browser: Any = None
+    pages: int = 0
+    launched_at: Optional[float] = None
+
+
+class BrowserLease:
+    """Navigateur loué pour un job; les contextes non fermés sont fermés à la restitution"""
+
+    def __init__(self, slot: _BrowserSlot):
+        self._slot = slot
+        self._contexts: List[Any] = []
+
+    @property
+    def browser(self):
+        return self._slot.browser
+
+    async def new_context(self, **kwargs):
+        context = await self._slot.browser.new_context(**kwargs)
+        self._slot.pages += 1
+        self._contexts.append(context)
+        return context
+
+    async def _release(self):
+        for context in self._contexts:
+            try:
+                await context.close()
+            except Exception:
+                pass
+        self._contexts.clear()
+
+
+class BrowserPool:
+    """Pool borné de navigateurs, avec contrôle de santé, recyclage et file d'attente"""
+
+    def __init__(
+        self,
+        size: int = BROWSER_POOL_SIZE,
+        max_pages_per_browser: int = BROWSER_MAX_PAGES,
+        max_queue: int = BROWSER_QUEUE_MAX,
+        queue_timeout: float = BROWSER_QUEUE_TIMEOUT_SECONDS,
+        launcher: Optional[Callable[[], Awaitable[Any]]] = None
+    ):
+        self.size = max(1, size)
+        self.max_pages_per_browser = max_pages_per_browser
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._launcher = launcher
+        self._playwright = None
+        self._slots = [_BrowserSlot(index) for index in range(self.size)]
+        # Créée au premier usage (liée à l'event loop de l'application); LIFO: le navigateur
+        # le plus récemment utilisé (déjà lancé) est reloué en premier
+        self._idle: Optional[asyncio.LifoQueue] = None
+        self._waiting = 0
+        self._closed = False
+        self.launches = 0
+        self.recycles = 0
+        self.leases = 0
+        self.rejected = 0
+
+    def _ensure_queue(self) -> asyncio.LifoQueue:
+        if self._idle is None:
+            self._idle = asyncio.LifoQueue()
+            for slot in reversed(self._slots):
+                self._idle.put_nowait(slot)
+        return self._idle
+
+    async def _launch(self):
+        if self._launcher is not None:
+            return await self._launcher()
+        if not HAS_PLAYWRIGHT:
+            raise ImportError("Playwright is required. Install with: pip install playwright && playwright install chromium")
+        if self._playwright is None:
+            # Appliquer nest_asyncio pour Python 3.13 Windows
+            if sys.platform == 'win32' and sys.version_info >= (3, 13):
+                import nest_asyncio
+                nest_asyncio.apply()
+            self._playwright = await async_playwright().start()
+        return await self._playwright.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+
+    async def _close_browser(self, slot: _BrowserSlot):
+        browser, slot.browser = slot.browser, None
+        slot.pages = 0
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.warning(f"⚠️ Fermeture du navigateur {slot.index} en échec: {e}")
+
+    async def _prepare(self, slot: _BrowserSlot):
+        """Relance le navigateur du slot s'il est absent, déconnecté ou à recycler"""
+        if slot.browser is not None:
+            if not slot.browser.is_connected():
+                logger.warning(f"⚠️ Navigateur {slot.index} déconnecté, relance")
+                await self._close_browser(slot)
+            elif slot.pages >= self.max_pages_per_browser:
+                logger.info(f"♻️ Navigateur {slot.index} recyclé après {slot.pages} pages")
+                self.recycles += 1
+                await self._close_browser(slot)
+        if slot.browser is None:
+            slot.browser = await self._launch()
+            slot.launched_at = time.time()
+            self.launches += 1
+            logger.info(f"✅ Navigateur {slot.index} lancé")
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[BrowserLease]:
+        """
+        Loue un navigateur pour la durée d'un job
+
+        Raises:
+            BrowserPoolBusy: file d'attente pleine ou attente trop longue
+        """
+        if self._closed:
+            raise RuntimeError("Browser pool is closed")
+        idle = self._ensure_queue()
+        if idle.empty() and self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise BrowserPoolBusy(f"{self._waiting} job(s) already waiting for a browser")
+
+        self._waiting += 1
+        try:
+            slot = await asyncio.wait_for(idle.get(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise BrowserPoolBusy(f"No browser available after {self.queue_timeout:.0f}s")
+        finally:
+            self._waiting -= 1
+
+        lease = None
+        try:
+            await self._prepare(slot)
+            lease = BrowserLease(slot)
+            self.leases += 1
+            yield lease
+        finally:
+            if lease is not None:
+                await lease._release()
+            if self._closed:
+                await self._close_browser(slot)
+            idle.put_nowait(slot)
+
+    async def start(self):
+        """Lance tous les navigateurs (préchauffage au démarrage de l'application)"""
+        for slot in self._slots:
+            await self._prepare(slot)
+
+    async def close(self):
+        """Ferme les navigateurs libres et Playwright (arrêt de l'application)"""
+        self._closed = True
+        for slot in self._slots:
+            await self._close_browser(slot)
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        logger.info("Playwright browser pool closed")
+
+    def status(self) -> Dict[str, Any]:
+        idle = self._idle.qsize() if self._idle is not None else self.size
+        return {
+            "size": self.size,
+            "busy": self.size - idle,
+            "waiting": self._waiting,
+            "max_queue": self.max_queue,
+            "browsers_running": sum(1 for slot in self._slots if slot.browser is not None),
+            "launches": self.launches,
+            "recycles": self.recycles,
+            "leases": self.leases,
+            "rejected": self.rejected,
+        }
+
+
+_browser_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    global _browser_pool
+    if _browser_pool is None:
+        _browser_pool = BrowserPool()
+    return _browser_pool
@@ -0,0 +1,54 @@
+"""
+Limite de requêtes simultanées par worker (remplace uvicorn --limit-concurrency)
+uvicorn compte chaque connexion ouverte: quelques dizaines d'apps abonnées au flux SSE des
+versions suffisaient à faire répondre 503 à toute l'API. Ici seules les requêtes classiques
+sont comptées; les flux longue durée ont leur propre limite (VERSION_EVENTS_MAX_CONNECTIONS).
+"""
+import logging
+import os
+from typing import Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Requêtes HTTP traitées en même temps par le worker (0 = pas de limite; 20 dans l'image Docker)
+REQUEST_CONCURRENCY_LIMIT = int(os.environ.get("REQUEST_CONCURRENCY_LIMIT", "0"))
+REQUEST_CONCURRENCY_RETRY_AFTER = 5
+
+
+class ConcurrencyLimitMiddleware:
+    """Répond 503 + Retry-After au-delà de `limit` requêtes en cours, hors chemins exclus"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limit: int = REQUEST_CONCURRENCY_LIMIT,
+        exclude_suffixes: Tuple[str, ...] = ()
+    ):
+        self.app = app
+        self.limit = limit
+        self.exclude_suffixes = exclude_suffixes
+        self.active = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.limit <= 0 or scope.get("path", "").endswith(self.exclude_suffixes):
+            await self.app(scope, receive, send)
+            return
+
+        if self.active >= self.limit:
+            logger.warning(f"⏳ {self.active} requêtes en cours, {scope.get('path')} refusée (503)")
+            response = JSONResponse(
+                {"detail": "Server busy, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(REQUEST_CONCURRENCY_RETRY_AFTER)}
+            )
+            await response(scope, receive, send)
+            return
+
+        self.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.active -= 1
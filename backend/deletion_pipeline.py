@@ -0,0 +1,279 @@
+"""
+Pipeline de suppression: lignes builds par lots, APK du bucket en arrière-plan
+Les endpoints de suppression (projet, builds) suppriment les lignes par lots puis mettent
+en file les préfixes / chemins du bucket: la réponse n'attend pas le Storage.
+La réconciliation récupère l'espace des APK orphelins (projets ou builds déjà supprimés).
+"""
+import asyncio
+import logging
+import os
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from artifact_index import APK_BUCKET
+from retention_service import RETENTION_BATCH_SIZE, RETENTION_CONCURRENCY, chunked
+
+logger = logging.getLogger(__name__)
+
+# Lignes supprimées par requête PostgREST
+DELETE_ROW_BATCH_SIZE = int(os.environ.get("DELETE_ROW_BATCH_SIZE", "500"))
+# Entrées lues par appel storage.list (maximum Supabase: 1000)
+STORAGE_LIST_PAGE_SIZE = 1000
+# Intervalle de la réconciliation planifiée (0 = uniquement à la demande): la purge des
+# orphelins parcourt tout le bucket, elle n'est planifiée que si configurée explicitement
+STORAGE_RECONCILE_INTERVAL_HOURS = float(os.environ.get("STORAGE_RECONCILE_INTERVAL_HOURS", "0"))
+
+
+@dataclass
+class ReclaimMetrics:
+    pending: int = 0
+    prefixes_processed: int = 0
+    objects_removed: int = 0
+    rows_deleted: int = 0
+    errors: int = 0
+    last_error: Optional[str] = None
+    reconciling: bool = False
+    last_reconcile_at: Optional[str] = None
+    last_reconcile_orphans: int = 0
+
+
+class DeletionPipeline:
+    """Suppression par lots des builds et récupération asynchrone de l'espace Storage"""
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        bucket: str = APK_BUCKET,
+        row_batch_size: int = DELETE_ROW_BATCH_SIZE,
+        storage_batch_size: int = RETENTION_BATCH_SIZE,
+        concurrency: int = RETENTION_CONCURRENCY,
+        on_builds_deleted: Optional[Callable[[List[str]], None]] = None
+    ):
+        self.client_factory = client_factory
+        self.bucket = bucket
+        self.row_batch_size = row_batch_size
+        self.storage_batch_size = storage_batch_size
+        self.concurrency = max(1, concurrency)
+        self.on_builds_deleted = on_builds_deleted
+        self.metrics = ReclaimMetrics()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._reconcile_task: Optional[asyncio.Task] = None
+        self._scheduler: Optional[asyncio.Task] = None
+
+    # ---------- lignes ----------
+
+    async def delete_build_rows(self, client, **filters: str) -> List[Dict[str, Any]]:
+        """
+        Supprime les builds correspondant aux filtres (égalité) par lots
+
+        Returns:
+            Lignes supprimées (id, project_id, storage_path)
+
+        Raises:
+            RuntimeError: un lot n'a rien supprimé (RLS, filtre): les mêmes lignes seraient
+                relues indéfiniment
+        """
+        deleted: List[Dict[str, Any]] = []
+        while True:
+            query = client.table("builds").select("id, project_id, storage_path")
+            for column, value in filters.items():
+                query = query.eq(column, value)
+            result = await asyncio.to_thread(query.limit(self.row_batch_size).execute)
+            selected = result.data or []
+            if not selected:
+                break
+
+            delete = client.table("builds").delete().in_("id", [row["id"] for row in selected])
+            removed_ids = {row["id"] for row in (await asyncio.to_thread(delete.execute)).data or []}
+            if not removed_ids:
+                raise RuntimeError(f"{len(selected)} build(s) non supprimé(s) ({filters}): suppression refusée")
+            rows = [row for row in selected if row["id"] in removed_ids]
+            deleted.extend(rows)
+            self.metrics.rows_deleted += len(rows)
+            if self.on_builds_deleted:
+                await asyncio.to_thread(self.on_builds_deleted, [row["id"] for row in rows])
+            if len(selected) < self.row_batch_size:
+                break
+        return deleted
+
+    # ---------- file de suppression Storage ----------
+
+    def _ensure_worker(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run_worker())
+
+    def enqueue_prefix(self, prefix: str):
+        """Met en file la suppression de tous les objets sous un préfixe (ex: projects/{id}/builds)"""
+        self._ensure_worker()
+        self._queue.put_nowait(("prefix", prefix.rstrip("/")))
+        self.metrics.pending += 1
+
+    def enqueue_paths(self, paths: List[str]):
+        """Met en file la suppression d'objets précis"""
+        paths = [path for path in paths if path]
+        if not paths:
+            return
+        self._ensure_worker()
+        for batch in chunked(paths, self.storage_batch_size):
+            self._queue.put_nowait(("paths", batch))
+            self.metrics.pending += 1
+
+    async def _run_worker(self):
+        while True:
+            kind, target = await self._queue.get()
+            try:
+                client = self.client_factory()
+                if not client:
+                    raise RuntimeError("Database unavailable")
+                if kind == "prefix":
+                    removed = await self._remove_prefix(client, target)
+                    self.metrics.prefixes_processed += 1
+                    logger.info(f"🗑️ Storage: {removed} objet(s) supprimé(s) sous {target}/")
+                else:
+                    await self._remove_paths(client, target)
+            except Exception as e:
+                self.metrics.errors += 1
+                self.metrics.last_error = str(e)
+                logger.warning(f"⚠️ Suppression Storage en échec ({kind} {target}): {e}")
+            finally:
+                self.metrics.pending -= 1
+                self._queue.task_done()
+
+    def _list(self, client, prefix: str, offset: int = 0) -> List[Dict[str, Any]]:
+        return client.storage.from_(self.bucket).list(
+            prefix, {"limit": STORAGE_LIST_PAGE_SIZE, "offset": offset}
+        ) or []
+
+    async def _remove_paths(self, client, paths: List[str]) -> int:
+        """Supprime des objets par lots, en parallèle borné; retourne le nombre supprimé"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def remove(batch):
+            async with semaphore:
+                try:
+                    await asyncio.to_thread(client.storage.from_(self.bucket).remove, batch)
+                    return len(batch)
+                except Exception as e:
+                    self.metrics.errors += 1
+                    self.metrics.last_error = str(e)
+                    logger.warning(f"⚠️ Storage: lot de {len(batch)} objet(s) non supprimé: {e}")
+                    return 0
+
+        removed = sum(await asyncio.gather(*(remove(batch) for batch in chunked(paths, self.storage_batch_size))))
+        self.metrics.objects_removed += removed
+        return removed
+
+    async def _remove_prefix(self, client, prefix: str) -> int:
+        total = 0
+        while True:
+            # Toujours relire depuis le début: les objets supprimés décalent les offsets
+            entries = await asyncio.to_thread(self._list, client, prefix)
+            files = [f"{prefix}/{entry['name']}" for entry in entries if entry.get("id")]
+            if not files:
+                return total
+            removed = await self._remove_paths(client, files)
+            total += removed
+            if removed < len(files):
+                raise RuntimeError(f"{len(files) - removed} objet(s) non supprimé(s) sous {prefix}/")
+
+    # ---------- réconciliation ----------
+
+    def _existing_ids(self, client, table: str, ids: List[str]) -> set:
+        existing = set()
+        for batch in chunked(ids, self.storage_batch_size):
+            result = client.table(table).select("id").in_("id", batch).execute()
+            existing.update(row["id"] for row in result.data or [])
+        return existing
+
+    async def _reconcile_project(self, client, project_id: str) -> int:
+        """Met en file les APK d'un projet existant dont le build n'existe plus"""
+        prefix = f"projects/{project_id}/builds"
+        orphans = 0
+        offset = 0
+        while True:
+            entries = await asyncio.to_thread(self._list, client, prefix, offset)
+            names = [entry["name"] for entry in entries if entry.get("id") and entry["name"].endswith(".apk")]
+            build_ids = [name[:-len(".apk")] for name in names]
+            existing = await asyncio.to_thread(self._existing_ids, client, "builds", build_ids)
+            orphan_paths = [f"{prefix}/{name}" for name, build_id in zip(names, build_ids) if build_id not in existing]
+            self.enqueue_paths(orphan_paths)
+            orphans += len(orphan_paths)
+            if len(entries) < STORAGE_LIST_PAGE_SIZE:
+                return orphans
+            offset += len(entries)
+
+    async def reconcile(self) -> Dict[str, Any]:
+        """Parcourt le bucket et met en file les APK orphelins (projet ou build supprimé)"""
+        client = self.client_factory()
+        if not client:
+            return {"orphans": 0, "error": "Database unavailable"}
+
+        self.metrics.reconciling = True
+        orphan_projects = 0
+        orphan_objects = 0
+        try:
+            offset = 0
+            while True:
+                entries = await asyncio.to_thread(self._list, client, "projects", offset)
+                # Les dossiers n'ont pas d'id dans la réponse de storage.list
+                project_ids = [entry["name"] for entry in entries if not entry.get("id")]
+                existing = await asyncio.to_thread(self._existing_ids, client, "projects", project_ids)
+                for project_id in project_ids:
+                    if project_id in existing:
+                        orphan_objects += await self._reconcile_project(client, project_id)
+                    else:
+                        self.enqueue_prefix(f"projects/{project_id}/builds")
+                        orphan_projects += 1
+                if len(entries) < STORAGE_LIST_PAGE_SIZE:
+                    break
+                offset += len(entries)
+
+            result = {"orphan_projects": orphan_projects, "orphan_objects": orphan_objects}
+            logger.info(f"🔎 Réconciliation Storage: {result}")
+            return result
+        except Exception as e:
+            self.metrics.errors += 1
+            self.metrics.last_error = str(e)
+            logger.error(f"❌ Erreur réconciliation Storage: {e}", exc_info=True)
+            return {"orphan_projects": orphan_projects, "orphan_objects": orphan_objects, "error": str(e)}
+        finally:
+            self.metrics.reconciling = False
+            self.metrics.last_reconcile_at = datetime.now(timezone.utc).isoformat()
+            self.metrics.last_reconcile_orphans = orphan_projects + orphan_objects
+
+    def start_reconcile(self) -> bool:
+        """Lance une réconciliation en arrière-plan; False si une est déjà en cours"""
+        if self._reconcile_task is not None and not self._reconcile_task.done():
+            return False
+        self._reconcile_task = asyncio.ensure_future(self.reconcile())
+        return True
+
+    def start_scheduler(self, interval_hours: float = STORAGE_RECONCILE_INTERVAL_HOURS):
+        if interval_hours <= 0 or self._scheduler is not None:
+            return
+
+        async def loop():
+            while True:
+                await asyncio.sleep(interval_hours * 3600)
+                self.start_reconcile()
+
+        self._scheduler = asyncio.ensure_future(loop())
+
+    def stop(self):
+        for task in (self._scheduler, self._reconcile_task, self._worker):
+            if task is not None and not task.done():
+                task.cancel()
+        self._scheduler = None
+        self._worker = None
+
+    def status(self) -> Dict[str, Any]:
+        return asdict(self.metrics)
+
+    async def drain(self):
+        """Attend que la file Storage soit vide (tests, arrêt propre)"""
+        if self._queue is not None:
+            await self._queue.join()
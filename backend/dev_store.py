@@ -0,0 +1,163 @@
+"""
+Stockage en mémoire du mode DEV (sans Supabase), indexé comme les tables qu'il remplace
+Les projets et builds sont retrouvés par id, projet ou utilisateur sans parcourir tout le
+stockage (tests de charge, CI). Un instantané JSON optionnel (DEV_STORE_SNAPSHOT) permet
+de conserver les données entre deux redémarrages.
+"""
+import json
+import logging
+import os
+import tempfile
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+DEV_STORE_SNAPSHOT = os.environ.get("DEV_STORE_SNAPSHOT")
+
+
+class DevProjectStore(MutableMapping):
+    """Projets par id (interface dict), avec un index par utilisateur"""
+
+    def __init__(self):
+        self._projects: Dict[str, Dict[str, Any]] = {}
+        self._by_user: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def __getitem__(self, project_id: str) -> Dict[str, Any]:
+        return self._projects[project_id]
+
+    def __setitem__(self, project_id: str, project: Dict[str, Any]):
+        # Une modification garde la position (ordre de création); seul un changement de
+        # propriétaire déplace le projet dans l'index
+        if project_id in self._projects and self._projects[project_id].get("user_id") != project.get("user_id"):
+            self._unindex(project_id)
+        self._projects[project_id] = project
+        self._by_user.setdefault(project.get("user_id"), {})[project_id] = project
+
+    def __delitem__(self, project_id: str):
+        self._unindex(project_id)
+        del self._projects[project_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._projects)
+
+    def __len__(self) -> int:
+        return len(self._projects)
+
+    def _unindex(self, project_id: str):
+        user_id = self._projects[project_id].get("user_id")
+        user_projects = self._by_user.get(user_id, {})
+        user_projects.pop(project_id, None)
+        if not user_projects:
+            self._by_user.pop(user_id, None)
+
+    def for_user(self, user_id: str) -> List[Dict[str, Any]]:
+        """Projets d'un utilisateur, dans l'ordre de création"""
+        return list(self._by_user.get(user_id, {}).values())
+
+    def count_for_user(self, user_id: str) -> int:
+        return len(self._by_user.get(user_id, ()))
+
+
+class DevBuildStore:
+    """Builds indexés par id, projet et utilisateur (les dicts sont mis à jour sur place)"""
+
+    def __init__(self):
+        self._builds: Dict[str, Dict[str, Any]] = {}
+        self._by_project: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._by_user: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._builds)
+
+    def __contains__(self, build_id: str) -> bool:
+        return build_id in self._builds
+
+    def add(self, build: Dict[str, Any]) -> Dict[str, Any]:
+        build_id = build["id"]
+        if build_id in self._builds:
+            self.remove(build_id)
+        self._builds[build_id] = build
+        self._by_project.setdefault(build.get("project_id"), {})[build_id] = build
+        self._by_user.setdefault(build.get("user_id"), {})[build_id] = build
+        return build
+
+    def get(self, build_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Build par id (None s'il n'existe pas ou n'appartient pas à user_id)"""
+        build = self._builds.get(build_id)
+        if build is None or (user_id is not None and build.get("user_id") != user_id):
+            return None
+        return build
+
+    def remove(self, build_id: str) -> Optional[Dict[str, Any]]:
+        build = self._builds.pop(build_id, None)
+        if build is None:
+            return None
+        for index, key in ((self._by_project, build.get("project_id")), (self._by_user, build.get("user_id"))):
+            entries = index.get(key, {})
+            entries.pop(build_id, None)
+            if not entries:
+                index.pop(key, None)
+        return build
+
+    def delete_project(self, project_id: str) -> List[Dict[str, Any]]:
+        """Supprime et retourne les builds d'un projet"""
+        return [self.remove(build_id) for build_id in list(self._by_project.get(project_id, ()))]
+
+    def for_user(self, user_id: str, project_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Builds d'un utilisateur (éventuellement d'un projet), du plus récent au plus ancien"""
+        if project_id is not None:
+            builds = [b for b in self._by_project.get(project_id, {}).values() if b.get("user_id") == user_id]
+        else:
+            builds = list(self._by_user.get(user_id, {}).values())
+        builds.reverse()
+        return builds
+
+    def for_project(self, project_id: str) -> List[Dict[str, Any]]:
+        return list(self._by_project.get(project_id, {}).values())
+
+    def count_for_user(self, user_id: str, status: Optional[str] = None) -> int:
+        builds = self._by_user.get(user_id, {})
+        if status is None:
+            return len(builds)
+        return sum(1 for build in builds.values() if build.get("status") == status)
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Tous les builds, du plus récent au plus ancien"""
+        return list(reversed(self._builds.values()))
+
+
+def save_snapshot(path: Union[str, Path], projects: DevProjectStore, builds: DevBuildStore):
+    """Écrit les projets et builds dans un fichier JSON (remplacement atomique)"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {"projects": list(projects.values()), "builds": list(reversed(builds.all()))}
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    logger.info(f"💾 Instantané DEV enregistré: {len(projects)} projet(s), {len(builds)} build(s)")
+
+
+def load_snapshot(path: Union[str, Path], projects: DevProjectStore, builds: DevBuildStore) -> bool:
+    """Recharge un instantané s'il existe (False sinon ou s'il est illisible)"""
+    path = Path(path)
+    if not path.exists():
+        return False
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Instantané DEV illisible ({path}): {e}")
+        return False
+    for project in data.get("projects", []):
+        projects[project["id"]] = project
+    for build in data.get("builds", []):
+        builds.add(build)
+    logger.info(f"📂 Instantané DEV rechargé: {len(projects)} projet(s), {len(builds)} build(s)")
+    return True
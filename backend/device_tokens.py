@@ -0,0 +1,467 @@
+"""
+Registre des tokens push des appareils (apps générées)
+Les apps enregistrent leur token via le SDK NativiWeb; les envois ciblent ensuite
+« tous les appareils du projet X » (ou d'un topic) sans que l'appelant transmette de listes.
+Production: tables Supabase device_tokens / device_token_topics
+(scripts/create-device-tokens-tables.sql), partagées par tous les workers et hôtes.
+Mode DEV: SQLite réparti en shards par projet dans DEVICE_TOKENS_DIR, à placer sur un volume
+persistant (sinon les tokens disparaissent au redémarrage du conteneur).
+Pagination par curseur (id croissant) pour parcourir des millions de tokens sans OFFSET.
+"""
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Registre SQLite (mode DEV uniquement); sans valeur, repli sur un dossier temporaire
+DEVICE_TOKENS_DIR = os.environ.get("DEVICE_TOKENS_DIR")
+DEVICE_TOKEN_SHARDS = int(os.environ.get("DEVICE_TOKEN_SHARDS", "16"))
+DEVICE_TOKEN_PAGE_SIZE = 1000
+DEVICE_TOKEN_MAX_TOPICS = 32
+# Valeurs par filtre in.(...) (longueur de l'URL PostgREST)
+DEVICE_TOKEN_FILTER_CHUNK = 100
+
+PLATFORMS = ("android", "ios")
+_TOPIC_RE = re.compile(r"^[A-Za-z0-9_.~%-]{1,64}$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS device_tokens (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_id TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    token TEXT NOT NULL,
+    device_id TEXT,
+    app_version TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (project_id, platform, token)
+);
+CREATE INDEX IF NOT EXISTS idx_device_tokens_project ON device_tokens(project_id, id);
+CREATE INDEX IF NOT EXISTS idx_device_tokens_device ON device_tokens(project_id, device_id);
+CREATE INDEX IF NOT EXISTS idx_device_tokens_token ON device_tokens(token);
+CREATE TABLE IF NOT EXISTS token_topics (
+    project_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    token_id INTEGER NOT NULL,
+    PRIMARY KEY (project_id, topic, token_id)
+);
+CREATE INDEX IF NOT EXISTS idx_token_topics_token ON token_topics(token_id);
+"""
+
+
+class InvalidTokenRegistration(ValueError):
+    """Plateforme, token ou topic invalide"""
+
+
+def _validate(platform: str, token: str, topics: Iterable[str]) -> List[str]:
+    if platform not in PLATFORMS:
+        raise InvalidTokenRegistration(f"platform must be one of {', '.join(PLATFORMS)}")
+    if not token or len(token) > 4096:
+        raise InvalidTokenRegistration("token is required (max 4096 characters)")
+    topics = list(dict.fromkeys(topics))
+    if len(topics) > DEVICE_TOKEN_MAX_TOPICS:
+        raise InvalidTokenRegistration(f"at most {DEVICE_TOKEN_MAX_TOPICS} topics per device")
+    for topic in topics:
+        if not _TOPIC_RE.match(topic):
+            raise InvalidTokenRegistration(f"invalid topic: {topic!r}")
+    return topics
+
+
+class DeviceTokenRegistry:
+    """Tokens par projet et topic, répartis sur N bases SQLite (WAL)"""
+
+    def __init__(self, root: Union[str, Path, None] = DEVICE_TOKENS_DIR, shards: int = DEVICE_TOKEN_SHARDS):
+        if not root:
+            root = Path(tempfile.gettempdir()) / "nativiweb_device_tokens"
+            logger.warning(
+                f"⚠️ DEVICE_TOKENS_DIR non défini: tokens push dans {root}, "
+                "perdus au redémarrage du conteneur"
+            )
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.shards = max(1, shards)
+        for shard in range(self.shards):
+            with self._connect(shard) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+
+    def shard_for(self, project_id: str) -> int:
+        """Shard stable d'un projet (tous ses tokens sont dans la même base)"""
+        return int.from_bytes(hashlib.sha1(project_id.encode("utf-8")).digest()[:4], "big") % self.shards
+
+    @contextmanager
+    def _connect(self, shard: int) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.root / f"tokens_{shard:02d}.sqlite3", timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # ---------- écriture ----------
+
+    def register(
+        self,
+        project_id: str,
+        platform: str,
+        token: str,
+        topics: Iterable[str] = (),
+        device_id: Optional[str] = None,
+        app_version: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Enregistre (ou met à jour) le token d'un appareil et remplace ses topics
+        Un nouveau token pour le même device_id remplace l'ancien (rotation du token).
+        """
+        topics = _validate(platform, token, topics)
+        now = time.time()
+        with self._connect(self.shard_for(project_id)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if device_id:
+                    stale = [row[0] for row in conn.execute(
+                        "SELECT id FROM device_tokens WHERE project_id = ? AND device_id = ? AND NOT (platform = ? AND token = ?)",
+                        (project_id, device_id, platform, token)
+                    )]
+                    self._delete_ids(conn, stale)
+                conn.execute(
+                    """
+                    INSERT INTO device_tokens (project_id, platform, token, device_id, app_version, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(project_id, platform, token) DO UPDATE SET
+                        device_id = COALESCE(excluded.device_id, device_tokens.device_id),
+                        app_version = COALESCE(excluded.app_version, device_tokens.app_version),
+                        updated_at = excluded.updated_at
+                    """,
+                    (project_id, platform, token, device_id, app_version, now, now)
+                )
+                token_id = conn.execute(
+                    "SELECT id FROM device_tokens WHERE project_id = ? AND platform = ? AND token = ?",
+                    (project_id, platform, token)
+                ).fetchone()[0]
+                conn.execute("DELETE FROM token_topics WHERE token_id = ?", (token_id,))
+                conn.executemany(
+                    "INSERT INTO token_topics (project_id, topic, token_id) VALUES (?, ?, ?)",
+                    ((project_id, topic, token_id) for topic in topics)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return {"id": token_id, "project_id": project_id, "platform": platform, "topics": topics}
+
+    @staticmethod
+    def _delete_ids(conn: sqlite3.Connection, ids: List[int]):
+        for token_id in ids:
+            conn.execute("DELETE FROM token_topics WHERE token_id = ?", (token_id,))
+            conn.execute("DELETE FROM device_tokens WHERE id = ?", (token_id,))
+
+    def unregister(self, project_id: str, platform: str, token: str) -> bool:
+        with self._connect(self.shard_for(project_id)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [row[0] for row in conn.execute(
+                    "SELECT id FROM device_tokens WHERE project_id = ? AND platform = ? AND token = ?",
+                    (project_id, platform, token)
+                )]
+                self._delete_ids(conn, ids)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return bool(ids)
+
+    def remove_tokens(self, tokens: Iterable[Tuple[str, str]]) -> int:
+        """Supprime des (platform, token) de tous les projets (tokens désinscrits signalés par FCM / APNs)"""
+        tokens = list(tokens)
+        removed = 0
+        if not tokens:
+            return 0
+        for shard in range(self.shards):
+            with self._connect(shard) as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for platform, token in tokens:
+                        ids = [row[0] for row in conn.execute(
+                            "SELECT id FROM device_tokens WHERE token = ? AND platform = ?", (token, platform)
+                        )]
+                        self._delete_ids(conn, ids)
+                        removed += len(ids)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        if removed:
+            logger.info(f"🧹 {removed} token(s) push désinscrit(s) retiré(s) du registre")
+        return removed
+
+    def delete_project(self, project_id: str) -> int:
+        with self._connect(self.shard_for(project_id)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM token_topics WHERE project_id = ?", (project_id,))
+                removed = conn.execute("DELETE FROM device_tokens WHERE project_id = ?", (project_id,)).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return removed
+
+    # ---------- lecture ----------
+
+    def page(
+        self,
+        project_id: str,
+        topic: Optional[str] = None,
+        platform: Optional[str] = None,
+        cursor: int = 0,
+        limit: int = DEVICE_TOKEN_PAGE_SIZE
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Page de tokens après le curseur (id exclusif), parcourue dans l'ordre de l'index
+
+        Returns:
+            (tokens, curseur suivant ou None en fin de liste)
+        """
+        if topic:
+            query = (
+                "SELECT d.id, d.platform, d.token, d.device_id, d.app_version, d.updated_at "
+                "FROM token_topics t JOIN device_tokens d ON d.id = t.token_id "
+                "WHERE t.project_id = ? AND t.topic = ? AND t.token_id > ?"
+            )
+            params: List[Any] = [project_id, topic, cursor]
+            order = "t.token_id"
+        else:
+            query = (
+                "SELECT id, platform, token, device_id, app_version, updated_at "
+                "FROM device_tokens d WHERE d.project_id = ? AND d.id > ?"
+            )
+            params = [project_id, cursor]
+            order = "d.id"
+        if platform:
+            query += " AND d.platform = ?"
+            params.append(platform)
+        query += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+
+        with self._connect(self.shard_for(project_id)) as conn:
+            rows = [dict(row) for row in conn.execute(query, params)]
+        next_cursor = rows[-1]["id"] if len(rows) == limit else None
+        return rows, next_cursor
+
+    def iter_recipients(
+        self,
+        project_id: str,
+        topic: Optional[str] = None,
+        platform: Optional[str] = None,
+        page_size: int = DEVICE_TOKEN_PAGE_SIZE
+    ) -> Iterator[Tuple[str, str]]:
+        """(platform, token) de tous les appareils ciblés, lus page par page"""
+        cursor: Optional[int] = 0
+        while cursor is not None:
+            rows, cursor = self.page(project_id, topic, platform, cursor, page_size)
+            for row in rows:
+                yield row["platform"], row["token"]
+
+    def count(self, project_id: str, topic: Optional[str] = None) -> Dict[str, int]:
+        with self._connect(self.shard_for(project_id)) as conn:
+            if topic:
+                rows = conn.execute(
+                    "SELECT d.platform, COUNT(*) FROM token_topics t JOIN device_tokens d ON d.id = t.token_id "
+                    "WHERE t.project_id = ? AND t.topic = ? GROUP BY d.platform",
+                    (project_id, topic)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT platform, COUNT(*) FROM device_tokens WHERE project_id = ? GROUP BY platform",
+                    (project_id,)
+                ).fetchall()
+        counts = {platform: 0 for platform in PLATFORMS}
+        counts.update({row[0]: row[1] for row in rows})
+        counts["total"] = sum(counts[platform] for platform in PLATFORMS)
+        return counts
+
+
+def _chunks(values: List[Any], size: int = DEVICE_TOKEN_FILTER_CHUNK) -> Iterator[List[Any]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class SupabaseDeviceTokenRegistry:
+    """
+    Même interface que DeviceTokenRegistry, sur les tables Supabase
+    Les topics sont supprimés avec leur token (ON DELETE CASCADE), tout comme les tokens
+    d'un projet supprimé; la plateforme est recopiée dans device_token_topics pour filtrer
+    et compter un topic sans jointure.
+    """
+
+    COLUMNS = "id, platform, token, device_id, app_version, updated_at"
+
+    def __init__(self, client_factory: Callable[[], Any]):
+        self._client_factory = client_factory
+
+    def _client(self):
+        client = self._client_factory()
+        if client is None:
+            raise RuntimeError("Supabase client unavailable")
+        return client
+
+    # ---------- écriture ----------
+
+    def register(
+        self,
+        project_id: str,
+        platform: str,
+        token: str,
+        topics: Iterable[str] = (),
+        device_id: Optional[str] = None,
+        app_version: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Enregistre (ou met à jour) le token d'un appareil et remplace ses topics"""
+        topics = _validate(platform, token, topics)
+        client = self._client()
+        if device_id:
+            rows = client.table("device_tokens").select("id, platform, token") \
+                .eq("project_id", project_id).eq("device_id", device_id).execute().data or []
+            stale = [row["id"] for row in rows if (row["platform"], row["token"]) != (platform, token)]
+            for ids in _chunks(stale):
+                client.table("device_tokens").delete().in_("id", ids).execute()
+
+        # Colonnes absentes du payload conservées à la mise à jour (comme COALESCE en SQLite)
+        row = {
+            "project_id": project_id,
+            "platform": platform,
+            "token": token,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if device_id:
+            row["device_id"] = device_id
+        if app_version:
+            row["app_version"] = app_version
+        token_id = client.table("device_tokens").upsert(
+            row, on_conflict="project_id,platform,token"
+        ).execute().data[0]["id"]
+
+        client.table("device_token_topics").delete().eq("token_id", token_id).execute()
+        if topics:
+            client.table("device_token_topics").insert([
+                {"project_id": project_id, "topic": topic, "token_id": token_id, "platform": platform}
+                for topic in topics
+            ]).execute()
+        return {"id": token_id, "project_id": project_id, "platform": platform, "topics": topics}
+
+    def unregister(self, project_id: str, platform: str, token: str) -> bool:
+        removed = self._client().table("device_tokens").delete() \
+            .eq("project_id", project_id).eq("platform", platform).eq("token", token).execute().data
+        return bool(removed)
+
+    def remove_tokens(self, tokens: Iterable[Tuple[str, str]]) -> int:
+        """Supprime des (platform, token) de tous les projets (tokens désinscrits signalés par FCM / APNs)"""
+        by_platform: Dict[str, List[str]] = {}
+        for platform, token in tokens:
+            by_platform.setdefault(platform, []).append(token)
+        if not by_platform:
+            return 0
+        client = self._client()
+        removed = 0
+        for platform, platform_tokens in by_platform.items():
+            for chunk in _chunks(platform_tokens):
+                removed += len(
+                    client.table("device_tokens").delete().eq("platform", platform).in_("token", chunk).execute().data or []
+                )
+        if removed:
+            logger.info(f"🧹 {removed} token(s) push désinscrit(s) retiré(s) du registre")
+        return removed
+
+    def delete_project(self, project_id: str) -> int:
+        return len(self._client().table("device_tokens").delete().eq("project_id", project_id).execute().data or [])
+
+    # ---------- lecture ----------
+
+    def page(
+        self,
+        project_id: str,
+        topic: Optional[str] = None,
+        platform: Optional[str] = None,
+        cursor: int = 0,
+        limit: int = DEVICE_TOKEN_PAGE_SIZE
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Page de tokens après le curseur (id exclusif)
+
+        Returns:
+            (tokens, curseur suivant ou None en fin de liste)
+        """
+        client = self._client()
+        if topic:
+            query = client.table("device_token_topics").select("token_id") \
+                .eq("project_id", project_id).eq("topic", topic).gt("token_id", cursor)
+            if platform:
+                query = query.eq("platform", platform)
+            ids = [row["token_id"] for row in query.order("token_id").limit(limit).execute().data or []]
+            rows = []
+            if ids:
+                rows = client.table("device_tokens").select(self.COLUMNS).in_("id", ids).order("id").execute().data or []
+            next_cursor = ids[-1] if len(ids) == limit else None
+            return rows, next_cursor
+
+        query = client.table("device_tokens").select(self.COLUMNS).eq("project_id", project_id).gt("id", cursor)
+        if platform:
+            query = query.eq("platform", platform)
+        rows = query.order("id").limit(limit).execute().data or []
+        next_cursor = rows[-1]["id"] if len(rows) == limit else None
+        return rows, next_cursor
+
+    def iter_recipients(
+        self,
+        project_id: str,
+        topic: Optional[str] = None,
+        platform: Optional[str] = None,
+        page_size: int = DEVICE_TOKEN_PAGE_SIZE
+    ) -> Iterator[Tuple[str, str]]:
+        """(platform, token) de tous les appareils ciblés, lus page par page"""
+        cursor: Optional[int] = 0
+        while cursor is not None:
+            rows, cursor = self.page(project_id, topic, platform, cursor, page_size)
+            for row in rows:
+                yield row["platform"], row["token"]
+
+    def count(self, project_id: str, topic: Optional[str] = None) -> Dict[str, int]:
+        client = self._client()
+        counts = {}
+        for platform in PLATFORMS:
+            table = "device_token_topics" if topic else "device_tokens"
+            query = client.table(table).select("project_id", count="exact", head=True) \
+                .eq("project_id", project_id).eq("platform", platform)
+            if topic:
+                query = query.eq("topic", topic)
+            counts[platform] = query.execute().count or 0
+        counts["total"] = sum(counts[platform] for platform in PLATFORMS)
+        return counts
+
+
+# Instance globale
+_device_tokens: Union[DeviceTokenRegistry, SupabaseDeviceTokenRegistry, None] = None
+
+
+def use_supabase_device_tokens(client_factory: Callable[[], Any]):
+    """Stocke le registre dans Supabase (hors mode DEV); à appeler avant get_device_tokens()"""
+    global _device_tokens
+    _device_tokens = SupabaseDeviceTokenRegistry(client_factory)
+
+
+def get_device_tokens() -> Union[DeviceTokenRegistry, SupabaseDeviceTokenRegistry]:
+    """Récupère le registre des tokens push (singleton par processus, stockage partagé)"""
+    global _device_tokens
+    if _device_tokens is None:
+        _device_tokens = DeviceTokenRegistry()
+    return _device_tokens
@@ -0,0 +1,331 @@
+"""
+Réponses de téléchargement: requêtes Range (reprise), ETag fort, GET conditionnel (304)
+et envoi zero-copy des artefacts locaux lorsque le serveur ASGI le permet
+"""
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import quote
+
+import anyio
+from fastapi import Request
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+APK_MEDIA_TYPE = "application/vnd.android.package-archive"
+ZIP_MEDIA_TYPE = "application/zip"
+
+# Lecture par blocs de 1 MiB quand le zero-copy n'est pas disponible
+CHUNK_SIZE = 1024 * 1024
+
+# Les clients doivent revalider (304) mais peuvent garder une copie locale
+DOWNLOAD_CACHE_CONTROL = "private, no-cache"
+
+# Hash des fichiers locaux, indexé par (chemin, taille, mtime) pour ne hasher qu'une fois
+_FILE_HASH_CACHE_SIZE = 256
+_file_hash_cache: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+
+
+class RangeNotSatisfiable(Exception):
+    """Plage demandée hors du fichier (416)"""
+
+
+def strong_etag(digest: str) -> str:
+    return f'"{digest}"'
+
+
+def bytes_sha256(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def file_sha256(path: Union[str, Path], stat_result: Optional[os.stat_result] = None) -> str:
+    """SHA-256 d'un fichier local, calculé dans un thread et mis en cache tant qu'il ne change pas"""
+    path = str(path)
+    if stat_result is None:
+        stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    key = (path, stat_result.st_size, stat_result.st_mtime_ns)
+
+    cached = _file_hash_cache.get(key)
+    if cached:
+        _file_hash_cache.move_to_end(key)
+        return cached
+
+    digest = await anyio.to_thread.run_sync(_hash_file, path)
+    _file_hash_cache[key] = digest
+    while len(_file_hash_cache) > _FILE_HASH_CACHE_SIZE:
+        _file_hash_cache.popitem(last=False)
+    return digest
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparaison faible (If-None-Match) entre l'en-tête reçu et notre ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse un en-tête Range mono-plage
+
+    Returns:
+        (start, end) inclusifs, ou None pour servir le fichier complet
+        (en-tête absent, invalide ou multi-plages)
+
+    Raises:
+        RangeNotSatisfiable: plage valide mais hors du fichier
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec or "," in spec:
+        return None
+
+    start_text, sep, end_text = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_text == "":
+            # Suffixe: les N derniers octets
+            suffix_length = int(end_text)
+            if suffix_length <= 0:
+                raise RangeNotSatisfiable(range_header)
+            return max(0, size - suffix_length), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable(range_header)
+    if start > end:
+        return None
+    return start, min(end, size - 1)
+
+
+def _content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _base_headers(filename: str, etag: str, extra_headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    headers = {
+        "Content-Disposition": _content_disposition(filename),
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": DOWNLOAD_CACHE_CONTROL,
+    }
+    if extra_headers:
+        headers.update(extra_headers)
+    return headers
+
+
+def _resolve_request(request: Request, etag: str, size: int) -> Tuple[int, Optional[Tuple[int, int]]]:
+    """Applique If-None-Match / If-Range / Range; retourne (status, plage)"""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return 304, None
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range.strip() != etag:
+        # La ressource a changé depuis le début du téléchargement: renvoyer tout
+        range_header = None
+
+    byte_range = parse_range(range_header, size)
+    if byte_range is None:
+        return 200, None
+    return 206, byte_range
+
+
+def _not_satisfiable(etag: str, size: int) -> Response:
+    return Response(
+        status_code=416,
+        headers={"Content-Range": f"bytes */{size}", "ETag": etag, "Accept-Ranges": "bytes"}
+    )
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": DOWNLOAD_CACHE_CONTROL})
+
+
+class ArtifactFileResponse(Response):
+    """
+    Envoie un fichier local (éventuellement une plage) en zero-copy si le serveur ASGI
+    expose http.response.zerocopy / http.response.pathsend, sinon par blocs de 1 MiB
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        offset: int,
+        length: int,
+        full_file: bool,
+        status_code: int,
+        headers: Dict[str, str],
+        media_type: str
+    ):
+        self.path = str(path)
+        self.offset = offset
+        self.length = length
+        self.full_file = full_file
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if scope["method"].upper() == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        extensions = scope.get("extensions") or {}
+        if self.full_file and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": self.path})
+            return
+
+        if "http.response.zerocopy" in extensions:
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": file,
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # Fichier tronqué pendant l'envoi: clore proprement la réponse
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def file_download_response(
+    request: Request,
+    path: Union[str, Path],
+    filename: str,
+    media_type: str = APK_MEDIA_TYPE,
+    content_hash: Optional[str] = None,
+    extra_headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """
+    Réponse de téléchargement pour un artefact local
+
+    Args:
+        request: Requête entrante (en-têtes Range / If-None-Match / If-Range)
+        path: Chemin du fichier
+        filename: Nom proposé au client
+        media_type: Type MIME
+        content_hash: SHA-256 connu de l'artefact (sinon calculé et mis en cache)
+        extra_headers: En-têtes additionnels
+    """
+    stat_result = await anyio.to_thread.run_sync(os.stat, str(path))
+    size = stat_result.st_size
+    etag = strong_etag(content_hash or await file_sha256(path, stat_result))
+
+    try:
+        status, byte_range = _resolve_request(request, etag, size)
+    except RangeNotSatisfiable:
+        return _not_satisfiable(etag, size)
+
+    if status == 304:
+        return _not_modified(etag)
+
+    headers = _base_headers(filename, etag, extra_headers)
+    if byte_range is None:
+        return ArtifactFileResponse(path, 0, size, True, 200, headers, media_type)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return ArtifactFileResponse(path, start, end - start + 1, False, 206, headers, media_type)
+
+
+def bytes_download_response(
+    request: Request,
+    content: bytes,
+    filename: str,
+    media_type: str = ZIP_MEDIA_TYPE,
+    extra_headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Réponse de téléchargement pour une archive en mémoire (ETag = SHA-256 du contenu)"""
+    size = len(content)
+    etag = strong_etag(bytes_sha256(content))
+
+    try:
+        status, byte_range = _resolve_request(request, etag, size)
+    except RangeNotSatisfiable:
+        return _not_satisfiable(etag, size)
+
+    if status == 304:
+        return _not_modified(etag)
+
+    headers = _base_headers(filename, etag, extra_headers)
+    if byte_range is None:
+        return Response(content=content, status_code=200, headers=headers, media_type=media_type)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return Response(content=content[start:end + 1], status_code=206, headers=headers, media_type=media_type)
+
+
+class DownloadAwareGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware qui laisse passer les téléchargements tels quels:
+    APK et ZIP sont déjà compressés, et le gzip casserait Range / Content-Length / zero-copy
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 500,
+        compresslevel: int = 9,
+        exclude_suffixes: Tuple[str, ...] = ("/download",),
+        exclude_prefixes: Tuple[str, ...] = ()
+    ):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.exclude_suffixes = exclude_suffixes
+        self.exclude_prefixes = exclude_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            path = scope.get("path", "")
+            if path.endswith(self.exclude_suffixes) or path.startswith(self.exclude_prefixes):
+                await self.app(scope, receive, send)
+                return
+        await super().__call__(scope, receive, send)
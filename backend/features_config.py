@@ -1,6 +1,10 @@
 """
 Configuration centralisée pour toutes les fonctionnalités natives
 """
+import hashlib
+from functools import lru_cache
+from typing import Iterable, NamedTuple, Tuple
+
 FEATURES_CONFIG = {
     'in_app_purchases': {
         'android_permissions': ['com.android.vending.BILLING'],
@@ -74,7 +78,7 @@ FEATURES_CONFIG = {
     },
     'push_notifications': {
         'android_permissions': ['android.permission.POST_NOTIFICATIONS'],
-        'android_dependencies': [],
+        'android_dependencies': ['com.google.firebase:firebase-messaging-ktx:23.4.0'],
         'ios_frameworks': ['UserNotifications'],
         'requires_config': True,
         'category': 'notifications'
@@ -117,45 +121,93 @@ FEATURES_CONFIG = {
     }
 }
 
+# ==================== INDEX COMPILÉ ====================
+
+# Chaque feature reçoit un bit stable (ordre de déclaration dans FEATURES_CONFIG).
+# Un ensemble de features devient un simple entier, utilisable comme clé de cache.
+FEATURE_BITS = {feature_id: 1 << index for index, feature_id in enumerate(FEATURES_CONFIG)}
+ALL_FEATURES_MASK = (1 << len(FEATURE_BITS)) - 1
+
+
+class FeatureBundle(NamedTuple):
+    """Permissions, dépendances Gradle et frameworks iOS précalculés pour un ensemble de features"""
+    mask: int
+    feature_ids: Tuple[str, ...]
+    android_permissions: Tuple[str, ...]
+    android_dependencies: Tuple[str, ...]
+    ios_frameworks: Tuple[str, ...]
+    cache_key: str
+
+
+def _feature_id(feature) -> str:
+    if isinstance(feature, dict):
+        return feature.get('id', '')
+    return feature
+
+
+def features_to_mask(features: Iterable) -> int:
+    """Convertit une liste d'IDs (ou de dicts avec 'id') en bitmask; les IDs inconnus sont ignorés"""
+    mask = 0
+    for feature in features or []:
+        mask |= FEATURE_BITS.get(_feature_id(feature), 0)
+    return mask
+
+
+@lru_cache(maxsize=None)
+def get_feature_bundle(mask: int) -> FeatureBundle:
+    """
+    Retourne le bundle précalculé pour un bitmask de features
+
+    Au plus 2^len(FEATURES_CONFIG) entrées possibles, chacune calculée une seule fois.
+    """
+    mask &= ALL_FEATURES_MASK
+    feature_ids = tuple(fid for fid, bit in FEATURE_BITS.items() if mask & bit)
+
+    permissions = set()
+    dependencies = set()
+    frameworks = set()
+    for feature_id in feature_ids:
+        config = FEATURES_CONFIG[feature_id]
+        permissions.update(config['android_permissions'])
+        dependencies.update(config['android_dependencies'])
+        frameworks.update(config['ios_frameworks'])
+
+    bundle_permissions = tuple(sorted(permissions))
+    bundle_dependencies = tuple(sorted(dependencies))
+    bundle_frameworks = tuple(sorted(frameworks))
+
+    # Clé stable: dépend du contenu réel et non de l'ordre des bits
+    fingerprint = "|".join([
+        ",".join(feature_ids),
+        ",".join(bundle_permissions),
+        ",".join(bundle_dependencies),
+        ",".join(bundle_frameworks),
+    ])
+    cache_key = hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:16]
+
+    return FeatureBundle(
+        mask=mask,
+        feature_ids=feature_ids,
+        android_permissions=bundle_permissions,
+        android_dependencies=bundle_dependencies,
+        ios_frameworks=bundle_frameworks,
+        cache_key=cache_key,
+    )
+
+
+def get_features_bundle(features: Iterable) -> FeatureBundle:
+    """Raccourci: bundle pour une liste d'IDs de features activées"""
+    return get_feature_bundle(features_to_mask(features))
+
+
 def get_android_permissions(features: list) -> list:
     """Récupère toutes les permissions Android nécessaires pour les features activées"""
-    permissions = set()
-    for feature in features:
-        if isinstance(feature, dict):
-            feature_id = feature.get('id', '')
-        else:
-            feature_id = feature
-        
-        if feature_id in FEATURES_CONFIG:
-            permissions.update(FEATURES_CONFIG[feature_id]['android_permissions'])
-    
-    return sorted(list(permissions))
+    return list(get_features_bundle(features).android_permissions)
 
 def get_android_dependencies(features: list) -> list:
     """Récupère toutes les dépendances Android nécessaires pour les features activées"""
-    dependencies = set()
-    for feature in features:
-        if isinstance(feature, dict):
-            feature_id = feature.get('id', '')
-        else:
-            feature_id = feature
-        
-        if feature_id in FEATURES_CONFIG:
-            dependencies.update(FEATURES_CONFIG[feature_id]['android_dependencies'])
-    
-    return sorted(list(dependencies))
+    return list(get_features_bundle(features).android_dependencies)
 
 def get_ios_frameworks(features: list) -> list:
     """Récupère tous les frameworks iOS nécessaires pour les features activées"""
-    frameworks = set()
-    for feature in features:
-        if isinstance(feature, dict):
-            feature_id = feature.get('id', '')
-        else:
-            feature_id = feature
-        
-        if feature_id in FEATURES_CONFIG:
-            frameworks.update(FEATURES_CONFIG[feature_id]['ios_frameworks'])
-    
-    return sorted(list(frameworks))
-
+    return list(get_features_bundle(features).ios_frameworks)
@@ -0,0 +1,172 @@
+"""
+Service de génération des projets natifs (Android / iOS) dans le pool de processus partagé
+La génération et la compression ZIP tournent hors de l'event loop FastAPI.
+Les deux plateformes d'un même projet peuvent être générées en parallèle.
+"""
+import asyncio
+import io
+import logging
+import os
+import zipfile
+from typing import Any, Dict, Iterable, List, Optional
+
+from task_executor import TaskExecutor, get_task_executor
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_PLATFORMS = ("android", "ios")
+
+# Timeout de génération d'un projet (quelques centaines de ms en temps normal)
+GENERATION_TIMEOUT_SECONDS = float(os.environ.get("GENERATION_TIMEOUT_SECONDS", "60"))
+
+# Générateur instancié une seule fois par processus worker
+_worker_generator = None
+
+
+def _get_worker_generator():
+    global _worker_generator
+    if _worker_generator is None:
+        from generator import NativeTemplateGenerator
+        _worker_generator = NativeTemplateGenerator()
+    return _worker_generator
+
+
+def app_identifier(project_name: str) -> str:
+    """Package Android / bundle iOS dérivé du nom du projet"""
+    safe_name = "".join(c.lower() if c.isalnum() else '' for c in project_name)
+    return f"com.nativiweb.{safe_name}" if safe_name else "com.nativiweb.app"
+
+
+def generate_platform_project(
+    platform: str,
+    project_name: str,
+    web_url: str,
+    features: List[Dict[str, Any]],
+    app_icon_url: Optional[str] = None,
+    compression: str = "download"
+) -> bytes:
+    """
+    Génère le ZIP source d'une plateforme (exécuté dans un processus worker)
+
+    Args:
+        platform: "android" ou "ios"
+        project_name: Nom de l'application
+        web_url: URL de l'application web
+        features: Features normalisées (dicts)
+        app_icon_url: URL de l'icône
+        compression: Politique de compression (internal, download, cache)
+
+    Returns:
+        Bytes du ZIP généré
+    """
+    generator = _get_worker_generator()
+    identifier = app_identifier(project_name)
+
+    if platform == "android":
+        return generator.generate_android_project(
+            project_name=project_name,
+            package_name=identifier,
+            web_url=web_url,
+            features=features,
+            app_icon_url=app_icon_url,
+            compression=compression
+        )
+    if platform == "ios":
+        return generator.generate_ios_project(
+            project_name=project_name,
+            bundle_identifier=identifier,
+            web_url=web_url,
+            features=features,
+            app_icon_url=app_icon_url,
+            compression=compression
+        )
+    raise ValueError(f"Platform must be one of: {list(SUPPORTED_PLATFORMS)}")
+
+
+def bundle_platform_archives(archives: Dict[str, bytes], base_name: str) -> bytes:
+    """Regroupe plusieurs ZIP déjà compressés dans une archive sans recompression"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as bundle:
+        for platform, archive in archives.items():
+            bundle.writestr(f"{base_name}-{platform}.zip", archive)
+    return buffer.getvalue()
+
+
+class GenerationService:
+    """Génération des projets natifs via l'exécuteur partagé"""
+
+    def __init__(self, max_workers: Optional[int] = None, task_executor: Optional[TaskExecutor] = None):
+        self._tasks = task_executor or TaskExecutor(pool_workers=max_workers)
+
+    def submit(
+        self,
+        project: Dict[str, Any],
+        features: List[Dict[str, Any]],
+        platforms: Iterable[str] = SUPPORTED_PLATFORMS,
+        compression: str = "download"
+    ) -> Dict[str, "asyncio.Future[bytes]"]:
+        """
+        Lance la génération de chaque plateforme en parallèle
+
+        Returns:
+            Dict plateforme -> future asyncio des bytes du ZIP
+        """
+        project_name = project.get('name', 'MyApp')
+        web_url = project.get('web_url', '')
+        app_icon_url = project.get('logo_url')
+
+        futures: Dict[str, asyncio.Future] = {}
+        for platform in platforms:
+            if platform not in SUPPORTED_PLATFORMS:
+                raise ValueError(f"Platform must be one of: {list(SUPPORTED_PLATFORMS)}")
+            if platform in futures:
+                continue
+            futures[platform] = self._tasks.submit(
+                generate_platform_project,
+                platform,
+                project_name,
+                web_url,
+                features,
+                app_icon_url,
+                compression
+            )
+        return futures
+
+    async def generate(
+        self,
+        project: Dict[str, Any],
+        features: List[Dict[str, Any]],
+        platform: str,
+        compression: str = "download"
+    ) -> bytes:
+        """Génère une seule plateforme sans bloquer l'event loop"""
+        results = await self.generate_all(project, features, [platform], compression)
+        return results[platform]
+
+    async def generate_all(
+        self,
+        project: Dict[str, Any],
+        features: List[Dict[str, Any]],
+        platforms: Iterable[str] = SUPPORTED_PLATFORMS,
+        compression: str = "download"
+    ) -> Dict[str, bytes]:
+        """Génère plusieurs plateformes; la durée totale est celle de la plus lente"""
+        futures = self.submit(project, features, platforms, compression)
+        results = await self._tasks.wait(futures.values(), GENERATION_TIMEOUT_SECONDS)
+        return dict(zip(futures.keys(), results))
+
+    def shutdown(self, wait: bool = True):
+        """Arrête le pool (appelé au shutdown de l'application)"""
+        self._tasks.shutdown(wait=wait)
+
+
+# Instance globale
+_generation_service: Optional[GenerationService] = None
+
+
+def get_generation_service() -> GenerationService:
+    """Récupère l'instance du service de génération (singleton)"""
+    global _generation_service
+    if _generation_service is None:
+        _generation_service = GenerationService(task_executor=get_task_executor())
+    return _generation_service
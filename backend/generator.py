@@ -22,6 +22,46 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Politiques de compression des archives générées: (méthode, niveau)
+#   internal: archive remise à AndroidBuilder, décompressée immédiatement -> pas de deflate
+#   download: téléchargement interactif -> deflate rapide
+#   cache:    artefact conservé longtemps -> compression maximale
+COMPRESSION_POLICIES = {
+    'internal': (zipfile.ZIP_STORED, None),
+    'download': (zipfile.ZIP_DEFLATED, 1),
+    'cache': (zipfile.ZIP_DEFLATED, 9),
+}
+DEFAULT_COMPRESSION_POLICY = 'download'
+
+
+# Horodatage fixe des entrées: un même projet produit une archive identique octet pour octet,
+# ce qui rend l'ETag (SHA-256 du contenu) stable d'une génération à l'autre
+FIXED_ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+class _ProjectZipFile(zipfile.ZipFile):
+    """ZipFile déterministe pour les projets générés"""
+
+    def writestr(self, zinfo_or_arcname, data, compress_type=None, compresslevel=None):
+        if isinstance(zinfo_or_arcname, str):
+            zinfo = zipfile.ZipInfo(zinfo_or_arcname, date_time=FIXED_ZIP_DATE_TIME)
+            if zinfo.is_dir():
+                zinfo.external_attr = (0o40775 << 16) | 0x10
+            else:
+                zinfo.external_attr = 0o600 << 16
+            zinfo.compress_type = self.compression
+            zinfo_or_arcname = zinfo
+            compresslevel = self.compresslevel if compresslevel is None else compresslevel
+        super().writestr(zinfo_or_arcname, data, compress_type, compresslevel)
+
+
+def open_project_zip(buffer: io.BytesIO, compression: str = DEFAULT_COMPRESSION_POLICY) -> zipfile.ZipFile:
+    """Ouvre un ZipFile en écriture selon la politique de compression demandée"""
+    if compression not in COMPRESSION_POLICIES:
+        raise ValueError(f"Unknown compression policy: {compression}. Expected one of: {list(COMPRESSION_POLICIES)}")
+    method, level = COMPRESSION_POLICIES[compression]
+    return _ProjectZipFile(buffer, 'w', method, compresslevel=level)
+
 class NativeTemplateGenerator:
     """Génère des templates de projets natifs Android et iOS"""
     
@@ -35,7 +75,8 @@ class NativeTemplateGenerator:
         package_name: str,
         web_url: str,
         features: List[Dict[str, Any]],
-        app_icon_url: Optional[str] = None
+        app_icon_url: Optional[str] = None,
+        compression: str = DEFAULT_COMPRESSION_POLICY
     ) -> bytes:
         """
         Génère un projet Android complet et fonctionnel
@@ -46,13 +87,14 @@ class NativeTemplateGenerator:
             web_url: URL de l'application web
             features: Liste des fonctionnalités activées
             app_icon_url: URL de l'icône de l'application
+            compression: Politique de compression (internal, download, cache)
             
         Returns:
             Bytes du fichier ZIP contenant le projet Android complet
         """
         zip_buffer = io.BytesIO()
         
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        with open_project_zip(zip_buffer, compression) as zip_file:
             # Structure du projet Android
             base_dir = f"{project_name.lower().replace(' ', '-')}-android"
             
@@ -691,6 +733,10 @@ import android.database.Cursor"""
 import com.google.firebase.analytics.FirebaseAnalytics
 import android.os.Bundle"""
         
+        if 'push_notifications' in enabled_features:
+            imports += """
+import com.google.firebase.messaging.FirebaseMessaging"""
+        
         if 'biometrics' in enabled_features:
             imports += """
 import androidx.biometric.BiometricManager
@@ -1533,6 +1579,40 @@ class NativiWebBridge(private val context: Context, private val webView: WebView
         }}
     }}"""
         
+        # Token FCM pour l'enregistrement auprès du registre du projet (SDK registerPushToken)
+        if 'push_notifications' in enabled_features:
+            bridge_code += """
+    
+    // ========== PUSH NOTIFICATIONS ==========
+    @JavascriptInterface
+    fun getPushToken(callback: String) {{
+        try {{
+            FirebaseMessaging.getInstance().token.addOnCompleteListener {{ task ->
+                val result = JSONObject().apply {{
+                    if (task.isSuccessful && task.result != null) {{
+                        put("success", true)
+                        put("token", task.result)
+                    }} else {{
+                        put("success", false)
+                        put("error", task.exception?.message ?: "Push token unavailable")
+                    }}
+                }}
+                webView.post {{
+                    webView.evaluateJavascript("$callback($result)", null)
+                }}
+            }}
+        }} catch (e: Exception) {{
+            // FirebaseApp non initialisé (google-services.json absent)
+            val result = JSONObject().apply {{
+                put("success", false)
+                put("error", e.message ?: "Firebase not configured")
+            }}
+            webView.post {{
+                webView.evaluateJavascript("$callback($result)", null)
+            }}
+        }}
+    }}"""
+        
         # Ajouter les méthodes Analytics si activé
         if 'analytics' in enabled_features:
             bridge_code += """
@@ -1875,12 +1955,13 @@ class NativiWebBridge(private val context: Context, private val webView: WebView
         bundle_identifier: str,
         web_url: str,
         features: List[Dict[str, Any]],
-        app_icon_url: Optional[str] = None
+        app_icon_url: Optional[str] = None,
+        compression: str = DEFAULT_COMPRESSION_POLICY
     ) -> bytes:
         """Génère un projet iOS complet et fonctionnel"""
         zip_buffer = io.BytesIO()
         
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        with open_project_zip(zip_buffer, compression) as zip_file:
             base_dir = f"{project_name.replace(' ', '')}-iOS"
             
             # Fichiers iOS (garder votre implémentation actuelle ou améliorer)
@@ -2368,6 +2449,114 @@ class NativiWebBridge(private val context: Context, private val webView: WebView
                 clearInterval(window._nativiwebVersionCheckInterval);
                 window._nativiwebVersionCheckInterval = null;
             }
+            if (window._nativiwebVersionEvents) {
+                window._nativiwebVersionEvents.close();
+                window._nativiwebVersionEvents = null;
+            }
+        },
+        
+        watchVersion: function(projectId, currentVersion, apiBaseUrl, onUpdate) {
+            if (!projectId) {
+                console.warn('NativiWeb: Cannot watch version without project ID');
+                return;
+            }
+            if (typeof EventSource === 'undefined') {
+                // No Server-Sent Events: fall back to periodic checks
+                return this.startVersionChecker(projectId, currentVersion, apiBaseUrl);
+            }
+            if (window._nativiwebVersionEvents) {
+                return;
+            }
+            
+            // The browser reconnects on its own (with Last-Event-ID) when the stream drops
+            const baseUrl = apiBaseUrl || (window.API_BASE_URL || '');
+            const url = `${baseUrl}/api/projects/${projectId}/version/events?current_version=${encodeURIComponent(currentVersion || '')}`;
+            const source = new EventSource(url);
+            window._nativiwebVersionEvents = source;
+            
+            source.addEventListener('version', (event) => {
+                const result = JSON.parse(event.data);
+                if (result.update_available) {
+                    console.log('NativiWeb: New version available:', result.version);
+                    window.dispatchEvent(new CustomEvent('nativiweb:update-available', {
+                        detail: result
+                    }));
+                    if (onUpdate) {
+                        onUpdate(result);
+                    }
+                }
+            });
+            source.addEventListener('deleted', () => {
+                this.stopVersionChecker();
+            });
+            source.onerror = () => {
+                // EventSource never reconnects after a non-200 response (503 when the server
+                // is at capacity): fall back to periodic checks
+                if (source.readyState === EventSource.CLOSED) {
+                    if (window._nativiwebVersionEvents === source) {
+                        window._nativiwebVersionEvents = null;
+                    }
+                    this.startVersionChecker(projectId, currentVersion, apiBaseUrl);
+                }
+            };
+        },"""
+        
+        # Ajouter l'enregistrement des tokens push si activé
+        if 'push_notifications' in enabled_features:
+            sdk_methods += """
+        
+        // Push Notifications (project token registry)
+        getPushToken: function() {
+            return new Promise((resolve, reject) => {
+                if (!this.isNative() || !window.NativiWebNative.getPushToken) {
+                    reject(new Error('Push token only available in native app'));
+                    return;
+                }
+                const callback = 'push_token_' + Date.now();
+                window[callback] = (result) => {
+                    delete window[callback];
+                    const parsed = typeof result === 'string' ? JSON.parse(result) : result;
+                    if (parsed.success) {
+                        resolve(parsed.token);
+                    } else {
+                        reject(new Error(parsed.error || 'Push token unavailable'));
+                    }
+                };
+                window.NativiWebNative.getPushToken(callback);
+            });
+        },
+        
+        registerPushToken: function(projectId, token, options = {}, apiBaseUrl) {
+            if (!projectId) {
+                return Promise.reject(new Error('Project ID is required'));
+            }
+            const tokenPromise = token ? Promise.resolve(token) : this.getPushToken();
+            const baseUrl = apiBaseUrl || (window.API_BASE_URL || '');
+            return tokenPromise.then(pushToken => fetch(`${baseUrl}/api/projects/${projectId}/push/tokens`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    token: pushToken,
+                    platform: options.platform || this.platform,
+                    topics: options.topics || [],
+                    device_id: options.deviceId || null,
+                    app_version: options.appVersion || null
+                })
+            }))
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('Push token registration failed: ' + response.status);
+                }
+                return response.json();
+            });
+        },
+        
+        unregisterPushToken: function(projectId, token, apiBaseUrl) {
+            const baseUrl = apiBaseUrl || (window.API_BASE_URL || '');
+            const url = `${baseUrl}/api/projects/${projectId}/push/tokens?platform=${encodeURIComponent(this.platform)}&token=${encodeURIComponent(token)}`;
+            return fetch(url, { method: 'DELETE' }).then(response => response.json());
         },"""
         
         # Ajouter Biometric Authentication si activé
@@ -2653,7 +2842,8 @@ L'APK sera dans: `app/build/outputs/apk/debug/app-debug.apk`
         bundle_identifier: str,
         web_url: str,
         features: List[Dict[str, Any]],
-        app_icon_url: Optional[str] = None
+        app_icon_url: Optional[str] = None,
+        compression: str = DEFAULT_COMPRESSION_POLICY
     ) -> bytes:
         """
         Génère un projet iOS complet et fonctionnel
@@ -2664,13 +2854,14 @@ L'APK sera dans: `app/build/outputs/apk/debug/app-debug.apk`
             web_url: URL de l'application web
             features: Liste des fonctionnalités activées
             app_icon_url: URL de l'icône de l'application
+            compression: Politique de compression (internal, download, cache)
             
         Returns:
             Bytes du fichier ZIP contenant le projet iOS complet
         """
         zip_buffer = io.BytesIO()
         
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        with open_project_zip(zip_buffer, compression) as zip_file:
             base_dir = f"{project_name.replace(' ', '')}-iOS"
             
             # 1. ContentView.swift - Vue principale avec WebView
@@ -1,4 +1,5 @@
 import asyncio
+import functools
 import platform
 import sys
 
@@ -6,12 +7,37 @@ if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, BackgroundTasks, UploadFile, File, Header, Request, Query
-from fastapi.responses import StreamingResponse, JSONResponse, RedirectResponse
+from fastapi.responses import StreamingResponse, JSONResponse, RedirectResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from starlette.middleware.gzip import GZipMiddleware
+from download_responses import (
+    APK_MEDIA_TYPE,
+    ZIP_MEDIA_TYPE,
+    DownloadAwareGZipMiddleware,
+    bytes_download_response,
+    etag_matches,
+    file_download_response,
+)
+from artifact_index import APK_BUCKET, get_artifact_index
+from apk_uploader import get_apk_uploader
+from generation_service import get_generation_service, bundle_platform_archives
+from task_executor import get_task_executor
+from artifact_store import get_artifact_store
+from single_flight import SingleFlight
+from retention_service import BUILD_RETENTION_INTERVAL_HOURS, RetentionService
+from deletion_pipeline import STORAGE_RECONCILE_INTERVAL_HOURS, DeletionPipeline
+from browser_pool import BROWSER_POOL_PREWARM, HAS_PLAYWRIGHT, get_browser_pool
+from concurrency_limit import ConcurrencyLimitMiddleware
+from screenshot_jobs import get_screenshot_jobs
+from push_dispatcher import close_push_dispatcher
+from push_campaigns import get_push_campaigns
+from device_tokens import InvalidTokenRegistration, get_device_tokens, use_supabase_device_tokens
+from version_cache import VERSION_CHECK_MAX_AGE, VERSION_COLUMNS, ProjectVersion, get_version_cache
+from version_events import VERSION_EVENTS_RETRY_MS, VersionBroadcastHub
+from project_cache import InvalidFields, get_project_cache, parse_fields, project_fields, select_columns
+from dev_store import DEV_STORE_SNAPSHOT, DevBuildStore, DevProjectStore, load_snapshot, save_snapshot
 
 # Rate limiting (optionnel)
 try:
@@ -48,11 +74,11 @@ except ImportError:
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr, HttpUrl, field_validator
 from urllib.parse import urlparse
-from typing import List, Optional, Dict, Any, Tuple, BinaryIO
+from typing import List, Optional, Dict, Any, Tuple, BinaryIO, Union
 import uuid
 from datetime import datetime, timezone, timedelta
 import json
-import io
+import dataclasses
 import zipfile
 import hashlib
 import secrets
@@ -76,14 +102,14 @@ if DEV_MODE:
     logging.warning("⚠️ MODE DÉVELOPPEMENT : Supabase désactivé, authentification bypassée")
 
 # Stockage en mémoire pour les projets en mode DEV
-DEV_PROJECTS_STORE: Dict[str, Dict[str, Any]] = {}
-DEV_BUILDS_STORE: Dict[str, List[Dict[str, Any]]] = {}
+DEV_PROJECTS_STORE = DevProjectStore()
+DEV_BUILDS_STORE = DevBuildStore()
 DEV_TEMPLATES_STORE: Dict[str, Dict[str, Any]] = {}
 DEV_PLATFORM_CONFIG: Dict[str, Any] = {}
 DEV_USERS_STORE: Dict[str, Dict[str, Any]] = {}
 
-# Stockage en mémoire pour les APKs compilés
-build_in_memory: Dict[str, Dict[str, Any]] = {}
+if DEV_MODE and DEV_STORE_SNAPSHOT:
+    load_snapshot(DEV_STORE_SNAPSHOT, DEV_PROJECTS_STORE, DEV_BUILDS_STORE)
 
 # Validate required environment variables
 REQUIRED_ENV_VARS = {
@@ -196,9 +222,10 @@ def get_supabase_client(token: Optional[str] = None, use_service_role: bool = Fa
         logging.warning(f"Error creating Supabase client: {e}")
         return None
 
-async def upload_apk_to_supabase(apk_bytes: bytes, build_id: str, project_id: str) -> str:
+async def upload_apk_to_supabase(apk_path: Union[str, Path], build_id: str, project_id: str, user_id: Optional[str] = None) -> str:
     """
-    Upload l'APK sur Supabase Storage
+    Upload l'APK sur Supabase Storage (streaming depuis le disque, upload résumable)
+    et l'enregistre dans l'index des artefacts
     Retourne l'URL publique de téléchargement
     """
     try:
@@ -209,77 +236,76 @@ async def upload_apk_to_supabase(apk_bytes: bytes, build_id: str, project_id: st
         # Chemin dans le bucket: projects/{project_id}/builds/{build_id}.apk
         storage_path = f"projects/{project_id}/builds/{build_id}.apk"
         
-        logger.info(f"📤 Uploading APK to Supabase: {storage_path} ({len(apk_bytes) / 1024 / 1024:.2f} MB)")
+        apk_size = os.path.getsize(apk_path)
+        logger.info(f"📤 Uploading APK to Supabase: {storage_path} ({apk_size / 1024 / 1024:.2f} MB)")
         
-        # Upload sur Supabase Storage
-        client.storage.from_('apks').upload(
-            path=storage_path,
-            file=apk_bytes,
-            file_options={
-                "content-type": "application/vnd.android.package-archive",
-                "cache-control": "3600",
-                "upsert": "true"
-            }
+        # Upload par blocs depuis le fichier (le SHA-256 est calculé au passage)
+        upload = await get_apk_uploader().upload_file(
+            apk_path,
+            storage_path,
+            content_type=APK_MEDIA_TYPE,
+            cache_control="3600"
         )
         
         logger.info(f"✅ APK uploadé sur Supabase: {storage_path}")
         
         # Générer l'URL publique
-        public_url = client.storage.from_('apks').get_public_url(storage_path)
+        public_url = client.storage.from_(APK_BUCKET).get_public_url(storage_path)
         
         # Sauvegarder l'URL dans la DB
         client.table("builds").update({
             "download_url": public_url,
             "storage_path": storage_path,
-            "file_size": len(apk_bytes)
+            "file_size": upload.size
         }).eq("id", build_id).execute()
         
         logger.info(f"✅ URL publique générée: {public_url}")
         
+        try:
+            # Colonne optionnelle (scripts/add-build-artifact-columns.sql)
+            client.table("builds").update({"file_sha256": upload.sha256}).eq("id", build_id).execute()
+        except Exception as hash_error:
+            logger.debug(f"file_sha256 non enregistré pour {build_id}: {hash_error}")
+        
+        if user_id:
+            get_artifact_index().record_upload(
+                build_id, user_id, project_id, storage_path, upload.size, upload.sha256
+            )
+        
         return public_url
         
     except Exception as e:
         logger.error(f"❌ Erreur upload Supabase: {e}", exc_info=True)
         raise
 
+def _forget_deleted_builds(build_ids: List[str]):
+    """Retire les builds supprimés de l'index des artefacts et du stockage local (bloquant: appelé dans un thread)"""
+    for build_id in build_ids:
+        get_artifact_index().invalidate(build_id)
+    get_artifact_store().remove_many(build_ids)
+
+# Job de rétention des builds (pages, lots, checkpoint)
+retention_service = RetentionService(
+    lambda: get_supabase_client(use_service_role=True),
+    on_builds_deleted=_forget_deleted_builds
+)
+
+# Suppressions par lots + récupération asynchrone de l'espace Storage
+deletion_pipeline = DeletionPipeline(
+    lambda: get_supabase_client(use_service_role=True),
+    on_builds_deleted=_forget_deleted_builds
+)
+
+# Tokens push des appareils: tables Supabase (scripts/create-device-tokens-tables.sql), SQLite en mode DEV
+if not DEV_MODE:
+    use_supabase_device_tokens(lambda: get_supabase_client(use_service_role=True))
+
 async def cleanup_old_builds_storage(days: int = 30):
     """
     Supprime les builds de plus de X jours pour libérer l'espace Supabase
+    (passage complet du job de rétention, par lots)
     """
-    try:
-        client = get_supabase_client(use_service_role=True)
-        if not client:
-            return
-        
-        cutoff_date = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
-        
-        # Récupérer les vieux builds
-        result = client.table("builds").select(
-            "id, storage_path"
-        ).lt("created_at", cutoff_date).execute()
-        
-        deleted_count = 0
-        for build in result.data:
-            try:
-                storage_path = build.get("storage_path")
-                if storage_path:
-                    # Supprimer du storage
-                    client.storage.from_('apks').remove([storage_path])
-                
-                # Supprimer de la DB
-                client.table("builds").delete().eq("id", build["id"]).execute()
-                
-                deleted_count += 1
-                
-            except Exception as e:
-                logger.warning(f"⚠️ Impossible de supprimer {build['id']}: {e}")
-        
-        logger.info(f"🧹 {deleted_count} builds supprimés (plus de {days} jours)")
-        return {"deleted": deleted_count}
-        
-    except Exception as e:
-        logger.error(f"❌ Erreur nettoyage: {e}")
-        return {"deleted": 0, "error": str(e)}
+    return await retention_service.run_once(dataclasses.replace(retention_service.policy, max_age_days=days))
 
 # Initialize rate limiter
 RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
@@ -502,6 +528,13 @@ class VisitTrack(BaseModel):
     session_id: Optional[str] = None
     user_id: Optional[str] = None
 
+class DeviceTokenRegister(BaseModel):
+    token: str
+    platform: str  # 'android' or 'ios'
+    topics: List[str] = []
+    device_id: Optional[str] = None
+    app_version: Optional[str] = None
+
 class PlatformConfig(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = "platform_config"
@@ -677,6 +710,19 @@ def normalize_features(features: Optional[List]) -> List[Dict[str, Any]]:
 
 security = HTTPBearer()
 
+# Durée de conservation des clés publiques Supabase (JWKS) entre deux téléchargements
+JWKS_CACHE_SECONDS = int(os.environ.get("JWKS_CACHE_SECONDS", "3600"))
+
+@functools.lru_cache(maxsize=4)
+def _get_jwks_client(timeout: int) -> "PyJWKClient":
+    """Client JWKS partagé: les clés sont gardées en cache au lieu d'être téléchargées à chaque requête"""
+    return PyJWKClient(
+        f"{SUPABASE_URL}/.well-known/jwks.json",
+        cache_keys=True,
+        lifespan=JWKS_CACHE_SECONDS,
+        timeout=timeout
+    )
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     """Extract user ID from JWT token"""
     if DEV_MODE:
@@ -716,8 +762,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                     )
                 
                 try:
-                    jwks_url = f"{SUPABASE_URL}/.well-known/jwks.json"
-                    jwks_client = PyJWKClient(jwks_url, timeout=5)
+                    jwks_client = _get_jwks_client(5)
                     signing_key = jwks_client.get_signing_key_from_jwt(token)
                     jwt.decode(
                         token, 
@@ -743,8 +788,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 # En développement, vérifier si disponible, sinon warning seulement
                 if HAS_PYJWK and SUPABASE_URL:
                     try:
-                        jwks_url = f"{SUPABASE_URL}/.well-known/jwks.json"
-                        jwks_client = PyJWKClient(jwks_url, timeout=2)
+                        jwks_client = _get_jwks_client(2)
                         signing_key = jwks_client.get_signing_key_from_jwt(token)
                         jwt.decode(
                             token, 
@@ -1117,6 +1161,7 @@ async def create_project(project_data: ProjectCreate, credentials: HTTPAuthoriza
             "updated_at": datetime.now(timezone.utc).isoformat()
         }
         DEV_PROJECTS_STORE[project_id] = project
+        _project_changed(project_id, user_id, project)
         logging.info(f"📁 Projet créé en mode DEV: {project_id}")
         return project
     
@@ -1170,6 +1215,7 @@ async def create_project(project_data: ProjectCreate, credentials: HTTPAuthoriza
         
         if not result.data:
             raise HTTPException(status_code=500, detail="Failed to create project")
+        _project_changed(project_id, user_id, project)
         
         await log_system_event("info", "project", f"Project created: {project_data.name}", user_id=user_id)
         return project
@@ -1182,31 +1228,88 @@ async def create_project(project_data: ProjectCreate, credentials: HTTPAuthoriza
         else:
             raise HTTPException(status_code=500, detail=f"Error creating project: {str(e)}")
 
+def _project_changed(project_id: str, user_id: Optional[str], project: Optional[Dict[str, Any]] = None):
+    """
+    Invalide les caches d'un projet créé / modifié (project) ou supprimé (None)
+    et prévient les apps connectées au flux de version
+    """
+    if user_id:
+        get_project_cache().invalidate_user(user_id)
+    get_version_cache().invalidate(project_id)
+    version_hub.publish(project_id, ProjectVersion.from_row(project) if project else None)
+
+def _parse_project_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    try:
+        return parse_fields(fields)
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @api_router.get("/projects")
-async def get_projects(user_id: str = Depends(get_current_user)):
+async def get_projects(
+    fields: Optional[str] = Query(None, description="Champs à renvoyer, ex: id,name,status"),
+    page: Optional[int] = Query(None, ge=1),
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Projets de l'utilisateur
+    Sans page / limit: liste complète (tableau). Avec: {projects, total, page, pages},
+    du plus récent au plus ancien. Les réponses sont gardées en cache par utilisateur.
+    """
+    selected = _parse_project_fields(fields)
+    paginated = page is not None or limit is not None
+    safe_page, safe_limit, start, end = _normalize_pagination(page or 1, limit or 20)
+    
     if DEV_MODE:
-        projects = [p for p in DEV_PROJECTS_STORE.values() if p.get("user_id") == user_id]
+        projects = DEV_PROJECTS_STORE.for_user(user_id)
         logging.info(f"📋 Retour de {len(projects)} projets en mode DEV")
-        return projects
+        if not paginated:
+            return [project_fields(p, selected) for p in projects]
+        projects.sort(key=lambda p: p.get("created_at") or "", reverse=True)
+        return {
+            "projects": [project_fields(p, selected) for p in projects[start:start + safe_limit]],
+            "total": len(projects),
+            "page": safe_page,
+            "pages": _calc_pages(len(projects), safe_limit)
+        }
     
     try:
         client = get_supabase_client(use_service_role=True)
         if not client:
             return []
         
-        response = client.table("projects").select("*").eq("user_id", user_id).execute()
-        return response.data or []
+        def load():
+            query = client.table("projects").select(select_columns(selected), count="exact" if paginated else None)
+            query = query.eq("user_id", user_id)
+            if not paginated:
+                return query.execute().data or []
+            response = query.order("created_at", desc=True).range(start, end).execute()
+            total = response.count or 0
+            return {
+                "projects": response.data or [],
+                "total": total,
+                "page": safe_page,
+                "pages": _calc_pages(total, safe_limit)
+            }
+        
+        key = f"list:{','.join(selected or ())}:{f'{safe_page}/{safe_limit}' if paginated else 'all'}"
+        return await get_project_cache().get(user_id, key, lambda: asyncio.to_thread(load))
     except Exception as e:
         logging.error(f"Error fetching projects: {e}")
         return []
 
 @api_router.get("/projects/{project_id}")
-async def get_project(project_id: str, user_id: str = Depends(get_current_user)):
+async def get_project(
+    project_id: str,
+    fields: Optional[str] = Query(None, description="Champs à renvoyer, ex: id,name,features"),
+    user_id: str = Depends(get_current_user)
+):
+    selected = _parse_project_fields(fields)
     if DEV_MODE:
         if project_id in DEV_PROJECTS_STORE:
             project = DEV_PROJECTS_STORE[project_id]
             logging.info(f"📦 Projet récupéré: {project_id}")
-            return project
+            return project_fields(project, selected)
         raise HTTPException(status_code=404, detail="Project not found")
     
     try:
@@ -1214,12 +1317,16 @@ async def get_project(project_id: str, user_id: str = Depends(get_current_user))
         if not client:
             raise HTTPException(status_code=500, detail="Database unavailable")
         
-        response = client.table("projects").select("*").eq("id", project_id).eq("user_id", user_id).execute()
+        def load():
+            response = client.table("projects").select(select_columns(selected)).eq("id", project_id).eq("user_id", user_id).execute()
+            return response.data[0] if response.data else None
         
-        if not response.data:
+        key = f"project:{project_id}:{','.join(selected or ())}"
+        project = await get_project_cache().get(user_id, key, lambda: asyncio.to_thread(load))
+        if not project:
             raise HTTPException(status_code=404, detail="Project not found")
         
-        return response.data[0]
+        return project
     except HTTPException:
         raise
     except Exception as e:
@@ -1253,6 +1360,7 @@ async def update_project(project_id: str, update_data: ProjectUpdate, user_id: s
         project.update(update_dict)
         project['updated_at'] = datetime.now(timezone.utc).isoformat()
         DEV_PROJECTS_STORE[project_id] = project
+        _project_changed(project_id, user_id, project)
         
         logging.info(f"📝 Projet mis à jour: {project_id}")
         return project
@@ -1285,6 +1393,7 @@ async def update_project(project_id: str, update_data: ProjectUpdate, user_id: s
         client.table("projects").update(update_dict).eq("id", project_id).execute()
         
         updated = client.table("projects").select("*").eq("id", project_id).single().execute()
+        _project_changed(project_id, user_id, updated.data)
         return updated.data
     except HTTPException:
         raise
@@ -1300,21 +1409,14 @@ async def delete_project(project_id: str, user_id: str = Depends(get_current_use
     if DEV_MODE:
         if project_id in DEV_PROJECTS_STORE:
             # Supprimer les builds associés
-            if project_id in DEV_BUILDS_STORE:
-                # Nettoyer build_in_memory pour les builds de ce projet
-                for build in DEV_BUILDS_STORE[project_id]:
-                    build_id = build.get('id')
-                    if build_id in build_in_memory:
-                        apk_path = build_in_memory[build_id].get('apk_path')
-                        if apk_path and Path(apk_path).exists():
-                            try:
-                                os.unlink(apk_path)
-                                logging.info(f"🗑️ APK supprimé: {apk_path}")
-                            except Exception as e:
-                                logging.warning(f"Erreur suppression APK {apk_path}: {e}")
-                        del build_in_memory[build_id]
-                del DEV_BUILDS_STORE[project_id]
+            if DEV_BUILDS_STORE.delete_project(project_id):
+                # Supprimer les APK locaux des builds de ce projet
+                removed = await asyncio.to_thread(get_artifact_store().remove_where, project_id=project_id)
+                if removed:
+                    logging.info(f"🗑️ {removed} APK local(aux) supprimé(s)")
             del DEV_PROJECTS_STORE[project_id]
+            await asyncio.to_thread(get_device_tokens().delete_project, project_id)
+            _project_changed(project_id, user_id)
             logging.info(f"🗑️ Projet supprimé: {project_id}")
         return {"message": "Project deleted"}
     
@@ -1328,29 +1430,16 @@ async def delete_project(project_id: str, user_id: str = Depends(get_current_use
         if not project_response.data:
             raise HTTPException(status_code=404, detail="Project not found")
         
-        # Récupérer tous les builds associés pour nettoyer build_in_memory
-        builds_response = client.table("builds").select("id").eq("project_id", project_id).execute()
-        build_ids = [build["id"] for build in builds_response.data] if builds_response.data else []
+        # Supprimer d'abord les builds associés, par lots (index et stockage local inclus)
+        deleted_builds = await deletion_pipeline.delete_build_rows(client, project_id=project_id)
+        if deleted_builds:
+            logging.info(f"🗑️ {len(deleted_builds)} build(s) supprimé(s) pour le projet {project_id}")
         
-        # Nettoyer build_in_memory et supprimer les fichiers APK
-        for build_id in build_ids:
-            if build_id in build_in_memory:
-                apk_path = build_in_memory[build_id].get('apk_path')
-                if apk_path and Path(apk_path).exists():
-                    try:
-                        os.unlink(apk_path)
-                        logging.info(f"🗑️ APK supprimé: {apk_path}")
-                    except Exception as e:
-                        logging.warning(f"Erreur suppression APK {apk_path}: {e}")
-                del build_in_memory[build_id]
-        
-        # Supprimer d'abord tous les builds associés
-        if build_ids:
-            client.table("builds").delete().eq("project_id", project_id).execute()
-            logging.info(f"🗑️ {len(build_ids)} build(s) supprimé(s) pour le projet {project_id}")
-        
-        # Ensuite supprimer le projet
+        # Ensuite supprimer le projet; les APK du bucket sont supprimés en arrière-plan
         client.table("projects").delete().eq("id", project_id).eq("user_id", user_id).execute()
+        deletion_pipeline.enqueue_prefix(f"projects/{project_id}/builds")
+        await asyncio.to_thread(get_device_tokens().delete_project, project_id)
+        _project_changed(project_id, user_id)
         await log_system_event("info", "project", f"Project deleted: {project_id}", user_id=user_id)
         return {"message": "Project deleted"}
     except HTTPException:
@@ -1397,9 +1486,7 @@ async def create_build(
             "duration_seconds": None
         }
         
-        if build_data.project_id not in DEV_BUILDS_STORE:
-            DEV_BUILDS_STORE[build_data.project_id] = []
-        DEV_BUILDS_STORE[build_data.project_id].append(build)
+        DEV_BUILDS_STORE.add(build)
         
         # CORRECTION: Passer les vraies données du projet
         logging.info(f"🎯 Adding background task for build {build_id}")
@@ -1483,13 +1570,7 @@ async def process_build(build_id: str, project: dict):
     
     if DEV_MODE:
         # Trouver le build dans le store
-        build_in_store = None
-        project_id = project.get('id')
-        if project_id and project_id in DEV_BUILDS_STORE:
-            for build in DEV_BUILDS_STORE[project_id]:
-                if build.get('id') == build_id:
-                    build_in_store = build
-                    break
+        build_in_store = DEV_BUILDS_STORE.get(build_id)
         
         if not build_in_store:
             logging.warning(f"Build {build_id} not found in DEV_BUILDS_STORE")
@@ -1498,7 +1579,6 @@ async def process_build(build_id: str, project: dict):
         logging.info(f"🔨 Mode dev : Traitement du build {build_id}")
         platform = build_in_store.get('platform', 'android')
         project_name = project.get('name', 'MyApp')
-        web_url = project.get('web_url', '')
         features = normalize_features(project.get('features', []))
         
         build_in_store['status'] = 'processing'
@@ -1521,68 +1601,50 @@ async def process_build(build_id: str, project: dict):
                 try:
                     logging.info(f"🔨 Compilation APK réelle pour {project_name}...")
                     
-                    safe_name = "".join(c.lower() if c.isalnum() else '' for c in project_name)
-                    package_name = f"com.nativiweb.{safe_name}" if safe_name else "com.nativiweb.app"
-                    
-                    project_zip = generator.generate_android_project(
-                        project_name=project_name,
-                        package_name=package_name,
-                        web_url=web_url,
-                        features=features,
-                        app_icon_url=project.get('logo_url')
-                    )
+                    project_zip = await get_generation_service().generate(project, features, 'android', compression='internal')
                     
                     try:
-                        from android_builder import AndroidBuilder
-                        builder = AndroidBuilder(Path(__file__).parent)
+                        from android_builder import build_apk_file_task
                         
-                        import concurrent.futures
-                        loop = asyncio.get_event_loop()
-                        with concurrent.futures.ThreadPoolExecutor() as executor:
-                            success, apk_bytes, error_msg = await loop.run_in_executor(
-                                executor, 
-                                builder.build_apk, 
-                                project_zip, 
-                                project_name,
-                                3  # max_retries
-                            )
+                        # Processus dédié (borné, tué au timeout): l'event loop reste libre
+                        success, apk_path, error_msg = await get_task_executor().run_isolated(
+                            build_apk_file_task,
+                            str(Path(__file__).parent),
+                            project_zip,
+                            project_name,
+                            3  # max_retries
+                        )
                         
-                        if success and apk_bytes:
-                            # ✅ NOUVEAU : Upload sur Supabase au lieu de sauvegarder localement
+                        if success and apk_path:
+                            apk_size = apk_path.stat().st_size
+                            # ✅ NOUVEAU : Upload sur Supabase (streaming depuis le disque)
                             try:
                                 public_url = await upload_apk_to_supabase(
-                                    apk_bytes, 
+                                    apk_path, 
                                     build_id, 
-                                    project['id']
+                                    project['id'],
+                                    project.get('user_id')
                                 )
                                 
-                                logging.info(f"✅ APK uploadé sur Supabase! Taille: {len(apk_bytes) / 1024 / 1024:.2f} MB")
+                                logging.info(f"✅ APK uploadé sur Supabase! Taille: {apk_size / 1024 / 1024:.2f} MB")
                                 logging.info(f"🔗 URL: {public_url}")
                                 
                                 apk_compiled = True
-                                apk_size = len(apk_bytes)
+                                apk_path.unlink(missing_ok=True)
                                 
                             except Exception as upload_error:
                                 logging.error(f"❌ Erreur upload Supabase: {upload_error}")
-                                # Fallback : sauvegarder localement
-                                import tempfile
-                                apk_file = tempfile.NamedTemporaryFile(
-                                    delete=False, 
-                                    suffix='.apk', 
-                                    prefix=f'{safe_name}_'
+                                # Fallback : stockage local durable (partagé entre workers)
+                                stored = await asyncio.to_thread(
+                                    get_artifact_store().put,
+                                    build_id,
+                                    apk_path,
+                                    project['id'],
+                                    project.get('user_id')
                                 )
-                                apk_file.write(apk_bytes)
-                                apk_file.close()
-                                
-                                build_in_memory[build_id] = {
-                                    'apk_path': apk_file.name,
-                                    'apk_size': len(apk_bytes),
-                                    'compiled': True
-                                }
                                 
-                                logging.warning(f"⚠️ Fallback: APK sauvegardé localement: {apk_file.name}")
+                                logging.warning(f"⚠️ Fallback: APK conservé localement: {stored.path}")
                                 apk_compiled = True
-                                apk_size = len(apk_bytes)
                         else:
                             logging.warning(f"⚠️ Compilation échouée: {error_msg[:200] if error_msg else 'Erreur inconnue'}")
                     except ImportError:
@@ -1652,71 +1714,53 @@ async def process_build(build_id: str, project: dict):
                     logging.info(f"🔨 Compilation APK réelle pour {project['name']}...")
                     
                     project_name = project.get('name', 'MyApp')
-                    web_url = project.get('web_url', '')
                     features = normalize_features(project.get('features', []))
-                    safe_name = "".join(c.lower() if c.isalnum() else '' for c in project_name)
-                    package_name = f"com.nativiweb.{safe_name}" if safe_name else "com.nativiweb.app"
                     
-                    project_zip = generator.generate_android_project(
-                        project_name=project_name,
-                        package_name=package_name,
-                        web_url=web_url,
-                        features=features,
-                        app_icon_url=project.get('logo_url')
-                    )
+                    project_zip = await get_generation_service().generate(project, features, 'android', compression='internal')
                     
                     try:
-                        from android_builder import AndroidBuilder
-                        builder = AndroidBuilder(Path(__file__).parent)
+                        from android_builder import build_apk_file_task
                         
-                        import concurrent.futures
-                        loop = asyncio.get_event_loop()
-                        with concurrent.futures.ThreadPoolExecutor() as executor:
-                            success, apk_bytes, error_msg = await loop.run_in_executor(
-                                executor, 
-                                builder.build_apk, 
-                                project_zip, 
-                                project_name,
-                                3  # max_retries
-                            )
+                        # Processus dédié (borné, tué au timeout): l'event loop reste libre
+                        success, apk_path, error_msg = await get_task_executor().run_isolated(
+                            build_apk_file_task,
+                            str(Path(__file__).parent),
+                            project_zip,
+                            project_name,
+                            3  # max_retries
+                        )
                         
-                        if success and apk_bytes:
-                            # ✅ NOUVEAU : Upload sur Supabase au lieu de sauvegarder localement
+                        if success and apk_path:
+                            apk_size = apk_path.stat().st_size
+                            # ✅ NOUVEAU : Upload sur Supabase (streaming depuis le disque)
                             try:
                                 public_url = await upload_apk_to_supabase(
-                                    apk_bytes, 
+                                    apk_path, 
                                     build_id, 
-                                    project['id']
+                                    project['id'],
+                                    project.get('user_id')
                                 )
                                 
-                                logging.info(f"✅ APK uploadé sur Supabase! Taille: {len(apk_bytes) / 1024 / 1024:.2f} MB")
+                                logging.info(f"✅ APK uploadé sur Supabase! Taille: {apk_size / 1024 / 1024:.2f} MB")
                                 logging.info(f"🔗 URL: {public_url}")
                                 
                                 apk_compiled = True
-                                apk_size = len(apk_bytes)
+                                apk_path.unlink(missing_ok=True)
                                 download_url_override = public_url
                                 
                             except Exception as upload_error:
                                 logging.error(f"❌ Erreur upload Supabase: {upload_error}")
-                                # Fallback : sauvegarder localement
-                                import tempfile
-                                apk_file = tempfile.NamedTemporaryFile(
-                                    delete=False, 
-                                    suffix='.apk', 
-                                    prefix=f'{safe_name}_'
+                                # Fallback : stockage local durable (partagé entre workers)
+                                stored = await asyncio.to_thread(
+                                    get_artifact_store().put,
+                                    build_id,
+                                    apk_path,
+                                    project['id'],
+                                    project.get('user_id')
                                 )
-                                apk_file.write(apk_bytes)
-                                apk_file.close()
-                                
-                                build_in_memory[build_id] = {
-                                    'apk_path': apk_file.name,
-                                    'apk_size': len(apk_bytes),
-                                    'compiled': True
-                                }
                                 
-                                logging.warning(f"⚠️ Fallback: APK sauvegardé localement: {apk_file.name}")
+                                logging.warning(f"⚠️ Fallback: APK conservé localement: {stored.path}")
                                 apk_compiled = True
-                                apk_size = len(apk_bytes)
                         else:
                             logging.warning(f"⚠️ Compilation échouée: {error_msg[:200] if error_msg else 'Erreur inconnue'}")
                     except ImportError:
@@ -1820,12 +1864,7 @@ async def process_build_with_timeout(build_id: str, project: dict, timeout_minut
 @api_router.get("/builds")
 async def get_builds(user_id: str = Depends(get_current_user), project_id: Optional[str] = None):
     if DEV_MODE:
-        all_builds = []
-        for builds in DEV_BUILDS_STORE.values():
-            all_builds.extend([b for b in builds if b.get("user_id") == user_id])
-        if project_id:
-            all_builds = [b for b in all_builds if b.get("project_id") == project_id]
-        return all_builds
+        return DEV_BUILDS_STORE.for_user(user_id, project_id)
     
     try:
         client = get_supabase_client(use_service_role=True)
@@ -1844,10 +1883,9 @@ async def get_builds(user_id: str = Depends(get_current_user), project_id: Optio
 @api_router.get("/builds/{build_id}")
 async def get_build(build_id: str, user_id: str = Depends(get_current_user)):
     if DEV_MODE:
-        for project_builds in DEV_BUILDS_STORE.values():
-            for build in project_builds:
-                if build.get('id') == build_id:
-                    return build
+        build = DEV_BUILDS_STORE.get(build_id, user_id)
+        if build:
+            return build
         raise HTTPException(status_code=404, detail="Build not found")
     
     try:
@@ -1887,6 +1925,8 @@ async def delete_build(build_id: str, user_id: str = Depends(get_current_user)):
             raise HTTPException(status_code=404, detail="Build not found")
         
         client.table("builds").delete().eq("id", build_id).execute()
+        _forget_deleted_builds([build_id])
+        deletion_pipeline.enqueue_paths([build_response.data[0].get("storage_path")])
         await log_system_event("info", "build", f"Build deleted: {build_id}", user_id=user_id)
         
         return {"message": "Build deleted successfully"}
@@ -1905,7 +1945,7 @@ async def delete_build(build_id: str, user_id: str = Depends(get_current_user)):
 @api_router.delete("/builds")
 async def delete_all_builds(user_id: str = Depends(get_current_user)):
     if DEV_MODE:
-        build_count = sum(len([b for b in builds if b.get("user_id") == user_id]) for builds in DEV_BUILDS_STORE.values())
+        build_count = DEV_BUILDS_STORE.count_for_user(user_id)
         logging.info(f"DEV_MODE: All builds deleted (simulated, {build_count} builds)")
         return {"message": "All builds deleted successfully", "deleted_count": build_count}
     
@@ -1914,10 +1954,9 @@ async def delete_all_builds(user_id: str = Depends(get_current_user)):
         if not client:
             raise HTTPException(status_code=500, detail="Database unavailable")
         
-        builds_response = client.table("builds").select("id").eq("user_id", user_id).execute()
-        build_count = len(builds_response.data) if builds_response.data else 0
-        
-        client.table("builds").delete().eq("user_id", user_id).execute()
+        deleted_builds = await deletion_pipeline.delete_build_rows(client, user_id=user_id)
+        build_count = len(deleted_builds)
+        deletion_pipeline.enqueue_paths([build.get("storage_path") for build in deleted_builds])
         await log_system_event("info", "build", f"All builds deleted ({build_count} builds)", user_id=user_id)
         
         return {"message": "All builds deleted successfully", "deleted_count": build_count}
@@ -1933,9 +1972,82 @@ async def delete_all_builds(user_id: str = Depends(get_current_user)):
             else:
                 raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+# Recompilations en cours (une seule par build et par processus)
+# Échec d'une recompilation gardé 10 min pour /download/status (clients wait=false)
+recompile_flights = SingleFlight("Recompilation APK", failure_ttl_seconds=600)
+
+async def _recompile_build_apk(build_id: str, project: dict, user_id: str, client) -> Dict[str, Any]:
+    """
+    Recompile l'APK d'un build puis l'upload (ou le garde en stockage local)
+    Exécuté une seule fois par build via recompile_flights, quel que soit le nombre de demandeurs.
+    
+    Returns:
+        {"redirect_url": ...} si l'APK est sur Supabase, sinon {"artifact": StoredArtifact}
+    """
+    try:
+        from android_builder import build_apk_file_task
+        
+        project_name = project.get('name', 'MyApp')
+        features = normalize_features(project.get('features', []))
+        
+        logging.info(f"🔨 Recompilation APK pour {project_name}...")
+        
+        project_zip = await get_generation_service().generate(project, features, 'android', compression='internal')
+        
+        success, apk_path, error_msg = await get_task_executor().run_isolated(
+            build_apk_file_task,
+            str(Path(__file__).parent),
+            project_zip,
+            project_name,
+            3  # max_retries
+        )
+        
+        if success and apk_path and apk_path.stat().st_size >= 50000:
+            logging.info(f"✅ APK recompilé! Taille: {apk_path.stat().st_size / 1024 / 1024:.2f} MB")
+            
+            # Upload sur Supabase
+            try:
+                public_url = await upload_apk_to_supabase(
+                    apk_path, 
+                    build_id, 
+                    project['id'],
+                    user_id
+                )
+                
+                logging.info(f"✅ APK uploadé sur Supabase: {public_url}")
+                
+                artifact = get_artifact_index().get(build_id)
+                redirect_url = get_artifact_index().signed_url(client, artifact) if artifact else public_url
+                apk_path.unlink(missing_ok=True)
+                return {"redirect_url": redirect_url}
+                
+            except Exception as upload_error:
+                logging.error(f"❌ Erreur upload Supabase après recompilation: {upload_error}")
+                # Fallback: stockage local (servi aussi aux téléchargements suivants)
+                stored = await asyncio.to_thread(
+                    get_artifact_store().put, build_id, apk_path, project['id'], user_id
+                )
+                return {"artifact": stored}
+        else:
+            raise HTTPException(status_code=500, detail=f"Recompilation failed: {error_msg}")
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"❌ Erreur recompilation: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to recompile APK: {str(e)}")
+
 @api_router.get("/builds/{build_id}/download")
-async def download_build(build_id: str, user_id: str = Depends(get_current_user)):
-    """Télécharge l'APK depuis Supabase Storage ou génère si nécessaire"""
+async def download_build(
+    build_id: str,
+    request: Request,
+    wait: bool = True,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Télécharge l'APK depuis Supabase Storage ou génère si nécessaire (Range / ETag supportés en local)
+    Si une recompilation est nécessaire et wait=false, répond 202 avec l'URL de progression.
+    """
     
     try:
         logging.info(f"📥 Download request for build {build_id}")
@@ -1944,16 +2056,20 @@ async def download_build(build_id: str, user_id: str = Depends(get_current_user)
         if not client and not DEV_MODE:
             raise HTTPException(status_code=500, detail="Database unavailable")
         
+        # Index des artefacts: aucune lecture DB si l'APK est déjà connu
+        if client:
+            artifact = get_artifact_index().get(build_id)
+            if artifact:
+                if artifact.user_id != user_id:
+                    raise HTTPException(status_code=403, detail="Forbidden")
+                try:
+                    return RedirectResponse(url=get_artifact_index().signed_url(client, artifact))
+                except Exception as sign_error:
+                    logging.warning(f"⚠️ URL signée indisponible pour {build_id}: {sign_error}")
+        
         # Récupérer le build
         if DEV_MODE:
-            build = None
-            for project_builds in DEV_BUILDS_STORE.values():
-                for b in project_builds:
-                    if b.get('id') == build_id:
-                        build = b
-                        break
-                if build:
-                    break
+            build = DEV_BUILDS_STORE.get(build_id)
             if not build:
                 raise HTTPException(status_code=404, detail="Build not found")
         else:
@@ -1966,58 +2082,38 @@ async def download_build(build_id: str, user_id: str = Depends(get_current_user)
         if build.get('user_id') != user_id:
             raise HTTPException(status_code=403, detail="Forbidden")
         
-        # ✅ NOUVEAU : Vérifier si l'APK existe sur Supabase Storage
-        download_url = build.get('download_url')
-        storage_path = build.get('storage_path')
-        
-        if download_url and storage_path:
-            # Vérifier que le fichier existe toujours sur Supabase
-            try:
-                exists = client.storage.from_('apks').list(path=str(Path(storage_path).parent))
-                file_exists = any(f['name'] == Path(storage_path).name for f in exists)
-                
-                if file_exists:
-                    logging.info(f"✅ APK trouvé sur Supabase Storage, redirection vers: {download_url}")
-                    return RedirectResponse(url=download_url)
-                else:
-                    logging.warning(f"⚠️ APK non trouvé sur Supabase: {storage_path}")
-            except Exception as check_error:
-                logging.warning(f"⚠️ Erreur vérification Supabase: {check_error}")
-        
-        # Si pas sur Supabase, vérifier si en mémoire locale (fallback)
-        if build_id in build_in_memory and build_in_memory[build_id].get('apk_path'):
-            apk_info = build_in_memory[build_id]
-            apk_path = Path(apk_info['apk_path'])
+        # APK sur Supabase Storage: l'index fait foi, pas de listing du bucket
+        if client:
+            artifact = get_artifact_index().record_from_build(build)
+            if artifact:
+                try:
+                    signed_url = get_artifact_index().signed_url(client, artifact)
+                    logging.info(f"✅ APK indexé sur Supabase Storage, redirection signée: {artifact.storage_path}")
+                    return RedirectResponse(url=signed_url)
+                except Exception as sign_error:
+                    logging.warning(f"⚠️ APK non disponible sur Supabase ({artifact.storage_path}): {sign_error}")
+        
+        # Si pas sur Supabase, vérifier le stockage local (fallback)
+        stored = await asyncio.to_thread(get_artifact_store().get, build_id)
+        if stored:
+            logging.info(f"✅ APK trouvé dans le stockage local: {stored.path}")
             
-            if apk_path.exists():
-                logging.info(f"✅ APK trouvé en mémoire locale: {apk_path}")
-                
-                # Récupérer le projet
-                if DEV_MODE:
-                    project = DEV_PROJECTS_STORE.get(build['project_id'])
-                else:
-                    project_response = client.table("projects").select("*").eq("id", build["project_id"]).execute()
-                    project = project_response.data[0] if project_response.data else None
-                
-                if project:
-                    safe_filename = "".join(c for c in project.get('name', 'MyApp') if c.isalnum() or c in (' ', '-', '_')).strip()
-                    filename = f"{safe_filename.lower().replace(' ', '-')}.apk"
-                else:
-                    filename = "app.apk"
-                
-                def iterfile():
-                    with open(apk_path, "rb") as f:
-                        yield from f
-                
-                return StreamingResponse(
-                    iterfile(),
-                    media_type="application/vnd.android.package-archive",
-                    headers={
-                        "Content-Disposition": f'attachment; filename="{filename}"',
-                        "Content-Type": "application/vnd.android.package-archive",
-                        "Content-Length": str(apk_info['apk_size'])
-                    }
-                )
+            # Récupérer le projet
+            if DEV_MODE:
+                project = DEV_PROJECTS_STORE.get(build['project_id'])
+            else:
+                project_response = client.table("projects").select("*").eq("id", build["project_id"]).execute()
+                project = project_response.data[0] if project_response.data else None
+            
+            if project:
+                safe_filename = "".join(c for c in project.get('name', 'MyApp') if c.isalnum() or c in (' ', '-', '_')).strip()
+                filename = f"{safe_filename.lower().replace(' ', '-')}.apk"
+            else:
+                filename = "app.apk"
+            
+            return await file_download_response(
+                request, stored.path, filename, APK_MEDIA_TYPE, content_hash=stored.sha256
+            )
         
         # Si pas d'APK disponible, générer le projet source ou recompiler
         logging.info(f"⚠️ APK non disponible pour le build {build_id}, génération à la volée...")
@@ -2046,66 +2142,35 @@ async def download_build(build_id: str, user_id: str = Depends(get_current_user)
             if not generator_available:
                 raise HTTPException(status_code=503, detail="Generator not available")
             
-            try:
-                from android_builder import AndroidBuilder
-                builder = AndroidBuilder(Path(__file__).parent)
-                
-                project_name = project.get('name', 'MyApp')
-                safe_name = "".join(c.lower() if c.isalnum() else '' for c in project_name)
-                package_name = f"com.nativiweb.{safe_name}" if safe_name else "com.nativiweb.app"
-                web_url = project.get('web_url', '')
-                features = normalize_features(project.get('features', []))
-                
-                logging.info(f"🔨 Recompilation APK pour {project_name}...")
-                
-                project_zip = generator.generate_android_project(
-                    project_name=project_name,
-                    package_name=package_name,
-                    web_url=web_url,
-                    features=features,
-                    app_icon_url=project.get('logo_url')
+            if not wait:
+                # Réponse immédiate: la recompilation (partagée) continue en arrière-plan
+                recompile_flights.start(
+                    build_id,
+                    lambda: _recompile_build_apk(build_id, project, user_id, client),
+                    user_id=user_id
                 )
-                
-                success, apk_bytes, error_msg = builder.build_apk(project_zip, project_name, max_retries=3)
-                
-                if success and apk_bytes and len(apk_bytes) >= 50000:
-                    logging.info(f"✅ APK recompilé! Taille: {len(apk_bytes) / 1024 / 1024:.2f} MB")
-                    
-                    # Upload sur Supabase
-                    try:
-                        public_url = await upload_apk_to_supabase(
-                            apk_bytes, 
-                            build_id, 
-                            project['id']
-                        )
-                        
-                        logging.info(f"✅ APK uploadé sur Supabase: {public_url}")
-                        
-                        return RedirectResponse(url=public_url)
-                        
-                    except Exception as upload_error:
-                        logging.error(f"❌ Erreur upload Supabase après recompilation: {upload_error}")
-                        # Fallback: retourner directement les bytes
-                        safe_filename = "".join(c for c in project_name if c.isalnum() or c in (' ', '-', '_')).strip()
-                        filename = f"{safe_filename.lower().replace(' ', '-')}.apk"
-                        
-                        return StreamingResponse(
-                            io.BytesIO(apk_bytes),
-                            media_type="application/vnd.android.package-archive",
-                            headers={
-                                "Content-Disposition": f'attachment; filename="{filename}"',
-                                "Content-Type": "application/vnd.android.package-archive",
-                                "Content-Length": str(len(apk_bytes))
-                            }
-                        )
-                else:
-                    raise HTTPException(status_code=500, detail=f"Recompilation failed: {error_msg}")
-                    
-            except HTTPException:
-                raise
-            except Exception as e:
-                logging.error(f"❌ Erreur recompilation: {e}", exc_info=True)
-                raise HTTPException(status_code=500, detail=f"Failed to recompile APK: {str(e)}")
+                progress_url = f"/api/builds/{build_id}/download/status"
+                return JSONResponse(
+                    status_code=202,
+                    content={"status": "compiling", "build_id": build_id, "progress_url": progress_url},
+                    headers={"Location": progress_url, "Retry-After": "15"}
+                )
+            
+            # Un seul Gradle par build: les demandeurs concurrents attendent le même résultat
+            result = await recompile_flights.do(
+                build_id,
+                lambda: _recompile_build_apk(build_id, project, user_id, client),
+                user_id=user_id
+            )
+            if result.get('redirect_url'):
+                return RedirectResponse(url=result['redirect_url'])
+            
+            stored = result['artifact']
+            safe_filename = "".join(c for c in project.get('name', 'MyApp') if c.isalnum() or c in (' ', '-', '_')).strip()
+            filename = f"{safe_filename.lower().replace(' ', '-')}.apk"
+            return await file_download_response(
+                request, stored.path, filename, APK_MEDIA_TYPE, content_hash=stored.sha256
+            )
         
         # Fallback: retourner le projet source
         logging.info("📦 Returning source project (ZIP)")
@@ -2119,41 +2184,19 @@ async def download_build(build_id: str, user_id: str = Depends(get_current_user)
             raise HTTPException(status_code=503, detail="Generator not available")
         
         project_name = project.get('name', 'MyApp')
-        safe_name = "".join(c.lower() if c.isalnum() else '' for c in project_name)
-        web_url = project.get('web_url', '')
         features = normalize_features(project.get('features', []))
         
         if platform == 'android':
-            package_name = f"com.nativiweb.{safe_name}" if safe_name else "com.nativiweb.app"
-            project_zip = generator.generate_android_project(
-                project_name=project_name,
-                package_name=package_name,
-                web_url=web_url,
-                features=features,
-                app_icon_url=project.get('logo_url')
-            )
+            project_zip = await get_generation_service().generate(project, features, 'android')
             filename_suffix = "-source.zip"
         else:
-            bundle_id = f"com.nativiweb.{safe_name}" if safe_name else "com.nativiweb.app"
-            project_zip = generator.generate_ios_project(
-                project_name=project_name,
-                bundle_identifier=bundle_id,
-                web_url=web_url,
-                features=features,
-                app_icon_url=project.get('logo_url')
-            )
+            project_zip = await get_generation_service().generate(project, features, 'ios')
             filename_suffix = "-ios-source.zip"
         
         safe_filename = "".join(c for c in project_name if c.isalnum() or c in (' ', '-', '_')).strip()
         filename = f"{safe_filename.lower().replace(' ', '-')}{filename_suffix}"
         
-        return StreamingResponse(
-            io.BytesIO(project_zip),
-            media_type="application/zip",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"'
-            }
-        )
+        return bytes_download_response(request, project_zip, filename, ZIP_MEDIA_TYPE)
             
     except HTTPException:
         raise
@@ -2161,16 +2204,70 @@ async def download_build(build_id: str, user_id: str = Depends(get_current_user)
         logging.error(f"❌ Download error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/builds/{build_id}/download/status")
+async def download_build_status(build_id: str, user_id: str = Depends(get_current_user)):
+    """Progression d'une recompilation lancée par download_build (wait=false)"""
+    download_url = f"/api/builds/{build_id}/download"
+    
+    status = recompile_flights.status(build_id)
+    if status:
+        if status.get('user_id') != user_id:
+            raise HTTPException(status_code=404, detail="Build not found")
+        return {
+            "build_id": build_id,
+            "status": "compiling",
+            "started_at": datetime.fromtimestamp(status['started_at'], timezone.utc).isoformat(),
+            "elapsed_seconds": status['elapsed_seconds'],
+            "download_url": download_url
+        }
+    
+    artifact = get_artifact_index().get(build_id) or await asyncio.to_thread(get_artifact_store().get, build_id)
+    if artifact and artifact.user_id == user_id:
+        return {"build_id": build_id, "status": "ready", "download_url": download_url}
+    
+    failure = recompile_flights.last_failure(build_id)
+    if failure and failure.get('user_id') == user_id:
+        return {
+            "build_id": build_id,
+            "status": "failed",
+            "error": failure['error'],
+            "failed_at": datetime.fromtimestamp(failure['failed_at'], timezone.utc).isoformat(),
+            "download_url": download_url
+        }
+    return {"build_id": build_id, "status": "unavailable", "download_url": download_url}
+
 @api_router.post("/admin/cleanup-builds")
 async def admin_cleanup_builds(
     days: int = 30,
+    wait: bool = False,
     admin_user: Dict[str, Any] = Depends(get_admin_user)
 ):
-    """Nettoyer les builds de plus de X jours (admin only)"""
-    result = await cleanup_old_builds_storage(days)
+    """Nettoyer les builds de plus de X jours (admin only), en arrière-plan par défaut"""
+    policy = dataclasses.replace(retention_service.policy, max_age_days=days)
+    if wait:
+        result = await retention_service.run_once(policy)
+    else:
+        result = {"started": retention_service.start(policy), **retention_service.status()}
     await log_system_event("info", "admin", f"Cleaned up old builds: {result}", user_id=admin_user.get("id"))
     return result
 
+@api_router.get("/admin/retention")
+async def admin_get_retention(admin_user: Dict[str, Any] = Depends(get_admin_user)):
+    """Politique et métriques du job de rétention des builds"""
+    return retention_service.status()
+
+@api_router.post("/admin/storage/reconcile")
+async def admin_reconcile_storage(admin_user: Dict[str, Any] = Depends(get_admin_user)):
+    """Rechercher et supprimer en arrière-plan les APK orphelins du bucket (admin only)"""
+    started = deletion_pipeline.start_reconcile()
+    await log_system_event("info", "admin", "Storage reconciliation started", user_id=admin_user.get("id"))
+    return {"started": started, **deletion_pipeline.status()}
+
+@api_router.get("/admin/storage/reclaim")
+async def admin_get_storage_reclaim(admin_user: Dict[str, Any] = Depends(get_admin_user)):
+    """Progression de la récupération de l'espace Storage"""
+    return deletion_pipeline.status()
+
 @api_router.post("/builds/{build_id}/publish")
 async def publish_build(
     build_id: str,
@@ -2190,14 +2287,7 @@ async def publish_build(
         
         # Récupérer le build (même logique que download_build)
         if DEV_MODE:
-            build = None
-            for project_builds in DEV_BUILDS_STORE.values():
-                for b in project_builds:
-                    if b.get('id') == build_id:
-                        build = b
-                        break
-                if build:
-                    break
+            build = DEV_BUILDS_STORE.get(build_id)
             if not build:
                 raise HTTPException(status_code=404, detail="Build not found")
         else:
@@ -2242,12 +2332,11 @@ async def publish_build(
                 
                 playstore = PlayStoreAPI(credentials_path)
                 
-                # Récupérer l'APK depuis build_in_memory
-                apk_path = None
-                if build_id in build_in_memory and build_in_memory[build_id].get('apk_path'):
-                    apk_path = build_in_memory[build_id]['apk_path']
+                # Récupérer l'APK depuis le stockage local
+                stored = await asyncio.to_thread(get_artifact_store().get, build_id, verify=True)
+                apk_path = str(stored.path) if stored else None
                 
-                if not apk_path or not Path(apk_path).exists():
+                if not apk_path:
                     raise HTTPException(status_code=404, detail="APK not found. Please ensure build completed successfully.")
                 
                 # Pour l'instant, on utilise l'APK directement
@@ -2372,63 +2461,81 @@ async def publish_build(
 async def get_available_features():
     return DEFAULT_FEATURES
 
+async def _load_project_version(project_id: str) -> Optional[ProjectVersion]:
+    """Lecture DB des seuls champs utiles à la vérification de version"""
+    if DEV_MODE:
+        project = DEV_PROJECTS_STORE.get(project_id)
+        return ProjectVersion.from_row(project) if project else None
+    
+    client = get_supabase_client(use_service_role=True)
+    if not client:
+        raise HTTPException(status_code=500, detail="Database unavailable")
+    response = await asyncio.to_thread(
+        lambda: client.table("projects").select(VERSION_COLUMNS).eq("id", project_id).execute()
+    )
+    return ProjectVersion.from_row(response.data[0]) if response.data else None
+
+async def _cached_project_version(project_id: str) -> Optional[ProjectVersion]:
+    return await get_version_cache().get(project_id, _load_project_version)
+
+# Connexions SSE des apps natives (un hub par worker)
+version_hub = VersionBroadcastHub(fetch=_cached_project_version)
+
 @api_router.get("/projects/{project_id}/version/check")
 async def check_web_app_version(
     project_id: str,
+    request: Request,
     current_version: Optional[str] = Query(None, description="Version actuelle dans l'app native"),
     user_id: str = Depends(get_current_user)
 ):
     """
     Vérifie si une nouvelle version de l'app web est disponible.
     Retourne la version actuelle du projet et indique si une mise à jour est nécessaire.
+    Appelé par chaque app installée: le projet est lu via le cache des versions, et la réponse
+    porte un ETag (304 si If-None-Match correspond) et un Cache-Control privé: la réponse est
+    authentifiée et propre au propriétaire, seul le client peut la réutiliser.
     """
     try:
-        if DEV_MODE:
-            if project_id not in DEV_PROJECTS_STORE:
-                raise HTTPException(status_code=404, detail="Project not found")
-            project = DEV_PROJECTS_STORE[project_id]
-        else:
-            client = get_supabase_client(use_service_role=True)
-            if not client:
-                raise HTTPException(status_code=500, detail="Database unavailable")
-            
-            response = client.table("projects").select("*").eq("id", project_id).eq("user_id", user_id).execute()
-            if not response.data:
-                raise HTTPException(status_code=404, detail="Project not found")
-            project = response.data[0]
+        version = await _cached_project_version(project_id)
+        if not version or (not DEV_MODE and version.user_id != user_id):
+            raise HTTPException(status_code=404, detail="Project not found")
         
-        # Récupérer la version actuelle du projet
-        project_version = project.get('web_app_version')
-        version_check_enabled = project.get('version_check_enabled', True)
+        etag = version.etag(current_version)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"private, max-age={VERSION_CHECK_MAX_AGE}",
+            "Vary": "Authorization",
+        }
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        
+        project_version = version.web_app_version
         
         # Si la vérification est désactivée
-        if not version_check_enabled:
-            return {
+        if not version.version_check_enabled:
+            content = {
                 "version_check_enabled": False,
                 "message": "Version check is disabled for this project"
             }
-        
         # Si aucune version n'est définie dans le projet
-        if not project_version:
-            return {
+        elif not project_version:
+            content = {
                 "version": None,
                 "update_available": False,
                 "message": "No version set for this project. Please set web_app_version in project settings."
             }
-        
-        # Comparer les versions
-        update_available = False
-        if current_version and current_version != project_version:
-            update_available = True
-        
-        return {
-            "version": project_version,
-            "current_version": current_version,
-            "update_available": update_available,
-            "project_id": project_id,
-            "web_url": project.get('web_url'),
-            "timestamp": datetime.now(timezone.utc).isoformat()
-        }
+        else:
+            # Comparer les versions
+            update_available = bool(current_version and current_version != project_version)
+            content = {
+                "version": project_version,
+                "current_version": current_version,
+                "update_available": update_available,
+                "project_id": project_id,
+                "web_url": version.web_url,
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            }
+        return JSONResponse(content=content, headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -2438,39 +2545,143 @@ async def check_web_app_version(
         else:
             raise HTTPException(status_code=500, detail=f"Error checking version: {str(e)}")
 
+@api_router.get("/projects/{project_id}/version/events")
+async def stream_web_app_version(
+    project_id: str,
+    request: Request,
+    current_version: Optional[str] = Query(None, description="Version actuelle dans l'app native")
+):
+    """
+    Flux Server-Sent Events des changements de version de l'app web.
+    Remplace le polling de /version/check: un évènement `version` à la connexion puis à chaque
+    mise à jour de web_app_version, un heartbeat pendant les périodes calmes, et Last-Event-ID
+    pour reprendre sans renvoyer un état déjà reçu. Public (EventSource n'envoie pas d'en-tête
+    Authorization): seuls la version et l'activation sont diffusées.
+    """
+    if not version_hub.has_capacity():
+        raise HTTPException(
+            status_code=503,
+            detail="Too many version listeners on this worker",
+            headers={"Retry-After": str(VERSION_EVENTS_RETRY_MS // 1000)}
+        )
+    version = await _cached_project_version(project_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    return StreamingResponse(
+        version_hub.subscribe(
+            project_id,
+            version,
+            current_version=current_version,
+            last_event_id=request.headers.get("last-event-id")
+        ),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+_EMPTY_STATS = {"projects": 0, "total_builds": 0, "successful_builds": 0, "api_keys": 0}
+
+# Éléments renvoyés par /dashboard/summary (premier affichage du dashboard)
+DASHBOARD_RECENT_PROJECTS = 3
+DASHBOARD_RECENT_BUILDS = 5
+_DASHBOARD_PROJECT_FIELDS = ("id", "name", "web_url", "status", "platform", "created_at", "updated_at")
+_DASHBOARD_BUILD_FIELDS = ("id", "project_id", "platform", "status", "created_at")
+
+async def _load_user_stats(client, user_id: str) -> Dict[str, int]:
+    """Compteurs de l'utilisateur: requêtes COUNT (sans lignes) lancées en parallèle"""
+    def count(table: str, **filters) -> int:
+        query = client.table(table).select("id", count="exact", head=True)
+        for column, value in filters.items():
+            query = query.eq(column, value)
+        return query.execute().count or 0
+    
+    projects, total_builds, successful_builds, api_keys = await asyncio.gather(
+        asyncio.to_thread(count, "projects", user_id=user_id),
+        asyncio.to_thread(count, "builds", user_id=user_id),
+        asyncio.to_thread(count, "builds", user_id=user_id, status="completed"),
+        asyncio.to_thread(count, "api_keys", user_id=user_id)
+    )
+    return {
+        "projects": projects,
+        "total_builds": total_builds,
+        "successful_builds": successful_builds,
+        "api_keys": api_keys
+    }
+
+def _dev_user_stats(user_id: str) -> Dict[str, int]:
+    return {
+        "projects": DEV_PROJECTS_STORE.count_for_user(user_id),
+        "total_builds": DEV_BUILDS_STORE.count_for_user(user_id),
+        "successful_builds": DEV_BUILDS_STORE.count_for_user(user_id, status="completed"),
+        "api_keys": 0
+    }
+
 @api_router.get("/stats")
 async def get_user_stats(user_id: str = Depends(get_current_user)):
     if DEV_MODE:
-        dev_projects_count = len([p for p in DEV_PROJECTS_STORE.values() if p.get("user_id") == user_id])
-        dev_builds_count = sum(len([b for b in builds if b.get("user_id") == user_id]) for builds in DEV_BUILDS_STORE.values())
-        dev_successful_count = sum(len([b for b in builds if b.get("user_id") == user_id and b.get("status") == "completed"]) for builds in DEV_BUILDS_STORE.values())
-        return {
-            "projects": dev_projects_count,
-            "total_builds": dev_builds_count,
-            "successful_builds": dev_successful_count,
-            "api_keys": 0
-        }
+        return _dev_user_stats(user_id)
     
     try:
         client = get_supabase_client(use_service_role=True)
         if not client:
-            return {"projects": 0, "total_builds": 0, "successful_builds": 0, "api_keys": 0}
-        
-        projects_result = client.table("projects").select("id").eq("user_id", user_id).execute()
-        builds_result = client.table("builds").select("id, status").eq("user_id", user_id).execute()
-        api_keys_result = client.table("api_keys").select("id").eq("user_id", user_id).execute()
-        
-        builds_data = builds_result.data if builds_result.data else []
-        
-        return {
-            "projects": len(projects_result.data) if projects_result.data else 0,
-            "total_builds": len(builds_data),
-            "successful_builds": len([b for b in builds_data if b.get("status") == "completed"]),
-            "api_keys": len(api_keys_result.data) if api_keys_result.data else 0
-        }
+            return dict(_EMPTY_STATS)
+        return await _load_user_stats(client, user_id)
     except Exception as e:
         logging.error(f"Error fetching stats: {e}")
-        return {"projects": 0, "total_builds": 0, "successful_builds": 0, "api_keys": 0}
+        return dict(_EMPTY_STATS)
+
+@api_router.get("/dashboard/summary")
+async def get_dashboard_summary(request: Request, user_id: str = Depends(get_current_user)):
+    """
+    Tout le premier affichage du dashboard en une requête: compteurs, projets récents
+    et derniers builds. ETag faible sur le contenu (304 si inchangé).
+    """
+    if DEV_MODE:
+        stats = _dev_user_stats(user_id)
+        projects = DEV_PROJECTS_STORE.for_user(user_id)[::-1][:DASHBOARD_RECENT_PROJECTS]
+        projects = [project_fields(p, _DASHBOARD_PROJECT_FIELDS) for p in projects]
+        builds = DEV_BUILDS_STORE.for_user(user_id)[:DASHBOARD_RECENT_BUILDS]
+        builds = [{field: b.get(field) for field in _DASHBOARD_BUILD_FIELDS} for b in builds]
+    else:
+        try:
+            client = get_supabase_client(use_service_role=True)
+            if not client:
+                raise HTTPException(status_code=500, detail="Database unavailable")
+            
+            def load_projects():
+                return client.table("projects").select(",".join(_DASHBOARD_PROJECT_FIELDS)).eq(
+                    "user_id", user_id
+                ).order("created_at", desc=True).limit(DASHBOARD_RECENT_PROJECTS).execute().data or []
+            
+            def load_builds():
+                return client.table("builds").select(",".join(_DASHBOARD_BUILD_FIELDS)).eq(
+                    "user_id", user_id
+                ).order("created_at", desc=True).limit(DASHBOARD_RECENT_BUILDS).execute().data or []
+            
+            # Projets: cache par utilisateur (invalidé à chaque modification); builds: état en direct
+            stats, projects, builds = await asyncio.gather(
+                _load_user_stats(client, user_id),
+                get_project_cache().get(user_id, "dashboard:projects", lambda: asyncio.to_thread(load_projects)),
+                asyncio.to_thread(load_builds)
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            logging.error(f"Error fetching dashboard summary: {e}")
+            if ENVIRONMENT == "production":
+                raise HTTPException(status_code=500, detail="Failed to load dashboard. Please try again later.")
+            else:
+                raise HTTPException(status_code=500, detail=f"Error fetching dashboard summary: {str(e)}")
+    
+    summary = {"stats": stats, "projects": projects, "recent_builds": builds}
+    digest = hashlib.sha1(json.dumps(summary, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:20]
+    headers = {"ETag": f'W/"{digest}"', "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=summary, headers=headers)
 
 # ==================== ADMIN ENDPOINTS ====================
 
@@ -2759,36 +2970,23 @@ async def admin_delete_project(
 ):
     if DEV_MODE:
         if project_id in DEV_PROJECTS_STORE:
-            if project_id in DEV_BUILDS_STORE:
-                del DEV_BUILDS_STORE[project_id]
-            del DEV_PROJECTS_STORE[project_id]
+            DEV_BUILDS_STORE.delete_project(project_id)
+            owner_id = DEV_PROJECTS_STORE.pop(project_id).get("user_id")
+            _project_changed(project_id, owner_id)
         return {"message": "Project deleted"}
 
     client = get_supabase_client(use_service_role=True)
     if not client:
         raise HTTPException(status_code=500, detail="Database unavailable")
 
-    project_response = client.table("projects").select("id").eq("id", project_id).execute()
+    project_response = client.table("projects").select("id,user_id").eq("id", project_id).execute()
     if not project_response.data:
         raise HTTPException(status_code=404, detail="Project not found")
 
-    builds_response = client.table("builds").select("id").eq("project_id", project_id).execute()
-    build_ids = [build["id"] for build in builds_response.data] if builds_response.data else []
-
-    for build_id in build_ids:
-        if build_id in build_in_memory:
-            apk_path = build_in_memory[build_id].get("apk_path")
-            if apk_path and Path(apk_path).exists():
-                try:
-                    os.unlink(apk_path)
-                except Exception as e:
-                    logging.warning(f"Error deleting APK {apk_path}: {e}")
-            del build_in_memory[build_id]
-
-    if build_ids:
-        client.table("builds").delete().eq("project_id", project_id).execute()
-
+    await deletion_pipeline.delete_build_rows(client, project_id=project_id)
     client.table("projects").delete().eq("id", project_id).execute()
+    _project_changed(project_id, project_response.data[0].get("user_id"))
+    deletion_pipeline.enqueue_prefix(f"projects/{project_id}/builds")
     await log_system_event("info", "admin", f"Admin deleted project {project_id}", user_id=admin_user.get("id"))
     return {"message": "Project deleted"}
 
@@ -2802,7 +3000,9 @@ async def admin_get_builds(
     safe_page, safe_limit, start, end = _normalize_pagination(page, limit)
 
     if DEV_MODE:
-        builds = [b for builds in DEV_BUILDS_STORE.values() for b in builds]
+        builds = DEV_BUILDS_STORE.all()
+        if status:
+            builds = [b for b in builds if b.get("status") == status]
         total = len(builds)
         return {
             "builds": builds[start:start + safe_limit],
@@ -3227,18 +3427,20 @@ except ImportError as e:
     GENERATOR_AVAILABLE = False
     generator = None
 
+
 @api_router.get("/generator/download/{project_id}/{platform}")
 async def download_generated_project(
     project_id: str,
     platform: str,
+    request: Request,
     user_id: str = Depends(get_current_user)
 ):
-    """Download generated native project"""
+    """Download generated native project (platform 'both' génère Android et iOS en parallèle)"""
     if not GENERATOR_AVAILABLE:
         raise HTTPException(status_code=503, detail="Generator unavailable")
     
-    if platform not in ['android', 'ios']:
-        raise HTTPException(status_code=400, detail="Platform must be 'android' or 'ios'")
+    if platform not in ['android', 'ios', 'both']:
+        raise HTTPException(status_code=400, detail="Platform must be 'android', 'ios' or 'both'")
     
     try:
         client = get_supabase_client(use_service_role=True)
@@ -3256,39 +3458,22 @@ async def download_generated_project(
             project = project_response.data[0]
         
         project_name = project.get('name', 'MyApp')
-        web_url = project.get('web_url', '')
         features = normalize_features(project.get('features', []))
         
         safe_name = "".join(c.lower() if c.isalnum() else '' for c in project_name)
         
-        if platform == 'android':
-            package_name = f"com.nativiweb.{safe_name}" if safe_name else "com.nativiweb.app"
-            project_zip = generator.generate_android_project(
-                project_name=project_name,
-                package_name=package_name,
-                web_url=web_url,
-                features=features,
-                app_icon_url=project.get('logo_url')
-            )
-            filename = f"{safe_name}-android.zip"
+        if platform == 'both':
+            # Les deux archives sont prêtes dans le temps de la plus lente
+            archives = await get_generation_service().generate_all(project, features, ['android', 'ios'])
+            project_zip = bundle_platform_archives(archives, safe_name)
+            filename = f"{safe_name}-native.zip"
         else:
-            bundle_id = f"com.nativiweb.{safe_name}" if safe_name else "com.nativiweb.app"
-            project_zip = generator.generate_ios_project(
-                project_name=project_name,
-                bundle_identifier=bundle_id,
-                web_url=web_url,
-                features=features,
-                app_icon_url=project.get('logo_url')
-            )
-            filename = f"{safe_name}-ios.zip"
+            project_zip = await get_generation_service().generate(project, features, platform)
+            filename = f"{safe_name}-{platform}.zip"
         
         await log_system_event("info", "generator", f"Generated {platform} project for {project_name}", user_id=user_id)
         
-        return StreamingResponse(
-            io.BytesIO(project_zip),
-            media_type="application/zip",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-        )
+        return bytes_download_response(request, project_zip, filename, ZIP_MEDIA_TYPE)
         
     except HTTPException:
         raise
@@ -3312,6 +3497,77 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
 
+async def _push_project_exists(project_id: str, user_id: Optional[str] = None) -> bool:
+    """Le projet existe (et appartient à user_id si fourni)"""
+    if DEV_MODE:
+        project = DEV_PROJECTS_STORE.get(project_id)
+        return bool(project) and (user_id is None or project.get("user_id") == user_id)
+    
+    client = get_supabase_client(use_service_role=True)
+    if not client:
+        raise HTTPException(status_code=500, detail="Database unavailable")
+    query = client.table("projects").select("id").eq("id", project_id)
+    if user_id is not None:
+        query = query.eq("user_id", user_id)
+    return bool(query.execute().data)
+
+@api_router.post("/projects/{project_id}/push/tokens")
+async def register_push_token(project_id: str, registration: DeviceTokenRegister):
+    """
+    Enregistre le token push d'un appareil (appelé par le SDK des apps générées)
+    Public: les appareils n'ont pas de session utilisateur, le token n'est rattaché qu'au projet.
+    """
+    try:
+        if not await _push_project_exists(project_id):
+            raise HTTPException(status_code=404, detail="Project not found")
+        return await asyncio.to_thread(
+            get_device_tokens().register,
+            project_id,
+            registration.platform,
+            registration.token,
+            registration.topics,
+            registration.device_id,
+            registration.app_version
+        )
+    except InvalidTokenRegistration as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Push token registration error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to register push token")
+
+@api_router.delete("/projects/{project_id}/push/tokens")
+async def unregister_push_token(
+    project_id: str,
+    token: str = Query(...),
+    platform: str = Query(...)
+):
+    """Retire le token d'un appareil (déconnexion, désactivation des notifications)"""
+    if not await _push_project_exists(project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    removed = await asyncio.to_thread(get_device_tokens().unregister, project_id, platform, token)
+    return {"removed": removed}
+
+@api_router.get("/projects/{project_id}/push/tokens")
+async def list_push_tokens(
+    project_id: str,
+    topic: Optional[str] = Query(None),
+    platform: Optional[str] = Query(None),
+    cursor: int = Query(0, ge=0, description="Dernier id de la page précédente"),
+    limit: int = Query(100, ge=1, le=1000),
+    user_id: str = Depends(get_current_user)
+):
+    """Tokens enregistrés du projet, paginés par curseur (next_cursor absent en fin de liste)"""
+    if not await _push_project_exists(project_id, user_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    registry = get_device_tokens()
+    tokens, next_cursor = await asyncio.to_thread(registry.page, project_id, topic, platform, cursor, limit)
+    response = {"tokens": tokens, "next_cursor": next_cursor}
+    if not cursor:
+        response["counts"] = await asyncio.to_thread(registry.count, project_id, topic)
+    return response
+
 @api_router.post("/push/send")
 async def send_push_notification(
     notification_data: dict,
@@ -3320,57 +3576,69 @@ async def send_push_notification(
     """
     Envoyer une push notification (OPTIONNEL - nécessite configuration)
     Nécessite FIREBASE_CREDENTIALS_PATH pour Android et APNs config pour iOS
+    La campagne est mise en file et livrée en arrière-plan (202 + campaign_id);
+    son avancement et ses métriques sont sur GET /push/campaigns/{campaign_id}
+    Avec project_id (et topic optionnel), la campagne cible les appareils enregistrés du projet.
     """
     try:
-        from push_service import get_push_service
-        push_service = get_push_service()
-        
         title = notification_data.get('title', '')
         body = notification_data.get('body', '')
         data = notification_data.get('data', {})
         android_tokens = notification_data.get('android_tokens', [])
         ios_tokens = notification_data.get('ios_tokens', [])
+        project_id = notification_data.get('project_id')
+        topic = notification_data.get('topic')
         
         if not title or not body:
             raise HTTPException(status_code=400, detail="title and body required")
         
-        if not android_tokens and not ios_tokens:
-            raise HTTPException(status_code=400, detail="At least one token (android_tokens or ios_tokens) required")
-        
-        results = {"android": [], "ios": []}
-        
-        # Android
-        for token in android_tokens:
-            try:
-                result = push_service.send_to_android(token, title, body, data)
-                results["android"].append({"token": token, "success": True, **result})
-            except Exception as e:
-                results["android"].append({"token": token, "success": False, "error": str(e)})
-        
-        # iOS
-        for token in ios_tokens:
-            try:
-                result = push_service.send_to_ios(token, title, body, data)
-                results["ios"].append({"token": token, "success": True, **result})
-            except Exception as e:
-                results["ios"].append({"token": token, "success": False, "error": str(e)})
+        if not android_tokens and not ios_tokens and not project_id:
+            raise HTTPException(
+                status_code=400,
+                detail="At least one token (android_tokens or ios_tokens) or a project_id required"
+            )
         
-        success_count = sum(1 for r in results["android"] + results["ios"] if r.get("success"))
-        total_count = len(results["android"]) + len(results["ios"])
+        recipients = None
+        if project_id:
+            # Appareils enregistrés du projet (ou du topic), lus page par page côté serveur
+            if not await _push_project_exists(project_id, user_id):
+                raise HTTPException(status_code=404, detail="Project not found")
+            recipients = get_device_tokens().iter_recipients(project_id, topic)
         
-        return {
-            "success": success_count > 0,
-            "sent": success_count,
-            "total": total_count,
-            "results": results
-        }
+        campaign = await get_push_campaigns().enqueue(
+            user_id, android_tokens, ios_tokens, title, body, data,
+            recipients=recipients, project_id=project_id, topic=topic
+        )
+        return JSONResponse(status_code=202, content=campaign.to_dict())
         
+    except HTTPException:
+        raise
     except ImportError:
         raise HTTPException(status_code=503, detail="Push notification service not available. Install firebase-admin and/or apns2.")
     except Exception as e:
         logging.error(f"Push notification error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/push/campaigns")
+async def list_push_campaigns(
+    limit: int = Query(20, ge=1, le=100),
+    user_id: str = Depends(get_current_user)
+):
+    """Dernières campagnes push de l'utilisateur"""
+    campaigns = await asyncio.to_thread(get_push_campaigns().recent, user_id, limit)
+    return {"campaigns": [campaign.to_dict() for campaign in campaigns]}
+
+@api_router.get("/push/campaigns/{campaign_id}")
+async def get_push_campaign(
+    campaign_id: str,
+    user_id: str = Depends(get_current_user)
+):
+    """État et métriques de livraison d'une campagne (envoyés, échecs, percentiles de latence)"""
+    campaign = await asyncio.to_thread(get_push_campaigns().get, campaign_id)
+    if not campaign or campaign.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign.to_dict()
+
 # ==================== CONFIGURATION FINALE ====================
 
 # CORS
@@ -3392,13 +3660,24 @@ app.add_middleware(
         "Content-Type",
         "Content-Length",
         "X-Build-Type",
-        "X-APK-Size"
+        "X-APK-Size",
+        "ETag",
+        "Accept-Ranges",
+        "Content-Range"
     ],
     max_age=3600,
 )
 
-# Compression
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Requêtes simultanées par worker; les flux SSE (connexions longues) ont leur propre limite
+app.add_middleware(ConcurrencyLimitMiddleware, exclude_suffixes=("/version/events",))
+
+# Compression (sauf téléchargements binaires: Range / ETag / zero-copy, et flux SSE)
+app.add_middleware(
+    DownloadAwareGZipMiddleware,
+    minimum_size=1000,
+    exclude_suffixes=("/download", "/version/events"),
+    exclude_prefixes=("/api/generator/download/",)
+)
 
 # Trusted host (production)
 if ENVIRONMENT == "production":
@@ -3441,8 +3720,47 @@ async def startup_event():
     else:
         logging.warning("⚠️ Supabase not fully configured")
     
+    # Registre des tokens push (avertit si le registre SQLite du mode DEV n'est pas persistant)
+    get_device_tokens()
+    
+    # Rétention des builds (reprend un éventuel checkpoint) et purge des APK orphelins,
+    # seulement si planifiées explicitement
+    if not DEV_MODE:
+        if BUILD_RETENTION_INTERVAL_HOURS > 0:
+            retention_service.start_scheduler()
+        if STORAGE_RECONCILE_INTERVAL_HOURS > 0:
+            deletion_pipeline.start_scheduler()
+    
+    # Campagnes push en file ou abandonnées par un worker arrêté
+    try:
+        get_push_campaigns().resume()
+    except Exception as e:
+        logging.warning(f"⚠️ Push campaigns resume failed: {e}")
+    
+    # Pool de navigateurs des screenshots (lancés au premier job sauf préchauffage)
+    if BROWSER_POOL_PREWARM and HAS_PLAYWRIGHT:
+        try:
+            await get_browser_pool().start()
+            logging.info(f"✅ Browser pool ready ({get_browser_pool().size} browsers)")
+        except Exception as e:
+            logging.warning(f"⚠️ Browser pool prewarm failed: {e}")
+    
     logging.info("=" * 60)
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Arrêter les pools de travail et les jobs planifiés"""
+    retention_service.stop()
+    deletion_pipeline.stop()
+    get_screenshot_jobs().shutdown()
+    get_push_campaigns().shutdown()
+    version_hub.close()
+    if DEV_MODE and DEV_STORE_SNAPSHOT:
+        save_snapshot(DEV_STORE_SNAPSHOT, DEV_PROJECTS_STORE, DEV_BUILDS_STORE)
+    await get_browser_pool().close()
+    await close_push_dispatcher()
+    get_task_executor().shutdown(wait=False)
+
 # Upload router
 try:
     from upload import router as upload_router
@@ -0,0 +1,290 @@
+"""
+Découverte des pages à capturer (screenshots)
+Les URLs candidates (pages usuelles, sitemap.xml, liens de la page d'accueil) sont sondées
+en parallèle en HTTP (HEAD, puis GET si HEAD est refusé). Le navigateur n'intervient que
+pour les routes d'une application JS (SPA) dont le serveur répond 200 à toute URL.
+Les résultats sont mis en cache par URL de base avec une durée de vie.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+import xml.etree.ElementTree as ElementTree
+from html.parser import HTMLParser
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DISCOVERY_CACHE_TTL_SECONDS = float(os.environ.get("DISCOVERY_CACHE_TTL_SECONDS", "600"))
+DISCOVERY_CONCURRENCY = int(os.environ.get("DISCOVERY_CONCURRENCY", "8"))
+DISCOVERY_TIMEOUT_SECONDS = float(os.environ.get("DISCOVERY_TIMEOUT_SECONDS", "5"))
+# Taille lue au maximum par réponse (HTML, sitemap)
+DISCOVERY_MAX_BODY_BYTES = 1024 * 1024
+DISCOVERY_CACHE_MAX_ENTRIES = 256
+
+# Pages usuelles vérifiées en plus du sitemap et des liens
+COMMON_PATHS = [
+    ("/auth", "Connexion"),
+    ("/login", "Login"),
+    ("/register", "Inscription"),
+    ("/signup", "Sign Up"),
+    ("/products", "Produits"),
+    ("/produits", "Produits (FR)"),
+    ("/shop", "Boutique"),
+    ("/about", "À propos"),
+    ("/contact", "Contact"),
+]
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+_SKIPPED_EXTENSIONS = (
+    ".pdf", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico", ".zip",
+    ".css", ".js", ".json", ".xml", ".txt", ".mp4", ".mp3",
+)
+# Point de montage vide d'une SPA (React, Vue, Next, Angular...)
+_SPA_MOUNT_RE = re.compile(r'<(div|app-root)[^>]*id=["\'](root|app|__next|__nuxt)["\'][^>]*>\s*</\1>|<app-root[^>]*>\s*</app-root>', re.I)
+
+# Vérifie dans le navigateur quelles URLs existent vraiment (routes JS)
+BrowserCheck = Callable[[List[str]], Awaitable[List[str]]]
+
+
+class _LinkExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.links.append(href)
+
+
+def extract_links(html: str) -> List[str]:
+    parser = _LinkExtractor()
+    try:
+        parser.feed(html)
+    except Exception:
+        pass
+    return parser.links
+
+
+def parse_sitemap(xml: bytes) -> Tuple[List[str], bool]:
+    """
+    Returns:
+        (URLs <loc>, True si c'est un index de sitemaps)
+    """
+    try:
+        root = ElementTree.fromstring(xml)
+    except ElementTree.ParseError:
+        return [], False
+    locs = [element.text.strip() for element in root.iter() if element.tag.endswith("loc") and element.text]
+    return locs, root.tag.endswith("sitemapindex")
+
+
+def looks_like_spa_shell(html: str) -> bool:
+    return bool(_SPA_MOUNT_RE.search(html))
+
+
+class PageDiscovery:
+    """Découverte parallèle des pages d'un site, avec cache TTL par URL de base"""
+
+    def __init__(
+        self,
+        cache_ttl: float = DISCOVERY_CACHE_TTL_SECONDS,
+        concurrency: int = DISCOVERY_CONCURRENCY,
+        timeout: float = DISCOVERY_TIMEOUT_SECONDS,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.cache_ttl = cache_ttl
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self._transport = transport
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+
+    # ---------- cache ----------
+
+    def _cache_get(self, key: Tuple[str, int]) -> Optional[List[str]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, pages = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        return list(pages)
+
+    def _cache_put(self, key: Tuple[str, int], pages: List[str]):
+        now = time.monotonic()
+        if len(self._cache) >= DISCOVERY_CACHE_MAX_ENTRIES:
+            for stale in [k for k, (expires_at, _) in self._cache.items() if expires_at < now]:
+                del self._cache[stale]
+            if len(self._cache) >= DISCOVERY_CACHE_MAX_ENTRIES:
+                del self._cache[min(self._cache, key=lambda k: self._cache[k][0])]
+        self._cache[key] = (now + self.cache_ttl, list(pages))
+
+    def invalidate(self, base_url: Optional[str] = None):
+        """Vide le cache (d'une URL de base, ou entièrement)"""
+        if base_url is None:
+            self._cache.clear()
+            return
+        base = base_url.rstrip("/")
+        for key in [key for key in self._cache if key[0] == base]:
+            del self._cache[key]
+
+    # ---------- HTTP ----------
+
+    async def _get_body(self, http: httpx.AsyncClient, url: str) -> Tuple[Optional[int], bytes]:
+        """GET limité à DISCOVERY_MAX_BODY_BYTES; (None, b"") si injoignable"""
+        try:
+            async with http.stream("GET", url) as response:
+                body = b""
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if len(body) >= DISCOVERY_MAX_BODY_BYTES:
+                        break
+                return response.status_code, body[:DISCOVERY_MAX_BODY_BYTES]
+        except httpx.HTTPError as e:
+            logger.info(f"❌ {url} injoignable: {str(e)[:50]}")
+            return None, b""
+
+    async def _probe(self, http: httpx.AsyncClient, url: str) -> Tuple[Optional[int], Optional[str]]:
+        """HEAD (GET si refusé); retourne (statut, hash du corps si lu en GET)"""
+        try:
+            response = await http.head(url)
+            if response.status_code not in (405, 501):
+                return response.status_code, None
+        except httpx.HTTPError:
+            pass
+        status, body = await self._get_body(http, url)
+        return status, hashlib.sha256(body).hexdigest() if body else None
+
+    async def _sitemap_urls(self, http: httpx.AsyncClient, base: str) -> List[str]:
+        status, body = await self._get_body(http, f"{base}/sitemap.xml")
+        if status is None or status >= 400 or not body:
+            return []
+        locs, is_index = parse_sitemap(body)
+        if not is_index:
+            return locs
+        # Index de sitemaps: suivre les premiers sitemaps enfants
+        urls: List[str] = []
+        for child_status, child_body in await asyncio.gather(*(self._get_body(http, loc) for loc in locs[:3])):
+            if child_status is not None and child_status < 400:
+                urls.extend(parse_sitemap(child_body)[0])
+        return urls
+
+    # ---------- découverte ----------
+
+    @staticmethod
+    def _same_site_url(base: str, href: str) -> Optional[str]:
+        """URL normalisée (base + chemin) si le lien pointe vers une page du site"""
+        parsed = urlparse(urljoin(base + "/", href))
+        base_parsed = urlparse(base)
+        if parsed.scheme not in ("http", "https") or parsed.netloc.lower() != base_parsed.netloc.lower():
+            return None
+        path = parsed.path.rstrip("/")
+        # Rester sous le chemin de base (application servie dans un sous-dossier)
+        if not path.startswith(base_parsed.path + "/"):
+            return None
+        if path.lower().endswith(_SKIPPED_EXTENSIONS) or "logout" in path.lower():
+            return None
+        return f"{base}{path[len(base_parsed.path):]}"
+
+    async def discover(
+        self,
+        base_url: str,
+        max_pages: int = 10,
+        browser_check: Optional[BrowserCheck] = None
+    ) -> List[str]:
+        """
+        Découvre les pages existantes d'un site (page d'accueil toujours en premier)
+
+        Args:
+            base_url: URL de base de l'application
+            max_pages: Nombre maximum de pages retournées
+            browser_check: Vérification navigateur des routes d'une SPA (sinon ignorées)
+        """
+        base = base_url.rstrip("/")
+        key = (base, max_pages)
+        cached = self._cache_get(key)
+        if cached is not None:
+            logger.info(f"⚡ Pages découvertes (cache) pour {base}: {len(cached)}")
+            return cached
+
+        started = time.monotonic()
+        headers = {"User-Agent": USER_AGENT}
+        async with httpx.AsyncClient(
+            timeout=self.timeout, follow_redirects=True, headers=headers, transport=self._transport
+        ) as http:
+            (home_status, home_body), sitemap_urls = await asyncio.gather(
+                self._get_body(http, base_url), self._sitemap_urls(http, base)
+            )
+            home_html = home_body.decode("utf-8", errors="replace")
+            home_hash = hashlib.sha256(home_body).hexdigest() if home_body else None
+            spa_shell = looks_like_spa_shell(home_html)
+
+            # Candidats: pages usuelles, puis sitemap, puis liens de la page d'accueil (ordre de priorité)
+            candidates: List[str] = []
+            trusted = set()
+            for path, _ in COMMON_PATHS:
+                candidates.append(f"{base}{path}")
+            for href in sitemap_urls + extract_links(home_html):
+                url = self._same_site_url(base, href)
+                if url:
+                    candidates.append(url)
+                    trusted.add(url)
+            candidates = [url for url in dict.fromkeys(candidates) if url != base][:len(COMMON_PATHS) + max_pages * 3]
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def probe(url):
+                async with semaphore:
+                    return await self._probe(http, url)
+
+            results = await asyncio.gather(*(probe(url) for url in candidates))
+
+        verified: List[str] = []
+        ambiguous: List[str] = []
+        for url, (status, body_hash) in zip(candidates, results):
+            if status is None or status >= 400:
+                logger.info(f"❌ Page ignorée: {url} - Status {status}")
+            elif url not in trusted and (spa_shell or (body_hash is not None and body_hash == home_hash)):
+                # Le serveur renvoie la coquille de la SPA pour toute route: seul le rendu tranche
+                ambiguous.append(url)
+            else:
+                verified.append(url)
+
+        if ambiguous:
+            if browser_check is not None:
+                confirmed = set(await browser_check(ambiguous))
+                verified.extend(url for url in ambiguous if url in confirmed)
+            else:
+                logger.info(f"⏭️ {len(ambiguous)} route(s) JS non vérifiée(s) (pas de navigateur)")
+
+        order = {url: index for index, url in enumerate(candidates)}
+        verified.sort(key=order.get)
+        pages = [base_url] + verified[:max(0, max_pages - 1)]
+        if home_status is None or home_status >= 400:
+            logger.warning(f"⚠️ Page d'accueil {base_url} - Status {home_status}, conservée par défaut")
+
+        logger.info(
+            f"📸 {len(pages)} page(s) seront capturées ({len(candidates)} candidates, "
+            f"{time.monotonic() - started:.1f}s): {pages}"
+        )
+        self._cache_put(key, pages)
+        return pages
+
+
+_page_discovery: Optional[PageDiscovery] = None
+
+
+def get_page_discovery() -> PageDiscovery:
+    global _page_discovery
+    if _page_discovery is None:
+        _page_discovery = PageDiscovery()
+    return _page_discovery
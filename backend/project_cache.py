@@ -0,0 +1,151 @@
+"""
+Cache des lectures de projets par utilisateur (liste du dashboard, détail d'un projet)
+Les réponses sont gardées en mémoire avec un TTL, par utilisateur et par forme de requête
+(champs demandés, page). Toute modification d'un projet invalide toutes les entrées de
+son propriétaire; les autres workers voient le changement au plus tard après le TTL, gardé
+court pour cette raison (quelques secondes suffisent à absorber les rafraîchissements).
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+PROJECT_CACHE_TTL_SECONDS = float(os.environ.get("PROJECT_CACHE_TTL_SECONDS", "5"))
+PROJECT_CACHE_MAX_ENTRIES = int(os.environ.get("PROJECT_CACHE_MAX_ENTRIES", "10000"))
+
+# Colonnes sélectionnables via ?fields= (projection)
+PROJECT_FIELDS = (
+    "id", "user_id", "name", "web_url", "description", "platform", "features", "status",
+    "logo_url", "advanced_config", "web_app_version", "version_check_enabled",
+    "created_at", "updated_at",
+)
+
+
+class InvalidFields(ValueError):
+    """Champ inconnu dans ?fields="""
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Liste de champs demandée ("name,status") → tuple trié incluant toujours id
+
+    Returns:
+        None si aucun champ n'est demandé (projet complet)
+    """
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(PROJECT_FIELDS)
+    if unknown:
+        raise InvalidFields(f"Unknown project fields: {', '.join(sorted(unknown))}")
+    return tuple(sorted(requested | {"id"}))
+
+
+def select_columns(fields: Optional[Tuple[str, ...]]) -> str:
+    return ",".join(fields) if fields else "*"
+
+
+def project_fields(project: Dict[str, Any], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+    """Projection d'un projet déjà chargé (mode DEV)"""
+    if not fields:
+        return project
+    return {field: project.get(field) for field in fields}
+
+
+class UserProjectCache:
+    """Cache TTL + LRU des lectures de projets, invalidé par propriétaire"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = PROJECT_CACHE_TTL_SECONDS,
+        max_entries: int = PROJECT_CACHE_MAX_ENTRIES
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._keys_by_user: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._loads = SingleFlight("project-cache")
+        # Incrémenté à chaque invalidation: une lecture DB lancée avant n'est pas mise en cache.
+        # Utile seulement pendant une lecture: supprimé quand l'utilisateur n'en a plus en cours
+        self._generations: Dict[str, int] = {}
+        self._pending: Dict[str, int] = {}
+
+    def _lookup(self, user_id: str, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if time.monotonic() > expires_at:
+                self._drop((user_id, key))
+                return False, None
+            self._entries.move_to_end((user_id, key))
+            return True, value
+
+    def _drop(self, entry_key: Tuple[str, str]):
+        self._entries.pop(entry_key, None)
+        keys = self._keys_by_user.get(entry_key[0])
+        if keys is not None:
+            keys.discard(entry_key[1])
+            if not keys:
+                del self._keys_by_user[entry_key[0]]
+
+    def _store(self, user_id: str, key: str, value: Any):
+        with self._lock:
+            self._entries[(user_id, key)] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end((user_id, key))
+            self._keys_by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    async def get(self, user_id: str, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Réponse en cache pour (utilisateur, requête), sinon via loader (une lecture à la fois)"""
+        found, value = self._lookup(user_id, key)
+        if found:
+            return value
+
+        with self._lock:
+            generation = self._generations.get(user_id, 0)
+            self._pending[user_id] = self._pending.get(user_id, 0) + 1
+
+        async def load():
+            loaded = await loader()
+            if self._generations.get(user_id, 0) == generation:
+                self._store(user_id, key, loaded)
+            return loaded
+
+        try:
+            return await self._loads.do(f"{user_id}:{generation}:{key}", load)
+        finally:
+            with self._lock:
+                self._pending[user_id] -= 1
+                if not self._pending[user_id]:
+                    del self._pending[user_id]
+                    self._generations.pop(user_id, None)
+
+    def invalidate_user(self, user_id: str):
+        """À appeler après toute création, modification ou suppression d'un projet de l'utilisateur"""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._drop((user_id, key))
+            if user_id in self._pending:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+
+# Instance globale
+_project_cache: Optional[UserProjectCache] = None
+
+
+def get_project_cache() -> UserProjectCache:
+    """Récupère le cache des lectures de projets (singleton par processus)"""
+    global _project_cache
+    if _project_cache is None:
+        _project_cache = UserProjectCache()
+    return _project_cache
@@ -0,0 +1,521 @@
+"""
+Campagnes de push notifications (file d'envoi asynchrone)
+POST /push/send enregistre la campagne et ses destinataires puis répond immédiatement.
+Un worker livre par lots via PushDispatcher: les échecs temporaires sont réessayés avec un
+backoff exponentiel, les tokens désinscrits sont écartés des campagnes suivantes.
+État des destinataires et métriques (envoyés, échecs, percentiles de latence) dans un index
+SQLite partagé par les workers; une campagne abandonnée (worker redémarré) est reprise.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+PUSH_CAMPAIGNS_DIR = os.environ.get(
+    "PUSH_CAMPAIGNS_DIR",
+    str(Path(tempfile.gettempdir()) / "nativiweb_push_campaigns")
+)
+# Tokens remis au dispatcher à chaque lot
+PUSH_CAMPAIGN_BATCH_SIZE = int(os.environ.get("PUSH_CAMPAIGN_BATCH_SIZE", "5000"))
+# Campagnes livrées en même temps par un worker
+PUSH_CAMPAIGN_CONCURRENCY = int(os.environ.get("PUSH_CAMPAIGN_CONCURRENCY", "2"))
+PUSH_MAX_ATTEMPTS = int(os.environ.get("PUSH_MAX_ATTEMPTS", "5"))
+PUSH_RETRY_BASE_SECONDS = float(os.environ.get("PUSH_RETRY_BASE_SECONDS", "2"))
+PUSH_RETRY_MAX_SECONDS = float(os.environ.get("PUSH_RETRY_MAX_SECONDS", "120"))
+# Campagne sans signe de vie depuis N secondes: reprise par un autre worker
+PUSH_CAMPAIGN_STALE_SECONDS = float(os.environ.get("PUSH_CAMPAIGN_STALE_SECONDS", "300"))
+PUSH_CAMPAIGN_TTL_SECONDS = float(os.environ.get("PUSH_CAMPAIGN_TTL_SECONDS", str(7 * 24 * 3600)))
+
+CAMPAIGN_QUEUED = "queued"
+CAMPAIGN_RUNNING = "running"
+CAMPAIGN_COMPLETED = "completed"
+CAMPAIGN_FAILED = "failed"
+
+TOKEN_PENDING = "pending"
+TOKEN_SENT = "sent"
+TOKEN_FAILED = "failed"
+TOKEN_INVALID = "invalid"
+# Token déjà connu comme invalide à la création de la campagne
+TOKEN_SKIPPED = "skipped"
+
+LATENCY_PERCENTILES = (50, 90, 99)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    campaign_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    data TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    project_id TEXT,
+    topic TEXT,
+    error TEXT,
+    owner TEXT,
+    heartbeat_at REAL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_campaigns_user ON campaigns(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_campaigns_status ON campaigns(status, heartbeat_at);
+CREATE TABLE IF NOT EXISTS campaign_tokens (
+    campaign_id TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    token TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    latency_ms REAL,
+    error TEXT,
+    PRIMARY KEY (campaign_id, platform, token)
+);
+CREATE INDEX IF NOT EXISTS idx_campaign_tokens_due ON campaign_tokens(campaign_id, status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_campaign_tokens_latency ON campaign_tokens(campaign_id, status, latency_ms);
+CREATE TABLE IF NOT EXISTS invalid_tokens (
+    platform TEXT NOT NULL,
+    token TEXT NOT NULL,
+    reason TEXT,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (platform, token)
+);
+"""
+
+
+@dataclass
+class Campaign:
+    campaign_id: str
+    user_id: str
+    title: str
+    body: str
+    data: str
+    status: str
+    total: int = 0
+    project_id: Optional[str] = None
+    topic: Optional[str] = None
+    error: Optional[str] = None
+    owner: Optional[str] = None
+    heartbeat_at: Optional[float] = None
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        for private in ("user_id", "owner", "heartbeat_at"):
+            data.pop(private)
+        data["data"] = json.loads(self.data)
+        end = self.finished_at or (time.time() if self.started_at else None)
+        data["duration_ms"] = round((end - self.started_at) * 1000, 1) if self.started_at and end else None
+        data["status_url"] = f"/api/push/campaigns/{self.campaign_id}"
+        return data
+
+
+def retry_delay(attempts: int, base: float = PUSH_RETRY_BASE_SECONDS, maximum: float = PUSH_RETRY_MAX_SECONDS) -> float:
+    """Backoff exponentiel avec jitter (50 à 100 % du délai) après N tentatives"""
+    delay = min(maximum, base * 2 ** max(0, attempts - 1))
+    return delay * (0.5 + random.random() / 2)
+
+
+class PushCampaignQueue:
+    """File des campagnes: index SQLite WAL + livraison asyncio dans le worker propriétaire"""
+
+    def __init__(
+        self,
+        root: Union[str, Path] = PUSH_CAMPAIGNS_DIR,
+        dispatcher_factory: Optional[Callable[[], Any]] = None,
+        batch_size: int = PUSH_CAMPAIGN_BATCH_SIZE,
+        concurrency: int = PUSH_CAMPAIGN_CONCURRENCY,
+        max_attempts: int = PUSH_MAX_ATTEMPTS,
+        retry_base: float = PUSH_RETRY_BASE_SECONDS,
+        retry_max: float = PUSH_RETRY_MAX_SECONDS,
+        stale_seconds: float = PUSH_CAMPAIGN_STALE_SECONDS,
+        ttl_seconds: float = PUSH_CAMPAIGN_TTL_SECONDS,
+        on_invalid_tokens: Optional[Callable[[List[Tuple[str, str]]], None]] = None
+    ):
+        """
+        Args:
+            dispatcher_factory: Retourne le PushDispatcher (par défaut get_push_dispatcher)
+            on_invalid_tokens: Appelé avec les (platform, token) désinscrits, pour les retirer ailleurs
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "campaigns.sqlite3"
+        self._dispatcher_factory = dispatcher_factory
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.stale_seconds = stale_seconds
+        self.ttl_seconds = ttl_seconds
+        self.on_invalid_tokens = on_invalid_tokens
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._tasks: Dict[str, asyncio.Task] = {}
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # Index créé avant le ciblage par projet / topic
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(campaigns)")}
+            for column in ("project_id", "topic"):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE campaigns ADD COLUMN {column} TEXT")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _dispatcher(self):
+        if self._dispatcher_factory is None:
+            from push_dispatcher import get_push_dispatcher
+            self._dispatcher_factory = get_push_dispatcher
+        return self._dispatcher_factory()
+
+    # ---------- lecture ----------
+
+    def _stats(self, conn: sqlite3.Connection, campaign_id: str) -> Dict[str, Any]:
+        counts = {
+            row["status"]: row["count"]
+            for row in conn.execute(
+                "SELECT status, COUNT(*) AS count FROM campaign_tokens WHERE campaign_id = ? GROUP BY status",
+                (campaign_id,)
+            )
+        }
+        retries = conn.execute(
+            "SELECT COALESCE(SUM(attempts - 1), 0) FROM campaign_tokens WHERE campaign_id = ? AND attempts > 1",
+            (campaign_id,)
+        ).fetchone()[0]
+        # Percentiles au rang le plus proche, lus dans l'ordre de l'index (campaign_id, status, latency_ms)
+        sent = counts.get(TOKEN_SENT, 0)
+        latency = {}
+        for p in LATENCY_PERCENTILES:
+            row = None
+            if sent:
+                row = conn.execute(
+                    "SELECT latency_ms FROM campaign_tokens WHERE campaign_id = ? AND status = ? "
+                    "AND latency_ms IS NOT NULL ORDER BY latency_ms LIMIT 1 OFFSET ?",
+                    (campaign_id, TOKEN_SENT, max(0, math.ceil(p / 100 * sent) - 1))
+                ).fetchone()
+            latency[f"p{p}"] = row[0] if row is not None else None
+        return {
+            "sent": sent,
+            "failed": counts.get(TOKEN_FAILED, 0),
+            "invalid": counts.get(TOKEN_INVALID, 0),
+            "skipped": counts.get(TOKEN_SKIPPED, 0),
+            "pending": counts.get(TOKEN_PENDING, 0),
+            "retries": retries,
+            "latency_ms": latency,
+        }
+
+    def get(self, campaign_id: str) -> Optional[Campaign]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM campaigns WHERE campaign_id = ?", (campaign_id,)).fetchone()
+            if row is None:
+                return None
+            campaign = Campaign(**dict(row))
+            campaign.stats = self._stats(conn, campaign_id)
+        return campaign
+
+    def recent(self, user_id: str, limit: int = 20) -> List[Campaign]:
+        """Dernières campagnes d'un utilisateur (sans métriques détaillées)"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM campaigns WHERE user_id = ? ORDER BY created_at DESC LIMIT ?", (user_id, limit)
+            ).fetchall()
+        return [Campaign(**dict(row)) for row in rows]
+
+    def invalid_token_count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM invalid_tokens").fetchone()[0]
+
+    # ---------- création ----------
+
+    def _create(
+        self,
+        user_id: str,
+        recipients: Iterable[Tuple[str, str]],
+        title: str,
+        body: str,
+        data: Dict[str, Any],
+        project_id: Optional[str] = None,
+        topic: Optional[str] = None
+    ) -> str:
+        """Enregistre la campagne; les destinataires sont consommés au fil de l'eau (doublons ignorés)"""
+        campaign_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO campaigns (campaign_id, user_id, title, body, data, status, project_id, topic, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (campaign_id, user_id, title, body, json.dumps(data), CAMPAIGN_QUEUED, project_id, topic, now)
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO campaign_tokens (campaign_id, platform, token, status) VALUES (?, ?, ?, ?)",
+                    ((campaign_id, platform, token, TOKEN_PENDING) for platform, token in recipients if token)
+                )
+                conn.execute(
+                    "UPDATE campaigns SET total = (SELECT COUNT(*) FROM campaign_tokens WHERE campaign_id = ?) "
+                    "WHERE campaign_id = ?",
+                    (campaign_id, campaign_id)
+                )
+                # Tokens désinscrits lors de campagnes précédentes: pas d'envoi
+                conn.execute(
+                    "UPDATE campaign_tokens SET status = ? WHERE campaign_id = ? AND EXISTS ("
+                    "SELECT 1 FROM invalid_tokens i WHERE i.platform = campaign_tokens.platform "
+                    "AND i.token = campaign_tokens.token)",
+                    (TOKEN_SKIPPED, campaign_id)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return campaign_id
+
+    def purge_expired(self) -> int:
+        """Supprime les campagnes terminées plus vieilles que la durée de conservation"""
+        cutoff = time.time() - self.ttl_seconds
+        with self._connect() as conn:
+            ids = [row[0] for row in conn.execute(
+                "SELECT campaign_id FROM campaigns WHERE created_at < ? AND status IN (?, ?)",
+                (cutoff, CAMPAIGN_COMPLETED, CAMPAIGN_FAILED)
+            )]
+            for campaign_id in ids:
+                conn.execute("DELETE FROM campaign_tokens WHERE campaign_id = ?", (campaign_id,))
+                conn.execute("DELETE FROM campaigns WHERE campaign_id = ?", (campaign_id,))
+        return len(ids)
+
+    async def enqueue(
+        self,
+        user_id: str,
+        android_tokens: Iterable[str],
+        ios_tokens: Iterable[str],
+        title: str,
+        body: str,
+        data: Optional[Dict[str, Any]] = None,
+        recipients: Optional[Iterable[Tuple[str, str]]] = None,
+        project_id: Optional[str] = None,
+        topic: Optional[str] = None
+    ) -> Campaign:
+        """
+        Enregistre une campagne et démarre sa livraison en arrière-plan
+
+        Args:
+            recipients: (platform, token) supplémentaires, lus à la demande (ex: registre des tokens)
+            project_id, topic: Cible de la campagne (informatif)
+        """
+        explicit = [("android", token) for token in android_tokens] + [("ios", token) for token in ios_tokens]
+        all_recipients = itertools.chain(explicit, recipients or ())
+        await asyncio.to_thread(self.purge_expired)
+        campaign_id = await asyncio.to_thread(
+            self._create, user_id, all_recipients, title, body, data or {}, project_id, topic
+        )
+        self._start(campaign_id)
+        campaign = await asyncio.to_thread(self.get, campaign_id)
+        logger.info(f"📬 Campagne push {campaign_id} en file ({campaign.total} destinataire(s))")
+        return campaign
+
+    # ---------- livraison ----------
+
+    def _start(self, campaign_id: str):
+        if campaign_id in self._tasks:
+            return
+        task = asyncio.ensure_future(self._run(campaign_id))
+        self._tasks[campaign_id] = task
+
+        def _forget(done: asyncio.Task):
+            self._tasks.pop(campaign_id, None)
+            if not done.cancelled():
+                done.exception()  # déjà enregistrée dans l'index
+
+        task.add_done_callback(_forget)
+
+    def _claim(self, campaign_id: str) -> bool:
+        """Prend la campagne si elle est libre ou abandonnée (un seul worker la livre)"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE campaigns SET status = ?, owner = ?, heartbeat_at = ?, started_at = COALESCE(started_at, ?) "
+                "WHERE campaign_id = ? AND (status = ? OR (status = ? AND (owner = ? OR heartbeat_at < ?)))",
+                (CAMPAIGN_RUNNING, self.owner, now, now, campaign_id,
+                 CAMPAIGN_QUEUED, CAMPAIGN_RUNNING, self.owner, now - self.stale_seconds)
+            )
+            return cursor.rowcount == 1
+
+    def _heartbeat(self, campaign_id: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE campaigns SET heartbeat_at = ? WHERE campaign_id = ? AND owner = ?",
+                (time.time(), campaign_id, self.owner)
+            )
+
+    def _finish(self, campaign_id: str, status: str, error: Optional[str] = None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE campaigns SET status = ?, error = ?, finished_at = ? WHERE campaign_id = ? AND owner = ?",
+                (status, error, time.time(), campaign_id, self.owner)
+            )
+
+    def _due_batch(self, campaign_id: str) -> List[sqlite3.Row]:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT platform, token, attempts FROM campaign_tokens "
+                "WHERE campaign_id = ? AND status = ? AND next_attempt_at <= ? LIMIT ?",
+                (campaign_id, TOKEN_PENDING, time.time(), self.batch_size)
+            ).fetchall()
+
+    def _next_retry_at(self, campaign_id: str) -> Optional[float]:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT MIN(next_attempt_at) FROM campaign_tokens WHERE campaign_id = ? AND status = ?",
+                (campaign_id, TOKEN_PENDING)
+            ).fetchone()[0]
+
+    def _record(self, campaign_id: str, attempts: Dict[Tuple[str, str], int], results: List[Any]) -> List[Tuple[str, str]]:
+        """Enregistre le résultat d'un lot; retourne les tokens désinscrits"""
+        now = time.time()
+        updates = []
+        invalid = []
+        for result in results:
+            key = (result.platform, result.token)
+            tried = attempts.get(key, 0) + 1
+            if result.success:
+                status, next_at = TOKEN_SENT, 0.0
+            elif result.invalid_token:
+                status, next_at = TOKEN_INVALID, 0.0
+                invalid.append(key)
+            elif result.retryable and tried < self.max_attempts:
+                status, next_at = TOKEN_PENDING, now + retry_delay(tried, self.retry_base, self.retry_max)
+            else:
+                status, next_at = TOKEN_FAILED, 0.0
+            updates.append((status, tried, next_at, result.latency_ms, result.error, campaign_id, *key))
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "UPDATE campaign_tokens SET status = ?, attempts = ?, next_attempt_at = ?, latency_ms = ?, error = ? "
+                    "WHERE campaign_id = ? AND platform = ? AND token = ?",
+                    updates
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO invalid_tokens (platform, token, reason, created_at) VALUES (?, ?, ?, ?)",
+                    ((platform, token, "unregistered", now) for platform, token in invalid)
+                )
+                conn.execute("UPDATE campaigns SET heartbeat_at = ? WHERE campaign_id = ?", (now, campaign_id))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return invalid
+
+    async def _run(self, campaign_id: str):
+        async with self._slots:
+            if not await asyncio.to_thread(self._claim, campaign_id):
+                return
+            campaign = await asyncio.to_thread(self.get, campaign_id)
+            data = json.loads(campaign.data)
+            try:
+                dispatcher = self._dispatcher()
+                while True:
+                    batch = await asyncio.to_thread(self._due_batch, campaign_id)
+                    if not batch:
+                        retry_at = await asyncio.to_thread(self._next_retry_at, campaign_id)
+                        if retry_at is None:
+                            break
+                        # Rester sous le délai d'abandon pendant l'attente du prochain essai
+                        await asyncio.sleep(min(max(0.0, retry_at - time.time()), self.stale_seconds / 2))
+                        await asyncio.to_thread(self._heartbeat, campaign_id)
+                        continue
+
+                    attempts = {(row["platform"], row["token"]): row["attempts"] for row in batch}
+                    report = await dispatcher.send(
+                        [row["token"] for row in batch if row["platform"] == "android"],
+                        [row["token"] for row in batch if row["platform"] == "ios"],
+                        campaign.title, campaign.body, data
+                    )
+                    invalid = await asyncio.to_thread(self._record, campaign_id, attempts, report.results)
+                    if invalid and self.on_invalid_tokens is not None:
+                        try:
+                            await asyncio.to_thread(self.on_invalid_tokens, invalid)
+                        except Exception as e:
+                            logger.warning(f"⚠️ Suppression des tokens invalides échouée: {e}")
+
+                await asyncio.to_thread(self._finish, campaign_id, CAMPAIGN_COMPLETED)
+                stats = (await asyncio.to_thread(self.get, campaign_id)).stats
+                logger.info(
+                    f"✅ Campagne push {campaign_id} terminée: {stats['sent']} envoyé(s), {stats['failed']} échec(s), "
+                    f"{stats['invalid']} token(s) invalide(s), {stats['retries']} nouvel(s) essai(s)"
+                )
+            except asyncio.CancelledError:
+                # Shutdown: la campagne est rendue à la file (shutdown()) et reprise au prochain démarrage
+                raise
+            except Exception as e:
+                logger.error(f"❌ Campagne push {campaign_id} en échec: {e}", exc_info=True)
+                await asyncio.to_thread(self._finish, campaign_id, CAMPAIGN_FAILED, str(e)[:500])
+                raise
+
+    async def wait(self, campaign_id: str) -> Optional[Campaign]:
+        """Attend la fin d'une campagne livrée par ce worker"""
+        task = self._tasks.get(campaign_id)
+        if task is not None:
+            await asyncio.shield(task)
+        return await asyncio.to_thread(self.get, campaign_id)
+
+    def resume(self) -> List[str]:
+        """Reprend les campagnes en file ou abandonnées par un worker arrêté (démarrage de l'application)"""
+        cutoff = time.time() - self.stale_seconds
+        with self._connect() as conn:
+            ids = [row[0] for row in conn.execute(
+                "SELECT campaign_id FROM campaigns WHERE status = ? OR (status = ? AND heartbeat_at < ?)",
+                (CAMPAIGN_QUEUED, CAMPAIGN_RUNNING, cutoff)
+            )]
+        for campaign_id in ids:
+            self._start(campaign_id)
+        if ids:
+            logger.info(f"🔁 {len(ids)} campagne(s) push reprise(s)")
+        return ids
+
+    def shutdown(self):
+        """Arrête les livraisons et rend les campagnes en cours à la file (tokens en attente renvoyés à la reprise)"""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE campaigns SET status = ?, owner = NULL WHERE owner = ? AND status = ?",
+                (CAMPAIGN_QUEUED, self.owner, CAMPAIGN_RUNNING)
+            )
+
+
+# Instance globale
+_push_campaigns: Optional[PushCampaignQueue] = None
+
+
+def get_push_campaigns() -> PushCampaignQueue:
+    """Récupère la file des campagnes push (singleton par processus, index partagé)"""
+    global _push_campaigns
+    if _push_campaigns is None:
+        from device_tokens import get_device_tokens
+        _push_campaigns = PushCampaignQueue(on_invalid_tokens=get_device_tokens().remove_tokens)
+    return _push_campaigns
@@ -0,0 +1,357 @@
+"""
+Envoi de push notifications en masse
+- Android: envois FCM groupés (jusqu'à 500 tokens par appel), plusieurs lots en parallèle
+- iOS: une connexion HTTP/2 APNs longue durée, multiplexée (authentification par token JWT
+  ES256), requêtes concurrentes bornées
+Les deux fournisseurs sont limités en débit (seau à jetons) et chaque token a son résultat.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+import jwt
+
+try:
+    import h2  # noqa: F401 - requis par httpx pour HTTP/2
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+logger = logging.getLogger(__name__)
+
+# Tokens par appel FCM (limite de l'API multicast)
+PUSH_FCM_BATCH_SIZE = min(500, int(os.environ.get("PUSH_FCM_BATCH_SIZE", "500")))
+# Lots FCM envoyés simultanément
+PUSH_FCM_CONCURRENCY = int(os.environ.get("PUSH_FCM_CONCURRENCY", "4"))
+# Messages par seconde (0 = illimité); quota FCM par défaut: 600 000 / minute
+PUSH_FCM_MAX_PER_SECOND = float(os.environ.get("PUSH_FCM_MAX_PER_SECOND", "10000"))
+# Requêtes APNs en vol sur la connexion HTTP/2
+PUSH_APNS_CONCURRENCY = int(os.environ.get("PUSH_APNS_CONCURRENCY", "500"))
+PUSH_APNS_MAX_PER_SECOND = float(os.environ.get("PUSH_APNS_MAX_PER_SECOND", "5000"))
+PUSH_APNS_TIMEOUT_SECONDS = float(os.environ.get("PUSH_APNS_TIMEOUT_SECONDS", "10"))
+APNS_USE_SANDBOX = os.environ.get("APNS_USE_SANDBOX", "true").lower() == "true"
+# Apple refuse les JWT de plus d'une heure et leur renouvellement plus d'une fois toutes les 20 minutes
+APNS_TOKEN_TTL_SECONDS = 50 * 60
+
+APNS_HOST = "https://api.push.apple.com"
+APNS_SANDBOX_HOST = "https://api.sandbox.push.apple.com"
+
+# Erreurs signifiant que le token ne sera plus jamais valide
+_FCM_INVALID_TOKEN_ERRORS = ("UnregisteredError", "SenderIdMismatchError")
+_APNS_INVALID_TOKEN_REASONS = ("BadDeviceToken", "Unregistered", "DeviceTokenNotForTopic")
+
+
+@dataclass
+class PushResult:
+    token: str
+    platform: str
+    success: bool
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+    # Token à supprimer (appareil désinscrit, token invalide)
+    invalid_token: bool = False
+    # Échec temporaire (quota, indisponibilité): un nouvel essai peut réussir
+    retryable: bool = False
+    # Durée de l'appel au fournisseur (lot entier pour FCM)
+    latency_ms: Optional[float] = None
+
+
+@dataclass
+class DispatchReport:
+    results: List[PushResult] = field(default_factory=list)
+    duration_ms: float = 0.0
+
+    @property
+    def sent(self) -> int:
+        return sum(1 for result in self.results if result.success)
+
+    @property
+    def invalid_tokens(self) -> List[str]:
+        return [result.token for result in self.results if result.invalid_token]
+
+    def to_dict(self) -> Dict[str, Any]:
+        results: Dict[str, List[Dict[str, Any]]] = {"android": [], "ios": []}
+        for result in self.results:
+            entry = asdict(result)
+            entry.pop("platform")
+            results[result.platform].append(entry)
+        return {
+            "success": self.sent > 0,
+            "sent": self.sent,
+            "total": len(self.results),
+            "invalid_tokens": len(self.invalid_tokens),
+            "duration_ms": self.duration_ms,
+            "results": results,
+        }
+
+
+class RateLimiter:
+    """Seau à jetons asyncio (capacité: une seconde de débit)"""
+
+    def __init__(self, rate_per_second: float):
+        self.rate = rate_per_second
+        self._tokens = rate_per_second
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: int = 1):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                # Un lot plus grand que la capacité passe dès que le seau est plein (le solde devient négatif)
+                needed = min(amount, self.rate)
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((needed - self._tokens) / self.rate)
+
+
+def _chunked(items: List[str], size: int) -> Iterable[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class APNsConnection:
+    """Client APNs HTTP/2 réutilisé pour tous les envois (une connexion multiplexée)"""
+
+    def __init__(
+        self,
+        key_path: str,
+        key_id: str,
+        team_id: str,
+        topic: str,
+        use_sandbox: bool = APNS_USE_SANDBOX,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.key_id = key_id
+        self.team_id = team_id
+        self.topic = topic
+        self.host = APNS_SANDBOX_HOST if use_sandbox else APNS_HOST
+        with open(key_path, "r") as key_file:
+            self._signing_key = key_file.read()
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._auth_token: Optional[str] = None
+        self._auth_issued_at = 0.0
+
+    def _bearer(self) -> str:
+        now = time.time()
+        if self._auth_token is None or now - self._auth_issued_at > APNS_TOKEN_TTL_SECONDS:
+            self._auth_token = jwt.encode(
+                {"iss": self.team_id, "iat": int(now)},
+                self._signing_key,
+                algorithm="ES256",
+                headers={"kid": self.key_id}
+            )
+            self._auth_issued_at = now
+        return self._auth_token
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.host,
+                http2=self._transport is None,
+                transport=self._transport,
+                timeout=PUSH_APNS_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=1, max_keepalive_connections=1, keepalive_expiry=None)
+            )
+        return self._client
+
+    async def send(self, token: str, payload: bytes) -> PushResult:
+        headers = {
+            "authorization": f"bearer {self._bearer()}",
+            "apns-topic": self.topic,
+            "apns-push-type": "alert",
+            "apns-priority": "10",
+        }
+        started = time.perf_counter()
+        try:
+            response = await self._get_client().post(f"/3/device/{token}", content=payload, headers=headers)
+        except httpx.HTTPError as e:
+            return PushResult(token, "ios", False, error=f"{type(e).__name__}: {e}"[:200], retryable=True)
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        if response.status_code == 200:
+            return PushResult(token, "ios", True, message_id=response.headers.get("apns-id"), latency_ms=latency_ms)
+        try:
+            reason = response.json().get("reason", "")
+        except ValueError:
+            reason = ""
+        return PushResult(
+            token, "ios", False,
+            error=f"APNs {response.status_code} {reason}".strip(),
+            invalid_token=response.status_code == 410 or reason in _APNS_INVALID_TOKEN_REASONS,
+            retryable=response.status_code == 429 or response.status_code >= 500,
+            latency_ms=latency_ms
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class PushDispatcher:
+    """Envoi concurrent et limité en débit vers FCM (lots) et APNs (HTTP/2)"""
+
+    def __init__(
+        self,
+        fcm_messaging=None,
+        apns: Optional[APNsConnection] = None,
+        fcm_batch_size: int = PUSH_FCM_BATCH_SIZE,
+        fcm_concurrency: int = PUSH_FCM_CONCURRENCY,
+        fcm_rate: float = PUSH_FCM_MAX_PER_SECOND,
+        apns_concurrency: int = PUSH_APNS_CONCURRENCY,
+        apns_rate: float = PUSH_APNS_MAX_PER_SECOND
+    ):
+        """
+        Args:
+            fcm_messaging: Module firebase_admin.messaging initialisé (None = FCM désactivé)
+            apns: Connexion APNs (None = APNs désactivé)
+        """
+        self.fcm_messaging = fcm_messaging
+        self.apns = apns
+        self.fcm_batch_size = max(1, min(500, fcm_batch_size))
+        self._fcm_slots = asyncio.Semaphore(max(1, fcm_concurrency))
+        self._fcm_rate = RateLimiter(fcm_rate)
+        self._apns_slots = asyncio.Semaphore(max(1, apns_concurrency))
+        self._apns_rate = RateLimiter(apns_rate)
+
+    # ---------- Android (FCM) ----------
+
+    def _send_fcm_batch(self, tokens: List[str], title: str, body: str, data: Dict[str, str]) -> List[PushResult]:
+        """Un appel FCM pour au plus 500 tokens (bloquant, exécuté dans un thread)"""
+        messaging = self.fcm_messaging
+        message = messaging.MulticastMessage(
+            tokens=tokens,
+            notification=messaging.Notification(title=title, body=body),
+            data=data
+        )
+        send = getattr(messaging, "send_each_for_multicast", None) or messaging.send_multicast
+        started = time.perf_counter()
+        batch = send(message)
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        results = []
+        for token, response in zip(tokens, batch.responses):
+            if response.success:
+                results.append(PushResult(token, "android", True, message_id=response.message_id, latency_ms=latency_ms))
+                continue
+            error = response.exception
+            error_type = type(error).__name__
+            results.append(PushResult(
+                token, "android", False,
+                error=f"{error_type}: {error}"[:200],
+                invalid_token=error_type in _FCM_INVALID_TOKEN_ERRORS,
+                retryable=error_type in ("QuotaExceededError", "UnavailableError", "InternalError"),
+                latency_ms=latency_ms
+            ))
+        return results
+
+    async def _send_android(self, tokens: List[str], title: str, body: str, data: Dict[str, str]) -> List[PushResult]:
+        if self.fcm_messaging is None:
+            error = "FCM not configured. Set FIREBASE_CREDENTIALS_PATH environment variable and install firebase-admin."
+            return [PushResult(token, "android", False, error=error) for token in tokens]
+
+        async def send_batch(batch: List[str]) -> List[PushResult]:
+            async with self._fcm_slots:
+                await self._fcm_rate.acquire(len(batch))
+                try:
+                    return await asyncio.to_thread(self._send_fcm_batch, batch, title, body, data)
+                except Exception as e:
+                    logger.error(f"❌ FCM batch error ({len(batch)} tokens): {e}")
+                    return [
+                        PushResult(token, "android", False, error=str(e)[:200], retryable=True) for token in batch
+                    ]
+
+        batches = await asyncio.gather(*(send_batch(batch) for batch in _chunked(tokens, self.fcm_batch_size)))
+        return [result for batch in batches for result in batch]
+
+    # ---------- iOS (APNs) ----------
+
+    async def _send_ios(self, tokens: List[str], title: str, body: str, data: Dict[str, Any]) -> List[PushResult]:
+        if self.apns is None:
+            error = "APNs not configured. Set APNS_KEY_PATH, APNS_KEY_ID, APNS_TEAM_ID, APNS_BUNDLE_ID environment variables."
+            return [PushResult(token, "ios", False, error=error) for token in tokens]
+
+        payload = json.dumps(
+            {"aps": {"alert": {"title": title, "body": body}, "sound": "default", "badge": 1}, **data},
+            separators=(",", ":")
+        ).encode("utf-8")
+
+        async def send_one(token: str) -> PushResult:
+            async with self._apns_slots:
+                await self._apns_rate.acquire()
+                return await self.apns.send(token, payload)
+
+        return list(await asyncio.gather(*(send_one(token) for token in tokens)))
+
+    # ---------- API ----------
+
+    async def send(
+        self,
+        android_tokens: Iterable[str],
+        ios_tokens: Iterable[str],
+        title: str,
+        body: str,
+        data: Optional[Dict[str, Any]] = None
+    ) -> DispatchReport:
+        """Envoie la notification à tous les tokens (doublons ignorés); un résultat par token"""
+        started = time.perf_counter()
+        android_tokens = list(dict.fromkeys(token for token in android_tokens if token))
+        ios_tokens = list(dict.fromkeys(token for token in ios_tokens if token))
+        data = data or {}
+
+        android, ios = await asyncio.gather(
+            self._send_android(android_tokens, title, body, {str(k): str(v) for k, v in data.items()}),
+            self._send_ios(ios_tokens, title, body, data)
+        )
+        report = DispatchReport(results=android + ios, duration_ms=round((time.perf_counter() - started) * 1000, 1))
+        logger.info(
+            f"📨 Push: {report.sent}/{len(report.results)} envoyé(s) en {report.duration_ms} ms "
+            f"({len(android_tokens)} Android, {len(ios_tokens)} iOS, {len(report.invalid_tokens)} token(s) invalide(s))"
+        )
+        return report
+
+    async def close(self):
+        if self.apns is not None:
+            await self.apns.close()
+
+
+# Instance globale
+_push_dispatcher: Optional[PushDispatcher] = None
+
+
+def get_push_dispatcher() -> PushDispatcher:
+    """Récupère le dispatcher (singleton: la connexion APNs est partagée par tous les envois)"""
+    global _push_dispatcher
+    if _push_dispatcher is None:
+        from push_service import get_push_service
+
+        service = get_push_service()
+        apns = None
+        if all([service.apns_key_path, service.apns_key_id, service.apns_team_id, service.apns_bundle_id]):
+            if not HAS_HTTP2:
+                logger.warning("⚠️ h2 not installed - iOS push disabled. Install with: pip install httpx[http2]")
+            elif not os.path.exists(service.apns_key_path):
+                logger.warning(f"⚠️ APNS_KEY_PATH not found: {service.apns_key_path} - iOS push disabled")
+            else:
+                apns = APNsConnection(
+                    service.apns_key_path, service.apns_key_id, service.apns_team_id, service.apns_bundle_id
+                )
+        _push_dispatcher = PushDispatcher(fcm_messaging=service.fcm_messaging if service.fcm_available else None, apns=apns)
+    return _push_dispatcher
+
+
+async def close_push_dispatcher():
+    """Ferme la connexion APNs si le dispatcher a été créé (shutdown de l'application)"""
+    if _push_dispatcher is not None:
+        await _push_dispatcher.close()
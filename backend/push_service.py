@@ -46,7 +46,7 @@ class PushNotificationService:
                 self.apns_available = True
                 logger.info("✅ APNs configuration found")
             except ImportError:
-                logger.warning("⚠️ apns2 not installed - iOS push disabled. Install with: pip install apns2")
+                logger.warning("⚠️ apns2 not installed - single iOS sends disabled (bulk sends use push_dispatcher)")
         else:
             logger.info("ℹ️ APNs credentials not configured - iOS push disabled")
     
@@ -0,0 +1,289 @@
+"""
+Rétention des builds: suppression incrémentale des builds expirés et de leurs APK
+Le job parcourt les builds expirés par pages, supprime les objets du bucket et les lignes
+par lots (concurrence bornée), enregistre un checkpoint après chaque page pour reprendre
+après un redémarrage, et expose ses métriques (admin).
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from artifact_index import APK_BUCKET
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BUILD_RETENTION_DAYS = int(os.environ.get("BUILD_RETENTION_DAYS", "30"))
+# Intervalle du job planifié (0 = uniquement à la demande via /admin/cleanup-builds)
+# La suppression planifiée est destructive: elle n'est active que si l'intervalle est configuré
+BUILD_RETENTION_INTERVAL_HOURS = float(os.environ.get("BUILD_RETENTION_INTERVAL_HOURS", "0"))
+RETENTION_PAGE_SIZE = int(os.environ.get("RETENTION_PAGE_SIZE", "500"))
+# Taille des lots envoyés au Storage / à PostgREST (limite la taille des requêtes)
+RETENTION_BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", "100"))
+RETENTION_CONCURRENCY = int(os.environ.get("RETENTION_CONCURRENCY", "4"))
+RETENTION_CHECKPOINT_PATH = os.environ.get(
+    "RETENTION_CHECKPOINT_PATH",
+    str(Path(tempfile.gettempdir()) / "nativiweb_retention_checkpoint.json")
+)
+
+
+@dataclass
+class RetentionPolicy:
+    """Politique de rétention des builds"""
+    max_age_days: int = BUILD_RETENTION_DAYS
+    # Statuts concernés (vide = tous)
+    statuses: Sequence[str] = ()
+    page_size: int = RETENTION_PAGE_SIZE
+    batch_size: int = RETENTION_BATCH_SIZE
+    concurrency: int = RETENTION_CONCURRENCY
+
+
+@dataclass
+class RetentionMetrics:
+    running: bool = False
+    runs: int = 0
+    pages: int = 0
+    builds_deleted: int = 0
+    objects_deleted: int = 0
+    errors: int = 0
+    last_started_at: Optional[str] = None
+    last_finished_at: Optional[str] = None
+    last_duration_seconds: Optional[float] = None
+    last_run_deleted: int = 0
+    last_error: Optional[str] = None
+    checkpoint: Dict[str, Any] = field(default_factory=dict)
+
+
+def after_cursor(cursor: Dict[str, str]) -> str:
+    """Filtre PostgREST des lignes après le curseur (created_at, id), dans l'ordre de la pagination"""
+    created_at = json.dumps(cursor["created_at"])
+    return f"created_at.gt.{created_at},and(created_at.eq.{created_at},id.gt.{json.dumps(cursor['id'])})"
+
+
+def chunked(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), max(1, size))]
+
+
+class RetentionService:
+    """Job de rétention incrémental (un seul passage à la fois sur la machine)"""
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        policy: Optional[RetentionPolicy] = None,
+        checkpoint_path: str = RETENTION_CHECKPOINT_PATH,
+        on_builds_deleted: Optional[Callable[[List[str]], None]] = None
+    ):
+        self.client_factory = client_factory
+        self.policy = policy or RetentionPolicy()
+        self.checkpoint_path = Path(checkpoint_path)
+        self.on_builds_deleted = on_builds_deleted
+        self.metrics = RetentionMetrics()
+        self._task: Optional[asyncio.Task] = None
+        self._scheduler: Optional[asyncio.Task] = None
+
+    # ---------- checkpoint ----------
+
+    def _load_checkpoint(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self.checkpoint_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_checkpoint(self, checkpoint: Dict[str, Any]):
+        tmp_path = self.checkpoint_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(checkpoint), encoding="utf-8")
+        os.replace(tmp_path, self.checkpoint_path)
+        self.metrics.checkpoint = checkpoint
+
+    def _clear_checkpoint(self):
+        self.checkpoint_path.unlink(missing_ok=True)
+        self.metrics.checkpoint = {}
+
+    # ---------- lots ----------
+
+    def _fetch_page(self, client, policy: RetentionPolicy, cutoff: str, cursor: Optional[Dict[str, str]]) -> List[Dict[str, Any]]:
+        query = client.table("builds").select("id, storage_path, created_at").lt("created_at", cutoff)
+        if policy.statuses:
+            query = query.in_("status", list(policy.statuses))
+        if cursor:
+            # Les lignes dont la suppression a échoué sont derrière le curseur: pas de boucle infinie
+            query = query.or_(after_cursor(cursor))
+        result = query.order("created_at").order("id").limit(policy.page_size).execute()
+        return result.data or []
+
+    async def _run_batches(self, batches: List[List[Any]], func: Callable[[List[Any]], Any], concurrency: int) -> List[List[Any]]:
+        """Exécute les lots en parallèle borné; retourne les lots réussis"""
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(batch):
+            async with semaphore:
+                try:
+                    await asyncio.to_thread(func, batch)
+                    return batch
+                except Exception as e:
+                    self.metrics.errors += 1
+                    self.metrics.last_error = str(e)
+                    logger.warning(f"⚠️ Rétention: lot de {len(batch)} en échec: {e}")
+                    return None
+
+        results = await asyncio.gather(*(run(batch) for batch in batches))
+        return [batch for batch in results if batch is not None]
+
+    async def _delete_page(self, client, rows: List[Dict[str, Any]], policy: RetentionPolicy) -> int:
+        by_path = {row["storage_path"]: row["id"] for row in rows if row.get("storage_path")}
+        failed_paths = set(by_path)
+
+        # 1. Objets du bucket, par lots (un appel Storage par lot)
+        removed = await self._run_batches(
+            chunked(list(by_path), policy.batch_size),
+            lambda paths: client.storage.from_(APK_BUCKET).remove(paths),
+            policy.concurrency
+        )
+        for batch in removed:
+            failed_paths.difference_update(batch)
+            self.metrics.objects_deleted += len(batch)
+
+        # 2. Lignes, par lots; une ligne dont l'APK n'a pas pu être supprimé est gardée
+        kept_ids = {by_path[path] for path in failed_paths}
+        ids = [row["id"] for row in rows if row["id"] not in kept_ids]
+        deleted = await self._run_batches(
+            chunked(ids, policy.batch_size),
+            lambda batch: client.table("builds").delete().in_("id", batch).execute(),
+            policy.concurrency
+        )
+        deleted_ids = [build_id for batch in deleted for build_id in batch]
+        if deleted_ids and self.on_builds_deleted:
+            await asyncio.to_thread(self.on_builds_deleted, deleted_ids)
+        return len(deleted_ids)
+
+    # ---------- job ----------
+
+    def _acquire_host_lock(self):
+        """Verrou fichier: un seul passage à la fois parmi les workers de la machine"""
+        if fcntl is None:
+            return None
+        lock_file = open(self.checkpoint_path.with_suffix(".lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise
+        return lock_file
+
+    async def run_once(self, policy: Optional[RetentionPolicy] = None) -> Dict[str, Any]:
+        """Exécute (ou reprend) un passage complet de rétention"""
+        try:
+            lock_file = self._acquire_host_lock()
+        except OSError:
+            logger.info("⏭️ Rétention déjà en cours dans un autre worker")
+            return {"deleted": 0, "skipped": "already running"}
+        try:
+            return await self._run_locked(policy or self.policy)
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+    async def _run_locked(self, policy: RetentionPolicy) -> Dict[str, Any]:
+        client = self.client_factory()
+        if not client:
+            return {"deleted": 0, "error": "Database unavailable"}
+
+        checkpoint = self._load_checkpoint()
+        if (
+            checkpoint.get("max_age_days") != policy.max_age_days
+            or checkpoint.get("statuses") != list(policy.statuses)
+            or isinstance(checkpoint.get("cursor"), str)  # ancien curseur (created_at seul)
+        ):
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=policy.max_age_days)).isoformat()
+            checkpoint = {
+                "max_age_days": policy.max_age_days,
+                "statuses": list(policy.statuses),
+                "cutoff": cutoff,
+                "cursor": None,
+                "deleted": 0,
+            }
+        else:
+            logger.info(f"↩️ Rétention: reprise depuis le checkpoint {checkpoint.get('cursor')}")
+
+        started = time.monotonic()
+        self.metrics.running = True
+        self.metrics.runs += 1
+        self.metrics.last_started_at = datetime.now(timezone.utc).isoformat()
+        self.metrics.last_error = None
+        run_deleted = 0
+        try:
+            while True:
+                rows = await asyncio.to_thread(
+                    self._fetch_page, client, policy, checkpoint["cutoff"], checkpoint["cursor"]
+                )
+                if not rows:
+                    break
+
+                deleted = await self._delete_page(client, rows, policy)
+                run_deleted += deleted
+                self.metrics.pages += 1
+                self.metrics.builds_deleted += deleted
+
+                checkpoint["deleted"] += deleted
+                if deleted < len(rows):
+                    # Échecs partiels: avancer le curseur au-delà de la page
+                    checkpoint["cursor"] = {"created_at": rows[-1]["created_at"], "id": rows[-1]["id"]}
+                self._save_checkpoint(checkpoint)
+
+                if len(rows) < policy.page_size:
+                    break
+
+            self._clear_checkpoint()
+            logger.info(f"🧹 Rétention: {checkpoint['deleted']} builds supprimés (plus de {policy.max_age_days} jours)")
+            return {"deleted": checkpoint["deleted"]}
+        except Exception as e:
+            self.metrics.errors += 1
+            self.metrics.last_error = str(e)
+            logger.error(f"❌ Erreur rétention: {e}", exc_info=True)
+            return {"deleted": checkpoint["deleted"], "error": str(e)}
+        finally:
+            self.metrics.running = False
+            self.metrics.last_run_deleted = run_deleted
+            self.metrics.last_finished_at = datetime.now(timezone.utc).isoformat()
+            self.metrics.last_duration_seconds = round(time.monotonic() - started, 2)
+
+    def start(self, policy: Optional[RetentionPolicy] = None) -> bool:
+        """Lance un passage en arrière-plan; False si un passage est déjà en cours"""
+        if self._task is not None and not self._task.done():
+            return False
+        self._task = asyncio.ensure_future(self.run_once(policy))
+        return True
+
+    def start_scheduler(self, interval_hours: float = BUILD_RETENTION_INTERVAL_HOURS):
+        """Planifie le job à intervalle régulier (reprend d'abord un éventuel checkpoint)"""
+        if interval_hours <= 0 or self._scheduler is not None:
+            return
+
+        async def loop():
+            while True:
+                self.start()
+                await asyncio.sleep(interval_hours * 3600)
+
+        self._scheduler = asyncio.ensure_future(loop())
+        logger.info(f"⏰ Rétention des builds planifiée toutes les {interval_hours}h ({self.policy.max_age_days} jours)")
+
+    def stop(self):
+        for task in (self._scheduler, self._task):
+            if task is not None and not task.done():
+                task.cancel()
+        self._scheduler = None
+
+    def status(self) -> Dict[str, Any]:
+        return {"policy": asdict(self.policy), "metrics": asdict(self.metrics)}
@@ -0,0 +1,279 @@
+"""
+Cache disque des screenshots, par (URL, largeur, hauteur, device)
+Chaque page garde ses validateurs (ETag / Last-Modified HTTP, hash du DOM rendu) et chaque
+screenshot le hash du DOM dont il provient: une page inchangée est servie depuis le cache sans
+navigateur (requête conditionnelle) ou sans recapture (DOM identique). Index SQLite partagé
+par les workers, éviction LRU sur budget disque.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Union
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+SCREENSHOT_CACHE_DIR = os.environ.get(
+    "SCREENSHOT_CACHE_DIR",
+    str(Path(tempfile.gettempdir()) / "nativiweb_screenshots")
+)
+# Budget disque du cache (512 MiB par défaut)
+SCREENSHOT_CACHE_MAX_BYTES = int(os.environ.get("SCREENSHOT_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+# Pages revalidées il y a moins de N secondes: servies sans nouvelle vérification
+SCREENSHOT_CACHE_FRESH_SECONDS = float(os.environ.get("SCREENSHOT_CACHE_FRESH_SECONDS", "60"))
+SCREENSHOT_CACHE_VALIDATE_TIMEOUT_SECONDS = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS screenshots (
+    cache_key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    device TEXT,
+    file_name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    dom_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_screenshots_url ON screenshots(url);
+CREATE INDEX IF NOT EXISTS idx_screenshots_last_access ON screenshots(last_access);
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    dom_hash TEXT,
+    validated_at REAL NOT NULL
+);
+"""
+
+
+def cache_key(url: str, width: int, height: int, device: Optional[str] = None) -> str:
+    return hashlib.sha256(f"{url}|{width}x{height}|{device or ''}".encode("utf-8")).hexdigest()
+
+
+class ScreenshotCache:
+    """Fichiers PNG + index SQLite (WAL), utilisable depuis n'importe quel thread ou worker"""
+
+    def __init__(
+        self,
+        root: Union[str, Path] = SCREENSHOT_CACHE_DIR,
+        max_bytes: int = SCREENSHOT_CACHE_MAX_BYTES,
+        fresh_seconds: float = SCREENSHOT_CACHE_FRESH_SECONDS,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self._transport = transport
+        self.files_dir = self.root / "files"
+        self.files_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "index.sqlite3"
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(screenshots)")}
+            if "dom_hash" not in columns:
+                # Index créé avant le hash par screenshot: ces entrées ne correspondent à aucun DOM
+                conn.execute("ALTER TABLE screenshots ADD COLUMN dom_hash TEXT")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # ---------- screenshots ----------
+
+    def get(
+        self,
+        url: str,
+        width: int,
+        height: int,
+        device: Optional[str] = None,
+        dom_hash: Optional[str] = None
+    ) -> Optional[bytes]:
+        """Screenshot en cache (si dom_hash est donné, seulement s'il a été capturé depuis ce DOM)"""
+        key = cache_key(url, width, height, device)
+        with self._connect() as conn:
+            row = conn.execute("SELECT file_name, dom_hash FROM screenshots WHERE cache_key = ?", (key,)).fetchone()
+            if row is None or (dom_hash is not None and row["dom_hash"] != dom_hash):
+                self.misses += 1
+                return None
+            try:
+                data = (self.files_dir / row["file_name"]).read_bytes()
+            except FileNotFoundError:
+                conn.execute("DELETE FROM screenshots WHERE cache_key = ?", (key,))
+                self.misses += 1
+                return None
+            conn.execute("UPDATE screenshots SET last_access = ? WHERE cache_key = ?", (time.time(), key))
+        self.hits += 1
+        return data
+
+    def put(self, url: str, width: int, height: int, device: Optional[str], png: bytes, dom_hash: Optional[str] = None):
+        key = cache_key(url, width, height, device)
+        file_name = f"{key}.png"
+        staging = self.files_dir / f".{file_name}.{os.getpid()}.tmp"
+        staging.write_bytes(png)
+        os.replace(staging, self.files_dir / file_name)
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO screenshots
+                    (cache_key, url, width, height, device, file_name, size, created_at, last_access, dom_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, url, width, height, device, file_name, len(png), now, now, dom_hash)
+            )
+
+    def invalidate_url(self, url: str) -> int:
+        """Retire les screenshots et les validateurs d'une page"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT file_name FROM screenshots WHERE url = ?", (url,)).fetchall()
+            conn.execute("DELETE FROM screenshots WHERE url = ?", (url,))
+            conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+        for row in rows:
+            (self.files_dir / row["file_name"]).unlink(missing_ok=True)
+        return len(rows)
+
+    def usage(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(SUM(size), 0) FROM screenshots").fetchone()[0]
+
+    def evict(self) -> int:
+        """Évince les screenshots les moins récemment servis au-delà du budget disque"""
+        evicted = []
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM screenshots").fetchone()[0]
+                if total > self.max_bytes:
+                    for row in conn.execute(
+                        "SELECT cache_key, file_name, size FROM screenshots ORDER BY last_access ASC"
+                    ).fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        conn.execute("DELETE FROM screenshots WHERE cache_key = ?", (row["cache_key"],))
+                        evicted.append(row["file_name"])
+                        total -= row["size"]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        for file_name in evicted:
+            (self.files_dir / file_name).unlink(missing_ok=True)
+        if evicted:
+            logger.info(f"🧹 {len(evicted)} screenshot(s) évincé(s) du cache")
+        return len(evicted)
+
+    # ---------- validateurs ----------
+
+    def page_validator(self, url: str) -> Optional[Dict[str, Optional[str]]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM pages WHERE url = ?", (url,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def set_page_validator(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        dom_hash: Optional[str] = None
+    ):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO pages (url, etag, last_modified, dom_hash, validated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    dom_hash = COALESCE(excluded.dom_hash, pages.dom_hash),
+                    validated_at = excluded.validated_at
+                """,
+                (url, etag, last_modified, dom_hash, time.time())
+            )
+
+    def _touch_page(self, url: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE pages SET validated_at = ? WHERE url = ?", (time.time(), url))
+
+    async def unchanged_pages(self, urls: Iterable[str]) -> Set[str]:
+        """
+        Pages dont le contenu n'a pas changé selon HTTP (revalidées récemment, 304, ou
+        ETag / Last-Modified identiques); les autres doivent être rendues dans le navigateur
+        """
+        urls = list(dict.fromkeys(urls))
+        validators = await asyncio.to_thread(lambda: {url: self.page_validator(url) for url in urls})
+        now = time.time()
+        unchanged: Set[str] = set()
+        to_check: List[str] = []
+        for url, validator in validators.items():
+            if validator is None:
+                continue
+            if now - validator["validated_at"] < self.fresh_seconds:
+                unchanged.add(url)
+            elif validator["etag"] or validator["last_modified"]:
+                to_check.append(url)
+
+        if to_check:
+            async with httpx.AsyncClient(
+                timeout=SCREENSHOT_CACHE_VALIDATE_TIMEOUT_SECONDS, follow_redirects=True, transport=self._transport
+            ) as http:
+                async def check(url: str) -> bool:
+                    validator = validators[url]
+                    headers = {}
+                    if validator["etag"]:
+                        headers["If-None-Match"] = validator["etag"]
+                    if validator["last_modified"]:
+                        headers["If-Modified-Since"] = validator["last_modified"]
+                    try:
+                        response = await http.head(url, headers=headers)
+                    except httpx.HTTPError:
+                        return False
+                    if response.status_code == 304:
+                        return True
+                    if response.status_code >= 400:
+                        return False
+                    etag = response.headers.get("etag")
+                    last_modified = response.headers.get("last-modified")
+                    return bool(
+                        (validator["etag"] and etag == validator["etag"])
+                        or (not validator["etag"] and validator["last_modified"] and last_modified == validator["last_modified"])
+                    )
+
+                results = await asyncio.gather(*(check(url) for url in to_check))
+            for url, ok in zip(to_check, results):
+                if ok:
+                    unchanged.add(url)
+                    await asyncio.to_thread(self._touch_page, url)
+        return unchanged
+
+    def status(self) -> Dict[str, int]:
+        return {"usage_bytes": self.usage(), "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+
+# Instance globale
+_screenshot_cache: Optional[ScreenshotCache] = None
+
+
+def get_screenshot_cache() -> ScreenshotCache:
+    """Récupère le cache des screenshots (singleton par processus, index partagé)"""
+    global _screenshot_cache
+    if _screenshot_cache is None:
+        _screenshot_cache = ScreenshotCache()
+    return _screenshot_cache
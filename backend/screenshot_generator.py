@@ -1,15 +1,27 @@
 import asyncio
+import hashlib
 import nest_asyncio
 import logging
 import os
 import zipfile
 import io
+import math
+import time
+from contextlib import AsyncExitStack
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Awaitable, BinaryIO, Callable, List, Dict, Optional, Tuple, TypeVar, Union
 from datetime import datetime
 
+from browser_pool import get_browser_pool
+from page_discovery import get_page_discovery
+from screenshot_cache import ScreenshotCache, get_screenshot_cache
+from screenshot_processing import ProcessedScreenshot, ProcessingOptions, process_screenshots, summarize_stages
+
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 # Maintenant on peut importer Playwright
 try:
     from playwright.async_api import async_playwright, Browser, Page, Error as PlaywrightError
@@ -74,15 +86,73 @@ PLAY_STORE_RESOLUTIONS = {
     }
 }
 
+# Captures simultanées (contextes ouverts en même temps sur le navigateur loué)
+SCREENSHOT_CONCURRENCY = int(os.environ.get("SCREENSHOT_CONCURRENCY", "4"))
+# Attente après redimensionnement de la viewport (media queries, layout)
+VIEWPORT_SETTLE_SECONDS = 0.3
+# Textes d'une page 404 rendue côté client
+NOT_FOUND_MARKERS = ("404", "not found", "page introuvable", "page non trouvée")
+
+
+@dataclass
+class CaptureTiming:
+    """Durées d'une capture (navigation partagée par les viewports d'une même page)"""
+    filename: str
+    page_url: str
+    resolution: str
+    width: int
+    height: int
+    navigation_ms: Optional[float]
+    capture_ms: float
+    ok: bool
+    error: Optional[str] = None
+    cached: bool = False
+
 
 class ScreenshotGenerator:
     """Générateur de screenshots pour les stores - VERSION OPTIMISÉE"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        browser=None,
+        concurrency: int = SCREENSHOT_CONCURRENCY,
+        browser_pool=None,
+        cache: Optional[ScreenshotCache] = None,
+        refresh: bool = False,
+        progress: Optional[Callable[[int, int], None]] = None,
+        processing: Optional[ProcessingOptions] = None,
+        executor=None
+    ):
+        """
+        Args:
+            browser: Navigateur loué au pool (BrowserLease); None = navigateur propre via initialize()
+            concurrency: Nombre maximum de captures simultanées
+            browser_pool: Pool où louer un navigateur au premier besoin (rien n'est loué si tout vient du cache)
+            cache: Cache des screenshots (None = toujours recapturer)
+            refresh: Ignorer le contenu du cache (les nouvelles captures y sont enregistrées)
+            progress: Appelé après chaque capture avec (terminées, total)
+            processing: Post-traitement des PNG (optimisation, variantes); None = PNG bruts
+            executor: TaskExecutor du post-traitement (par défaut l'exécuteur partagé)
+        """
         if not HAS_PLAYWRIGHT:
             raise ImportError("Playwright is required. Install with: pip install playwright && playwright install chromium")
-        self.browser: Optional[Browser] = None
+        self.browser: Optional[Browser] = browser
+        self.browser_pool = browser_pool
+        self.cache = cache
+        self.refresh = refresh
         self.playwright = None
+        self._owns_browser = browser is None and browser_pool is None
+        self._lease_stack: Optional[AsyncExitStack] = None
+        self._lease_lock = asyncio.Lock()
+        self.concurrency = max(1, concurrency)
+        self.progress = progress
+        self.processing = processing
+        self.executor = executor
+        self.processed: Dict[str, ProcessedScreenshot] = {}
+        self.timings: List[CaptureTiming] = []
+        self.completed = 0
+        self.total = 0
+        self.total_ms = 0.0
     
     async def initialize(self):
         """Initialize Playwright browser"""
@@ -106,8 +176,25 @@ class ScreenshotGenerator:
             await self.close()
             raise
     
+    async def _get_browser(self):
+        """Navigateur courant; loue un navigateur au pool au premier besoin"""
+        if self.browser is None and self.browser_pool is not None:
+            async with self._lease_lock:
+                if self.browser is None:
+                    stack = AsyncExitStack()
+                    self.browser = await stack.enter_async_context(self.browser_pool.lease())
+                    self._lease_stack = stack
+        return self.browser
+    
     async def close(self):
-        """Ferme le navigateur"""
+        """Ferme le navigateur, ou le rend au pool s'il y a été loué"""
+        if self._lease_stack is not None:
+            stack, self._lease_stack = self._lease_stack, None
+            self.browser = None
+            await stack.aclose()
+            return
+        if not self._owns_browser:
+            return
         if self.browser:
             await self.browser.close()
         if self.playwright:
@@ -117,77 +204,51 @@ class ScreenshotGenerator:
     async def discover_pages(self, base_url: str, max_pages: int = 10) -> List[str]:
         """
         Découvre et vérifie les pages essentielles de l'application
-        Ne garde QUE les pages qui existent (pas d'erreur 404)
+        Ne garde QUE les pages qui existent (pas d'erreur 404): sondes HTTP parallèles
+        (pages usuelles, sitemap.xml, liens de l'accueil), navigateur pour les routes JS
         
         Args:
             base_url: URL de base de l'application
-            max_pages: Non utilisé (gardé pour compatibilité)
+            max_pages: Nombre maximum de pages capturées
         
         Returns:
             Liste des URLs des pages qui existent réellement
         """
-        # 🎯 PAGES POTENTIELLES À VÉRIFIER
-        # Le système vérifiera automatiquement lesquelles existent
-        potential_pages = [
-            {"url": base_url, "name": "Accueil"},
-            {"url": f"{base_url}/auth", "name": "Connexion"},
-            {"url": f"{base_url}/login", "name": "Login"},
-            {"url": f"{base_url}/register", "name": "Inscription"},
-            {"url": f"{base_url}/signup", "name": "Sign Up"},
-            {"url": f"{base_url}/products", "name": "Produits"},
-            {"url": f"{base_url}/produits", "name": "Produits (FR)"},
-            {"url": f"{base_url}/shop", "name": "Boutique"},
-            {"url": f"{base_url}/about", "name": "À propos"},
-            {"url": f"{base_url}/contact", "name": "Contact"},
-        ]
-        
-        # 🔍 Vérification : tester quelles pages existent vraiment
-        verified_pages = []
-        verified_urls = set()  # Pour éviter les doublons
-        
         try:
-            context = await self.browser.new_context(
-                viewport={"width": 1920, "height": 1080},
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            )
-            page = await context.new_page()
-            
-            for page_info in potential_pages:
-                url = page_info["url"]
-                name = page_info["name"]
-                
-                # Éviter les doublons (ex: si base_url et base_url/ sont identiques)
-                if url in verified_urls:
-                    continue
-                
-                try:
-                    response = await page.goto(url, wait_until="domcontentloaded", timeout=10000)
-                    
-                    if response and response.status < 400:
-                        verified_pages.append(url)
-                        verified_urls.add(url)
-                        logger.info(f"✅ Page trouvée: {name} ({url}) - Status {response.status}")
-                    else:
-                        logger.info(f"❌ Page ignorée: {name} ({url}) - Status {response.status}")
-                        
-                except Exception as e:
-                    logger.info(f"❌ Page ignorée: {name} ({url}) - Erreur: {str(e)[:50]}")
-            
-            await context.close()
-            
+            return await get_page_discovery().discover(base_url, max_pages, browser_check=self._browser_check)
         except Exception as e:
             logger.error(f"Erreur lors de la vérification des pages: {e}")
             # En cas d'erreur, au minimum on garde la page d'accueil
-            verified_pages = [base_url]
-        
-        # 🛡️ Garantie : toujours avoir au moins la page d'accueil
-        if not verified_pages:
-            logger.warning("Aucune page vérifiée, utilisation de la page d'accueil par défaut")
-            verified_pages = [base_url]
+            return [base_url]
+    
+    async def _browser_check(self, urls: List[str]) -> List[str]:
+        """Vérifie dans le navigateur les routes d'une SPA (rendu réel, pas de page 404)"""
+        semaphore = asyncio.Semaphore(self.concurrency)
         
-        logger.info(f"📸 {len(verified_pages)} page(s) seront capturées: {verified_pages}")
+        async def check(url: str) -> bool:
+            async with semaphore:
+                browser = await self._get_browser()
+                context = await browser.new_context(
+                    viewport={"width": 1920, "height": 1080},
+                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+                )
+                try:
+                    page = await context.new_page()
+                    response = await page.goto(url, wait_until="networkidle", timeout=10000)
+                    if response is None or response.status >= 400:
+                        return False
+                    text = (await page.inner_text("body"))[:2000].lower()
+                    exists = not any(marker in text for marker in NOT_FOUND_MARKERS)
+                    logger.info(f"{'✅ Page trouvée' if exists else '❌ Page ignorée'}: {url} (rendu navigateur)")
+                    return exists
+                except Exception as e:
+                    logger.info(f"❌ Page ignorée: {url} - Erreur: {str(e)[:50]}")
+                    return False
+                finally:
+                    await context.close()
         
-        return verified_pages
+        results = await asyncio.gather(*(check(url) for url in urls))
+        return [url for url, exists in zip(urls, results) if exists]
     
     async def capture_screenshot(
         self,
@@ -210,7 +271,8 @@ class ScreenshotGenerator:
         Returns:
             Bytes de l'image PNG
         """
-        context = await self.browser.new_context(
+        browser = await self._get_browser()
+        context = await browser.new_context(
             viewport={"width": width, "height": height},
             device_scale_factor=1,
             user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
@@ -264,6 +326,318 @@ class ScreenshotGenerator:
             logger.error(f"Error capturing screenshot of {url}: {e}")
             raise
     
+    def _plan_captures(self, base_url: str, pages: List[str], store: str) -> List[Tuple[str, List[Dict]]]:
+        """
+        Planifie les captures: pour chaque page, les viewports à rendre après une seule navigation
+        Les viewports d'une page sont répartis en groupes (un contexte chacun) pour occuper
+        les captures simultanées disponibles quand il y a peu de pages.
+        """
+        resolutions = []
+        if store in ["ios", "both"]:
+            resolutions += [("ios", resolution_id, resolution) for resolution_id, resolution in APP_STORE_RESOLUTIONS.items()]
+        if store in ["android", "both"]:
+            resolutions += [("android", resolution_id, resolution) for resolution_id, resolution in PLAY_STORE_RESOLUTIONS.items()]
+        if not resolutions or not pages:
+            return []
+
+        groups_per_page = min(len(resolutions), max(1, self.concurrency // len(pages)))
+        group_size = math.ceil(len(resolutions) / groups_per_page)
+        plan = []
+        for page_url in pages:
+            page_name = self._get_page_name(page_url, base_url)
+            targets = [
+                {
+                    "filename": f"{platform}/{resolution_id}/{page_name}.png",
+                    "resolution_id": resolution_id,
+                    "width": resolution["width"],
+                    "height": resolution["height"],
+                    "device": resolution.get("device"),
+                }
+                for platform, resolution_id, resolution in resolutions
+            ]
+            for start in range(0, len(targets), group_size):
+                plan.append((page_url, targets[start:start + group_size]))
+        return plan
+
+    def _read_cached(self, url: str, targets: List[Dict], dom_hash: Optional[str] = None) -> Dict[str, bytes]:
+        """Screenshots en cache pour les viewports demandées (bloquant: SQLite + disque)"""
+        found = {}
+        for target in targets:
+            png = self.cache.get(url, target["width"], target["height"], target["device"], dom_hash)
+            if png is not None:
+                found[target["filename"]] = png
+        return found
+
+    def _read_unchanged(self, url: str, targets: List[Dict]) -> Dict[str, bytes]:
+        """Screenshots d'une page inchangée selon HTTP, capturés depuis le DOM de son validateur"""
+        validator = self.cache.page_validator(url)
+        return self._read_cached(url, targets, validator["dom_hash"] if validator else None)
+
+    def _store_cached(self, url: str, targets: List[Dict], screenshots: Dict[str, bytes], dom_hash: Optional[str]):
+        for target in targets:
+            if target["filename"] in screenshots:
+                self.cache.put(
+                    url, target["width"], target["height"], target["device"], screenshots[target["filename"]], dom_hash
+                )
+
+    async def _cached_if_dom_unchanged(self, page, response, url: str, targets: List[Dict]) -> Tuple[Dict[str, bytes], Dict]:
+        """
+        Screenshots en cache capturés depuis le même DOM rendu, et les validateurs de la page
+        (enregistrés seulement une fois les nouvelles captures en cache, par _finish_group)
+        """
+        try:
+            html = await page.evaluate("() => document.documentElement.outerHTML")
+            dom_hash = hashlib.sha256(html.encode("utf-8")).hexdigest()
+        except Exception:
+            dom_hash = None
+        headers = response.headers if response is not None else {}
+        validator = {"etag": headers.get("etag"), "last_modified": headers.get("last-modified"), "dom_hash": dom_hash}
+        if self.refresh or dom_hash is None:
+            return {}, validator
+        return await asyncio.to_thread(self._read_cached, url, targets, dom_hash), validator
+
+    async def _serve_unchanged(
+        self,
+        plan: List[Tuple[str, List[Dict]]],
+        unchanged: set,
+        screenshots: Dict[str, bytes]
+    ) -> List[Tuple[str, List[Dict]]]:
+        """Sert depuis le cache les pages inchangées; retourne le plan restant à capturer"""
+        remaining = []
+        for page_url, targets in plan:
+            cached = await asyncio.to_thread(self._read_unchanged, page_url, targets) if page_url in unchanged else {}
+            for target in targets:
+                if target["filename"] in cached:
+                    screenshots[target["filename"]] = cached[target["filename"]]
+                    self._record(self.timings, CaptureTiming(
+                        target["filename"], page_url, target["resolution_id"], target["width"], target["height"],
+                        navigation_ms=None, capture_ms=0.0, ok=True, cached=True
+                    ))
+            missing = [target for target in targets if target["filename"] not in cached]
+            if missing:
+                remaining.append((page_url, missing))
+        return remaining
+
+    async def capture_viewports(
+        self,
+        url: str,
+        targets: List[Dict],
+        wait_time: int = 1
+    ) -> Tuple[Dict[str, bytes], List[CaptureTiming], Optional[Dict]]:
+        """
+        Navigue une seule fois vers l'URL puis capture chaque viewport demandée
+        (redimensionnement de la page au lieu d'un nouveau contexte par résolution)
+        Avec un cache, les viewports d'une page dont le DOM rendu est inchangé ne sont pas recapturées.
+        
+        Returns:
+            (screenshots par nom de fichier, timings par capture, validateurs de la page rendue)
+        """
+        screenshots: Dict[str, bytes] = {}
+        timings: List[CaptureTiming] = []
+        validator = None
+        first = targets[0]
+        browser = await self._get_browser()
+        context = await browser.new_context(
+            viewport={"width": first["width"], "height": first["height"]},
+            device_scale_factor=1,
+            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+        )
+        try:
+            page = await context.new_page()
+            started = time.perf_counter()
+            try:
+                response = await page.goto(url, wait_until="networkidle", timeout=30000)
+                await asyncio.sleep(wait_time)
+            except Exception as e:
+                logger.error(f"Error loading {url}: {e}")
+                for target in targets:
+                    self._record(timings, CaptureTiming(
+                        target["filename"], url, target["resolution_id"], target["width"], target["height"],
+                        navigation_ms=None, capture_ms=0.0, ok=False, error=str(e)[:200]
+                    ))
+                return screenshots, timings, validator
+            navigation_ms = round((time.perf_counter() - started) * 1000, 1)
+            cached = {}
+            if self.cache is not None:
+                cached, validator = await self._cached_if_dom_unchanged(page, response, url, targets)
+
+            viewport = (first["width"], first["height"])
+            for target in targets:
+                started = time.perf_counter()
+                if target["filename"] in cached:
+                    screenshots[target["filename"]] = cached[target["filename"]]
+                    self._record(timings, CaptureTiming(
+                        target["filename"], url, target["resolution_id"], target["width"], target["height"],
+                        navigation_ms=navigation_ms, capture_ms=0.0, ok=True, cached=True
+                    ))
+                    continue
+                try:
+                    if (target["width"], target["height"]) != viewport:
+                        viewport = (target["width"], target["height"])
+                        await page.set_viewport_size({"width": target["width"], "height": target["height"]})
+                        # Laisser les media queries / le layout s'appliquer
+                        await asyncio.sleep(VIEWPORT_SETTLE_SECONDS)
+                    screenshots[target["filename"]] = await page.screenshot(
+                        type="png",
+                        full_page=False,  # Capturer seulement la viewport
+                    )
+                    error = None
+                    logger.info(f"Generated: {target['filename']}")
+                except Exception as e:
+                    error = str(e)[:200]
+                    logger.error(f"Failed to generate {target['resolution_id']} for {url}: {e}")
+                self._record(timings, CaptureTiming(
+                    target["filename"], url, target["resolution_id"], target["width"], target["height"],
+                    navigation_ms=navigation_ms,
+                    capture_ms=round((time.perf_counter() - started) * 1000, 1),
+                    ok=error is None,
+                    error=error
+                ))
+
+            return screenshots, timings, validator
+        finally:
+            await context.close()
+    
+    async def _postprocess(self, screenshots: Dict[str, bytes], optimize: set):
+        """Post-traite (pool de processus) les screenshots pas encore traités, remplacés par le PNG optimisé"""
+        if self.processing is None:
+            return
+        pending = {name: png for name, png in screenshots.items() if name not in self.processed}
+        results = await process_screenshots(pending, self.processing, optimize, self.executor)
+        for name, result in results.items():
+            screenshots[name] = result.png
+            self.processed[name] = result
+
+    async def _finish_group(
+        self,
+        url: str,
+        targets: List[Dict],
+        screenshots: Dict[str, bytes],
+        timings: List[CaptureTiming],
+        validator: Optional[Dict]
+    ):
+        """
+        Post-traite les nouvelles captures d'une page puis les enregistre (optimisées) dans le cache
+        Les validateurs de la page ne sont mis à jour qu'ensuite, et seulement si toutes ses
+        viewports ont été capturées: une capture en échec ne fait pas passer l'ancien PNG pour actuel.
+        """
+        fresh = {timing.filename for timing in timings if timing.ok and not timing.cached}
+        await self._postprocess(screenshots, fresh)
+        if self.cache is None or validator is None:
+            return
+        if fresh:
+            captured = {name: png for name, png in screenshots.items() if name in fresh}
+            await asyncio.to_thread(self._store_cached, url, targets, captured, validator["dom_hash"])
+        if all(timing.ok for timing in timings):
+            await asyncio.to_thread(
+                self.cache.set_page_validator, url, validator["etag"], validator["last_modified"], validator["dom_hash"]
+            )
+
+    def _record(self, timings: List[CaptureTiming], timing: CaptureTiming):
+        """Ajoute le timing d'une capture terminée et signale la progression"""
+        timings.append(timing)
+        self.completed += 1
+        if self.progress is not None:
+            self.progress(self.completed, self.total)
+    
+    async def capture_all(
+        self,
+        base_url: str,
+        pages: Optional[List[str]] = None,
+        store: str = "both",  # "ios", "android", "both"
+        auto_discover: bool = True
+    ) -> Tuple[List[str], Dict[str, bytes]]:
+        """
+        Capture tous les screenshots nécessaires pour les stores
+        Les captures tournent en parallèle (au plus self.concurrency contextes à la fois);
+        les timings de chaque capture sont dans self.timings.
+        Avec un cache, les pages inchangées (ETag / Last-Modified) sont servies sans navigateur.
+        
+        Returns:
+            (pages capturées, screenshots par nom de fichier)
+        """
+        if pages is None and auto_discover:
+            pages = await self.discover_pages(base_url)
+        elif pages is None:
+            pages = [base_url]
+        
+        started = time.perf_counter()
+        plan = self._plan_captures(base_url, pages, store)
+        screenshots: Dict[str, bytes] = {}
+        self.timings = []
+        self.processed = {}
+        self.completed = 0
+        self.total = sum(len(targets) for _, targets in plan)
+        
+        if self.cache is not None and not self.refresh:
+            unchanged = await self.cache.unchanged_pages(pages)
+            if unchanged:
+                plan = await self._serve_unchanged(plan, unchanged, screenshots)
+        
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def run(page_url, targets):
+            async with semaphore:
+                group_screenshots, group_timings, validator = await self.capture_viewports(page_url, targets)
+            # Hors du sémaphore: la page suivante est capturée pendant le post-traitement
+            await self._finish_group(page_url, targets, group_screenshots, group_timings, validator)
+            return group_screenshots, group_timings
+        
+        results = await asyncio.gather(*(run(page_url, targets) for page_url, targets in plan))
+        
+        for group_screenshots, group_timings in results:
+            screenshots.update(group_screenshots)
+            self.timings.extend(group_timings)
+        # Screenshots servis par le cache (déjà optimisés): variantes seulement
+        await self._postprocess(screenshots, set())
+        if self.cache is not None and plan:
+            await asyncio.to_thread(self.cache.evict)
+        self.total_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(
+            f"📸 {len(screenshots)}/{len(self.timings)} screenshots en {self.total_ms} ms "
+            f"({sum(1 for timing in self.timings if timing.cached)} depuis le cache, "
+            f"{len(plan)} navigation(s), {self.concurrency} en parallèle)"
+        )
+        for stage, stats in summarize_stages(self.processed).items():
+            logger.info(
+                f"🗜️ {stage}: {stats['count']} fichier(s), {stats['input_bytes']} -> {stats['output_bytes']} bytes, "
+                f"{stats['cpu_ms']} ms CPU"
+            )
+        return pages, screenshots
+    
+    def timings_report(self) -> Dict:
+        """Timings de la dernière génération (captures et post-traitement), hors du ZIP livré"""
+        return {
+            "total_ms": self.total_ms,
+            "concurrency": self.concurrency,
+            "cached": sum(1 for timing in self.timings if timing.cached),
+            "captures": [asdict(timing) for timing in self.timings],
+            "processing": {
+                "stages": summarize_stages(self.processed),
+                "files": {
+                    name: [asdict(stats) for stats in result.stages] for name, result in self.processed.items()
+                },
+            },
+        }
+    
+    def write_zip(self, target: Union[str, Path, BinaryIO], pages: List[str], store: str, screenshots: Dict[str, bytes]):
+        """
+        Écrit le ZIP (screenshots, variantes, README.txt) dans un fichier ou un buffer
+        Les images, déjà compressées, sont stockées sans nouvelle passe DEFLATE.
+        """
+        with zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            # Ordre du plan quel que soit l'ordre de fin des captures
+            for timing in self.timings:
+                if timing.filename in screenshots:
+                    zip_file.writestr(timing.filename, screenshots[timing.filename], compress_type=zipfile.ZIP_STORED)
+                    processed = self.processed.get(timing.filename)
+                    for name, data in (processed.variants.items() if processed else ()):
+                        zip_file.writestr(name, data, compress_type=zipfile.ZIP_STORED)
+            
+            # Ajouter un fichier README avec les instructions
+            readme = self._generate_readme(pages, store, len(screenshots))
+            zip_file.writestr("README.txt", readme)
+    
     async def generate_all_screenshots(
         self,
         base_url: str,
@@ -283,65 +657,30 @@ class ScreenshotGenerator:
         Returns:
             Bytes du fichier ZIP contenant tous les screenshots
         """
-        if pages is None and auto_discover:
-            pages = await self.discover_pages(base_url)
-        elif pages is None:
-            pages = [base_url]
-        
+        pages, screenshots = await self.capture_all(base_url, pages, store, auto_discover)
         zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            screenshots_generated = 0
-            
-            # Générer screenshots iOS si demandé
-            if store in ["ios", "both"]:
-                for resolution_id, resolution in APP_STORE_RESOLUTIONS.items():
-                    for page_url in pages:
-                        try:
-                            page_name = self._get_page_name(page_url, base_url)
-                            screenshot = await self.capture_screenshot(
-                                page_url,
-                                resolution["width"],
-                                resolution["height"],
-                                resolution.get("device")
-                            )
-                            
-                            filename = f"ios/{resolution_id}/{page_name}.png"
-                            zip_file.writestr(filename, screenshot)
-                            screenshots_generated += 1
-                            logger.info(f"Generated: {filename}")
-                            
-                        except Exception as e:
-                            logger.error(f"Failed to generate {resolution_id} for {page_url}: {e}")
-            
-            # Générer screenshots Android si demandé
-            if store in ["android", "both"]:
-                for resolution_id, resolution in PLAY_STORE_RESOLUTIONS.items():
-                    for page_url in pages:
-                        try:
-                            page_name = self._get_page_name(page_url, base_url)
-                            screenshot = await self.capture_screenshot(
-                                page_url,
-                                resolution["width"],
-                                resolution["height"],
-                                resolution.get("device")
-                            )
-                            
-                            filename = f"android/{resolution_id}/{page_name}.png"
-                            zip_file.writestr(filename, screenshot)
-                            screenshots_generated += 1
-                            logger.info(f"Generated: {filename}")
-                            
-                        except Exception as e:
-                            logger.error(f"Failed to generate {resolution_id} for {page_url}: {e}")
-            
-            # Ajouter un fichier README avec les instructions
-            readme = self._generate_readme(pages, store, screenshots_generated)
-            zip_file.writestr("README.txt", readme)
-        
+        self.write_zip(zip_buffer, pages, store, screenshots)
         zip_buffer.seek(0)
         return zip_buffer.read()
     
+    async def generate_to_file(
+        self,
+        output_path: Union[str, Path],
+        base_url: str,
+        pages: Optional[List[str]] = None,
+        store: str = "both",
+        auto_discover: bool = True
+    ) -> int:
+        """
+        Génère les screenshots dans un fichier ZIP (résultat persistant d'un job)
+        
+        Returns:
+            Taille du ZIP en octets
+        """
+        pages, screenshots = await self.capture_all(base_url, pages, store, auto_discover)
+        await asyncio.to_thread(self.write_zip, output_path, pages, store, screenshots)
+        return os.path.getsize(output_path)
+    
     def _get_page_name(self, url: str, base_url: str) -> str:
         """Extrait un nom de fichier propre depuis l'URL"""
         # Enlever le protocole et le domaine
@@ -370,6 +709,8 @@ Store: {store}
 - Seulement 2 résolutions Android (Phone + Tablet 10")
 - Temps d'attente réduit à 1 seconde
 - Scroll désactivé pour vitesse maximale
+- Captures en parallèle, une seule navigation par page
+- PNG optimisés sans perte (variantes JPEG / WebP et miniatures en option)
 - 4 pages essentielles seulement
 
 Pages:
@@ -398,41 +739,76 @@ Note: Version optimisée pour génération rapide (30-45 secondes au lieu de 8 m
 """
 
 
-# Fonction helper pour utilisation synchrone
-async def _generate_screenshots_async_internal(
-    base_url: str,
-    pages: Optional[List[str]] = None,
-    store: str = "both",
-    auto_discover: bool = True
-) -> bytes:
+async def _run_generator(
+    job: Callable[[ScreenshotGenerator], Awaitable[T]],
+    use_pool: bool = True,
+    use_cache: bool = True,
+    refresh: bool = False,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> T:
     """
-    Version asynchrone du générateur de screenshots (pour FastAPI)
+    Exécute un travail avec un générateur prêt à l'emploi
     
     Args:
-        base_url: URL de base
-        pages: Pages à capturer (None = pages essentielles)
-        store: "ios", "android", ou "both"
-        auto_discover: Utiliser les pages essentielles prédéfinies
-    
-    Returns:
-        Bytes du ZIP contenant les screenshots
+        job: Travail à exécuter (ex: generator.generate_all_screenshots)
+        use_pool: Louer un navigateur du pool partagé (False = navigateur dédié)
+        use_cache: Servir / enregistrer les screenshots dans le cache disque
+        refresh: Recapturer même si le cache est valide
+        progress: Appelé après chaque capture avec (terminées, total)
     """
-    generator = ScreenshotGenerator()
+    cache = get_screenshot_cache() if use_cache else None
+    if use_pool:
+        # Navigateur loué au pool partagé au premier besoin (aucun si tout vient du cache)
+        generator = ScreenshotGenerator(
+            browser_pool=get_browser_pool(), cache=cache, refresh=refresh, progress=progress,
+            processing=ProcessingOptions()
+        )
+        try:
+            return await job(generator)
+        finally:
+            await generator.close()
+
+    generator = ScreenshotGenerator(cache=cache, refresh=refresh, progress=progress, processing=ProcessingOptions())
     try:
         await generator.initialize()
-        result = await generator.generate_all_screenshots(
-            base_url, pages, store, auto_discover
-        )
-        return result
+        return await job(generator)
     finally:
         await generator.close()
 
 
+async def _run_on_playwright_loop(run: Callable[[bool], Awaitable[T]]) -> T:
+    """
+    Exécute run(use_pool) sur un event loop compatible Playwright
+    Sur Windows, Playwright doit tourner sur un event loop Proactor: sinon le travail part
+    dans un thread avec son propre event loop, où le pool (lié à l'event loop de l'application)
+    n'est pas utilisable.
+    """
+    import sys
+
+    if sys.platform == "win32":
+        try:
+            loop = asyncio.get_running_loop()
+            loop_name = type(loop).__name__
+        except RuntimeError:
+            loop = None
+            loop_name = ""
+
+        if loop is not None and "Proactor" not in loop_name:
+            def _run_in_thread():
+                asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+                return asyncio.run(run(False))
+
+            return await asyncio.to_thread(_run_in_thread)
+
+    return await run(True)
+
+
 async def generate_screenshots_async(
     base_url: str,
     pages: Optional[List[str]] = None,
     store: str = "both",
-    auto_discover: bool = True
+    auto_discover: bool = True,
+    refresh: bool = False
 ) -> bytes:
     """
     Version asynchrone du générateur de screenshots (pour FastAPI)
@@ -442,35 +818,50 @@ async def generate_screenshots_async(
         pages: Pages à capturer (None = pages essentielles)
         store: "ios", "android", ou "both"
         auto_discover: Utiliser les pages essentielles prédéfinies
+        refresh: Recapturer même si les screenshots en cache sont valides
     
     Returns:
         Bytes du ZIP contenant les screenshots
     """
-    import sys
+    return await _run_on_playwright_loop(lambda use_pool: _run_generator(
+        lambda generator: generator.generate_all_screenshots(base_url, pages, store, auto_discover),
+        use_pool=use_pool,
+        refresh=refresh
+    ))
 
-    # Sur Windows, Playwright doit tourner sur un event loop Proactor
-    if sys.platform == "win32":
-        try:
-            loop = asyncio.get_running_loop()
-            loop_name = type(loop).__name__
-        except RuntimeError:
-            loop = None
-            loop_name = ""
 
-        if loop is not None and "Proactor" not in loop_name:
-            def _run_in_thread():
-                asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-                return asyncio.run(
-                    _generate_screenshots_async_internal(
-                        base_url, pages, store, auto_discover
-                    )
-                )
+async def generate_screenshots_to_file(
+    output_path: Union[str, Path],
+    base_url: str,
+    pages: Optional[List[str]] = None,
+    store: str = "both",
+    auto_discover: bool = True,
+    refresh: bool = False,
+    progress: Optional[Callable[[int, int], None]] = None,
+    report: Optional[Callable[[Dict], None]] = None
+) -> int:
+    """
+    Génère les screenshots dans un fichier ZIP (jobs de screenshots)
+    
+    Args:
+        report: Appelé en fin de génération avec les timings par capture (timings_report)
+    
+    Returns:
+        Taille du ZIP en octets
+    """
+    async def job(generator: ScreenshotGenerator) -> int:
+        size = await generator.generate_to_file(output_path, base_url, pages, store, auto_discover)
+        if report is not None:
+            report(generator.timings_report())
+        return size
 
-            return await asyncio.to_thread(_run_in_thread)
+    return await _run_on_playwright_loop(lambda use_pool: _run_generator(
+        job,
+        use_pool=use_pool,
+        refresh=refresh,
+        progress=progress
+    ))
 
-    return await _generate_screenshots_async_internal(
-        base_url, pages, store, auto_discover
-    )
 
 def generate_screenshots_sync(
     base_url: str,
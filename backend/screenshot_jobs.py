@@ -0,0 +1,326 @@
+"""
+Jobs de génération de screenshots
+Un job s'exécute en arrière-plan dans le worker qui l'a créé (pool de navigateurs du processus);
+son état et sa progression (captures terminées / total) sont dans un index SQLite partagé
+par les workers, et le ZIP résultat est conservé sur disque pour un téléchargement en streaming.
+Les accès à l'index passent par des threads: l'event loop ne bloque pas sur SQLite.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+SCREENSHOT_JOBS_DIR = os.environ.get(
+    "SCREENSHOT_JOBS_DIR",
+    str(Path(tempfile.gettempdir()) / "nativiweb_screenshot_jobs")
+)
+# Durée de conservation des résultats
+SCREENSHOT_JOB_TTL_SECONDS = float(os.environ.get("SCREENSHOT_JOB_TTL_SECONDS", str(24 * 3600)))
+# Un job sans nouvelle progression depuis N secondes est considéré interrompu (worker redémarré)
+SCREENSHOT_JOB_STALE_SECONDS = float(os.environ.get("SCREENSHOT_JOB_STALE_SECONDS", "900"))
+# Écart minimal entre deux écritures de progression
+_PROGRESS_INTERVAL_SECONDS = 0.5
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+_ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    store TEXT NOT NULL,
+    fingerprint TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    captured INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    size INTEGER,
+    error TEXT,
+    file_name TEXT,
+    timings TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_project ON jobs(project_id, user_id, created_at);
+"""
+
+# generate(output_path, progress, report) -> taille du ZIP; report reçoit les timings par capture
+GenerateFunc = Callable[[str, Callable[[int, int], None], Callable[[Dict[str, Any]], None]], Awaitable[int]]
+
+
+def job_fingerprint(**params: Any) -> str:
+    """Empreinte des paramètres de génération: seul un job identique est réutilisé"""
+    payload = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ScreenshotJob:
+    job_id: str
+    project_id: str
+    user_id: str
+    store: str
+    status: str
+    fingerprint: str = ""
+    captured: int = 0
+    total: int = 0
+    size: Optional[int] = None
+    error: Optional[str] = None
+    file_name: Optional[str] = None
+    timings: Optional[Dict[str, Any]] = None
+    created_at: float = 0.0
+    updated_at: float = 0.0
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("user_id")
+        data.pop("fingerprint")
+        data["progress"] = round(self.captured / self.total * 100) if self.total else 0
+        data["status_url"] = f"/api/screenshots/jobs/{self.job_id}"
+        data["download_url"] = f"/api/screenshots/jobs/{self.job_id}/download" if self.status == JOB_COMPLETED else None
+        return data
+
+
+class ScreenshotJobManager:
+    """Création, exécution et suivi des jobs (index SQLite WAL + fichiers ZIP)"""
+
+    def __init__(
+        self,
+        root: Union[str, Path] = SCREENSHOT_JOBS_DIR,
+        ttl_seconds: float = SCREENSHOT_JOB_TTL_SECONDS,
+        stale_seconds: float = SCREENSHOT_JOB_STALE_SECONDS
+    ):
+        self.root = Path(root)
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.results_dir = self.root / "results"
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "jobs.sqlite3"
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Écritures d'un job (progression, statut) dans un seul thread: appliquées dans l'ordre
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot-jobs")
+        # Recherche + création d'un job sans requête concurrente entre les deux
+        self._starting = asyncio.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "fingerprint" not in columns:
+                # Index créé avant l'empreinte: ces jobs ne sont plus réutilisés
+                conn.execute("ALTER TABLE jobs ADD COLUMN fingerprint TEXT NOT NULL DEFAULT ''")
+            if "timings" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN timings TEXT")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _to_job(self, row: sqlite3.Row) -> ScreenshotJob:
+        data = dict(row)
+        data["timings"] = json.loads(data["timings"]) if data["timings"] else None
+        job = ScreenshotJob(**data)
+        if job.status in _ACTIVE_STATUSES and time.time() - job.updated_at > self.stale_seconds:
+            job.status = JOB_FAILED
+            job.error = "Job interrompu (redémarrage du serveur)"
+        return job
+
+    def result_path(self, job_id: str) -> Path:
+        return self.results_dir / f"{job_id}.zip"
+
+    # ---------- lecture ----------
+
+    def get(self, job_id: str) -> Optional[ScreenshotJob]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def latest(self, project_id: str, user_id: str) -> Optional[ScreenshotJob]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE project_id = ? AND user_id = ? ORDER BY created_at DESC LIMIT 1",
+                (project_id, user_id)
+            ).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def find_active(self, project_id: str, user_id: str, store: str, fingerprint: str = "") -> Optional[ScreenshotJob]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE project_id = ? AND user_id = ? AND store = ? AND fingerprint = ? "
+                f"AND status IN ({', '.join('?' for _ in _ACTIVE_STATUSES)}) ORDER BY created_at DESC",
+                (project_id, user_id, store, fingerprint, *_ACTIVE_STATUSES)
+            ).fetchall()
+        for row in rows:
+            job = self._to_job(row)
+            if job.status in _ACTIVE_STATUSES:
+                return job
+        return None
+
+    # ---------- écriture ----------
+
+    def _update(self, job_id: str, **fields: Any):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def _create(
+        self,
+        project_id: str,
+        user_id: str,
+        store: str,
+        file_name: Optional[str],
+        fingerprint: str = ""
+    ) -> ScreenshotJob:
+        now = time.time()
+        job = ScreenshotJob(
+            uuid.uuid4().hex, project_id, user_id, store, JOB_QUEUED, fingerprint,
+            file_name=file_name, created_at=now, updated_at=now
+        )
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, project_id, user_id, store, fingerprint, status, file_name, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.job_id, project_id, user_id, store, fingerprint, job.status, file_name, now, now)
+            )
+        return job
+
+    def purge_expired(self) -> int:
+        """Supprime les jobs terminés (et leurs ZIP) plus vieux que la durée de conservation"""
+        cutoff = time.time() - self.ttl_seconds
+        with self._connect() as conn:
+            rows = conn.execute("SELECT job_id FROM jobs WHERE created_at < ?", (cutoff,)).fetchall()
+            conn.execute("DELETE FROM jobs WHERE created_at < ?", (cutoff,))
+        for row in rows:
+            self.result_path(row["job_id"]).unlink(missing_ok=True)
+        return len(rows)
+
+    # ---------- exécution ----------
+
+    async def start(
+        self,
+        project_id: str,
+        user_id: str,
+        store: str,
+        generate: GenerateFunc,
+        file_name: Optional[str] = None,
+        fingerprint: str = ""
+    ) -> ScreenshotJob:
+        """
+        Lance un job en arrière-plan; un job déjà en cours pour le même projet, store et
+        paramètres (fingerprint, voir job_fingerprint) est réutilisé
+
+        Args:
+            generate: Coroutine qui écrit le ZIP à output_path et signale la progression
+            file_name: Nom du ZIP proposé au téléchargement
+            fingerprint: Empreinte des paramètres de génération (URLs, refresh, ...)
+        """
+        async with self._starting:
+            active = await asyncio.to_thread(self.find_active, project_id, user_id, store, fingerprint)
+            if active is not None:
+                logger.info(f"🔗 Job screenshots déjà en cours pour {project_id} ({store}): {active.job_id}")
+                return active
+
+            await asyncio.to_thread(self.purge_expired)
+            job = await asyncio.to_thread(self._create, project_id, user_id, store, file_name, fingerprint)
+        task = asyncio.ensure_future(self._run(job.job_id, generate))
+        self._tasks[job.job_id] = task
+
+        def _forget(done: asyncio.Task):
+            self._tasks.pop(job.job_id, None)
+            if not done.cancelled():
+                done.exception()  # déjà enregistrée dans l'index
+
+        task.add_done_callback(_forget)
+        logger.info(f"🚀 Job screenshots {job.job_id} créé pour {project_id} ({store})")
+        return job
+
+    async def _run(self, job_id: str, generate: GenerateFunc) -> ScreenshotJob:
+        path = self.result_path(job_id)
+        staging = path.with_suffix(".tmp")
+        last_write = 0.0
+        timings: Dict[str, Any] = {}
+
+        def write(**fields: Any) -> "asyncio.Future":
+            return asyncio.wrap_future(self._writer.submit(self._update, job_id, **fields))
+
+        def progress(captured: int, total: int):
+            nonlocal last_write
+            now = time.monotonic()
+            if captured >= total or now - last_write >= _PROGRESS_INTERVAL_SECONDS:
+                last_write = now
+                # Sans attendre: la capture continue pendant l'écriture
+                self._writer.submit(self._update, job_id, captured=captured, total=total)
+
+        def report(data: Dict[str, Any]):
+            timings.update(data)
+
+        await write(status=JOB_RUNNING)
+        try:
+            size = await generate(str(staging), progress, report)
+            await asyncio.to_thread(os.replace, staging, path)
+            await write(
+                status=JOB_COMPLETED, size=size, finished_at=time.time(),
+                timings=json.dumps(timings) if timings else None
+            )
+            logger.info(f"✅ Job screenshots {job_id} terminé ({size} bytes)")
+        except BaseException as e:
+            staging.unlink(missing_ok=True)
+            error = "Job annulé" if isinstance(e, asyncio.CancelledError) else str(e)[:500]
+            # Écriture terminée même si le job est annulé pendant l'attente
+            await asyncio.shield(write(status=JOB_FAILED, error=error, finished_at=time.time()))
+            logger.error(f"❌ Job screenshots {job_id} en échec: {error}")
+            raise
+        return await asyncio.to_thread(self.get, job_id)
+
+    async def wait(self, job_id: str) -> ScreenshotJob:
+        """
+        Attend la fin d'un job lancé par ce worker (l'exception du job est propagée)
+        Un demandeur qui abandonne n'annule pas le job.
+        """
+        task = self._tasks.get(job_id)
+        if task is not None:
+            return await asyncio.shield(task)
+        # Job d'un autre worker: suivre l'index
+        while True:
+            job = await asyncio.to_thread(self.get, job_id)
+            if job is None or job.status not in _ACTIVE_STATUSES:
+                return job
+            await asyncio.sleep(1)
+
+    def shutdown(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+
+# Instance globale
+_screenshot_jobs: Optional[ScreenshotJobManager] = None
+
+
+def get_screenshot_jobs() -> ScreenshotJobManager:
+    """Récupère le gestionnaire des jobs de screenshots (singleton par processus, index partagé)"""
+    global _screenshot_jobs
+    if _screenshot_jobs is None:
+        _screenshot_jobs = ScreenshotJobManager()
+    return _screenshot_jobs
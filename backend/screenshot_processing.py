@@ -0,0 +1,267 @@
+"""
+Post-traitement des screenshots (pool de processus partagé)
+- Optimisation PNG sans perte: IDAT recompressé (zlib niveau 9), métadonnées retirées,
+  canal alpha entièrement opaque supprimé (Pillow) — PNG plus légers et acceptés par les stores
+- Variantes optionnelles JPEG / WebP (fond opaque, conformes aux stores) et miniatures (Pillow)
+Chaque étape rapporte taille de sortie et temps CPU; les PNG étant déjà compressés,
+le ZIP les stocke sans nouvelle passe DEFLATE.
+"""
+import io
+import logging
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from task_executor import get_task_executor
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+SCREENSHOT_OPTIMIZE_PNG = os.environ.get("SCREENSHOT_OPTIMIZE_PNG", "true").lower() == "true"
+# Variantes ajoutées au ZIP à côté des PNG: "jpeg", "webp" (séparées par des virgules)
+SCREENSHOT_VARIANTS = tuple(
+    variant.strip().lower() for variant in os.environ.get("SCREENSHOT_VARIANTS", "").split(",") if variant.strip()
+)
+# Largeur des miniatures (0 = pas de miniatures)
+SCREENSHOT_THUMBNAIL_WIDTH = int(os.environ.get("SCREENSHOT_THUMBNAIL_WIDTH", "0"))
+SCREENSHOT_JPEG_QUALITY = int(os.environ.get("SCREENSHOT_JPEG_QUALITY", "90"))
+SCREENSHOT_WEBP_QUALITY = int(os.environ.get("SCREENSHOT_WEBP_QUALITY", "85"))
+SCREENSHOT_PROCESSING_TIMEOUT_SECONDS = float(os.environ.get("SCREENSHOT_PROCESSING_TIMEOUT_SECONDS", "120"))
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Chunks sans effet sur le rendu (texte, date)
+_DROPPED_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"tIME"}
+_VARIANT_EXTENSIONS = {"jpeg": "jpg", "webp": "webp"}
+
+
+@dataclass(frozen=True)
+class ProcessingOptions:
+    optimize_png: bool = SCREENSHOT_OPTIMIZE_PNG
+    variants: Tuple[str, ...] = SCREENSHOT_VARIANTS
+    thumbnail_width: int = SCREENSHOT_THUMBNAIL_WIDTH
+    jpeg_quality: int = SCREENSHOT_JPEG_QUALITY
+    webp_quality: int = SCREENSHOT_WEBP_QUALITY
+
+    @property
+    def has_variants(self) -> bool:
+        return bool(self.variants) or self.thumbnail_width > 0
+
+
+@dataclass
+class StageStats:
+    """Coût d'une étape pour un screenshot"""
+    stage: str
+    input_bytes: int
+    output_bytes: int
+    cpu_ms: float
+    skipped: Optional[str] = None
+
+
+@dataclass
+class ProcessedScreenshot:
+    png: bytes
+    # Fichiers supplémentaires du ZIP (chemin -> contenu)
+    variants: Dict[str, bytes] = field(default_factory=dict)
+    stages: List[StageStats] = field(default_factory=list)
+
+
+# ---------- PNG ----------
+
+def _iter_chunks(data: bytes) -> Iterator[Tuple[bytes, bytes]]:
+    offset = len(PNG_SIGNATURE)
+    while offset < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[offset:offset + 8])
+        yield chunk_type, data[offset + 8:offset + 8 + length]
+        offset += 12 + length
+        if chunk_type == b"IEND":
+            return
+    raise ValueError("PNG tronqué (IEND manquant)")
+
+
+def _chunk(chunk_type: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", zlib.crc32(chunk_type + body))
+
+
+def optimize_png(data: bytes) -> bytes:
+    """
+    Recompresse un PNG sans perte (zlib niveau 9, meilleure des stratégies) et retire
+    les métadonnées; les pixels décodés sont identiques. Retourne l'entrée si rien n'est gagné.
+    """
+    if not data.startswith(PNG_SIGNATURE):
+        return data
+    try:
+        chunks = list(_iter_chunks(data))
+        raw = zlib.decompress(b"".join(body for chunk_type, body in chunks if chunk_type == b"IDAT"))
+    except (ValueError, struct.error, zlib.error):
+        return data
+
+    candidates = []
+    for strategy in (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+        candidates.append(compressor.compress(raw) + compressor.flush())
+    idat = min(candidates, key=len)
+
+    output = [PNG_SIGNATURE]
+    idat_written = False
+    for chunk_type, body in chunks:
+        if chunk_type == b"IDAT":
+            if not idat_written:
+                output.append(_chunk(b"IDAT", idat))
+                idat_written = True
+        elif chunk_type not in _DROPPED_CHUNKS:
+            output.append(_chunk(chunk_type, body))
+    optimized = b"".join(output)
+    return optimized if len(optimized) < len(data) else data
+
+
+def _opaque_rgb(image: "Image.Image") -> "Image.Image":
+    """Image RGB sans transparence (fond blanc), exigée par les stores"""
+    if image.mode in ("RGBA", "LA", "P") or "transparency" in image.info:
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _optimize_png_pillow(data: bytes) -> bytes:
+    """Supprime un canal alpha entièrement opaque, puis recompresse; retourne l'entrée si rien n'est gagné"""
+    with Image.open(io.BytesIO(data)) as image:
+        if image.mode != "RGBA" or image.getchannel("A").getextrema() != (255, 255):
+            return data
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, "PNG", optimize=True)
+    optimized = optimize_png(buffer.getvalue())
+    return optimized if len(optimized) < len(data) else data
+
+
+def _encode(image: "Image.Image", variant: str, options: ProcessingOptions) -> bytes:
+    buffer = io.BytesIO()
+    if variant == "jpeg":
+        image.save(buffer, "JPEG", quality=options.jpeg_quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, "WEBP", quality=options.webp_quality, method=4)
+    return buffer.getvalue()
+
+
+# ---------- étapes ----------
+
+def process_screenshot(
+    filename: str,
+    png: bytes,
+    options: ProcessingOptions,
+    optimize: bool = True
+) -> ProcessedScreenshot:
+    """
+    Post-traite un screenshot (exécuté dans un processus du pool: arguments picklables)
+
+    Args:
+        filename: Chemin du PNG dans le ZIP (les variantes sont nommées d'après lui)
+        optimize: Optimiser le PNG (False pour un PNG déjà optimisé, servi depuis le cache)
+    """
+    result = ProcessedScreenshot(png=png)
+
+    def run_stage(stage: str, input_bytes: int, work):
+        started = time.thread_time()
+        output = work()
+        cpu_ms = round((time.thread_time() - started) * 1000, 1)
+        result.stages.append(StageStats(stage, input_bytes, len(output), cpu_ms))
+        return output
+
+    if optimize and options.optimize_png:
+        result.png = run_stage("png", len(png), lambda: optimize_png(png))
+        if HAS_PIL:
+            optimized = result.png
+            result.png = run_stage("png_alpha", len(optimized), lambda: _optimize_png_pillow(optimized))
+
+    if not options.has_variants:
+        return result
+    if not HAS_PIL:
+        result.stages.append(StageStats("variants", len(result.png), 0, 0.0, skipped="Pillow non installé"))
+        return result
+
+    stem = filename.rsplit(".", 1)[0]
+    started = time.thread_time()
+    with Image.open(io.BytesIO(result.png)) as image:
+        rgb = _opaque_rgb(image)
+    decode_ms = round((time.thread_time() - started) * 1000, 1)
+    result.stages.append(StageStats("decode", len(result.png), rgb.width * rgb.height * 3, decode_ms))
+
+    for variant in options.variants:
+        if variant not in _VARIANT_EXTENSIONS:
+            continue
+        result.variants[f"{stem}.{_VARIANT_EXTENSIONS[variant]}"] = run_stage(
+            variant, len(result.png), lambda: _encode(rgb, variant, options)
+        )
+
+    if options.thumbnail_width > 0 and rgb.width > options.thumbnail_width:
+        def thumbnail() -> bytes:
+            small = rgb.resize(
+                (options.thumbnail_width, round(rgb.height * options.thumbnail_width / rgb.width)),
+                Image.LANCZOS
+            )
+            return _encode(small, "jpeg", options)
+
+        result.variants[f"thumbnails/{stem}.jpg"] = run_stage("thumbnail", len(result.png), thumbnail)
+    return result
+
+
+async def process_screenshots(
+    screenshots: Dict[str, bytes],
+    options: ProcessingOptions,
+    optimize: Iterable[str] = (),
+    executor=None
+) -> Dict[str, ProcessedScreenshot]:
+    """
+    Post-traite des screenshots en parallèle dans le pool de processus partagé
+
+    Args:
+        screenshots: PNG par chemin dans le ZIP
+        optimize: Chemins dont le PNG doit être optimisé (captures fraîches)
+        executor: TaskExecutor (par défaut l'exécuteur partagé)
+
+    Returns:
+        Résultats par chemin; vide si le pool échoue (les PNG bruts restent utilisables)
+    """
+    optimize = set(optimize)
+    pending = {
+        name: png for name, png in screenshots.items()
+        if (options.optimize_png and name in optimize) or options.has_variants
+    }
+    if not pending:
+        return {}
+
+    executor = executor or get_task_executor()
+    futures = [
+        executor.submit(process_screenshot, name, png, options, name in optimize)
+        for name, png in pending.items()
+    ]
+    try:
+        results = await executor.wait(futures, timeout=SCREENSHOT_PROCESSING_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.warning(f"⚠️ Post-traitement des screenshots abandonné, PNG bruts conservés: {e}")
+        return {}
+    return dict(zip(pending, results))
+
+
+def summarize_stages(processed: Dict[str, ProcessedScreenshot]) -> Dict[str, Dict[str, float]]:
+    """Totaux par étape (nombre, octets en entrée / sortie, temps CPU)"""
+    totals: Dict[str, Dict[str, float]] = {}
+    for result in processed.values():
+        for stats in result.stages:
+            if stats.skipped:
+                continue
+            total = totals.setdefault(stats.stage, {"count": 0, "input_bytes": 0, "output_bytes": 0, "cpu_ms": 0.0})
+            total["count"] += 1
+            total["input_bytes"] += stats.input_bytes
+            total["output_bytes"] += stats.output_bytes
+            total["cpu_ms"] = round(total["cpu_ms"] + stats.cpu_ms, 1)
+    return totals
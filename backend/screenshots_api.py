@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 # ✅ Définir le logger
@@ -5,8 +6,9 @@ logger = logging.getLogger(__name__)
 
 # Maintenant on peut importer les autres modules
 from fastapi import APIRouter, HTTPException, Query, Depends
-from fastapi.responses import Response
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pathlib import Path
 from typing import Literal, List, Optional
 
 router = APIRouter()
@@ -53,13 +55,62 @@ async def get_user_id_from_token(credentials: Optional[HTTPAuthorizationCredenti
         logger.warning(f"Error in get_user_id_from_token: {e}")
         return None
 
+def _generation_error(e: Exception, base_url: str) -> HTTPException:
+    """Traduit une erreur de génération en réponse HTTP"""
+    from browser_pool import BrowserPoolBusy
+
+    if isinstance(e, BrowserPoolBusy):
+        logger.warning(f"⏳ Pool de navigateurs saturé: {e}")
+        return HTTPException(
+            status_code=503,
+            detail="Trop de générations de screenshots en cours. Réessayez dans quelques instants.",
+            headers={"Retry-After": "30"}
+        )
+
+    logger.error(f"Erreur lors de la génération de screenshots: {e}", exc_info=True)
+
+    # Messages d'erreur plus détaillés
+    error_message = str(e)
+
+    if "Playwright" in error_message or "chromium" in error_message:
+        return HTTPException(
+            status_code=500,
+            detail="Playwright non configuré. Exécutez: playwright install chromium"
+        )
+    elif "timeout" in error_message.lower():
+        return HTTPException(
+            status_code=500,
+            detail=f"Timeout lors de l'accès à {base_url}. Vérifiez que l'URL est accessible."
+        )
+    elif "connect" in error_message.lower() or "network" in error_message.lower():
+        return HTTPException(
+            status_code=500,
+            detail=f"Impossible de se connecter à {base_url}. Vérifiez que l'URL est correcte et accessible."
+        )
+    return HTTPException(
+        status_code=500,
+        detail=f"Erreur lors de la génération: {error_message}"
+    )
+
+
+def _zip_response(path: Path, file_name: str) -> FileResponse:
+    """ZIP du job servi en streaming depuis le disque"""
+    return FileResponse(
+        path,
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={file_name}"}
+    )
+
+
 @router.post("/projects/{project_id}/screenshots/generate")
 async def generate_screenshots(
     project_id: str,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     store: Literal["android", "ios", "both"] = Query("both"),
     auto_discover: bool = Query(True),
-    urls: Optional[List[str]] = Query(None)
+    urls: Optional[List[str]] = Query(None),
+    refresh: bool = Query(False),
+    wait: bool = Query(False)
 ):
     """
     Génère les screenshots pour les stores
@@ -69,6 +120,8 @@ async def generate_screenshots(
         store: Store cible (android, ios, both)
         auto_discover: Découvrir automatiquement les pages
         urls: Liste d'URLs spécifiques (optionnel)
+        refresh: Recapturer sans utiliser le cache des screenshots
+        wait: Attendre le ZIP dans la réponse (opt-in); par défaut 202 avec l'URL de suivi du job
     """
     try:
         from main import get_supabase_client, DEV_MODE
@@ -116,66 +169,49 @@ async def generate_screenshots(
                 detail="Module screenshot_generator introuvable. Vérifiez que le fichier existe."
             )
         
-        # Utiliser le générateur de screenshots
-        try:
-            from screenshot_generator import generate_screenshots_async
-            
-            logger.info(f"Génération de screenshots pour {base_url} (store: {store})")
-            
-            # Générer les screenshots
-            zip_bytes = await generate_screenshots_async(
+        # Générer les screenshots dans un job en arrière-plan
+        from screenshot_generator import generate_screenshots_to_file
+        from screenshot_jobs import JOB_COMPLETED, get_screenshot_jobs, job_fingerprint
+        
+        logger.info(f"Génération de screenshots pour {base_url} (store: {store})")
+        
+        async def generate(output_path, progress, report):
+            return await generate_screenshots_to_file(
+                output_path,
                 base_url=base_url,
                 pages=urls,
                 store=store,
-                auto_discover=auto_discover
-            )
-            
-            if not zip_bytes or len(zip_bytes) == 0:
-                logger.error("Le ZIP généré est vide")
-                raise HTTPException(
-                    status_code=500,
-                    detail="Aucun screenshot généré. Vérifiez que l'URL est accessible."
-                )
-            
-            logger.info(f"Screenshots générés avec succès ({len(zip_bytes)} bytes)")
-            
-            # Retourner le ZIP
-            return Response(
-                content=zip_bytes,
-                media_type="application/zip",
-                headers={
-                    "Content-Disposition": f"attachment; filename=screenshots_{project_name.replace(' ', '_')}_{store}.zip"
-                }
+                auto_discover=auto_discover,
+                refresh=refresh,
+                progress=progress,
+                report=report
             )
-            
-        except HTTPException:
-            raise
+        
+        jobs = get_screenshot_jobs()
+        job = await jobs.start(
+            project_id, user_id, store, generate,
+            file_name=f"screenshots_{project_name.replace(' ', '_')}_{store}.zip",
+            fingerprint=job_fingerprint(base_url=base_url, urls=urls, auto_discover=auto_discover, refresh=refresh)
+        )
+        
+        if not wait:
+            return JSONResponse(status_code=202, content=job.to_dict())
+        
+        try:
+            job = await jobs.wait(job.job_id)
         except Exception as e:
-            logger.error(f"Erreur lors de la génération de screenshots: {e}", exc_info=True)
-            
-            # Messages d'erreur plus détaillés
-            error_message = str(e)
-            
-            if "Playwright" in error_message or "chromium" in error_message:
-                raise HTTPException(
-                    status_code=500,
-                    detail="Playwright non configuré. Exécutez: playwright install chromium"
-                )
-            elif "timeout" in error_message.lower():
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Timeout lors de l'accès à {base_url}. Vérifiez que l'URL est accessible."
-                )
-            elif "connect" in error_message.lower() or "network" in error_message.lower():
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Impossible de se connecter à {base_url}. Vérifiez que l'URL est correcte et accessible."
-                )
-            else:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Erreur lors de la génération: {error_message}"
-                )
+            raise _generation_error(e, base_url)
+        
+        if job is None or job.status != JOB_COMPLETED:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Erreur lors de la génération: {job.error if job else 'job introuvable'}"
+            )
+        
+        logger.info(f"Screenshots générés avec succès ({job.size} bytes)")
+        
+        # Retourner le ZIP
+        return _zip_response(jobs.result_path(job.job_id), job.file_name)
         
     except HTTPException:
         raise
@@ -183,6 +219,58 @@ async def generate_screenshots(
         logger.error(f"Erreur génération screenshots: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/screenshots/jobs/{job_id}")
+async def get_screenshot_job(
+    job_id: str,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+):
+    """Retourne l'état et la progression d'un job de screenshots"""
+    from screenshot_jobs import get_screenshot_jobs
+    
+    user_id = await get_user_id_from_token(credentials)
+    
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    job = await asyncio.to_thread(get_screenshot_jobs().get, job_id)
+    
+    if not job or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Job non trouvé")
+    
+    return job.to_dict()
+
+@router.get("/screenshots/jobs/{job_id}/download")
+async def download_screenshot_job(
+    job_id: str,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+):
+    """Télécharge le ZIP d'un job terminé"""
+    from screenshot_jobs import JOB_COMPLETED, JOB_FAILED, get_screenshot_jobs
+    
+    user_id = await get_user_id_from_token(credentials)
+    
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    jobs = get_screenshot_jobs()
+    job = await asyncio.to_thread(jobs.get, job_id)
+    
+    if not job or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Job non trouvé")
+    
+    if job.status == JOB_FAILED:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la génération: {job.error}")
+    
+    if job.status != JOB_COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job en cours ({job.status})")
+    
+    path = jobs.result_path(job_id)
+    
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Résultat expiré")
+    
+    return _zip_response(path, job.file_name or f"screenshots_{job.project_id}_{job.store}.zip")
+
 @router.get("/projects/{project_id}/screenshots/status")
 async def get_screenshot_status(
     project_id: str,
@@ -217,15 +305,27 @@ async def get_screenshot_status(
         # Vérifier si Playwright est disponible
         try:
             from screenshot_generator import HAS_PLAYWRIGHT
+            from browser_pool import get_browser_pool
+            from screenshot_cache import get_screenshot_cache
+            from screenshot_jobs import get_screenshot_jobs
             playwright_available = HAS_PLAYWRIGHT
+            browser_pool = get_browser_pool().status()
+            screenshot_cache = get_screenshot_cache().status()
+            latest_job = await asyncio.to_thread(get_screenshot_jobs().latest, project_id, user_id)
         except ImportError:
             playwright_available = False
+            browser_pool = None
+            screenshot_cache = None
+            latest_job = None
         
         return {
             "status": "ready" if playwright_available else "unavailable",
             "project_id": project_id,
             "available_stores": ["android", "ios"],
             "playwright_installed": playwright_available,
+            "browser_pool": browser_pool,
+            "screenshot_cache": screenshot_cache,
+            "latest_job": latest_job.to_dict() if latest_job else None,
             "message": "Playwright est installé et prêt" if playwright_available else "Installez Playwright avec: pip install playwright && playwright install chromium"
         }
     except HTTPException:
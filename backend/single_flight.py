@@ -0,0 +1,109 @@
+"""
+Coalescence des travaux identiques en cours (single-flight)
+Le premier appel pour une clé lance le travail; les appels concurrents pour la même clé
+attendent le même résultat au lieu de relancer (ex: une recompilation Gradle par build).
+Optionnellement, le dernier échec d'une clé reste consultable un temps (failure_ttl_seconds)
+pour les demandeurs qui suivent le travail sans l'attendre.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Un seul travail en cours par clé, partagé par tous les demandeurs du processus"""
+
+    def __init__(self, name: str = "single-flight", failure_ttl_seconds: float = 0):
+        self.name = name
+        self.failure_ttl_seconds = failure_ttl_seconds
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._started_at: Dict[str, float] = {}
+        self._waiters: Dict[str, int] = {}
+        self._info: Dict[str, Dict[str, Any]] = {}
+        # Dernier échec par clé: (expire_at, détail)
+        self._failures: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    def in_flight(self, key: str) -> bool:
+        task = self._tasks.get(key)
+        return task is not None and not task.done()
+
+    def start(self, key: str, factory: Callable[[], Awaitable[Any]], **info: Any) -> asyncio.Task:
+        """Retourne le travail en cours pour la clé, ou le lance (info: exposé par status())"""
+        task = self._tasks.get(key)
+        if task is not None and not task.done():
+            return task
+
+        task = asyncio.ensure_future(factory())
+        self._failures.pop(key, None)
+        self._tasks[key] = task
+        self._started_at[key] = time.time()
+        self._waiters[key] = 0
+        self._info[key] = info
+        logger.info(f"🚀 {self.name}: démarrage pour {key}")
+
+        def _forget(done: asyncio.Task):
+            info = self._info.get(key, {})
+            if self._tasks.get(key) is done:
+                del self._tasks[key]
+                self._started_at.pop(key, None)
+                self._waiters.pop(key, None)
+                self._info.pop(key, None)
+            if not done.cancelled() and done.exception() is not None:
+                logger.warning(f"⚠️ {self.name}: échec pour {key}: {done.exception()}")
+                if self.failure_ttl_seconds > 0:
+                    self._record_failure(key, done.exception(), info)
+
+        task.add_done_callback(_forget)
+        return task
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]], **info: Any) -> Any:
+        """
+        Attend le travail partagé pour la clé
+        Un demandeur qui abandonne (client déconnecté) n'annule pas le travail des autres.
+        """
+        task = self.start(key, factory, **info)
+        if self._waiters.get(key, 0) > 0:
+            logger.info(f"🔗 {self.name}: {key} déjà en cours, attente du résultat partagé")
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if key in self._waiters and self._tasks.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _record_failure(self, key: str, error: BaseException, info: Dict[str, Any]):
+        now = time.time()
+        for expired in [k for k, (expire_at, _) in self._failures.items() if expire_at <= now]:
+            del self._failures[expired]
+        self._failures[key] = (now + self.failure_ttl_seconds, {
+            "failed_at": now,
+            "error": str(getattr(error, "detail", None) or error),
+            **info,
+        })
+
+    def last_failure(self, key: str) -> Optional[Dict[str, Any]]:
+        """Dernier échec de la clé (None si aucun, expiré, ou si un nouveau travail a démarré)"""
+        failure = self._failures.get(key)
+        if failure is None:
+            return None
+        expire_at, detail = failure
+        if time.time() >= expire_at:
+            del self._failures[key]
+            return None
+        return detail
+
+    def status(self, key: str) -> Optional[Dict[str, Any]]:
+        """Progression d'un travail en cours (None si aucun)"""
+        if not self.in_flight(key):
+            return None
+        started_at = self._started_at.get(key, time.time())
+        return {
+            "in_progress": True,
+            "started_at": started_at,
+            "elapsed_seconds": round(time.time() - started_at, 1),
+            "waiters": self._waiters.get(key, 0),
+            **self._info.get(key, {}),
+        }
@@ -0,0 +1,257 @@
+"""
+Service d'exécution partagé pour le travail bloquant (génération de projets, compilation APK)
+- Pool de processus borné et réutilisé pour les tâches courtes (génération des ZIP); une
+  tâche bloquée fait remplacer le pool, l'ancien n'est tué qu'une fois les autres tâches finies
+- Processus dédié par tâche longue (compilation Gradle), en nombre borné, avec un timeout
+  qui tue le processus enfant et tout son groupe (Gradle, aapt, ...)
+Aucune de ces tâches ne tourne sur l'event loop: une compilation lente ne bloque pas l'API.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import weakref
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Processus du pool partagé (tâches courtes, CPU-bound)
+POOL_WORKERS = int(os.environ.get("POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Compilations simultanées (chacune lance sa propre JVM Gradle)
+BUILD_WORKERS = int(os.environ.get("BUILD_WORKERS", "2"))
+# Timeout d'une compilation: reste sous le timeout global de process_build_with_timeout (15 min)
+BUILD_TIMEOUT_SECONDS = float(os.environ.get("BUILD_TIMEOUT_SECONDS", "840"))
+# Timeout par défaut d'une tâche du pool
+POOL_TASK_TIMEOUT_SECONDS = float(os.environ.get("POOL_TASK_TIMEOUT_SECONDS", "120"))
+
+# Les processus dédiés démarrent en "spawn": pas d'héritage de l'event loop ni des threads
+_mp_context = multiprocessing.get_context("spawn")
+
+
+class TaskTimeoutError(Exception):
+    """Tâche interrompue après expiration de son timeout"""
+
+
+def _isolated_entry(conn, func: Callable, args: tuple):
+    """Point d'entrée du processus dédié: exécute la tâche et renvoie (ok, résultat)"""
+    if hasattr(os, "setsid"):
+        # Groupe de processus propre pour pouvoir tuer les sous-processus (Gradle) avec lui
+        os.setsid()
+    # Processus "spawn": la configuration de logging du serveur n'est pas héritée
+    logging.basicConfig(
+        level=getattr(logging, os.environ.get("LOG_LEVEL", "INFO").upper(), logging.INFO),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    try:
+        result = func(*args)
+        conn.send((True, result))
+    except BaseException as e:
+        try:
+            conn.send((False, e))
+        except Exception:
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+    finally:
+        conn.close()
+
+
+def _receive_result(conn):
+    """Attend le résultat du processus dédié (exécuté dans un thread)"""
+    try:
+        return conn.recv()
+    except (EOFError, OSError):
+        return False, RuntimeError("Le processus de la tâche s'est arrêté sans résultat")
+
+
+def _kill_process_tree(process):
+    """Tue le processus dédié et son groupe"""
+    if process.pid is None:
+        return
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        process.kill()
+    process.join(5)
+
+
+class TaskExecutor:
+    """Exécuteur partagé: pool de processus + processus dédiés avec timeout"""
+
+    def __init__(self, pool_workers: Optional[int] = None, isolated_workers: Optional[int] = None):
+        self.pool_workers = max(1, pool_workers or POOL_WORKERS)
+        self.isolated_workers = max(1, isolated_workers or BUILD_WORKERS)
+        self._pool: Optional[Executor] = None
+        # Tâches soumises et pas encore terminées, par pool
+        self._inflight: Dict[Executor, Set[Future]] = {}
+        # Pools remplacés après un timeout -> tâches bloquées qu'ils exécutent encore
+        self._retired: Dict[Executor, Set[Future]] = {}
+        self._origins: "weakref.WeakKeyDictionary[asyncio.Future, Tuple[Executor, Future]]" = weakref.WeakKeyDictionary()
+        self._lock = threading.RLock()
+        self._isolated_slots = asyncio.Semaphore(self.isolated_workers)
+        self._isolated_processes: Set[Any] = set()
+
+    # ---------- pool partagé ----------
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            try:
+                self._pool = ProcessPoolExecutor(max_workers=self.pool_workers)
+                logger.info(f"✅ Pool de processus démarré ({self.pool_workers} processus)")
+            except (OSError, NotImplementedError) as e:
+                # Environnements sans multiprocessing: on garde au moins l'event loop libre
+                logger.warning(f"⚠️ ProcessPoolExecutor indisponible ({e}), repli sur des threads")
+                self._pool = ThreadPoolExecutor(max_workers=self.pool_workers, thread_name_prefix="tasks")
+        return self._pool
+
+    def _reset_pool(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _task_done(self, pool: Executor, future: Future):
+        with self._lock:
+            inflight = self._inflight.get(pool)
+            if inflight is not None:
+                inflight.discard(future)
+                if not inflight and pool is not self._pool:
+                    del self._inflight[pool]
+            self._recycle_if_idle(pool)
+
+    def _retire(self, futures: Iterable["asyncio.Future"]):
+        """
+        Abandonne des tâches du pool au-delà de leur timeout: leur pool est remplacé pour les
+        nouvelles tâches, les autres tâches en cours y terminent normalement
+        """
+        with self._lock:
+            for future in futures:
+                pool, origin = self._origins.get(future, (None, None))
+                if pool is None or origin.done():
+                    continue
+                self._retired.setdefault(pool, set()).add(origin)
+                if pool is self._pool:
+                    self._pool = None
+                    pool.shutdown(wait=False)
+            for pool in list(self._retired):
+                self._recycle_if_idle(pool)
+
+    def _recycle_if_idle(self, pool: Executor):
+        """Tue les workers d'un pool remplacé quand il n'exécute plus que des tâches bloquées"""
+        stuck = self._retired.get(pool)
+        if stuck is None or self._inflight.get(pool, set()) - stuck:
+            return
+        del self._retired[pool]
+        self._inflight.pop(pool, None)
+        # Un worker bloqué ne rend jamais la main; les autres workers sont inactifs
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"♻️ Ancien pool de processus arrêté ({len(stuck)} tâche(s) bloquée(s))")
+
+    def submit(self, func: Callable, *args) -> "asyncio.Future":
+        """Soumet une tâche courte au pool partagé"""
+        with self._lock:
+            pool = self._get_pool()
+            future = pool.submit(func, *args)
+            self._inflight.setdefault(pool, set()).add(future)
+        future.add_done_callback(lambda done: self._task_done(pool, done))
+        wrapped = asyncio.wrap_future(future)
+        self._origins[wrapped] = (pool, future)
+        return wrapped
+
+    async def wait(self, futures: Iterable["asyncio.Future"], timeout: Optional[float] = POOL_TASK_TIMEOUT_SECONDS) -> List[Any]:
+        """
+        Attend des tâches du pool
+
+        Raises:
+            TaskTimeoutError: timeout dépassé (le pool est remplacé, sans interrompre les
+                autres tâches; le worker bloqué est tué ensuite)
+            BrokenProcessPool: un worker est mort (le pool est réinitialisé)
+        """
+        futures = list(futures)
+        try:
+            return await asyncio.wait_for(asyncio.gather(*futures), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"❌ Tâche du pool au-delà de {timeout}s, pool remplacé")
+            self._retire(futures)
+            raise TaskTimeoutError(f"Task exceeded {timeout}s")
+        except BrokenProcessPool:
+            logger.error("❌ Pool de processus cassé (worker mort), réinitialisation")
+            with self._lock:
+                self._reset_pool()
+            raise
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = POOL_TASK_TIMEOUT_SECONDS) -> Any:
+        """Exécute une tâche courte dans le pool partagé"""
+        results = await self.wait([self.submit(func, *args)], timeout)
+        return results[0]
+
+    # ---------- processus dédiés ----------
+
+    async def run_isolated(self, func: Callable, *args, timeout: Optional[float] = BUILD_TIMEOUT_SECONDS) -> Any:
+        """
+        Exécute une tâche longue dans un processus dédié (func et args doivent être picklables)
+
+        Raises:
+            TaskTimeoutError: timeout dépassé, le processus et ses enfants ont été tués
+            Exception: exception levée par la tâche
+        """
+        async with self._isolated_slots:
+            loop = asyncio.get_running_loop()
+            parent_conn, child_conn = _mp_context.Pipe(duplex=False)
+            process = _mp_context.Process(target=_isolated_entry, args=(child_conn, func, args))
+            await loop.run_in_executor(None, process.start)
+            child_conn.close()
+            self._isolated_processes.add(process)
+
+            try:
+                receiving = loop.run_in_executor(None, _receive_result, parent_conn)
+                try:
+                    ok, payload = await asyncio.wait_for(asyncio.shield(receiving), timeout)
+                except asyncio.TimeoutError:
+                    logger.error(f"❌ Tâche {getattr(func, '__name__', func)} au-delà de {timeout}s, processus tué")
+                    _kill_process_tree(process)
+                    await receiving
+                    raise TaskTimeoutError(f"Task exceeded {timeout}s")
+                except asyncio.CancelledError:
+                    _kill_process_tree(process)
+                    raise
+            finally:
+                self._isolated_processes.discard(process)
+                parent_conn.close()
+                await loop.run_in_executor(None, process.join, 5)
+
+            if not ok:
+                raise payload
+            return payload
+
+    def shutdown(self, wait: bool = True):
+        """Arrête le pool et tue les processus dédiés encore actifs (shutdown de l'application)"""
+        for process in list(self._isolated_processes):
+            _kill_process_tree(process)
+        self._isolated_processes.clear()
+        with self._lock:
+            for pool in list(self._retired):
+                self._retired[pool] = set(self._inflight.get(pool, ()))
+                self._recycle_if_idle(pool)
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+                self._pool = None
+            self._inflight.clear()
+
+
+# Instance globale
+_task_executor: Optional[TaskExecutor] = None
+
+
+def get_task_executor() -> TaskExecutor:
+    """Récupère l'exécuteur partagé (singleton)"""
+    global _task_executor
+    if _task_executor is None:
+        _task_executor = TaskExecutor()
+    return _task_executor
@@ -0,0 +1,166 @@
+"""
+Cache des versions web des projets, pour /projects/{id}/version/check
+Chaque app native installée interroge cet endpoint au lancement: la ligne utile du projet
+(version, activation, URL) est gardée en mémoire avec un TTL, les lectures concurrentes
+d'un même projet absent du cache sont regroupées en une seule requête DB, et
+update_project invalide l'entrée. Les autres workers voient le changement au plus tard
+après le TTL.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+VERSION_CACHE_TTL_SECONDS = float(os.environ.get("VERSION_CACHE_TTL_SECONDS", "30"))
+VERSION_CACHE_MAX_ENTRIES = int(os.environ.get("VERSION_CACHE_MAX_ENTRIES", "50000"))
+# Durée de réutilisation des réponses par le client (Cache-Control: private, max-age)
+VERSION_CHECK_MAX_AGE = int(os.environ.get("VERSION_CHECK_MAX_AGE", "60"))
+
+# Colonnes lues en DB (au lieu de la ligne complète)
+VERSION_COLUMNS = "id,user_id,web_app_version,version_check_enabled,web_url"
+
+
+@dataclass(frozen=True)
+class ProjectVersion:
+    """Champs du projet nécessaires à la vérification de version"""
+    project_id: str
+    user_id: Optional[str]
+    web_app_version: Optional[str]
+    version_check_enabled: bool = True
+    web_url: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: dict) -> "ProjectVersion":
+        enabled = row.get("version_check_enabled")
+        return cls(
+            project_id=row["id"],
+            user_id=row.get("user_id"),
+            web_app_version=row.get("web_app_version"),
+            version_check_enabled=True if enabled is None else bool(enabled),
+            web_url=row.get("web_url")
+        )
+
+    def fingerprint(self, current_version: Optional[str] = None) -> str:
+        """Empreinte des champs renvoyés (le timestamp de la réponse n'en fait pas partie)"""
+        key = "\x1f".join([
+            self.web_app_version or "",
+            "1" if self.version_check_enabled else "0",
+            self.web_url or "",
+            current_version or ""
+        ])
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+    def etag(self, current_version: Optional[str] = None) -> str:
+        """ETag faible de la réponse de /version/check"""
+        return f'W/"{self.fingerprint(current_version)}"'
+
+
+# Marqueur des projets inexistants (mis en cache aussi: apps d'un projet supprimé)
+_MISSING = object()
+
+
+class ProjectVersionCache:
+    """Cache TTL + LRU des versions de projet, partagé par toutes les requêtes du processus"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = VERSION_CACHE_TTL_SECONDS,
+        max_entries: int = VERSION_CACHE_MAX_ENTRIES
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loads = SingleFlight("version-cache")
+        # Incrémenté à chaque invalidation: une lecture DB lancée avant n'est pas mise en cache.
+        # Utile seulement pendant une lecture: supprimé quand le projet n'en a plus en cours
+        self._generations: dict = {}
+        self._pending: dict = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, project_id: str):
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() > expires_at:
+                del self._entries[project_id]
+                return None
+            self._entries.move_to_end(project_id)
+            return value
+
+    def _store(self, project_id: str, value):
+        with self._lock:
+            self._entries[project_id] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(project_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get(
+        self,
+        project_id: str,
+        loader: Callable[[str], Awaitable[Optional[ProjectVersion]]]
+    ) -> Optional[ProjectVersion]:
+        """
+        Version du projet depuis le cache, sinon via loader (un seul appel par projet à la fois)
+
+        Returns:
+            ProjectVersion, ou None si le projet n'existe pas
+        """
+        value = self._lookup(project_id)
+        if value is not None:
+            self.hits += 1
+            return None if value is _MISSING else value
+
+        self.misses += 1
+        with self._lock:
+            generation = self._generations.get(project_id, 0)
+            self._pending[project_id] = self._pending.get(project_id, 0) + 1
+
+        async def load():
+            loaded = await loader(project_id)
+            if self._generations.get(project_id, 0) == generation:
+                self._store(project_id, _MISSING if loaded is None else loaded)
+            return loaded
+
+        try:
+            return await self._loads.do(f"{project_id}:{generation}", load)
+        finally:
+            with self._lock:
+                self._pending[project_id] -= 1
+                if not self._pending[project_id]:
+                    del self._pending[project_id]
+                    self._generations.pop(project_id, None)
+
+    def invalidate(self, project_id: str):
+        """À appeler après toute modification (ou suppression) du projet"""
+        with self._lock:
+            self._entries.pop(project_id, None)
+            if project_id in self._pending:
+                self._generations[project_id] = self._generations.get(project_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Instance globale
+_version_cache: Optional[ProjectVersionCache] = None
+
+
+def get_version_cache() -> ProjectVersionCache:
+    """Récupère le cache des versions de projet (singleton par processus)"""
+    global _version_cache
+    if _version_cache is None:
+        _version_cache = ProjectVersionCache()
+    return _version_cache
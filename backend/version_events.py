@@ -0,0 +1,177 @@
+"""
+Notification des nouvelles versions web aux apps natives (Server-Sent Events)
+Les apps restent connectées à /projects/{id}/version/events au lieu d'interroger
+/version/check en boucle. Un seul asyncio.Event par projet est partagé par toutes les
+connexions du worker: une publication réveille tous les abonnés sans état par connexion.
+update_project publie directement sur son worker; les autres workers relisent les projets
+suivis à intervalle régulier (via le cache des versions), une lecture par projet et non
+par connexion.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from version_cache import ProjectVersion
+
+logger = logging.getLogger(__name__)
+
+# Commentaire SSE envoyé aux connexions inactives (proxies, load balancers)
+VERSION_EVENTS_HEARTBEAT_SECONDS = float(os.environ.get("VERSION_EVENTS_HEARTBEAT_SECONDS", "25"))
+# Relecture des projets suivis (changements faits sur un autre worker)
+VERSION_EVENTS_POLL_SECONDS = float(os.environ.get("VERSION_EVENTS_POLL_SECONDS", "15"))
+VERSION_EVENTS_MAX_CONNECTIONS = int(os.environ.get("VERSION_EVENTS_MAX_CONNECTIONS", "20000"))
+# Délai de reconnexion suggéré au client (champ retry de SSE)
+VERSION_EVENTS_RETRY_MS = int(os.environ.get("VERSION_EVENTS_RETRY_MS", "5000"))
+
+_POLL_CONCURRENCY = 8
+
+
+def format_event(data: Dict, event: str = "version", event_id: Optional[str] = None) -> str:
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+def version_payload(version: ProjectVersion, current_version: Optional[str] = None) -> Dict:
+    """Contenu d'un évènement `version` (sans web_url: le flux est public)"""
+    return {
+        "project_id": version.project_id,
+        "version": version.web_app_version,
+        "version_check_enabled": version.version_check_enabled,
+        "update_available": bool(
+            version.version_check_enabled
+            and version.web_app_version
+            and current_version
+            and current_version != version.web_app_version
+        ),
+    }
+
+
+class _Channel:
+    """Dernière version connue d'un projet et évènement partagé par ses abonnés"""
+    __slots__ = ("version", "event", "subscribers")
+
+    def __init__(self, version: Optional[ProjectVersion]):
+        self.version = version
+        self.event = asyncio.Event()
+        self.subscribers = 0
+
+
+class VersionBroadcastHub:
+    """Diffusion des changements de version aux connexions SSE du processus"""
+
+    def __init__(
+        self,
+        fetch: Optional[Callable[[str], Awaitable[Optional[ProjectVersion]]]] = None,
+        heartbeat_seconds: float = VERSION_EVENTS_HEARTBEAT_SECONDS,
+        poll_seconds: float = VERSION_EVENTS_POLL_SECONDS,
+        max_connections: int = VERSION_EVENTS_MAX_CONNECTIONS,
+        retry_ms: int = VERSION_EVENTS_RETRY_MS
+    ):
+        self.fetch = fetch
+        self.heartbeat_seconds = heartbeat_seconds
+        self.poll_seconds = poll_seconds
+        self.max_connections = max_connections
+        self.retry_ms = retry_ms
+        self._channels: Dict[str, _Channel] = {}
+        self._watcher: Optional[asyncio.Task] = None
+        self._closed = False
+        self.connections = 0
+
+    def has_capacity(self) -> bool:
+        return not self._closed and self.connections < self.max_connections
+
+    def publish(self, project_id: str, version: Optional[ProjectVersion]):
+        """Nouvel état du projet (None: supprimé); réveille les abonnés s'il a changé"""
+        channel = self._channels.get(project_id)
+        if channel is None or channel.version == version:
+            return
+        channel.version = version
+        event, channel.event = channel.event, asyncio.Event()
+        event.set()
+        if channel.subscribers:
+            label = version.web_app_version if version else "supprimé"
+            logger.info(f"📡 Version {label} diffusée à {channel.subscribers} app(s) du projet {project_id}")
+
+    async def subscribe(
+        self,
+        project_id: str,
+        version: ProjectVersion,
+        current_version: Optional[str] = None,
+        last_event_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Flux SSE d'un projet: état courant, puis un évènement par changement et un
+        commentaire de heartbeat pendant les périodes calmes
+
+        Args:
+            version: État lu à la connexion
+            current_version: Version chargée dans l'app (calcul de update_available)
+            last_event_id: En-tête Last-Event-ID d'une reconnexion; l'état courant n'est
+                pas renvoyé s'il correspond déjà
+        """
+        channel = self._channels.get(project_id)
+        if channel is None:
+            channel = self._channels[project_id] = _Channel(version)
+        else:
+            self.publish(project_id, version)
+        channel.subscribers += 1
+        self.connections += 1
+        self._ensure_watcher()
+        try:
+            yield f"retry: {self.retry_ms}\n\n"
+            sent_id = last_event_id
+            while not self._closed:
+                # Capturé avant d'envoyer: une publication pendant l'envoi n'est pas manquée
+                event = channel.event
+                current = channel.version
+                if current is None:
+                    yield format_event({"project_id": project_id}, event="deleted")
+                    return
+                event_id = current.fingerprint()
+                if event_id != sent_id:
+                    yield format_event(version_payload(current, current_version), event_id=event_id)
+                    sent_id = event_id
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+        finally:
+            channel.subscribers -= 1
+            self.connections -= 1
+            if channel.subscribers == 0 and self._channels.get(project_id) is channel:
+                del self._channels[project_id]
+
+    def _ensure_watcher(self):
+        if self.fetch is None or self.poll_seconds <= 0:
+            return
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.ensure_future(self._watch())
+
+    async def _watch(self):
+        """Relit périodiquement les projets ayant des abonnés (changements d'autres workers)"""
+        semaphore = asyncio.Semaphore(_POLL_CONCURRENCY)
+
+        async def refresh(project_id: str):
+            async with semaphore:
+                try:
+                    self.publish(project_id, await self.fetch(project_id))
+                except Exception as e:
+                    logger.warning(f"⚠️ Relecture de la version du projet {project_id} impossible: {e}")
+
+        while self._channels and not self._closed:
+            await asyncio.sleep(self.poll_seconds)
+            await asyncio.gather(*(refresh(project_id) for project_id in list(self._channels)))
+
+    def close(self):
+        """Termine tous les flux (arrêt du worker: les apps se reconnectent ailleurs)"""
+        self._closed = True
+        if self._watcher is not None:
+            self._watcher.cancel()
+        for channel in self._channels.values():
+            channel.event.set()
@@ -0,0 +1,10 @@
+-- Métadonnées des artefacts APK (index des téléchargements)
+-- Exécutez cette requête dans Supabase SQL Editor
+
+-- Hash SHA-256 de l'APK uploadé (utilisé comme ETag / contrôle d'intégrité)
+ALTER TABLE public.builds ADD COLUMN IF NOT EXISTS file_sha256 TEXT;
+
+-- Vérifier que la colonne existe
+SELECT column_name, data_type 
+FROM information_schema.columns 
+WHERE table_name = 'builds' AND column_name = 'file_sha256';
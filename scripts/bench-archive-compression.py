@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Benchmark des politiques de compression des archives générées (CPU vs taille)
+Usage: python scripts/bench-archive-compression.py [iterations]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from generator import NativeTemplateGenerator, COMPRESSION_POLICIES  # noqa: E402
+
+FEATURES = [
+    {"id": feature_id, "name": feature_id, "enabled": True, "config": {}}
+    for feature_id in [
+        "push_notifications", "camera", "geolocation", "biometrics",
+        "qr_scanner", "in_app_purchases", "analytics", "offline_bundling",
+    ]
+]
+
+
+def bench(iterations: int):
+    generator = NativeTemplateGenerator()
+    targets = {
+        "android": lambda policy: generator.generate_android_project(
+            "Bench App", "com.nativiweb.benchapp", "https://example.com", FEATURES, compression=policy
+        ),
+        "ios": lambda policy: generator.generate_ios_project(
+            "Bench App", "com.nativiweb.benchapp", "https://example.com", FEATURES, compression=policy
+        ),
+    }
+
+    print(f"\n📊 Compression des archives générées ({iterations} itérations)\n")
+    print(f"{'plateforme':<10} {'politique':<10} {'taille (KB)':>12} {'ms / archive':>14}")
+    print("-" * 50)
+
+    for platform, generate in targets.items():
+        for policy in COMPRESSION_POLICIES:
+            generate(policy)  # warm-up
+            start = time.perf_counter()
+            for _ in range(iterations):
+                archive = generate(policy)
+            elapsed_ms = (time.perf_counter() - start) * 1000 / iterations
+            print(f"{platform:<10} {policy:<10} {len(archive) / 1024:>12.1f} {elapsed_ms:>14.2f}")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,41 @@
+-- Registre des tokens push des appareils (apps générées)
+-- Exécutez cette requête dans Supabase SQL Editor
+-- Remplace le registre SQLite local: les tokens survivent aux redéploiements et sont
+-- partagés par tous les workers / hôtes
+
+-- Un token par (projet, plateforme, token); supprimé avec son projet
+CREATE TABLE IF NOT EXISTS public.device_tokens (
+  id BIGSERIAL PRIMARY KEY,
+  project_id UUID NOT NULL REFERENCES public.projects(id) ON DELETE CASCADE,
+  platform TEXT NOT NULL CHECK (platform IN ('android', 'ios')),
+  token TEXT NOT NULL,
+  device_id TEXT,
+  app_version TEXT,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  UNIQUE (project_id, platform, token)
+);
+
+-- Topics d'un token (plateforme recopiée pour filtrer / compter sans jointure)
+CREATE TABLE IF NOT EXISTS public.device_token_topics (
+  project_id UUID NOT NULL,
+  topic TEXT NOT NULL,
+  token_id BIGINT NOT NULL REFERENCES public.device_tokens(id) ON DELETE CASCADE,
+  platform TEXT NOT NULL,
+  PRIMARY KEY (project_id, topic, token_id)
+);
+
+-- Index pour la pagination par curseur et les suppressions
+CREATE INDEX IF NOT EXISTS idx_device_tokens_project ON public.device_tokens(project_id, id);
+CREATE INDEX IF NOT EXISTS idx_device_tokens_device ON public.device_tokens(project_id, device_id);
+CREATE INDEX IF NOT EXISTS idx_device_tokens_token ON public.device_tokens(token);
+CREATE INDEX IF NOT EXISTS idx_device_token_topics_token ON public.device_token_topics(token_id);
+
+-- RLS: aucun accès direct, seul le backend (service role) lit et écrit
+ALTER TABLE public.device_tokens ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.device_token_topics ENABLE ROW LEVEL SECURITY;
+
+-- Vérifier que les tables sont créées
+SELECT table_name
+FROM information_schema.tables
+WHERE table_schema = 'public' AND table_name IN ('device_tokens', 'device_token_topics');
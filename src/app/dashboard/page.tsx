@@ -7,7 +7,7 @@ import { useAuth } from '@/context/AuthContext'
 import { DashboardLayout } from '@/components/layout/DashboardLayout'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Button } from '@/components/ui/button'
-import { statsApi, projectsApi, buildsApi } from '@/lib/api'
+import { statsApi, projectsApi, buildsApi, dashboardApi } from '@/lib/api'
 import { logger } from '@/lib/logger'
 import { 
   FolderKanban, 
@@ -59,6 +59,17 @@ export default function DashboardPage() {
 
   const fetchData = useCallback(async () => {
     if (!user?.id) return
+    try {
+      // Une seule requête pour le premier affichage
+      const summary = await dashboardApi.getSummary()
+      setStats(summary.stats)
+      setProjects(summary.projects)
+      setRecentBuilds(summary.recent_builds)
+      setLoading(false)
+      return
+    } catch (error) {
+      logger.error('Failed to fetch dashboard summary', error, { userId: user?.id })
+    }
     try {
       const [statsData, projectsData, buildsData] = await Promise.all([
         statsApi.get().catch(() => null), // Ne pas échouer si stats échoue
@@ -103,6 +103,7 @@ export default function ProjectDetailPage() {
   const [statusBarStyle, setStatusBarStyle] = useState<'light' | 'dark'>('dark')
   const [statusBarColor, setStatusBarColor] = useState('#000000')
   const [generatingScreenshots, setGeneratingScreenshots] = useState(false)
+  const [screenshotProgress, setScreenshotProgress] = useState(0)
   
   // Charger les configs avancées depuis le projet
   useEffect(() => {
@@ -352,6 +353,7 @@ export default function ProjectDetailPage() {
     if (!project || !user?.id) return
     
     setGeneratingScreenshots(true)
+    setScreenshotProgress(0)
     try {
       // Utiliser apiClient pour gérer automatiquement l'authentification
       // Note: apiClient n'est pas exporté, on doit utiliser fetch avec l'URL correcte
@@ -366,23 +368,44 @@ export default function ProjectDetailPage() {
         throw new Error('Not authenticated')
       }
       
+      const headers = { 'Authorization': `Bearer ${currentSession.access_token}` }
+      const readError = async (response: Response, fallback: string) => {
+        const error = await response.json().catch(() => ({ detail: fallback }))
+        return new Error(error.detail || fallback)
+      }
+      
+      // Lancer la génération en arrière-plan (202 + job), puis suivre le job:
+      // aucune requête ne reste ouverte pendant toute la capture (timeouts des proxies)
       const response = await fetch(
-        `${API_URL}/projects/${projectId}/screenshots/generate?store=${store}&auto_discover=true`,
-        {
-          method: 'POST',
-          headers: {
-            'Authorization': `Bearer ${currentSession.access_token}`,
-          },
-        }
+        `${API_URL}/projects/${projectId}/screenshots/generate?store=${store}&auto_discover=true&wait=false`,
+        { method: 'POST', headers }
       )
       
       if (!response.ok) {
-        const error = await response.json().catch(() => ({ detail: 'Failed to generate screenshots' }))
-        throw new Error(error.detail || 'Failed to generate screenshots')
+        throw await readError(response, 'Failed to generate screenshots')
+      }
+      
+      let job = await response.json()
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 2000))
+        const statusResponse = await fetch(`${backendBaseUrl}${job.status_url}`, { headers })
+        if (!statusResponse.ok) {
+          throw await readError(statusResponse, 'Failed to get screenshot job status')
+        }
+        job = await statusResponse.json()
+        setScreenshotProgress(job.progress || 0)
+      }
+      
+      if (job.status !== 'completed' || !job.download_url) {
+        throw new Error(job.error || 'Failed to generate screenshots')
       }
       
       // Télécharger le ZIP
-      const blob = await response.blob()
+      const download = await fetch(`${backendBaseUrl}${job.download_url}`, { headers })
+      if (!download.ok) {
+        throw await readError(download, 'Failed to download screenshots')
+      }
+      const blob = await download.blob()
       const url = window.URL.createObjectURL(blob)
       const a = document.createElement('a')
       a.href = url
@@ -904,7 +927,7 @@ export default function ProjectDetailPage() {
                     <div className="flex items-center gap-2">
                       <Loader2 className="w-4 h-4 animate-spin text-primary" />
                       <p className="text-sm text-muted-foreground">
-                        Génération en cours... Cela peut prendre quelques minutes.
+                        Génération en cours{screenshotProgress > 0 ? ` (${screenshotProgress}%)` : ''}... Cela peut prendre quelques minutes.
                       </p>
                     </div>
                   </div>
@@ -337,6 +337,14 @@ export const statsApi = {
   },
 };
 
+// Dashboard API (compteurs, projets récents et derniers builds en une requête)
+export const dashboardApi = {
+  getSummary: async () => {
+    const response = await apiClient.get('/dashboard/summary');
+    return response.data;
+  },
+};
+
 // Features API
 export const featuresApi = {
   getAll: async () => {
@@ -448,6 +456,7 @@ export default {
   builds: buildsApi,
   apiKeys: apiKeysApi,
   stats: statsApi,
+  dashboard: dashboardApi,
   features: featuresApi,
   admin: adminApi,
 };
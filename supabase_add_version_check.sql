@@ -0,0 +1,15 @@
+-- Script SQL pour ajouter les colonnes de vérification de version à la table projects
+-- À exécuter dans l'éditeur SQL de Supabase
+-- (lues par /projects/{id}/version/check, qui ne sélectionne plus la ligne complète)
+
+-- Ajouter les colonnes web_app_version et version_check_enabled
+ALTER TABLE projects 
+ADD COLUMN IF NOT EXISTS web_app_version TEXT;
+
+ALTER TABLE projects 
+ADD COLUMN IF NOT EXISTS version_check_enabled BOOLEAN DEFAULT TRUE;
+
+-- Mettre à jour les projets existants
+UPDATE projects 
+SET version_check_enabled = TRUE
+WHERE version_check_enabled IS NULL;
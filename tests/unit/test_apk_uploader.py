@@ -0,0 +1,113 @@
+"""
+Unit tests for the resumable (TUS) APK uploader
+"""
+import asyncio
+import hashlib
+
+import httpx
+import pytest
+
+from apk_uploader import ResumableUploader, UploadError
+
+
+class FakeTusServer:
+    """Minimal TUS endpoint keeping the uploaded bytes in memory"""
+
+    def __init__(self, fail_patches=0, partial_first_patch=False):
+        self.data = bytearray()
+        self.length = None
+        self.metadata = None
+        self.fail_patches = fail_patches
+        self.partial_first_patch = partial_first_patch
+        self.patch_sizes = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            self.length = int(request.headers["upload-length"])
+            self.metadata = request.headers["upload-metadata"]
+            return httpx.Response(201, headers={"Location": "/storage/v1/upload/resumable/abc"})
+
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={"Upload-Offset": str(len(self.data))})
+
+        if request.method == "PATCH":
+            if int(request.headers["upload-offset"]) != len(self.data):
+                return httpx.Response(409)
+            body = request.read()
+            if self.partial_first_patch:
+                # The connection drops after half of the chunk was stored
+                self.partial_first_patch = False
+                self.data.extend(body[:len(body) // 2])
+                raise httpx.ReadError("connection reset")
+            if self.fail_patches:
+                self.fail_patches -= 1
+                return httpx.Response(503)
+            self.patch_sizes.append(len(body))
+            self.data.extend(body)
+            return httpx.Response(204, headers={"Upload-Offset": str(len(self.data))})
+
+        return httpx.Response(405)
+
+
+def make_uploader(server, **kwargs):
+    return ResumableUploader(
+        "https://project.supabase.co",
+        "service-key",
+        chunk_size=1024,
+        transport=httpx.MockTransport(server.handler),
+        **kwargs
+    )
+
+
+@pytest.fixture
+def apk_file(tmp_path):
+    payload = bytes(range(256)) * 18  # 4608 bytes -> 5 chunks of 1 KiB
+    path = tmp_path / "app.apk"
+    path.write_bytes(payload)
+    return path, payload
+
+
+@pytest.mark.unit
+class TestResumableUploader:
+    """Test chunked upload, retries and resume"""
+
+    def test_upload_in_chunks(self, apk_file):
+        """Test that the file is sent in chunks and hashed on the way"""
+        path, payload = apk_file
+        server = FakeTusServer()
+        result = asyncio.run(make_uploader(server).upload_file(path, "projects/p/builds/b.apk"))
+
+        assert bytes(server.data) == payload
+        assert server.length == len(payload)
+        assert server.patch_sizes == [1024, 1024, 1024, 1024, 512]
+        assert result.size == len(payload)
+        assert result.sha256 == hashlib.sha256(payload).hexdigest()
+
+    def test_retry_transient_errors(self, apk_file, monkeypatch):
+        """Test that a 503 on a chunk is retried"""
+        monkeypatch.setattr(asyncio, "sleep", _no_sleep)
+        path, payload = apk_file
+        server = FakeTusServer(fail_patches=2)
+        asyncio.run(make_uploader(server).upload_file(path, "b.apk"))
+        assert bytes(server.data) == payload
+
+    def test_resume_from_server_offset(self, apk_file, monkeypatch):
+        """Test that a dropped connection resumes from the confirmed offset"""
+        monkeypatch.setattr(asyncio, "sleep", _no_sleep)
+        path, payload = apk_file
+        server = FakeTusServer(partial_first_patch=True)
+        asyncio.run(make_uploader(server).upload_file(path, "b.apk"))
+        assert bytes(server.data) == payload
+        assert server.patch_sizes[0] == 512
+
+    def test_gives_up_after_max_retries(self, apk_file, monkeypatch):
+        """Test that persistent failures raise UploadError"""
+        monkeypatch.setattr(asyncio, "sleep", _no_sleep)
+        path, _ = apk_file
+        server = FakeTusServer(fail_patches=100)
+        with pytest.raises(UploadError):
+            asyncio.run(make_uploader(server, max_retries=2).upload_file(path, "b.apk"))
+
+
+async def _no_sleep(_delay):
+    return None
@@ -0,0 +1,93 @@
+"""
+Unit tests for the APK artifact index
+"""
+from unittest.mock import MagicMock
+
+import pytest
+
+from artifact_index import ArtifactIndex
+
+
+BUILD_ROW = {
+    "id": "build-1",
+    "user_id": "user-1",
+    "project_id": "project-1",
+    "storage_path": "projects/project-1/builds/build-1.apk",
+    "download_url": "https://storage.example.com/public/apks/projects/project-1/builds/build-1.apk",
+    "file_size": 1234,
+}
+
+
+def make_client(signed_url="https://storage.example.com/sign/build-1.apk?token=abc"):
+    client = MagicMock()
+    client.storage.from_.return_value.create_signed_url.return_value = {
+        "signedURL": signed_url,
+        "signedUrl": signed_url,
+    }
+    return client
+
+
+@pytest.mark.unit
+class TestArtifactIndex:
+    """Test TTL caching, invalidation and signed URL reuse"""
+
+    def test_record_from_build(self):
+        """Test that only rows pointing to the bucket are indexed"""
+        index = ArtifactIndex()
+        assert index.record_from_build({"id": "build-2", "storage_path": None}) is None
+
+        record = index.record_from_build(BUILD_ROW)
+        assert record.size == 1234
+        assert index.get("build-1") is record
+
+    def test_entries_expire(self):
+        """Test that stale entries are dropped"""
+        index = ArtifactIndex(ttl_seconds=-1)
+        index.record_from_build(BUILD_ROW)
+        assert index.get("build-1") is None
+
+    def test_lru_bound(self):
+        """Test that the index keeps at most max_entries"""
+        index = ArtifactIndex(max_entries=2)
+        for build_id in ("a", "b", "c"):
+            index.record_upload(build_id, "user-1", "project-1", f"{build_id}.apk", 10)
+        assert index.get("a") is None
+        assert index.get("c") is not None
+
+    def test_invalidation(self):
+        """Test invalidation by build, user and project"""
+        index = ArtifactIndex()
+        index.record_upload("a", "user-1", "project-1", "a.apk", 10)
+        index.record_upload("b", "user-1", "project-2", "b.apk", 10)
+        index.record_upload("c", "user-2", "project-3", "c.apk", 10)
+
+        index.invalidate("a")
+        assert index.get("a") is None
+        index.invalidate_where(project_id="project-2")
+        assert index.get("b") is None
+        index.invalidate_where(user_id="user-2")
+        assert index.get("c") is None
+
+    def test_signed_url_reused(self):
+        """Test that a valid signed URL is reused instead of re-signing"""
+        index = ArtifactIndex(signed_url_ttl_seconds=3600)
+        client = make_client()
+        record = index.record_from_build(BUILD_ROW)
+
+        first = index.signed_url(client, record)
+        second = index.signed_url(client, index.record_from_build(BUILD_ROW))
+        assert first == second
+        client.storage.from_.return_value.create_signed_url.assert_called_once_with(
+            BUILD_ROW["storage_path"], 3600
+        )
+
+    def test_signing_failure_invalidates(self):
+        """Test that a missing object removes the entry and raises"""
+        index = ArtifactIndex()
+        client = MagicMock()
+        client.storage.from_.return_value.create_signed_url.side_effect = Exception("Object not found")
+        record = index.record_from_build(BUILD_ROW)
+
+        with pytest.raises(Exception):
+            index.signed_url(client, record)
+        assert index.get("build-1") is None
@@ -0,0 +1,90 @@
+"""
+Unit tests for the durable local artifact store
+"""
+import hashlib
+
+import pytest
+
+from artifact_store import ArtifactStore
+
+
+def make_apk(tmp_path, name, size):
+    path = tmp_path / f"{name}.apk"
+    path.write_bytes(name.encode() * (size // len(name)))
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(tmp_path / "store", max_bytes=10_000)
+
+
+@pytest.mark.unit
+class TestArtifactStore:
+    """Test put/get, integrity checks, removal and LRU eviction"""
+
+    def test_put_and_get(self, store, tmp_path):
+        """Test that a stored APK is moved, hashed and found again"""
+        source = make_apk(tmp_path, "build", 1000)
+        expected_hash = hashlib.sha256(source.read_bytes()).hexdigest()
+
+        stored = store.put("build-1", source, project_id="project-1", user_id="user-1")
+        assert not source.exists()
+        assert stored.path.exists()
+        assert stored.sha256 == expected_hash
+
+        found = store.get("build-1")
+        assert found.path == stored.path
+        assert found.size == 1000
+        assert store.get("unknown") is None
+
+    def test_index_shared_between_instances(self, store, tmp_path):
+        """Test that another worker opening the same directory sees the artifact"""
+        store.put("build-1", make_apk(tmp_path, "build", 1000))
+        other_worker = ArtifactStore(store.root, max_bytes=store.max_bytes)
+        assert other_worker.get("build-1") is not None
+
+    def test_corrupted_or_missing_files_are_dropped(self, store, tmp_path):
+        """Test that integrity failures remove the entry"""
+        stored = store.put("build-1", make_apk(tmp_path, "build", 1000))
+        stored.path.write_bytes(b"tampered")
+        assert store.get("build-1", verify=True) is None
+
+        stored = store.put("build-2", make_apk(tmp_path, "other", 1000))
+        stored.path.unlink()
+        assert store.get("build-2") is None
+
+    def test_remove_where(self, store, tmp_path):
+        """Test removal by project and by user"""
+        store.put("a", make_apk(tmp_path, "a", 100), project_id="p1", user_id="u1")
+        store.put("b", make_apk(tmp_path, "b", 100), project_id="p2", user_id="u1")
+        store.put("c", make_apk(tmp_path, "c", 100), project_id="p3", user_id="u2")
+
+        assert store.remove_where(project_id="p1") == 1
+        assert store.remove_where(user_id="u1") == 1
+        assert store.get("c") is not None
+        assert store.remove("c")
+        assert store.usage() == 0
+
+    def test_remove_many(self, store, tmp_path):
+        """Test that a batch removal deletes the listed artifacts and ignores unknown ids"""
+        for build_id in ("a", "b", "c"):
+            store.put(build_id, make_apk(tmp_path, build_id, 100))
+
+        assert store.remove_many(["a", "c", "missing"]) == 2
+        assert store.get("a") is None and store.get("c") is None
+        assert store.get("b") is not None
+        assert sorted(p.name for p in store.files_dir.iterdir()) == ["b.apk"]
+        assert store.remove_many([]) == 0
+
+    def test_lru_eviction(self, store, tmp_path):
+        """Test that the least recently used artifacts go first past the budget"""
+        store.put("old", make_apk(tmp_path, "old", 4000))
+        store.put("recent", make_apk(tmp_path, "recent", 4000))
+        store.get("old")  # old becomes the most recently used
+
+        store.put("new", make_apk(tmp_path, "new", 4000))
+        assert store.get("recent") is None
+        assert store.get("old") is not None
+        assert store.get("new") is not None
+        assert store.usage() <= store.max_bytes
@@ -0,0 +1,126 @@
+"""
+Unit tests for the shared Playwright browser pool
+"""
+import asyncio
+
+import pytest
+
+from browser_pool import BrowserPool, BrowserPoolBusy
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+        self.closed = False
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **kwargs):
+        context = FakeContext()
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    launched = []
+
+    async def launcher():
+        browser = FakeBrowser()
+        launched.append(browser)
+        return browser
+
+    return BrowserPool(launcher=launcher, **kwargs), launched
+
+
+@pytest.mark.unit
+class TestBrowserPool:
+    """Test leasing, health checks, recycling and backpressure"""
+
+    def test_browsers_are_reused_across_jobs(self):
+        """Test that sequential jobs share one launched browser"""
+        pool, launched = make_pool(size=2)
+
+        async def scenario():
+            for _ in range(3):
+                async with pool.lease() as lease:
+                    await lease.new_context(viewport={"width": 100, "height": 100})
+
+        asyncio.run(scenario())
+        assert len(launched) == 1
+        assert all(context.closed for context in launched[0].contexts)
+        assert pool.status()["leases"] == 3
+
+    def test_disconnected_browser_is_relaunched(self):
+        """Test that a crashed browser is replaced at the next lease"""
+        pool, launched = make_pool(size=1)
+
+        async def scenario():
+            async with pool.lease() as lease:
+                lease.browser.connected = False
+            async with pool.lease() as lease:
+                return lease.browser
+
+        browser = asyncio.run(scenario())
+        assert len(launched) == 2
+        assert browser is launched[1]
+
+    def test_browser_recycled_after_max_pages(self):
+        """Test that a browser is closed and relaunched after N pages"""
+        pool, launched = make_pool(size=1, max_pages_per_browser=2)
+
+        async def scenario():
+            for _ in range(3):
+                async with pool.lease() as lease:
+                    await lease.new_context()
+
+        asyncio.run(scenario())
+        assert len(launched) == 2
+        assert launched[0].closed
+        assert pool.status()["recycles"] == 1
+
+    def test_full_queue_rejects_jobs(self):
+        """Test that jobs beyond the queue limit are refused"""
+        pool, _ = make_pool(size=1, max_queue=1, queue_timeout=5)
+
+        async def job(hold):
+            async with pool.lease():
+                await asyncio.sleep(hold)
+
+        async def scenario():
+            first = asyncio.ensure_future(job(0.05))
+            await asyncio.sleep(0.01)
+            second = asyncio.ensure_future(job(0))
+            await asyncio.sleep(0.01)
+            with pytest.raises(BrowserPoolBusy):
+                async with pool.lease():
+                    pass
+            await asyncio.gather(first, second)
+
+        asyncio.run(scenario())
+        assert pool.status()["rejected"] == 1
+        assert pool.status()["busy"] == 0
+
+    def test_queue_timeout(self):
+        """Test that waiting too long for a browser raises BrowserPoolBusy"""
+        pool, _ = make_pool(size=1, queue_timeout=0.02)
+
+        async def scenario():
+            async with pool.lease():
+                with pytest.raises(BrowserPoolBusy):
+                    async with pool.lease():
+                        pass
+
+        asyncio.run(scenario())
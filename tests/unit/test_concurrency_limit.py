@@ -0,0 +1,63 @@
+"""
+Unit tests for the per-worker request concurrency limit
+"""
+import asyncio
+
+import pytest
+from starlette.responses import PlainTextResponse
+
+from concurrency_limit import ConcurrencyLimitMiddleware
+
+
+def make_app(release: asyncio.Event):
+    async def app(scope, receive, send):
+        await release.wait()
+        await PlainTextResponse("ok")(scope, receive, send)
+    return app
+
+
+async def call(app, path):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app({"type": "http", "method": "GET", "path": path, "headers": [], "query_string": b""}, receive, send)
+    start = messages[0]
+    return start["status"], dict(start["headers"])
+
+
+@pytest.mark.unit
+class TestConcurrencyLimit:
+    """Test the in-flight request limit and its exclusions"""
+
+    def test_rejects_beyond_limit_and_skips_streams(self):
+        """Test that extra requests get 503 while excluded SSE paths are not counted"""
+        async def scenario():
+            release = asyncio.Event()
+            app = ConcurrencyLimitMiddleware(make_app(release), limit=1, exclude_suffixes=("/version/events",))
+            busy = asyncio.ensure_future(call(app, "/api/projects"))
+            stream = asyncio.ensure_future(call(app, "/api/projects/p/version/events"))
+            await asyncio.sleep(0)
+            rejected = await call(app, "/api/projects")
+            assert app.active == 1
+            release.set()
+            return rejected, await busy, await stream, app.active
+
+        rejected, busy, stream, active = asyncio.run(scenario())
+        assert rejected[0] == 503 and rejected[1][b"retry-after"] == b"5"
+        assert busy[0] == 200 and stream[0] == 200
+        assert active == 0
+
+    def test_zero_disables_limit(self):
+        """Test that a limit of 0 lets every request through"""
+        async def scenario():
+            release = asyncio.Event()
+            release.set()
+            app = ConcurrencyLimitMiddleware(make_app(release), limit=0)
+            return await asyncio.gather(*(call(app, "/api/projects") for _ in range(5)))
+
+        assert [status for status, _ in asyncio.run(scenario())] == [200] * 5
@@ -0,0 +1,128 @@
+"""
+Unit tests for the one-request dashboard summary
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import project_cache
+from dev_store import DevBuildStore, DevProjectStore
+
+
+class FakeQuery:
+    """Records the PostgREST calls of one query and answers from canned rows / counts"""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.call = {"table": table, "filters": {}, "head": False, "count": None}
+
+    def select(self, columns, count=None, head=False):
+        self.call.update(columns=columns, count=count, head=head)
+        return self
+
+    def eq(self, column, value):
+        self.call["filters"][column] = value
+        return self
+
+    def order(self, column, desc=False):
+        self.call["order"] = (column, desc)
+        return self
+
+    def limit(self, count):
+        self.call["limit"] = count
+        return self
+
+    def execute(self):
+        self.db.calls.append(self.call)
+        table, filters = self.call["table"], self.call["filters"]
+        if self.call["head"]:
+            return SimpleNamespace(data=[], count=self.db.counts[(table, filters.get("status"))])
+        return SimpleNamespace(data=self.db.rows[table][:self.call["limit"]], count=None)
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.calls = []
+        self.counts = {("projects", None): 4, ("builds", None): 9, ("builds", "completed"): 6, ("api_keys", None): 1}
+        self.rows = {
+            "projects": [{"id": f"p{i}", "name": f"App {i}"} for i in range(3)],
+            "builds": [{"id": f"b{i}", "status": "completed"} for i in range(5)],
+        }
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(project_cache, "_project_cache", None)
+    main.app.dependency_overrides[main.get_current_user] = lambda: "user-1"
+    yield TestClient(main.app)
+    main.app.dependency_overrides.pop(main.get_current_user, None)
+
+
+@pytest.mark.unit
+class TestUserStats:
+    """Test the counters behind /stats and /dashboard/summary"""
+
+    def test_counts_are_head_only_exact_queries(self):
+        """Test that every counter is a COUNT request without rows, filtered by user"""
+        db = FakeSupabase()
+
+        stats = asyncio.run(main._load_user_stats(db, "user-1"))
+
+        assert stats == {"projects": 4, "total_builds": 9, "successful_builds": 6, "api_keys": 1}
+        assert len(db.calls) == 4
+        assert all(call["head"] and call["count"] == "exact" and call["columns"] == "id" for call in db.calls)
+        assert all(call["filters"]["user_id"] == "user-1" for call in db.calls)
+        assert {"user_id": "user-1", "status": "completed"} in [call["filters"] for call in db.calls]
+
+
+@pytest.mark.unit
+class TestDashboardSummary:
+    """Test the summary payload, its weak ETag and the DEV_MODE path"""
+
+    def test_summary_and_conditional_request(self, client, monkeypatch):
+        """Test that the summary carries a weak ETag and answers 304 when it matches"""
+        db = FakeSupabase()
+        monkeypatch.setattr(main, "DEV_MODE", False)
+        monkeypatch.setattr(main, "get_supabase_client", lambda **_: db)
+
+        response = client.get("/api/dashboard/summary")
+        etag = response.headers["etag"]
+
+        assert response.status_code == 200
+        assert etag.startswith('W/"')
+        body = response.json()
+        assert body["stats"]["total_builds"] == 9
+        assert len(body["projects"]) == 3 and len(body["recent_builds"]) == 5
+        lists = [call for call in db.calls if not call["head"]]
+        assert all(call["order"] == ("created_at", True) for call in lists)
+
+        cached = client.get("/api/dashboard/summary", headers={"If-None-Match": etag})
+        assert cached.status_code == 304 and cached.headers["etag"] == etag and not cached.content
+
+        db.counts[("builds", None)] = 10
+        assert client.get("/api/dashboard/summary", headers={"If-None-Match": etag}).status_code == 200
+
+    def test_dev_mode_is_newest_first_and_limited(self, client, monkeypatch):
+        """Test that DEV_MODE returns the 3 newest projects and the 5 newest builds"""
+        projects, builds = DevProjectStore(), DevBuildStore()
+        for i in range(5):
+            projects[f"p{i}"] = {"id": f"p{i}", "user_id": "user-1", "name": f"App {i}"}
+        projects["other"] = {"id": "other", "user_id": "user-2"}
+        for i in range(7):
+            builds.add({"id": f"b{i}", "project_id": "p0", "user_id": "user-1", "status": "completed"})
+        monkeypatch.setattr(main, "DEV_MODE", True)
+        monkeypatch.setattr(main, "DEV_PROJECTS_STORE", projects)
+        monkeypatch.setattr(main, "DEV_BUILDS_STORE", builds)
+
+        body = client.get("/api/dashboard/summary").json()
+
+        assert [p["id"] for p in body["projects"]] == ["p4", "p3", "p2"]
+        assert [b["id"] for b in body["recent_builds"]] == ["b6", "b5", "b4", "b3", "b2"]
+        assert body["stats"]["projects"] == 5 and body["stats"]["successful_builds"] == 7
+        assert set(body["projects"][0]) == set(main._DASHBOARD_PROJECT_FIELDS)
@@ -0,0 +1,163 @@
+"""
+Unit tests for batched build deletes and asynchronous storage reclamation
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from deletion_pipeline import DeletionPipeline
+
+
+class FakeQuery:
+    """Chainable subset of the PostgREST query builder over an in-memory table"""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.action = "select"
+        self.filters = []
+        self.row_limit = None
+
+    def select(self, *_):
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def execute(self):
+        table = self.db.tables[self.table]
+        rows = [row for row in table if all(f(row) for f in self.filters)]
+        if self.action == "delete":
+            if self.db.refuse_deletes:
+                # Row level security: no error, nothing removed
+                return SimpleNamespace(data=[])
+            self.db.delete_calls += 1
+            self.db.tables[self.table] = [row for row in table if row not in rows]
+            return SimpleNamespace(data=rows)
+        return SimpleNamespace(data=rows[:self.row_limit])
+
+
+class FakeBucket:
+    """Flat object store listing one folder level like storage3"""
+
+    def __init__(self, objects):
+        self.objects = set(objects)
+        self.remove_calls = 0
+
+    def list(self, prefix, options):
+        children = {}
+        for path in sorted(self.objects):
+            if not path.startswith(prefix + "/"):
+                continue
+            name, _, rest = path[len(prefix) + 1:].partition("/")
+            children[name] = None if rest else f"id-{name}"
+        entries = [{"name": name, "id": object_id} for name, object_id in sorted(children.items())]
+        return entries[options["offset"]:options["offset"] + options["limit"]]
+
+    def remove(self, paths):
+        self.remove_calls += 1
+        self.objects.difference_update(paths)
+
+
+class FakeSupabase:
+    def __init__(self, projects, builds, objects):
+        self.tables = {"projects": projects, "builds": builds}
+        self.bucket = FakeBucket(objects)
+        self.delete_calls = 0
+        self.refuse_deletes = False
+        self.storage = SimpleNamespace(from_=lambda bucket: self.bucket)
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def apk(project_id, build_id):
+    return f"projects/{project_id}/builds/{build_id}.apk"
+
+
+def make_client(builds_per_project=25):
+    builds = [
+        {"id": f"{p}-b{i}", "project_id": p, "user_id": "user-1", "storage_path": apk(p, f"{p}-b{i}")}
+        for p in ("p1", "p2") for i in range(builds_per_project)
+    ]
+    return FakeSupabase(
+        projects=[{"id": "p1"}, {"id": "p2"}],
+        builds=builds,
+        objects=[build["storage_path"] for build in builds],
+    )
+
+
+@pytest.mark.unit
+class TestDeletionPipeline:
+    """Test batched row deletes, prefix removal and reconciliation"""
+
+    def test_delete_build_rows_in_batches(self):
+        """Test that rows are deleted by id batches and reported to the callback"""
+        client = make_client()
+        forgotten = []
+        pipeline = DeletionPipeline(lambda: client, row_batch_size=10, on_builds_deleted=forgotten.extend)
+
+        deleted = asyncio.run(pipeline.delete_build_rows(client, project_id="p1"))
+
+        assert len(deleted) == 25
+        assert client.delete_calls == 3
+        assert len(forgotten) == 25
+        assert all(build["project_id"] == "p2" for build in client.tables["builds"])
+
+    def test_delete_that_removes_nothing_stops(self):
+        """Test that rows the delete cannot remove (RLS) raise instead of looping forever"""
+        client = make_client()
+        client.refuse_deletes = True
+        pipeline = DeletionPipeline(lambda: client, row_batch_size=10)
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(asyncio.wait_for(pipeline.delete_build_rows(client, project_id="p1"), 5))
+        assert len(client.tables["builds"]) == 50
+
+    def test_enqueued_prefix_is_removed_in_background(self):
+        """Test that a project prefix is emptied in a few storage calls"""
+        client = make_client()
+        pipeline = DeletionPipeline(lambda: client, storage_batch_size=10)
+
+        async def scenario():
+            pipeline.enqueue_prefix("projects/p1/builds")
+            await pipeline.drain()
+            pipeline.stop()
+
+        asyncio.run(scenario())
+        assert not any(path.startswith("projects/p1/") for path in client.bucket.objects)
+        assert len(client.bucket.objects) == 25
+        assert client.bucket.remove_calls == 3
+        assert pipeline.status()["objects_removed"] == 25
+        assert pipeline.status()["pending"] == 0
+
+    def test_reconcile_finds_orphans(self):
+        """Test that objects of deleted projects and builds are reclaimed"""
+        client = make_client(builds_per_project=3)
+        client.tables["projects"] = [{"id": "p2"}]
+        client.tables["builds"] = [build for build in client.tables["builds"] if build["id"] != "p2-b0"]
+        pipeline = DeletionPipeline(lambda: client)
+
+        async def scenario():
+            result = await pipeline.reconcile()
+            await pipeline.drain()
+            pipeline.stop()
+            return result
+
+        result = asyncio.run(scenario())
+        assert result == {"orphan_projects": 1, "orphan_objects": 1}
+        assert client.bucket.objects == {apk("p2", "p2-b1"), apk("p2", "p2-b2")}
@@ -0,0 +1,115 @@
+"""
+Unit tests for the indexed DEV_MODE store
+"""
+import pytest
+
+from dev_store import DevBuildStore, DevProjectStore, load_snapshot, save_snapshot
+
+
+def build(build_id, project_id="p1", user_id="u1", status="processing"):
+    return {"id": build_id, "project_id": project_id, "user_id": user_id, "status": status}
+
+
+@pytest.mark.unit
+class TestDevProjectStore:
+    """Test the dict interface and the per-user index"""
+
+    def test_projects_are_indexed_by_user(self):
+        """Test that inserts, replacements and deletions keep the user index in sync"""
+        store = DevProjectStore()
+        store["p1"] = {"id": "p1", "user_id": "u1"}
+        store["p2"] = {"id": "p2", "user_id": "u1"}
+        store["p3"] = {"id": "p3", "user_id": "u2"}
+        store["p2"] = {"id": "p2", "user_id": "u2", "name": "moved"}
+        del store["p1"]
+
+        assert [p["id"] for p in store.for_user("u2")] == ["p3", "p2"]
+        assert store.for_user("u1") == [] and store.count_for_user("u2") == 2
+        assert "p1" not in store and len(store) == 2
+        assert store.pop("p3")["user_id"] == "u2" and store.count_for_user("u2") == 1
+
+    def test_update_keeps_creation_order(self):
+        """Test that editing a project does not make it the newest one"""
+        store = DevProjectStore()
+        store["a"] = {"id": "a", "user_id": "u1"}
+        store["b"] = {"id": "b", "user_id": "u1"}
+        store["a"] = {"id": "a", "user_id": "u1", "name": "edited"}
+
+        assert [p["id"] for p in store.for_user("u1")] == ["a", "b"]
+        assert store.for_user("u1")[0]["name"] == "edited"
+
+
+@pytest.mark.unit
+class TestDevBuildStore:
+    """Test lookups by id, project and user"""
+
+    def test_lookup_by_id_and_owner(self):
+        """Test that a build is found by id, and hidden from other users"""
+        store = DevBuildStore()
+        store.add(build("b1"))
+
+        assert store.get("b1")["project_id"] == "p1"
+        assert store.get("b1", "u1") is not None and store.get("b1", "u2") is None
+        assert store.get("missing") is None
+
+    def test_listing_is_newest_first_and_filtered(self):
+        """Test per-user listing, project filter and status counts"""
+        store = DevBuildStore()
+        store.add(build("b1", status="completed"))
+        store.add(build("b2", project_id="p2"))
+        store.add(build("b3", status="completed"))
+        store.add(build("b4", user_id="u2"))
+
+        assert [b["id"] for b in store.for_user("u1")] == ["b3", "b2", "b1"]
+        assert [b["id"] for b in store.for_user("u1", "p1")] == ["b3", "b1"]
+        assert store.count_for_user("u1") == 3 and store.count_for_user("u1", "completed") == 2
+        assert [b["id"] for b in store.all()] == ["b4", "b3", "b2", "b1"]
+
+    def test_updates_in_place_are_visible(self):
+        """Test that mutating a stored build is reflected by every index"""
+        store = DevBuildStore()
+        stored = store.add(build("b1"))
+        stored["status"] = "completed"
+
+        assert store.count_for_user("u1", "completed") == 1
+        assert store.for_project("p1")[0]["status"] == "completed"
+
+    def test_delete_project_removes_its_builds(self):
+        """Test that a project's builds leave every index"""
+        store = DevBuildStore()
+        store.add(build("b1"))
+        store.add(build("b2", project_id="p2"))
+
+        assert [b["id"] for b in store.delete_project("p1")] == ["b1"]
+        assert "b1" not in store and store.for_user("u1") == [store.get("b2")]
+        assert store.delete_project("p1") == []
+
+
+@pytest.mark.unit
+class TestSnapshot:
+    """Test optional persistence between restarts"""
+
+    def test_snapshot_round_trip(self, tmp_path):
+        """Test that projects and builds come back with their order and indexes"""
+        projects, builds = DevProjectStore(), DevBuildStore()
+        projects["p1"] = {"id": "p1", "user_id": "u1"}
+        builds.add(build("b1"))
+        builds.add(build("b2"))
+        path = tmp_path / "dev" / "store.json"
+        save_snapshot(path, projects, builds)
+
+        restored_projects, restored_builds = DevProjectStore(), DevBuildStore()
+        assert load_snapshot(path, restored_projects, restored_builds)
+
+        assert restored_projects.for_user("u1") == [{"id": "p1", "user_id": "u1"}]
+        assert [b["id"] for b in restored_builds.for_user("u1")] == ["b2", "b1"]
+        assert list(path.parent.iterdir()) == [path]
+
+    def test_missing_or_corrupt_snapshot_is_ignored(self, tmp_path):
+        """Test that startup continues with an empty store"""
+        projects, builds = DevProjectStore(), DevBuildStore()
+        assert not load_snapshot(tmp_path / "none.json", projects, builds)
+        corrupt = tmp_path / "corrupt.json"
+        corrupt.write_text("{not json")
+        assert not load_snapshot(corrupt, projects, builds)
+        assert len(projects) == 0 and len(builds) == 0
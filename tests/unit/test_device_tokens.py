@@ -0,0 +1,255 @@
+"""
+Unit tests for the device token registry
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from device_tokens import DeviceTokenRegistry, InvalidTokenRegistration, SupabaseDeviceTokenRegistry
+from push_campaigns import PushCampaignQueue
+from push_dispatcher import DispatchReport, PushResult
+
+
+class RejectingDispatcher:
+    """Delivers every token except the ones the provider reports as unregistered"""
+
+    def __init__(self, unregistered=()):
+        self.unregistered = set(unregistered)
+
+    async def send(self, android_tokens, ios_tokens, title, body, data=None):
+        results = [
+            PushResult(token, platform, success=token not in self.unregistered,
+                       invalid_token=token in self.unregistered)
+            for platform, tokens in (("android", android_tokens), ("ios", ios_tokens))
+            for token in tokens
+        ]
+        return DispatchReport(results=results)
+
+
+class FakeQuery:
+    """Chainable subset of the PostgREST query builder over in-memory tables"""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.action = "select"
+        self.payload = None
+        self.filters = []
+        self.order_by = None
+        self.row_limit = None
+        self.head = False
+
+    def select(self, *_, count=None, head=False):
+        self.head = head
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = "insert", rows
+        return self
+
+    def upsert(self, row, on_conflict):
+        self.action, self.payload = "upsert", (row, on_conflict.split(","))
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row[column] > value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row[column] in values)
+        return self
+
+    def order(self, column):
+        self.order_by = column
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def execute(self):
+        rows = self.db.tables.setdefault(self.table, [])
+        if self.action == "insert":
+            rows.extend(dict(row) for row in self.payload)
+            return SimpleNamespace(data=self.payload)
+        if self.action == "upsert":
+            row, keys = self.payload
+            existing = next((r for r in rows if all(r[k] == row[k] for k in keys)), None)
+            if existing is None:
+                self.db.next_id += 1
+                existing = {"id": self.db.next_id, "device_id": None, "app_version": None}
+                rows.append(existing)
+            existing.update(row)
+            return SimpleNamespace(data=[existing])
+        matched = [row for row in rows if all(f(row) for f in self.filters)]
+        if self.action == "delete":
+            self.db.tables[self.table] = [row for row in rows if row not in matched]
+            if self.table == "device_tokens":
+                # ON DELETE CASCADE
+                ids = {row["id"] for row in matched}
+                self.db.tables["device_token_topics"] = [
+                    row for row in self.db.tables.get("device_token_topics", []) if row["token_id"] not in ids
+                ]
+            return SimpleNamespace(data=matched)
+        if self.order_by:
+            matched.sort(key=lambda row: row[self.order_by])
+        if self.head:
+            return SimpleNamespace(data=[], count=len(matched))
+        return SimpleNamespace(data=[dict(row) for row in matched[:self.row_limit]], count=None)
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+        self.next_id = 0
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+@pytest.fixture
+def supabase_registry():
+    client = FakeSupabase()
+    return SupabaseDeviceTokenRegistry(lambda: client)
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return DeviceTokenRegistry(tmp_path / "tokens", shards=4)
+
+
+@pytest.mark.unit
+class TestDeviceTokenRegistry:
+    """Test registration, topics, keyset paging and pruning"""
+
+    def test_register_is_an_upsert(self, registry):
+        """Test that registering the same token twice keeps one row and replaces its topics"""
+        first = registry.register("p1", "android", "tok", ["news", "promo"])
+        second = registry.register("p1", "android", "tok", ["news"], app_version="2.0")
+
+        assert first["id"] == second["id"]
+        assert registry.count("p1") == {"android": 1, "ios": 0, "total": 1}
+        assert registry.count("p1", "promo")["total"] == 0
+        rows, _ = registry.page("p1", topic="news")
+        assert rows[0]["app_version"] == "2.0"
+
+    def test_new_token_replaces_the_device_token(self, registry):
+        """Test that a rotated token for the same device_id replaces the previous one"""
+        registry.register("p1", "ios", "old", device_id="d1")
+        registry.register("p1", "ios", "new", device_id="d1")
+
+        assert list(registry.iter_recipients("p1")) == [("ios", "new")]
+
+    def test_paging_walks_every_token_once(self, registry):
+        """Test that cursor paging covers all tokens of the project, filtered by topic and platform"""
+        for i in range(25):
+            platform = "android" if i % 2 else "ios"
+            registry.register("p1", platform, f"t{i}", ["even"] if i % 2 == 0 else [])
+        registry.register("p2", "android", "other")
+
+        seen, cursor, pages = [], 0, 0
+        while cursor is not None:
+            rows, cursor = registry.page("p1", cursor=cursor, limit=10)
+            seen += [row["token"] for row in rows]
+            pages += 1
+        assert pages == 3 and len(seen) == 25 and len(set(seen)) == 25
+
+        even = list(registry.iter_recipients("p1", topic="even", page_size=4))
+        assert len(even) == 13 and all(platform == "ios" for platform, _ in even)
+        assert len(list(registry.iter_recipients("p1", platform="android", page_size=4))) == 12
+
+    def test_unregister_and_prune(self, registry):
+        """Test removal of one token and pruning of unregistered tokens across projects"""
+        for project in ("p1", "p2", "p3"):
+            registry.register(project, "android", "gone", ["news"])
+        registry.register("p1", "android", "kept")
+
+        assert registry.unregister("p1", "android", "kept")
+        assert not registry.unregister("p1", "android", "kept")
+        assert registry.remove_tokens([("android", "gone")]) == 3
+        assert all(registry.count(project, "news")["total"] == 0 for project in ("p1", "p2", "p3"))
+
+    def test_delete_project(self, registry):
+        """Test that deleting a project removes only its tokens"""
+        registry.register("p1", "android", "a", ["news"])
+        registry.register("p2", "android", "b")
+
+        assert registry.delete_project("p1") == 1
+        assert registry.count("p1")["total"] == 0 and registry.count("p2")["total"] == 1
+
+    @pytest.mark.parametrize("platform,token,topics", [
+        ("web", "tok", []),
+        ("ios", "", []),
+        ("ios", "tok", ["not a topic"]),
+    ])
+    def test_invalid_registrations_are_rejected(self, registry, platform, token, topics):
+        """Test that unknown platforms, empty tokens and malformed topics are refused"""
+        with pytest.raises(InvalidTokenRegistration):
+            registry.register("p1", platform, token, topics)
+
+    def test_campaign_streams_project_recipients(self, registry, tmp_path):
+        """Test that a campaign targets registered devices and prunes the ones FCM rejects"""
+        for i in range(5):
+            registry.register("p1", "android", f"a{i}", ["news"] if i < 3 else [])
+        registry.register("p1", "ios", "i0", ["news"])
+        dispatcher = RejectingDispatcher({"a1"})
+        queue = PushCampaignQueue(
+            tmp_path / "campaigns",
+            dispatcher_factory=lambda: dispatcher,
+            batch_size=2,
+            on_invalid_tokens=registry.remove_tokens
+        )
+
+        async def scenario():
+            campaign = await queue.enqueue(
+                "u1", [], [], "Hello", "World",
+                recipients=registry.iter_recipients("p1", "news", page_size=2),
+                project_id="p1", topic="news"
+            )
+            return await queue.wait(campaign.campaign_id)
+
+        campaign = asyncio.run(scenario())
+
+        assert campaign.total == 4 and campaign.project_id == "p1" and campaign.topic == "news"
+        assert campaign.stats["sent"] == 3 and campaign.stats["invalid"] == 1
+        assert registry.count("p1", "news") == {"android": 2, "ios": 1, "total": 3}
+
+
+@pytest.mark.unit
+class TestSupabaseDeviceTokenRegistry:
+    """Test the Supabase-backed registry used outside DEV mode"""
+
+    def test_register_upserts_and_keeps_device_fields(self, supabase_registry):
+        """Test that re-registering keeps one row, its device_id, and replaces the topics"""
+        first = supabase_registry.register("p1", "android", "tok", ["news", "promo"], device_id="d1")
+        second = supabase_registry.register("p1", "android", "tok", ["news"], app_version="2.0")
+
+        assert first["id"] == second["id"]
+        rows, _ = supabase_registry.page("p1", topic="news")
+        assert rows[0]["device_id"] == "d1" and rows[0]["app_version"] == "2.0"
+        assert supabase_registry.count("p1", "promo")["total"] == 0
+        assert supabase_registry.count("p1") == {"android": 1, "ios": 0, "total": 1}
+
+    def test_rotation_paging_and_pruning(self, supabase_registry):
+        """Test token rotation, topic paging by platform and removal of unregistered tokens"""
+        supabase_registry.register("p1", "ios", "old", ["news"], device_id="d1")
+        supabase_registry.register("p1", "ios", "new", ["news"], device_id="d1")
+        for i in range(5):
+            supabase_registry.register("p1", "android", f"a{i}", ["news"])
+
+        assert ("ios", "old") not in list(supabase_registry.iter_recipients("p1"))
+        android = list(supabase_registry.iter_recipients("p1", "news", "android", page_size=2))
+        assert android == [("android", f"a{i}") for i in range(5)]
+        assert supabase_registry.remove_tokens([("android", "a0"), ("ios", "new")]) == 2
+        assert supabase_registry.count("p1", "news") == {"android": 4, "ios": 0, "total": 4}
+        assert supabase_registry.delete_project("p1") == 4
+        assert not supabase_registry.unregister("p1", "android", "a1")
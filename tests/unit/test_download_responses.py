@@ -0,0 +1,113 @@
+"""
+Unit tests for resumable / conditional download responses
+"""
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from download_responses import (
+    RangeNotSatisfiable,
+    bytes_download_response,
+    etag_matches,
+    file_download_response,
+    parse_range,
+)
+
+
+@pytest.mark.unit
+class TestRangeParsing:
+    """Test Range header parsing"""
+
+    def test_no_or_invalid_header_serves_full_file(self):
+        """Test that missing, malformed and multi-range headers fall back to 200"""
+        assert parse_range(None, 100) is None
+        assert parse_range("items=0-10", 100) is None
+        assert parse_range("bytes=abc-", 100) is None
+        assert parse_range("bytes=0-1,5-6", 100) is None
+        assert parse_range("bytes=10-5", 100) is None
+
+    def test_valid_ranges(self):
+        """Test explicit, open-ended and suffix ranges"""
+        assert parse_range("bytes=0-9", 100) == (0, 9)
+        assert parse_range("bytes=90-", 100) == (90, 99)
+        assert parse_range("bytes=95-500", 100) == (95, 99)
+        assert parse_range("bytes=-10", 100) == (90, 99)
+        assert parse_range("bytes=-500", 100) == (0, 99)
+
+    def test_unsatisfiable_range(self):
+        """Test that a start past the end raises"""
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range("bytes=100-", 100)
+
+    def test_etag_matching(self):
+        """Test If-None-Match comparison"""
+        assert etag_matches('"abc"', '"abc"')
+        assert etag_matches('W/"abc", "def"', '"abc"')
+        assert etag_matches("*", '"abc"')
+        assert not etag_matches('"def"', '"abc"')
+        assert not etag_matches(None, '"abc"')
+
+
+@pytest.fixture
+def download_client(tmp_path):
+    """Small app serving a local file and an in-memory archive"""
+    payload = bytes(range(256)) * 20
+    artifact = tmp_path / "app.apk"
+    artifact.write_bytes(payload)
+
+    app = FastAPI()
+
+    @app.get("/file")
+    async def serve_file(request: Request):
+        return await file_download_response(request, artifact, "app.apk")
+
+    @app.get("/bytes")
+    async def serve_bytes(request: Request):
+        return bytes_download_response(request, payload, "app.zip")
+
+    return TestClient(app), payload
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("route", ["/file", "/bytes"])
+class TestDownloadResponses:
+    """Test full, partial and conditional downloads"""
+
+    def test_full_download(self, download_client, route):
+        """Test that a plain GET returns the whole body with validators"""
+        client, payload = download_client
+        response = client.get(route)
+        assert response.status_code == 200
+        assert response.content == payload
+        assert response.headers["accept-ranges"] == "bytes"
+        assert response.headers["etag"].startswith('"')
+
+    def test_range_request(self, download_client, route):
+        """Test that a Range request resumes from the given offset"""
+        client, payload = download_client
+        response = client.get(route, headers={"Range": "bytes=1000-"})
+        assert response.status_code == 206
+        assert response.content == payload[1000:]
+        assert response.headers["content-range"] == f"bytes 1000-{len(payload) - 1}/{len(payload)}"
+
+    def test_if_none_match(self, download_client, route):
+        """Test that a matching ETag yields 304 without a body"""
+        client, _ = download_client
+        etag = client.get(route).headers["etag"]
+        response = client.get(route, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_if_range_mismatch(self, download_client, route):
+        """Test that a stale If-Range ignores Range and sends everything"""
+        client, payload = download_client
+        response = client.get(route, headers={"Range": "bytes=10-", "If-Range": '"stale"'})
+        assert response.status_code == 200
+        assert response.content == payload
+
+    def test_unsatisfiable(self, download_client, route):
+        """Test that an out-of-bounds range yields 416"""
+        client, payload = download_client
+        response = client.get(route, headers={"Range": f"bytes={len(payload)}-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{len(payload)}"
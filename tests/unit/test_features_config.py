@@ -0,0 +1,77 @@
+"""
+Unit tests for the compiled feature index in features_config
+"""
+import pytest
+
+from features_config import (
+    FEATURES_CONFIG,
+    FEATURE_BITS,
+    features_to_mask,
+    get_feature_bundle,
+    get_features_bundle,
+    get_android_permissions,
+    get_android_dependencies,
+    get_ios_frameworks,
+)
+
+
+@pytest.mark.unit
+class TestFeatureIndex:
+    """Test bitmask compilation and bundle lookup"""
+
+    def test_every_feature_has_a_distinct_bit(self):
+        """Test that each configured feature maps to its own bit"""
+        assert set(FEATURE_BITS) == set(FEATURES_CONFIG)
+        bits = list(FEATURE_BITS.values())
+        assert len(set(bits)) == len(bits)
+        assert all(bit & (bit - 1) == 0 for bit in bits)
+
+    def test_mask_ignores_order_duplicates_and_unknown_ids(self):
+        """Test that the mask only depends on the set of known features"""
+        a = features_to_mask(["camera", "geolocation", "unknown"])
+        b = features_to_mask([{"id": "geolocation"}, "camera", "camera"])
+        assert a == b
+        assert features_to_mask([]) == 0
+        assert features_to_mask(None) == 0
+
+    def test_bundle_is_cached(self):
+        """Test that the same mask returns the same bundle object"""
+        mask = features_to_mask(["qr_scanner", "biometrics"])
+        assert get_feature_bundle(mask) is get_feature_bundle(mask)
+
+    def test_bundle_contents(self):
+        """Test that bundles merge and sort permissions, dependencies and frameworks"""
+        bundle = get_features_bundle(["camera", "video_recording"])
+        assert bundle.android_permissions == (
+            "android.permission.CAMERA",
+            "android.permission.RECORD_AUDIO",
+        )
+        assert bundle.ios_frameworks == ("AVFoundation", "UIKit")
+        assert bundle.android_dependencies == ()
+
+    def test_cache_key_is_stable(self):
+        """Test that equivalent feature sets share a cache key and others differ"""
+        a = get_features_bundle(["camera", "geolocation"]).cache_key
+        b = get_features_bundle(["geolocation", "camera"]).cache_key
+        c = get_features_bundle(["camera"]).cache_key
+        assert a == b
+        assert a != c
+
+
+@pytest.mark.unit
+class TestLegacyHelpers:
+    """Test the list-returning helpers used by the generator"""
+
+    def test_helpers_match_bundle(self):
+        """Test that the helpers return sorted lists equal to the bundle"""
+        features = ["in_app_purchases", "subscriptions", "analytics"]
+        bundle = get_features_bundle(features)
+        assert get_android_permissions(features) == list(bundle.android_permissions)
+        assert get_android_dependencies(features) == list(bundle.android_dependencies)
+        assert get_ios_frameworks(features) == list(bundle.ios_frameworks)
+
+    def test_helpers_return_fresh_lists(self):
+        """Test that callers can mutate the returned list without corrupting the cache"""
+        permissions = get_android_permissions(["camera"])
+        permissions.insert(0, "android.permission.INTERNET")
+        assert "android.permission.INTERNET" not in get_android_permissions(["camera"])
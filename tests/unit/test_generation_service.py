@@ -0,0 +1,109 @@
+"""
+Unit tests for the process-pool generation service
+"""
+import asyncio
+import io
+import zipfile
+
+import pytest
+
+from generation_service import (
+    GenerationService,
+    app_identifier,
+    bundle_platform_archives,
+    generate_platform_project,
+)
+
+
+PROJECT = {
+    "id": "test-project-id",
+    "name": "Test Project",
+    "web_url": "https://example.com",
+    "logo_url": None,
+}
+FEATURES = [{"id": "camera", "name": "Camera", "enabled": True, "config": {}}]
+
+
+@pytest.mark.unit
+class TestGenerationHelpers:
+    """Test the pure helpers run inside workers"""
+
+    def test_app_identifier(self):
+        """Test package name derivation from the project name"""
+        assert app_identifier("My App!") == "com.nativiweb.myapp"
+        assert app_identifier("---") == "com.nativiweb.app"
+
+    def test_generate_android_project(self):
+        """Test that the worker function returns a valid Android zip"""
+        archive = generate_platform_project("android", "Test Project", "https://example.com", FEATURES)
+        names = zipfile.ZipFile(io.BytesIO(archive)).namelist()
+        assert any(name.endswith("AndroidManifest.xml") for name in names)
+
+    def test_push_bridge_exposes_token(self):
+        """Test that apps with push notifications can hand their FCM token to the SDK"""
+        push = [{"id": "push_notifications", "name": "Push", "enabled": True, "config": {}}]
+        with zipfile.ZipFile(io.BytesIO(generate_platform_project("android", "Test", "https://example.com", push))) as zf:
+            bridge = next(zf.read(name).decode() for name in zf.namelist() if name.endswith("NativiWebBridge.kt"))
+            gradle = next(zf.read(name).decode() for name in zf.namelist() if name.endswith("app/build.gradle"))
+        assert "fun getPushToken(callback: String)" in bridge
+        assert "firebase-messaging" in gradle
+
+    def test_compression_policies(self):
+        """Test that internal archives are stored and cache archives are smallest"""
+        archives = {
+            policy: generate_platform_project("android", "Test", "https://example.com", FEATURES, compression=policy)
+            for policy in ("internal", "download", "cache")
+        }
+        with zipfile.ZipFile(io.BytesIO(archives["internal"])) as zf:
+            assert all(info.compress_type == zipfile.ZIP_STORED for info in zf.infolist())
+        assert len(archives["cache"]) <= len(archives["download"]) < len(archives["internal"])
+
+        with pytest.raises(ValueError):
+            generate_platform_project("android", "Test", "https://example.com", FEATURES, compression="ultra")
+
+    def test_unknown_platform(self):
+        """Test that unsupported platforms are rejected"""
+        with pytest.raises(ValueError):
+            generate_platform_project("windows", "Test", "https://example.com", [])
+
+    def test_bundle_platform_archives(self):
+        """Test that platform archives are bundled without recompression"""
+        bundle = bundle_platform_archives({"android": b"a" * 100, "ios": b"i" * 100}, "test")
+        with zipfile.ZipFile(io.BytesIO(bundle)) as zf:
+            assert sorted(zf.namelist()) == ["test-android.zip", "test-ios.zip"]
+            assert all(info.compress_type == zipfile.ZIP_STORED for info in zf.infolist())
+
+
+@pytest.mark.unit
+class TestGenerationService:
+    """Test the async service API"""
+
+    def test_generate_all_in_parallel(self):
+        """Test that both platforms are generated and returned per platform"""
+        service = GenerationService(max_workers=2)
+
+        async def run():
+            return await service.generate_all(PROJECT, FEATURES, ["android", "ios"])
+
+        try:
+            archives = asyncio.run(run())
+        finally:
+            service.shutdown()
+
+        assert set(archives) == {"android", "ios"}
+        for archive in archives.values():
+            assert zipfile.is_zipfile(io.BytesIO(archive))
+
+    def test_submit_returns_futures(self):
+        """Test that submit returns one awaitable per requested platform"""
+        service = GenerationService(max_workers=1)
+
+        async def run():
+            futures = service.submit(PROJECT, FEATURES, ["android", "android"])
+            assert list(futures) == ["android"]
+            return await futures["android"]
+
+        try:
+            assert zipfile.is_zipfile(io.BytesIO(asyncio.run(run())))
+        finally:
+            service.shutdown()
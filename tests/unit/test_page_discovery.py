@@ -0,0 +1,104 @@
+"""
+Unit tests for parallel screenshot page discovery
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from page_discovery import PageDiscovery, parse_sitemap
+
+HOME = b'<html><body><a href="/pricing">Pricing</a><a href="https://other.test/x">x</a><a href="/logo.png">logo</a></body></html>'
+SPA_HOME = b'<html><body><div id="root"></div><script src="/app.js"></script></body></html>'
+SITEMAP = b"""<?xml version="1.0"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://app.test/blog</loc></url>
+  <url><loc>https://app.test/pricing</loc></url>
+</urlset>"""
+
+
+def make_transport(routes, calls=None):
+    def handler(request):
+        if calls is not None:
+            calls.append((request.method, request.url.path))
+        route = routes.get(request.url.path)
+        if route is None:
+            return httpx.Response(404)
+        status, body = route
+        if request.method == "HEAD" and status == 405:
+            return httpx.Response(405)
+        return httpx.Response(200 if status == 405 else status, content=body)
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.unit
+class TestPageDiscovery:
+    """Test HTTP probing, sitemap/link sources, SPA fallback and caching"""
+
+    def test_discovers_common_sitemap_and_linked_pages(self):
+        """Test that existing candidates from every source are kept in priority order"""
+        routes = {
+            "/": (200, HOME),
+            "/about": (200, b"about"),
+            "/contact": (405, b"contact"),  # HEAD refused, GET accepted
+            "/sitemap.xml": (200, SITEMAP),
+            "/blog": (200, b"blog"),
+            "/pricing": (200, b"pricing"),
+        }
+        discovery = PageDiscovery(transport=make_transport(routes))
+
+        pages = asyncio.run(discovery.discover("https://app.test"))
+
+        assert pages == [
+            "https://app.test",
+            "https://app.test/about",
+            "https://app.test/contact",
+            "https://app.test/blog",
+            "https://app.test/pricing",
+        ]
+
+    def test_max_pages_limits_result(self):
+        """Test that the home page is always first and the list is capped"""
+        routes = {"/": (200, HOME), "/about": (200, b"a"), "/contact": (200, b"c"), "/shop": (200, b"s")}
+        discovery = PageDiscovery(transport=make_transport(routes))
+        pages = asyncio.run(discovery.discover("https://app.test/", max_pages=2))
+        assert pages == ["https://app.test/", "https://app.test/shop"]
+
+    def test_spa_routes_use_browser_check(self):
+        """Test that catch-all SPA routes are only kept when the browser confirms them"""
+        routes = {path: (200, SPA_HOME) for path in ("/", "/login", "/about")}
+        discovery = PageDiscovery(transport=make_transport(routes))
+        checked = []
+
+        async def browser_check(urls):
+            checked.extend(urls)
+            return [url for url in urls if url.endswith("/login")]
+
+        pages = asyncio.run(discovery.discover("https://app.test", browser_check=browser_check))
+
+        assert sorted(checked) == ["https://app.test/about", "https://app.test/login"]
+        assert pages == ["https://app.test", "https://app.test/login"]
+
+    def test_results_are_cached_per_base_url(self):
+        """Test that a second discovery within the TTL makes no requests"""
+        calls = []
+        discovery = PageDiscovery(transport=make_transport({"/": (200, HOME)}, calls))
+
+        asyncio.run(discovery.discover("https://app.test"))
+        first_calls = len(calls)
+        asyncio.run(discovery.discover("https://app.test"))
+        assert len(calls) == first_calls
+
+        discovery.invalidate("https://app.test")
+        asyncio.run(discovery.discover("https://app.test"))
+        assert len(calls) == 2 * first_calls
+
+    def test_parse_sitemap_index(self):
+        """Test that a sitemap index is recognised"""
+        locs, is_index = parse_sitemap(
+            b'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            b"<sitemap><loc>https://app.test/s1.xml</loc></sitemap></sitemapindex>"
+        )
+        assert locs == ["https://app.test/s1.xml"] and is_index
+        assert parse_sitemap(b"not xml") == ([], False)
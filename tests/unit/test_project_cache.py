@@ -0,0 +1,136 @@
+"""
+Unit tests for the per-user project cache and field projection
+"""
+import asyncio
+
+import pytest
+
+from project_cache import InvalidFields, UserProjectCache, parse_fields, project_fields, select_columns
+
+
+class CountingLoader:
+    def __init__(self, value, delay=0.0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.value
+
+
+@pytest.mark.unit
+class TestFieldProjection:
+    """Test the ?fields= parameter"""
+
+    def test_fields_are_normalized(self):
+        """Test that requested fields are sorted, deduplicated and always include id"""
+        assert parse_fields("status, name,name") == ("id", "name", "status")
+        assert parse_fields(None) is None and parse_fields("") is None
+        assert select_columns(("id", "name")) == "id,name" and select_columns(None) == "*"
+
+    def test_unknown_fields_are_rejected(self):
+        """Test that columns outside the allow-list are refused"""
+        with pytest.raises(InvalidFields):
+            parse_fields("name,password_hash")
+
+    def test_projection_of_loaded_project(self):
+        """Test that only the requested keys are kept"""
+        project = {"id": "p1", "name": "App", "features": [{"id": "camera"}]}
+        assert project_fields(project, ("id", "name")) == {"id": "p1", "name": "App"}
+        assert project_fields(project, None) is project
+
+
+@pytest.mark.unit
+class TestUserProjectCache:
+    """Test per-user caching and invalidation"""
+
+    def test_responses_are_cached_per_user_and_query(self):
+        """Test that each (user, query) pair is read once"""
+        cache = UserProjectCache(ttl_seconds=60)
+        loader = CountingLoader(["p1"])
+
+        async def scenario():
+            for _ in range(3):
+                await cache.get("u1", "list:all", loader)
+                await cache.get("u1", "list:id,name:all", loader)
+                await cache.get("u2", "list:all", loader)
+
+        asyncio.run(scenario())
+        assert loader.calls == 3
+
+    def test_invalidation_only_affects_the_owner(self):
+        """Test that a project change drops every cached query of its owner and nobody else"""
+        cache = UserProjectCache(ttl_seconds=60)
+        loader = CountingLoader(["p1"])
+
+        async def scenario():
+            for user in ("u1", "u2"):
+                await cache.get(user, "list:all", loader)
+                await cache.get(user, "project:p1:", loader)
+            cache.invalidate_user("u1")
+            for user in ("u1", "u2"):
+                await cache.get(user, "list:all", loader)
+                await cache.get(user, "project:p1:", loader)
+
+        asyncio.run(scenario())
+        assert loader.calls == 6
+
+    def test_read_in_flight_during_invalidation_is_not_cached(self):
+        """Test that a list read before an update is not served after it"""
+        cache = UserProjectCache(ttl_seconds=60)
+        stale = CountingLoader(["old"], delay=0.05)
+        fresh = CountingLoader(["new"])
+
+        async def scenario():
+            pending = asyncio.ensure_future(cache.get("u1", "list:all", stale))
+            await asyncio.sleep(0.01)
+            cache.invalidate_user("u1")
+            await pending
+            return await cache.get("u1", "list:all", fresh)
+
+        assert asyncio.run(scenario()) == ["new"]
+
+    def test_missing_project_is_cached(self):
+        """Test that a None result (404) is cached like any other response"""
+        cache = UserProjectCache(ttl_seconds=60)
+        loader = CountingLoader(None)
+
+        async def scenario():
+            return [await cache.get("u1", "project:x:", loader) for _ in range(3)]
+
+        assert asyncio.run(scenario()) == [None, None, None]
+        assert loader.calls == 1
+
+    def test_eviction_keeps_the_user_index_consistent(self):
+        """Test the entry limit and that evicted entries leave no trace"""
+        cache = UserProjectCache(ttl_seconds=60, max_entries=2)
+        loader = CountingLoader([])
+
+        async def scenario():
+            await cache.get("u1", "a", loader)
+            await cache.get("u2", "b", loader)
+            await cache.get("u3", "c", loader)
+
+        asyncio.run(scenario())
+        assert len(cache._entries) == 2
+        assert "u1" not in cache._keys_by_user
+        cache.invalidate_user("u2")
+        assert list(cache._keys_by_user) == ["u3"]
+
+    def test_generations_are_pruned(self):
+        """Test that invalidation counters do not outlive the reads they guard"""
+        cache = UserProjectCache(ttl_seconds=60)
+        loader = CountingLoader([], delay=0.02)
+
+        async def scenario():
+            pending = asyncio.ensure_future(cache.get("u1", "list:all", loader))
+            await asyncio.sleep(0.01)
+            cache.invalidate_user("u1")
+            assert cache._generations == {"u1": 1}
+            await pending
+            cache.invalidate_user("u2")
+
+        asyncio.run(scenario())
+        assert cache._generations == {} and cache._pending == {}
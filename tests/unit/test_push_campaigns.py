@@ -0,0 +1,146 @@
+"""
+Unit tests for the push campaign queue
+"""
+import asyncio
+import time
+
+import pytest
+
+from push_campaigns import (
+    CAMPAIGN_COMPLETED,
+    CAMPAIGN_QUEUED,
+    CAMPAIGN_RUNNING,
+    PushCampaignQueue,
+    retry_delay,
+)
+from push_dispatcher import DispatchReport, PushResult
+
+
+class ScriptedDispatcher:
+    """Answers each token from a script of outcomes (last outcome repeats)"""
+
+    def __init__(self, script=None):
+        self.script = script or {}
+        self.calls = []
+        self.seen = {}
+
+    async def send(self, android_tokens, ios_tokens, title, body, data=None):
+        self.calls.append((list(android_tokens), list(ios_tokens)))
+        results = []
+        for platform, tokens in (("android", android_tokens), ("ios", ios_tokens)):
+            for token in tokens:
+                outcomes = self.script.get(token, ["ok"])
+                attempt = self.seen.get(token, 0)
+                self.seen[token] = attempt + 1
+                outcome = outcomes[min(attempt, len(outcomes) - 1)]
+                results.append(PushResult(
+                    token, platform,
+                    success=outcome == "ok",
+                    error=None if outcome == "ok" else outcome,
+                    invalid_token=outcome == "gone",
+                    retryable=outcome == "busy",
+                    latency_ms=float(len(results) + 1)
+                ))
+        return DispatchReport(results=results)
+
+
+def make_queue(tmp_path, dispatcher, **kwargs):
+    options = {"batch_size": 2, "retry_base": 0.01, "retry_max": 0.02}
+    options.update(kwargs)
+    return PushCampaignQueue(tmp_path, dispatcher_factory=lambda: dispatcher, **options)
+
+
+def run_campaign(queue, android=(), ios=(), user_id="u1"):
+    async def scenario():
+        campaign = await queue.enqueue(user_id, android, ios, "Hello", "World", {"k": "v"})
+        return await queue.wait(campaign.campaign_id)
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.unit
+class TestPushCampaignQueue:
+    """Test batching, retries, invalid-token pruning and metrics"""
+
+    def test_campaign_is_delivered_in_batches(self, tmp_path):
+        """Test that recipients are sent in batches and counted once"""
+        dispatcher = ScriptedDispatcher()
+        queue = make_queue(tmp_path, dispatcher)
+
+        campaign = run_campaign(queue, android=["a1", "a2", "a3", "a1"], ios=["i1"])
+
+        assert campaign.status == CAMPAIGN_COMPLETED
+        assert campaign.total == 4
+        assert len(dispatcher.calls) == 2
+        assert campaign.stats["sent"] == 4 and campaign.stats["pending"] == 0
+        assert campaign.stats["latency_ms"]["p50"] is not None
+        data = campaign.to_dict()
+        assert data["data"] == {"k": "v"} and "user_id" not in data and data["duration_ms"] is not None
+
+    def test_retryable_errors_are_retried_with_backoff(self, tmp_path):
+        """Test that temporary failures are retried until success or the attempt limit"""
+        dispatcher = ScriptedDispatcher({"flaky": ["busy", "busy", "ok"], "down": ["busy"]})
+        queue = make_queue(tmp_path, dispatcher, max_attempts=3)
+
+        campaign = run_campaign(queue, android=["flaky", "down", "fine"])
+
+        assert dispatcher.seen == {"flaky": 3, "down": 3, "fine": 1}
+        assert campaign.stats["sent"] == 2
+        assert campaign.stats["failed"] == 1
+        assert campaign.stats["retries"] == 4
+
+    def test_unregistered_tokens_are_pruned(self, tmp_path):
+        """Test that an unregistered token is skipped by later campaigns and reported"""
+        dispatcher = ScriptedDispatcher({"old": ["gone"]})
+        pruned = []
+        queue = make_queue(tmp_path, dispatcher, on_invalid_tokens=pruned.extend)
+
+        first = run_campaign(queue, ios=["old", "new"])
+        second = run_campaign(queue, ios=["old", "new"])
+
+        assert first.stats["invalid"] == 1
+        assert pruned == [("ios", "old")]
+        assert second.stats["skipped"] == 1 and second.stats["sent"] == 1
+        assert dispatcher.seen["old"] == 1
+        assert queue.invalid_token_count() == 1
+
+    def test_latency_percentiles(self, tmp_path):
+        """Test nearest-rank percentiles over delivered tokens"""
+        queue = make_queue(tmp_path, ScriptedDispatcher(), batch_size=100)
+        campaign = run_campaign(queue, android=[f"t{i}" for i in range(100)])
+
+        assert campaign.stats["latency_ms"] == {"p50": 50.0, "p90": 90.0, "p99": 99.0}
+
+    def test_abandoned_campaign_is_resumed(self, tmp_path):
+        """Test that another worker takes over a campaign whose owner stopped"""
+        dispatcher = ScriptedDispatcher()
+        crashed = make_queue(tmp_path, dispatcher)
+        campaign_id = crashed._create("u1", [("android", "a"), ("android", "b")], "T", "B", {})
+        assert crashed._claim(campaign_id)
+        with crashed._connect() as conn:
+            conn.execute("UPDATE campaigns SET heartbeat_at = ?", (time.time() - 3600,))
+
+        worker = make_queue(tmp_path, dispatcher, stale_seconds=60)
+
+        async def scenario():
+            assert worker.resume() == [campaign_id]
+            return await worker.wait(campaign_id)
+
+        campaign = asyncio.run(scenario())
+        assert campaign.status == CAMPAIGN_COMPLETED and campaign.stats["sent"] == 2
+
+    def test_shutdown_requeues_running_campaigns(self, tmp_path):
+        """Test that a stopped worker hands its campaigns back to the queue"""
+        queue = make_queue(tmp_path, ScriptedDispatcher())
+        campaign_id = queue._create("u1", [("ios", "a")], "T", "B", {})
+        assert queue._claim(campaign_id)
+        assert queue.get(campaign_id).status == CAMPAIGN_RUNNING
+
+        queue.shutdown()
+        assert queue.get(campaign_id).status == CAMPAIGN_QUEUED
+
+    def test_retry_delay_grows_and_is_capped(self):
+        """Test exponential backoff bounds"""
+        assert 0.5 <= retry_delay(1, base=1, maximum=100) <= 1
+        assert 4 <= retry_delay(4, base=1, maximum=100) <= 8
+        assert retry_delay(20, base=1, maximum=10) <= 10
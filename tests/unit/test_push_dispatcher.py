@@ -0,0 +1,150 @@
+"""
+Unit tests for batched push delivery
+"""
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from push_dispatcher import APNsConnection, PushDispatcher, RateLimiter
+
+
+class UnregisteredError(Exception):
+    pass
+
+
+class FakeMessaging:
+    """Stand-in for firebase_admin.messaging"""
+
+    def __init__(self, invalid=()):
+        self.invalid = set(invalid)
+        self.calls = []
+
+    def Notification(self, title, body):
+        return SimpleNamespace(title=title, body=body)
+
+    def MulticastMessage(self, tokens, notification, data):
+        return SimpleNamespace(tokens=tokens, notification=notification, data=data)
+
+    def send_each_for_multicast(self, message):
+        self.calls.append(len(message.tokens))
+        responses = []
+        for token in message.tokens:
+            if token in self.invalid:
+                responses.append(SimpleNamespace(success=False, message_id=None, exception=UnregisteredError("gone")))
+            else:
+                responses.append(SimpleNamespace(success=True, message_id=f"m-{token}", exception=None))
+        return SimpleNamespace(responses=responses)
+
+
+@pytest.fixture
+def apns_key(tmp_path):
+    key = ec.generate_private_key(ec.SECP256R1())
+    path = tmp_path / "AuthKey.p8"
+    path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    return path, key.public_key()
+
+
+def apns_transport(requests, public_key):
+    def handler(request):
+        requests.append(request)
+        claims = jwt.decode(request.headers["authorization"].split()[1], public_key, algorithms=["ES256"])
+        assert claims["iss"] == "TEAM"
+        token = request.url.path.rsplit("/", 1)[1]
+        if token == "gone":
+            return httpx.Response(410, json={"reason": "Unregistered"})
+        if token == "busy":
+            return httpx.Response(503, json={"reason": "ServiceUnavailable"})
+        return httpx.Response(200, headers={"apns-id": f"id-{token}"})
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.unit
+class TestPushDispatcher:
+    """Test FCM batching, APNs delivery and per-token results"""
+
+    def test_fcm_tokens_are_sent_in_batches(self):
+        """Test that Android tokens go out in multicast batches of at most the batch size"""
+        messaging = FakeMessaging(invalid={"t3"})
+        dispatcher = PushDispatcher(fcm_messaging=messaging, fcm_batch_size=2, fcm_rate=0)
+        tokens = [f"t{i}" for i in range(5)] + ["t0"]
+
+        report = asyncio.run(dispatcher.send(tokens, [], "Hi", "Body", {"n": 1}))
+
+        assert sorted(messaging.calls) == [1, 2, 2]
+        assert len(report.results) == 5
+        assert report.sent == 4
+        assert report.invalid_tokens == ["t3"]
+        data = report.to_dict()
+        assert data["total"] == 5 and data["results"]["android"][0]["message_id"] == "m-t0"
+
+    def test_apns_reuses_one_client(self, apns_key):
+        """Test that iOS sends share one client and one signed token, with per-token outcomes"""
+        path, public_key = apns_key
+        requests = []
+        apns = APNsConnection(str(path), "KEY", "TEAM", "com.app", transport=apns_transport(requests, public_key))
+        dispatcher = PushDispatcher(apns=apns, apns_rate=0)
+
+        async def scenario():
+            report = await dispatcher.send([], ["a", "b", "gone", "busy"], "Hi", "Body", {"deep_link": "/x"})
+            client = apns._client
+            await dispatcher.send([], ["c"], "Hi", "Body")
+            assert apns._client is client
+            await dispatcher.close()
+            return report
+
+        report = asyncio.run(scenario())
+
+        assert len(requests) == 5
+        assert len({request.headers["authorization"] for request in requests}) == 1
+        assert requests[0].headers["apns-topic"] == "com.app"
+        payload = json.loads(requests[0].content)
+        assert payload["aps"]["alert"] == {"title": "Hi", "body": "Body"} and payload["deep_link"] == "/x"
+        by_token = {result.token: result for result in report.results}
+        assert by_token["a"].success and by_token["a"].message_id == "id-a"
+        assert by_token["gone"].invalid_token and not by_token["gone"].retryable
+        assert by_token["busy"].retryable and not by_token["busy"].invalid_token
+
+    def test_unconfigured_providers_report_errors(self):
+        """Test that tokens for a disabled provider fail with a configuration message"""
+        report = asyncio.run(PushDispatcher().send(["a"], ["b"], "Hi", "Body"))
+        assert report.sent == 0
+        assert all("not configured" in result.error for result in report.results)
+
+
+@pytest.mark.unit
+class TestRateLimiter:
+    """Test the token bucket"""
+
+    def test_rate_is_enforced(self):
+        """Test that acquiring beyond the bucket waits for refill"""
+        limiter = RateLimiter(100)
+
+        async def scenario():
+            started = time.monotonic()
+            for _ in range(120):
+                await limiter.acquire()
+            return time.monotonic() - started
+
+        assert 0.15 <= asyncio.run(scenario()) < 1.0
+
+    def test_zero_rate_is_unlimited(self):
+        """Test that a zero rate never waits"""
+        limiter = RateLimiter(0)
+
+        async def scenario():
+            for _ in range(10000):
+                await limiter.acquire()
+
+        started = time.monotonic()
+        asyncio.run(scenario())
+        assert time.monotonic() - started < 0.5
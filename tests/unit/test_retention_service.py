@@ -0,0 +1,173 @@
+"""
+Unit tests for the incremental build retention job
+"""
+import asyncio
+import json
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from retention_service import RetentionPolicy, RetentionService
+
+
+class FakeBuildsQuery:
+    """Chainable subset of the PostgREST query builder over an in-memory table"""
+
+    def __init__(self, db, action="select"):
+        self.db = db
+        self.action = action
+        self.filters = []
+        self.row_limit = None
+
+    def select(self, *_):
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row[column] < value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row[column] > value)
+        return self
+
+    def or_(self, condition):
+        # Only the keyset filter built by after_cursor()
+        created_at, build_id = re.fullmatch(
+            r'created_at\.gt\.(".*?"),and\(created_at\.eq\.\1,id\.gt\.(".*?")\)', condition
+        ).groups()
+        cursor = (json.loads(created_at), json.loads(build_id))
+        self.filters.append(lambda row: (row["created_at"], row["id"]) > cursor)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row[column] in values)
+        return self
+
+    def order(self, *_):
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def execute(self):
+        rows = sorted(
+            (row for row in self.db.rows if all(f(row) for f in self.filters)),
+            key=lambda row: (row["created_at"], row["id"])
+        )
+        if self.action == "delete":
+            self.db.delete_calls += 1
+            self.db.rows = [row for row in self.db.rows if row not in rows]
+            return SimpleNamespace(data=rows)
+        return SimpleNamespace(data=rows[:self.row_limit])
+
+
+class FakeSupabase:
+    def __init__(self, count, failing_paths=()):
+        self.rows = [
+            {
+                "id": f"build-{i:03d}",
+                "created_at": f"2020-01-01T00:{i // 60:02d}:{i % 60:02d}+00:00",
+                "storage_path": f"projects/p/builds/build-{i:03d}.apk",
+                "status": "completed",
+            }
+            for i in range(count)
+        ]
+        self.removed = []
+        self.remove_calls = 0
+        self.delete_calls = 0
+        self.failing_paths = set(failing_paths)
+        self.storage = SimpleNamespace(from_=lambda bucket: SimpleNamespace(remove=self._remove))
+
+    def _remove(self, paths):
+        self.remove_calls += 1
+        if self.failing_paths.intersection(paths):
+            raise RuntimeError("storage unavailable")
+        self.removed.extend(paths)
+
+    def table(self, name):
+        assert name == "builds"
+        return FakeBuildsQuery(self)
+
+
+def make_service(client, tmp_path, **policy):
+    return RetentionService(
+        lambda: client,
+        policy=RetentionPolicy(max_age_days=30, page_size=50, batch_size=20, concurrency=3, **policy),
+        checkpoint_path=str(tmp_path / "checkpoint.json"),
+    )
+
+
+@pytest.mark.unit
+class TestRetentionService:
+    """Test paging, bulk deletes, checkpoints and metrics"""
+
+    def test_deletes_in_batches(self, tmp_path):
+        """Test that 120 expired builds take a handful of bulk calls"""
+        client = FakeSupabase(120)
+        deleted_ids = []
+        service = make_service(client, tmp_path)
+        service.on_builds_deleted = deleted_ids.extend
+
+        result = asyncio.run(service.run_once())
+
+        assert result == {"deleted": 120}
+        assert client.rows == []
+        assert len(client.removed) == 120
+        assert client.remove_calls == 7  # 3 pages of 50/50/20 rows, 20 paths per call
+        assert client.delete_calls == 7
+        assert len(deleted_ids) == 120
+        assert service.metrics.builds_deleted == 120
+        assert not (tmp_path / "checkpoint.json").exists()
+
+    def test_failed_storage_batches_keep_rows(self, tmp_path):
+        """Test that rows whose APK could not be removed are kept and skipped"""
+        client = FakeSupabase(60, failing_paths={"projects/p/builds/build-005.apk"})
+        service = make_service(client, tmp_path)
+
+        result = asyncio.run(service.run_once())
+
+        assert result["deleted"] == 40
+        assert len(client.rows) == 20
+        assert service.metrics.errors == 1
+
+    def test_resumes_from_checkpoint(self, tmp_path):
+        """Test that an interrupted run keeps its cutoff and count"""
+        client = FakeSupabase(10)
+        checkpoint = {
+            "max_age_days": 30,
+            "statuses": [],
+            "cutoff": "2020-01-01T00:00:05+00:00",
+            "cursor": None,
+            "deleted": 7,
+        }
+        (tmp_path / "checkpoint.json").write_text(json.dumps(checkpoint))
+
+        result = asyncio.run(make_service(client, tmp_path).run_once())
+
+        assert result == {"deleted": 12}
+        assert [row["id"] for row in client.rows][0] == "build-005"
+
+    def test_cursor_keeps_rows_sharing_a_timestamp(self, tmp_path):
+        """Test that rows with the same created_at as the page boundary are not skipped"""
+        client = FakeSupabase(60, failing_paths={"projects/p/builds/build-005.apk"})
+        for row in client.rows[45:]:
+            row["created_at"] = client.rows[49]["created_at"]
+        service = make_service(client, tmp_path)
+
+        result = asyncio.run(service.run_once())
+
+        assert result["deleted"] == 40
+        assert [row["id"] for row in client.rows] == [f"build-{i:03d}" for i in range(20)]
+
+    def test_status_policy_filter(self, tmp_path):
+        """Test that only configured statuses are purged"""
+        client = FakeSupabase(10)
+        client.rows[0]["status"] = "failed"
+        asyncio.run(make_service(client, tmp_path, statuses=("failed",)).run_once())
+        assert len(client.rows) == 9
@@ -0,0 +1,77 @@
+"""
+Unit tests for the on-disk screenshot cache
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from screenshot_cache import ScreenshotCache
+
+
+@pytest.mark.unit
+class TestScreenshotCache:
+    """Test storage, LRU eviction and page revalidation"""
+
+    def test_put_get_keyed_by_viewport(self, tmp_path):
+        """Test that entries are keyed by url, size and device"""
+        cache = ScreenshotCache(tmp_path)
+        cache.put("https://app.test", 1080, 1920, "Pixel 5", b"phone")
+        assert cache.get("https://app.test", 1080, 1920, "Pixel 5") == b"phone"
+        assert cache.get("https://app.test", 1200, 1920, "Pixel 5") is None
+        assert cache.status()["hits"] == 1 and cache.status()["misses"] == 1
+
+    def test_entries_are_tied_to_their_dom(self, tmp_path):
+        """Test that a screenshot is only served for the rendered DOM it was captured from"""
+        cache = ScreenshotCache(tmp_path)
+        cache.put("https://app.test", 1080, 1920, None, b"v1", dom_hash="hash-v1")
+        assert cache.get("https://app.test", 1080, 1920, dom_hash="hash-v1") == b"v1"
+        assert cache.get("https://app.test", 1080, 1920, dom_hash="hash-v2") is None
+        assert cache.get("https://app.test", 1080, 1920) == b"v1"
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        """Test that the oldest accessed screenshots go first"""
+        cache = ScreenshotCache(tmp_path, max_bytes=20)
+        cache.put("https://app.test/a", 1, 1, None, b"a" * 10)
+        cache.put("https://app.test/b", 1, 1, None, b"b" * 10)
+        cache.get("https://app.test/a", 1, 1)
+        cache.put("https://app.test/c", 1, 1, None, b"c" * 10)
+
+        assert cache.evict() == 1
+        assert cache.get("https://app.test/b", 1, 1) is None
+        assert cache.get("https://app.test/a", 1, 1) == b"a" * 10
+
+    def test_unchanged_pages_uses_conditional_requests(self, tmp_path):
+        """Test 304 / same Last-Modified revalidation and changed pages"""
+        seen = []
+
+        def handler(request):
+            seen.append(dict(request.headers))
+            if request.url.path == "/etag":
+                return httpx.Response(304)
+            if request.url.path == "/modified":
+                return httpx.Response(200, headers={"Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+            return httpx.Response(200, headers={"ETag": '"new"'})
+
+        cache = ScreenshotCache(tmp_path, fresh_seconds=0, transport=httpx.MockTransport(handler))
+        cache.set_page_validator("https://app.test/etag", etag='"v1"')
+        cache.set_page_validator("https://app.test/modified", last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+        cache.set_page_validator("https://app.test/changed", etag='"old"')
+        cache.set_page_validator("https://app.test/dom", dom_hash="abc")
+
+        unchanged = asyncio.run(cache.unchanged_pages([
+            "https://app.test/etag", "https://app.test/modified", "https://app.test/changed",
+            "https://app.test/dom", "https://app.test/unknown",
+        ]))
+
+        assert unchanged == {"https://app.test/etag", "https://app.test/modified"}
+        assert any(headers.get("if-none-match") == '"v1"' for headers in seen)
+        assert len(seen) == 3
+
+    def test_invalidate_url(self, tmp_path):
+        """Test that a page's screenshots and validators are dropped"""
+        cache = ScreenshotCache(tmp_path)
+        cache.put("https://app.test", 1, 1, None, b"x")
+        cache.set_page_validator("https://app.test", etag='"v1"')
+        assert cache.invalidate_url("https://app.test") == 1
+        assert cache.page_validator("https://app.test") is None
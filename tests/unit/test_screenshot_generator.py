@@ -0,0 +1,245 @@
+"""
+Unit tests for the concurrent screenshot capture planner
+"""
+import asyncio
+import io
+import zipfile
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import screenshot_generator
+from screenshot_cache import ScreenshotCache
+from screenshot_generator import APP_STORE_RESOLUTIONS, PLAY_STORE_RESOLUTIONS, ScreenshotGenerator
+
+pytestmark = pytest.mark.skipif(not screenshot_generator.HAS_PLAYWRIGHT, reason="Playwright not installed")
+
+
+class FakePage:
+    def __init__(self, browser, viewport):
+        self.browser = browser
+        self.viewport = viewport
+
+    async def goto(self, url, **kwargs):
+        self.browser.navigations.append(url)
+        if "broken" in url:
+            raise RuntimeError("net::ERR_NAME_NOT_RESOLVED")
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(status=200, headers=self.browser.headers)
+
+    async def evaluate(self, script):
+        return self.browser.dom
+
+    async def set_viewport_size(self, viewport):
+        self.viewport = viewport
+
+    async def screenshot(self, **kwargs):
+        if self.browser.fail_screenshots:
+            raise RuntimeError("Target closed")
+        self.browser.screenshots += 1
+        return f"{self.viewport['width']}x{self.viewport['height']}".encode()
+
+
+class FakeContext:
+    def __init__(self, browser, viewport):
+        self.browser = browser
+        self.viewport = viewport
+
+    async def new_page(self):
+        return FakePage(self.browser, self.viewport)
+
+    async def close(self):
+        self.browser.open_contexts -= 1
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.navigations = []
+        self.dom = "<html><body>v1</body></html>"
+        self.headers = {}
+        self.screenshots = 0
+        self.fail_screenshots = False
+        self.open_contexts = 0
+        self.max_open_contexts = 0
+
+    async def new_context(self, viewport, **kwargs):
+        self.open_contexts += 1
+        self.max_open_contexts = max(self.max_open_contexts, self.open_contexts)
+        return FakeContext(self, viewport)
+
+
+@pytest.fixture(autouse=True)
+def no_waits(monkeypatch):
+    monkeypatch.setattr(screenshot_generator, "VIEWPORT_SETTLE_SECONDS", 0)
+    original = ScreenshotGenerator.capture_viewports
+
+    async def capture_viewports(self, url, targets, wait_time=0):
+        return await original(self, url, targets, wait_time=0)
+
+    monkeypatch.setattr(ScreenshotGenerator, "capture_viewports", capture_viewports)
+
+
+@pytest.mark.unit
+class TestScreenshotCapturePlanner:
+    """Test planning, bounded concurrency and per-capture timings"""
+
+    def test_navigates_once_per_page_group(self):
+        """Test that resolutions of a page are rendered from one navigation"""
+        browser = FakeBrowser()
+        generator = ScreenshotGenerator(browser=browser, concurrency=2)
+        pages = ["https://app.test", "https://app.test/about"]
+
+        zip_bytes = asyncio.run(generator.generate_all_screenshots("https://app.test", pages, "both", False))
+
+        expected = len(pages) * (len(APP_STORE_RESOLUTIONS) + len(PLAY_STORE_RESOLUTIONS))
+        assert len(browser.navigations) == 2
+        assert browser.max_open_contexts <= 2
+        assert browser.open_contexts == 0
+        with zipfile.ZipFile(io.BytesIO(zip_bytes)) as archive:
+            assert archive.read("ios/iphone_6_7/about.png") == b"1290x2796"
+            assert archive.read("android/phone/home.png") == b"1080x1920"
+            assert "timings.json" not in archive.namelist()
+        timings = generator.timings_report()
+        assert len(timings["captures"]) == expected
+        assert all(capture["ok"] and capture["navigation_ms"] is not None for capture in timings["captures"])
+
+    def test_single_page_is_split_across_contexts(self):
+        """Test that a lone page uses the available concurrency"""
+        generator = ScreenshotGenerator(browser=FakeBrowser(), concurrency=4)
+        plan = generator._plan_captures("https://app.test", ["https://app.test"], "both")
+        assert len(plan) == 4
+        assert sum(len(targets) for _, targets in plan) == 8
+
+    def test_failed_page_is_reported(self):
+        """Test that a page that cannot load is recorded without failing the job"""
+        generator = ScreenshotGenerator(browser=FakeBrowser(), concurrency=2)
+        pages = ["https://app.test", "https://broken.test"]
+
+        zip_bytes = asyncio.run(generator.generate_all_screenshots("https://app.test", pages, "android", False))
+
+        failed = [timing for timing in generator.timings if not timing.ok]
+        assert len(failed) == 2 and all(timing.page_url == "https://broken.test" for timing in failed)
+        with zipfile.ZipFile(io.BytesIO(zip_bytes)) as archive:
+            assert len([name for name in archive.namelist() if name.endswith(".png")]) == 2
+
+
+def etag_transport(etag):
+    def handler(request):
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(304)
+        return httpx.Response(200, headers={"ETag": etag})
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.unit
+class TestScreenshotCacheIntegration:
+    """Test that unchanged pages are served from the screenshot cache"""
+
+    def run(self, generator):
+        return asyncio.run(generator.generate_all_screenshots("https://app.test", ["https://app.test"], "android", False))
+
+    def test_unchanged_etag_skips_browser(self, tmp_path):
+        """Test that a 304 revalidation serves the zip without leasing a browser"""
+        cache = ScreenshotCache(tmp_path, fresh_seconds=0, transport=etag_transport('"v1"'))
+        browser = FakeBrowser()
+        browser.headers = {"etag": '"v1"'}
+        self.run(ScreenshotGenerator(browser=browser, cache=cache))
+
+        class NoPool:
+            def lease(self):
+                raise AssertionError("browser leased for a cached page")
+
+        generator = ScreenshotGenerator(browser_pool=NoPool(), cache=cache)
+        zip_bytes = self.run(generator)
+
+        assert all(timing.cached for timing in generator.timings)
+        with zipfile.ZipFile(io.BytesIO(zip_bytes)) as archive:
+            assert archive.read("android/phone/home.png") == b"1080x1920"
+
+    def test_dom_hash_avoids_recapture(self, tmp_path):
+        """Test that an identical rendered DOM reuses cached PNGs and a changed one recaptures"""
+        cache = ScreenshotCache(tmp_path, fresh_seconds=0)
+        browser = FakeBrowser()
+        self.run(ScreenshotGenerator(browser=browser, cache=cache))
+        assert browser.screenshots == 2
+
+        self.run(ScreenshotGenerator(browser=browser, cache=cache))
+        assert browser.screenshots == 2
+
+        browser.dom = "<html><body>v2</body></html>"
+        self.run(ScreenshotGenerator(browser=browser, cache=cache))
+        assert browser.screenshots == 4
+
+    def test_failed_capture_does_not_revalidate_old_pngs(self, tmp_path):
+        """Test that a page changed during a failed capture is recaptured instead of served from the cache"""
+        current = {"etag": '"v1"'}
+
+        def handler(request):
+            if request.headers.get("if-none-match") == current["etag"]:
+                return httpx.Response(304)
+            return httpx.Response(200, headers={"ETag": current["etag"]})
+
+        cache = ScreenshotCache(tmp_path, fresh_seconds=0, transport=httpx.MockTransport(handler))
+        browser = FakeBrowser()
+        browser.headers = {"etag": '"v1"'}
+        self.run(ScreenshotGenerator(browser=browser, cache=cache))
+
+        current["etag"] = browser.headers["etag"] = '"v2"'
+        browser.dom = "<html><body>v2</body></html>"
+        browser.fail_screenshots = True
+        self.run(ScreenshotGenerator(browser=browser, cache=cache))
+
+        browser.fail_screenshots = False
+        generator = ScreenshotGenerator(browser=browser, cache=cache)
+        self.run(generator)
+        assert not any(timing.cached for timing in generator.timings)
+        assert browser.screenshots == 4
+
+    def test_refresh_bypasses_cache(self, tmp_path):
+        """Test that refresh recaptures even within the freshness window"""
+        cache = ScreenshotCache(tmp_path, fresh_seconds=60)
+        browser = FakeBrowser()
+        self.run(ScreenshotGenerator(browser=browser, cache=cache))
+        self.run(ScreenshotGenerator(browser=browser, cache=cache, refresh=True))
+        assert browser.screenshots == 4
+
+
+@pytest.mark.unit
+class TestScreenshotPostProcessing:
+    """Test that captures go through the post-processing pool before the zip and the cache"""
+
+    def test_processing_stats_and_optimized_cache(self, tmp_path):
+        """Test that fresh captures are optimized once and the timings report each stage"""
+        from screenshot_processing import ProcessingOptions
+
+        class CountingExecutor:
+            def __init__(self):
+                self.calls = []
+
+            def submit(self, func, *args):
+                self.calls.append(args[0])
+                return asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+            async def wait(self, futures, timeout=None):
+                return await asyncio.gather(*futures)
+
+        executor = CountingExecutor()
+        cache = ScreenshotCache(tmp_path, fresh_seconds=60)
+        options = ProcessingOptions(optimize_png=True, variants=())
+        generator = ScreenshotGenerator(browser=FakeBrowser(), cache=cache, processing=options, executor=executor)
+        zip_bytes = asyncio.run(generator.generate_all_screenshots("https://app.test", ["https://app.test"], "android", False))
+
+        assert sorted(executor.calls) == ["android/phone/home.png", "android/tablet_10/home.png"]
+        with zipfile.ZipFile(io.BytesIO(zip_bytes)) as archive:
+            assert archive.getinfo("android/phone/home.png").compress_type == zipfile.ZIP_STORED
+        processing = generator.timings_report()["processing"]
+        assert processing["stages"]["png"]["count"] == 2
+        assert set(processing["files"]) == {"android/phone/home.png", "android/tablet_10/home.png"}
+
+        # Served from the cache: nothing left to optimize
+        executor.calls.clear()
+        cached = ScreenshotGenerator(browser=FakeBrowser(), cache=cache, processing=options, executor=executor)
+        asyncio.run(cached.generate_all_screenshots("https://app.test", ["https://app.test"], "android", False))
+        assert executor.calls == []
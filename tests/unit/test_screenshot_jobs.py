@@ -0,0 +1,149 @@
+"""
+Unit tests for background screenshot jobs
+"""
+import asyncio
+import time
+import zipfile
+
+import pytest
+
+from screenshot_jobs import JOB_COMPLETED, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, ScreenshotJobManager, job_fingerprint
+
+
+def fake_generate(total=3, fail=False, release=None):
+    async def generate(output_path, progress, report):
+        for captured in range(1, total + 1):
+            if release is not None:
+                await release.wait()
+            progress(captured, total)
+        if fail:
+            raise RuntimeError("net::ERR_CONNECTION_REFUSED")
+        with zipfile.ZipFile(output_path, "w") as archive:
+            archive.writestr("README.md", "ok")
+        report({"total_ms": 12.5, "captures": [{"filename": "home.png", "ms": 12.5}]})
+        return len(open(output_path, "rb").read())
+
+    return generate
+
+
+async def wait_for_status(manager, job_id, status):
+    while manager.get(job_id).status != status:
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.unit
+class TestScreenshotJobManager:
+    """Test job lifecycle, progress tracking, reuse and retention"""
+
+    def test_job_completes_with_progress_and_result(self, tmp_path):
+        """Test that a job records progress and keeps its zip on disk"""
+        manager = ScreenshotJobManager(tmp_path)
+
+        async def scenario():
+            job = await manager.start("p1", "u1", "android", fake_generate(), file_name="shots.zip")
+            assert job.status == JOB_QUEUED
+            return await manager.wait(job.job_id)
+
+        job = asyncio.run(scenario())
+
+        assert job.status == JOB_COMPLETED
+        assert (job.captured, job.total) == (3, 3)
+        assert job.to_dict()["progress"] == 100
+        assert job.to_dict()["timings"]["captures"] == [{"filename": "home.png", "ms": 12.5}]
+        assert job.to_dict()["download_url"] == f"/api/screenshots/jobs/{job.job_id}/download"
+        assert "user_id" not in job.to_dict()
+        path = manager.result_path(job.job_id)
+        assert path.stat().st_size == job.size
+        assert not path.with_suffix(".tmp").exists()
+
+    def test_failed_job_is_recorded(self, tmp_path):
+        """Test that a generation error is stored and propagated to the waiter"""
+        manager = ScreenshotJobManager(tmp_path)
+
+        async def scenario():
+            job = await manager.start("p1", "u1", "ios", fake_generate(fail=True))
+            with pytest.raises(RuntimeError):
+                await manager.wait(job.job_id)
+            return job.job_id
+
+        job = manager.get(asyncio.run(scenario()))
+
+        assert job.status == JOB_FAILED
+        assert "ERR_CONNECTION_REFUSED" in job.error
+        assert job.to_dict()["download_url"] is None
+        assert not manager.result_path(job.job_id).exists()
+
+    def test_active_job_is_reused(self, tmp_path):
+        """Test that a second request for the same project and store joins the running job"""
+        manager = ScreenshotJobManager(tmp_path)
+
+        async def scenario():
+            release = asyncio.Event()
+            first = await manager.start("p1", "u1", "both", fake_generate(release=release))
+            await asyncio.sleep(0)
+            second = await manager.start("p1", "u1", "both", fake_generate())
+            other_store = await manager.start("p1", "u1", "ios", fake_generate())
+            # The status write goes through the manager's writer thread
+            await asyncio.wait_for(wait_for_status(manager, first.job_id, JOB_RUNNING), 5)
+            release.set()
+            await manager.wait(first.job_id)
+            await manager.wait(other_store.job_id)
+            return first, second, other_store
+
+        first, second, other_store = asyncio.run(scenario())
+
+        assert second.job_id == first.job_id
+        assert other_store.job_id != first.job_id
+        assert manager.latest("p1", "u1").job_id == other_store.job_id
+
+    def test_different_parameters_start_a_new_job(self, tmp_path):
+        """Test that a refresh or explicit URLs do not join a running job with other parameters"""
+        manager = ScreenshotJobManager(tmp_path)
+        default = job_fingerprint(urls=None, refresh=False)
+
+        async def scenario():
+            release = asyncio.Event()
+            first = await manager.start("p1", "u1", "both", fake_generate(release=release), fingerprint=default)
+            refreshed = await manager.start(
+                "p1", "u1", "both", fake_generate(), fingerprint=job_fingerprint(urls=None, refresh=True)
+            )
+            same = await manager.start(
+                "p1", "u1", "both", fake_generate(), fingerprint=job_fingerprint(refresh=False, urls=None)
+            )
+            release.set()
+            await manager.wait(first.job_id)
+            await manager.wait(refreshed.job_id)
+            return first, refreshed, same
+
+        first, refreshed, same = asyncio.run(scenario())
+
+        assert refreshed.job_id != first.job_id
+        assert same.job_id == first.job_id
+        assert "fingerprint" not in first.to_dict()
+
+    def test_stale_job_is_reported_failed(self, tmp_path):
+        """Test that a job abandoned by a restarted worker is not reused"""
+        manager = ScreenshotJobManager(tmp_path, stale_seconds=60)
+        job = manager._create("p1", "u1", "android", None)
+        manager._update(job.job_id, status=JOB_RUNNING)
+        with manager._connect() as conn:
+            conn.execute("UPDATE jobs SET updated_at = ?", (time.time() - 120,))
+
+        assert manager.get(job.job_id).status == JOB_FAILED
+        assert manager.find_active("p1", "u1", "android") is None
+
+    def test_purge_expired_removes_results(self, tmp_path):
+        """Test that expired jobs and their zips are deleted"""
+        manager = ScreenshotJobManager(tmp_path, ttl_seconds=60)
+        job = asyncio.run(self._complete(manager))
+        with manager._connect() as conn:
+            conn.execute("UPDATE jobs SET created_at = ?", (time.time() - 120,))
+
+        assert manager.purge_expired() == 1
+        assert manager.get(job.job_id) is None
+        assert not manager.result_path(job.job_id).exists()
+
+    @staticmethod
+    async def _complete(manager):
+        job = await manager.start("p1", "u1", "android", fake_generate())
+        return await manager.wait(job.job_id)
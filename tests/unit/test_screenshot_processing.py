@@ -0,0 +1,148 @@
+"""
+Unit tests for screenshot post-processing
+"""
+import asyncio
+import io
+import struct
+import zlib
+
+import pytest
+
+import screenshot_processing
+from screenshot_processing import (
+    PNG_SIGNATURE,
+    ProcessingOptions,
+    _chunk,
+    _iter_chunks,
+    optimize_png,
+    process_screenshot,
+    process_screenshots,
+    summarize_stages,
+)
+
+
+def make_png(width=64, height=64, level=1):
+    """Poorly compressed RGB PNG with a text chunk, like a raw browser capture"""
+    raw = b"".join(
+        b"\x00" + b"".join(bytes((x % 256, (x * y) % 7, 200)) for x in range(width)) for y in range(height)
+    )
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + _chunk(b"IHDR", header)
+        + _chunk(b"tEXt", b"Software\x00Chromium")
+        + _chunk(b"IDAT", zlib.compress(raw, level))
+        + _chunk(b"IEND", b"")
+    ), raw
+
+
+def decoded_idat(png):
+    return zlib.decompress(b"".join(body for chunk_type, body in _iter_chunks(png) if chunk_type == b"IDAT"))
+
+
+class InlineExecutor:
+    """Runs pool tasks in the default thread executor"""
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, func, *args):
+        self.submitted += 1
+        return asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def wait(self, futures, timeout=None):
+        return await asyncio.gather(*futures)
+
+
+@pytest.mark.unit
+class TestPngOptimization:
+    """Test lossless PNG recompression"""
+
+    def test_optimized_png_is_smaller_and_lossless(self):
+        """Test that recompression shrinks the file, keeps pixels and drops metadata"""
+        png, raw = make_png()
+        optimized = optimize_png(png)
+
+        assert len(optimized) < len(png)
+        assert decoded_idat(optimized) == raw
+        assert [chunk_type for chunk_type, _ in _iter_chunks(optimized)] == [b"IHDR", b"IDAT", b"IEND"]
+
+    def test_invalid_input_is_returned_unchanged(self):
+        """Test that non-PNG or truncated data is passed through"""
+        png, _ = make_png()
+        assert optimize_png(b"not a png") == b"not a png"
+        assert optimize_png(png[:40]) == png[:40]
+
+    def test_stages_report_size_and_cpu(self):
+        """Test that each stage reports its input, output and CPU cost"""
+        png, _ = make_png()
+        result = process_screenshot("ios/iphone_6_7/home.png", png, ProcessingOptions(optimize_png=True, variants=()))
+
+        stage = result.stages[0]
+        assert stage.stage == "png"
+        assert stage.input_bytes == len(png) and stage.output_bytes == len(result.png)
+        assert stage.cpu_ms >= 0
+        assert summarize_stages({"home": result})["png"]["count"] == 1
+
+    def test_alpha_removal_never_grows_the_png(self, monkeypatch):
+        """Test that the Pillow re-encode is dropped when it is not smaller"""
+        Image = pytest.importorskip("PIL.Image")
+        buffer = io.BytesIO()
+        Image.new("RGBA", (32, 32), (10, 20, 30, 255)).save(buffer, "PNG")
+        png = buffer.getvalue()
+        monkeypatch.setattr(screenshot_processing, "optimize_png", lambda data: data + b"\0" * len(png))
+
+        assert screenshot_processing._optimize_png_pillow(png) == png
+
+    def test_variants_without_pillow_are_skipped(self, monkeypatch):
+        """Test that requested variants are reported as skipped when Pillow is missing"""
+        monkeypatch.setattr(screenshot_processing, "HAS_PIL", False)
+        png, _ = make_png()
+        result = process_screenshot("a.png", png, ProcessingOptions(optimize_png=False, variants=("jpeg",)))
+
+        assert result.variants == {}
+        assert result.stages[-1].skipped
+        assert summarize_stages({"a.png": result}) == {}
+
+    def test_variants_and_thumbnails(self):
+        """Test that JPEG, WebP and thumbnail variants are produced next to the PNG"""
+        pytest.importorskip("PIL")
+        png, _ = make_png(width=400, height=200)
+        options = ProcessingOptions(variants=("jpeg", "webp"), thumbnail_width=100)
+        result = process_screenshot("android/phone/home.png", png, options)
+
+        assert set(result.variants) == {
+            "android/phone/home.jpg", "android/phone/home.webp", "thumbnails/android/phone/home.jpg"
+        }
+        assert result.variants["android/phone/home.jpg"].startswith(b"\xff\xd8")
+
+
+@pytest.mark.unit
+class TestProcessScreenshots:
+    """Test dispatching to the shared pool"""
+
+    def test_only_fresh_captures_are_optimized(self):
+        """Test that cached PNGs are not resubmitted when no variant is requested"""
+        png, _ = make_png()
+        executor = InlineExecutor()
+        results = asyncio.run(process_screenshots(
+            {"fresh.png": png, "cached.png": png}, ProcessingOptions(optimize_png=True, variants=()),
+            optimize={"fresh.png"}, executor=executor
+        ))
+
+        assert executor.submitted == 1
+        assert set(results) == {"fresh.png"} and len(results["fresh.png"].png) < len(png)
+
+    def test_pool_failure_keeps_raw_pngs(self):
+        """Test that a failing pool returns no results instead of failing the job"""
+        class BrokenExecutor(InlineExecutor):
+            async def wait(self, futures, timeout=None):
+                for future in futures:
+                    future.cancel()
+                raise RuntimeError("pool broken")
+
+        png, _ = make_png()
+        results = asyncio.run(process_screenshots(
+            {"a.png": png}, ProcessingOptions(), optimize={"a.png"}, executor=BrokenExecutor()
+        ))
+        assert results == {}
@@ -0,0 +1,102 @@
+"""
+Unit tests for single-flight coalescing of in-flight work
+"""
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+@pytest.mark.unit
+class TestSingleFlight:
+    """Test that concurrent callers share one execution"""
+
+    def test_concurrent_callers_share_one_run(self):
+        """Test that N concurrent requests start a single job"""
+        flights = SingleFlight()
+        calls = []
+
+        async def compile_apk():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"redirect_url": "https://example.com/app.apk"}
+
+        async def scenario():
+            return await asyncio.gather(*[flights.do("build-1", compile_apk) for _ in range(5)])
+
+        results = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert all(result == results[0] for result in results)
+
+    def test_errors_are_shared_and_forgotten(self):
+        """Test that a failure reaches every waiter and allows a retry"""
+        flights = SingleFlight()
+        attempts = []
+
+        async def failing():
+            attempts.append(1)
+            await asyncio.sleep(0.01)
+            raise RuntimeError("gradle failed")
+
+        async def scenario():
+            results = await asyncio.gather(
+                flights.do("build-1", failing), flights.do("build-1", failing), return_exceptions=True
+            )
+            assert all(isinstance(result, RuntimeError) for result in results)
+            assert not flights.in_flight("build-1")
+            with pytest.raises(RuntimeError):
+                await flights.do("build-1", failing)
+
+        asyncio.run(scenario())
+        assert len(attempts) == 2
+
+    def test_cancelled_waiter_does_not_cancel_job(self):
+        """Test that a disconnecting client leaves the shared job running"""
+        flights = SingleFlight()
+
+        async def compile_apk():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        async def scenario():
+            first = asyncio.ensure_future(flights.do("build-1", compile_apk))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await flights.do("build-1", compile_apk)
+
+        assert asyncio.run(scenario()) == "done"
+
+    def test_status_exposes_progress(self):
+        """Test that status reports running jobs with their metadata"""
+        flights = SingleFlight()
+
+        async def scenario():
+            flights.start("build-1", lambda: asyncio.sleep(0.05), user_id="user-1")
+            status = flights.status("build-1")
+            await asyncio.sleep(0.1)
+            return status, flights.status("build-1")
+
+        running, finished = asyncio.run(scenario())
+        assert running["in_progress"] and running["user_id"] == "user-1"
+        assert finished is None
+
+    def test_last_failure_is_kept_until_retry(self):
+        """Test that a failed background job stays visible with its error until the next run"""
+        flights = SingleFlight(failure_ttl_seconds=60)
+
+        async def failing():
+            raise RuntimeError("gradle failed")
+
+        async def scenario():
+            task = flights.start("build-1", failing, user_id="user-1")
+            await asyncio.gather(task, return_exceptions=True)
+            await asyncio.sleep(0)
+            failure = flights.last_failure("build-1")
+            flights.start("build-1", lambda: asyncio.sleep(0.01))
+            return failure, flights.last_failure("build-1")
+
+        failure, after_retry = asyncio.run(scenario())
+        assert failure["error"] == "gradle failed" and failure["user_id"] == "user-1"
+        assert after_retry is None
+        assert SingleFlight().last_failure("build-1") is None
@@ -0,0 +1,85 @@
+"""
+Unit tests for the shared executor service
+"""
+import asyncio
+import math
+import operator
+import time
+
+import pytest
+
+from task_executor import TaskExecutor, TaskTimeoutError
+
+
+@pytest.fixture
+def executor():
+    tasks = TaskExecutor(pool_workers=1, isolated_workers=1)
+    yield tasks
+    tasks.shutdown()
+
+
+@pytest.mark.unit
+class TestPool:
+    """Test short tasks in the shared process pool"""
+
+    def test_run(self, executor):
+        """Test that pooled tasks return their result"""
+        assert asyncio.run(executor.run(math.factorial, 10)) == 3628800
+
+    def test_timeout_replaces_pool(self, executor):
+        """Test that a stuck task times out and the pool keeps working"""
+        with pytest.raises(TaskTimeoutError):
+            asyncio.run(executor.run(time.sleep, 30, timeout=0.5))
+        assert asyncio.run(executor.run(math.factorial, 5)) == 120
+
+    def test_timeout_spares_concurrent_tasks(self):
+        """Test that a stuck task does not break unrelated tasks sharing the pool"""
+        executor = TaskExecutor(pool_workers=2, isolated_workers=1)
+
+        async def scenario():
+            stuck = executor.run(time.sleep, 30, timeout=0.5)
+            other = executor.run(math.factorial, 5, timeout=10)
+            slow = executor.run(time.sleep, 1.5, timeout=10)
+            return await asyncio.gather(stuck, other, slow, return_exceptions=True)
+
+        try:
+            stuck, other, slow = asyncio.run(scenario())
+            assert isinstance(stuck, TaskTimeoutError)
+            assert other == 120 and slow is None
+            # The replaced pool is killed once only the stuck task remains
+            assert not executor._retired
+            assert asyncio.run(executor.run(math.factorial, 4)) == 24
+        finally:
+            executor.shutdown()
+
+
+@pytest.mark.unit
+class TestIsolated:
+    """Test long tasks in dedicated, killable processes"""
+
+    def test_result_and_errors(self, executor):
+        """Test that results and exceptions come back from the child"""
+        assert asyncio.run(executor.run_isolated(operator.add, 2, 3)) == 5
+        with pytest.raises(ZeroDivisionError):
+            asyncio.run(executor.run_isolated(operator.truediv, 1, 0))
+
+    def test_timeout_kills_child(self, executor):
+        """Test that an expired task is killed instead of running on"""
+        started = time.monotonic()
+        with pytest.raises(TaskTimeoutError):
+            asyncio.run(executor.run_isolated(time.sleep, 30, timeout=1))
+        assert time.monotonic() - started < 15
+        assert not executor._isolated_processes
+
+    def test_event_loop_stays_responsive(self, executor):
+        """Test that the loop keeps serving while a task runs"""
+        async def scenario():
+            task = asyncio.ensure_future(executor.run_isolated(time.sleep, 1))
+            ticks = 0
+            while not task.done():
+                await asyncio.sleep(0.05)
+                ticks += 1
+            await task
+            return ticks
+
+        assert asyncio.run(scenario()) >= 10
@@ -0,0 +1,125 @@
+"""
+Unit tests for the project version cache
+"""
+import asyncio
+
+import pytest
+
+from version_cache import ProjectVersion, ProjectVersionCache
+
+
+class CountingLoader:
+    """Returns project rows from a dict and counts DB reads"""
+
+    def __init__(self, rows, delay=0.0):
+        self.rows = rows
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, project_id):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        row = self.rows.get(project_id)
+        return ProjectVersion.from_row(row) if row else None
+
+
+def row(version="1.0", **extra):
+    return {"id": "p1", "user_id": "u1", "web_app_version": version, "web_url": "https://a.test", **extra}
+
+
+@pytest.mark.unit
+class TestProjectVersionCache:
+    """Test read-through caching, coalescing and invalidation"""
+
+    def test_repeated_checks_hit_the_cache(self):
+        """Test that only the first lookup reads the database, including for unknown projects"""
+        cache = ProjectVersionCache(ttl_seconds=60)
+        loader = CountingLoader({"p1": row()})
+
+        async def scenario():
+            for _ in range(5):
+                version = await cache.get("p1", loader)
+                missing = await cache.get("nope", loader)
+            return version, missing
+
+        version, missing = asyncio.run(scenario())
+
+        assert version.web_app_version == "1.0" and version.version_check_enabled
+        assert missing is None
+        assert loader.calls == 2 and cache.hits == 8
+
+    def test_concurrent_misses_share_one_read(self):
+        """Test that simultaneous checks for the same project wait for one database read"""
+        cache = ProjectVersionCache(ttl_seconds=60)
+        loader = CountingLoader({"p1": row()}, delay=0.05)
+
+        async def scenario():
+            return await asyncio.gather(*(cache.get("p1", loader) for _ in range(20)))
+
+        results = asyncio.run(scenario())
+
+        assert loader.calls == 1
+        assert all(result.web_app_version == "1.0" for result in results)
+
+    def test_invalidate_reloads_new_version(self):
+        """Test that an invalidated project is read again, even if a stale read was in flight"""
+        cache = ProjectVersionCache(ttl_seconds=60)
+        rows = {"p1": row("1.0")}
+        loader = CountingLoader(rows, delay=0.05)
+
+        async def scenario():
+            stale_read = asyncio.ensure_future(cache.get("p1", loader))
+            await asyncio.sleep(0.01)
+            rows["p1"] = row("2.0")
+            cache.invalidate("p1")
+            await stale_read
+            return await cache.get("p1", loader)
+
+        assert asyncio.run(scenario()).web_app_version == "2.0"
+        assert loader.calls == 2
+
+    def test_generations_are_pruned(self):
+        """Test that invalidation counters only live while a read is in flight"""
+        cache = ProjectVersionCache(ttl_seconds=60)
+        loader = CountingLoader({"p1": row()}, delay=0.02)
+
+        async def scenario():
+            pending = asyncio.ensure_future(cache.get("p1", loader))
+            await asyncio.sleep(0.01)
+            cache.invalidate("p1")
+            assert cache._generations == {"p1": 1}
+            await pending
+            for project_id in ("p1", "p2", "p3"):
+                cache.invalidate(project_id)
+
+        asyncio.run(scenario())
+        assert cache._generations == {} and cache._pending == {}
+
+    def test_expired_and_evicted_entries_are_reloaded(self):
+        """Test the TTL and the entry limit"""
+        loader = CountingLoader({"p1": row(), "p2": {**row(), "id": "p2"}})
+
+        expired = ProjectVersionCache(ttl_seconds=0)
+        asyncio.run(expired.get("p1", loader))
+        asyncio.run(expired.get("p1", loader))
+        assert loader.calls == 2
+
+        small = ProjectVersionCache(ttl_seconds=60, max_entries=1)
+
+        async def scenario():
+            await small.get("p1", loader)
+            await small.get("p2", loader)
+            await small.get("p1", loader)
+
+        asyncio.run(scenario())
+        assert loader.calls == 5
+
+    def test_etag_follows_the_response(self):
+        """Test that the ETag changes with the version, the toggle and the caller's version"""
+        base = ProjectVersion.from_row(row("1.0"))
+
+        assert base.etag("1.0") == ProjectVersion.from_row(row("1.0")).etag("1.0")
+        assert base.etag("1.0").startswith('W/"')
+        assert base.etag("1.0") != base.etag("0.9")
+        assert base.etag() != ProjectVersion.from_row(row("1.1")).etag()
+        assert base.etag() != ProjectVersion.from_row(row("1.0", version_check_enabled=False)).etag()
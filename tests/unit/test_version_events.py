@@ -0,0 +1,144 @@
+"""
+Unit tests for the version broadcast hub
+"""
+import asyncio
+import json
+
+import pytest
+
+from version_cache import ProjectVersion
+from version_events import VersionBroadcastHub
+
+
+def version(number, enabled=True):
+    return ProjectVersion("p1", "u1", number, enabled, "https://a.test")
+
+
+def parse(chunk):
+    """(event, data) of an SSE chunk, or the raw chunk for retry and heartbeat lines"""
+    fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+    if "event" not in fields:
+        return chunk
+    return fields["event"], json.loads(fields["data"])
+
+
+@pytest.mark.unit
+class TestVersionBroadcastHub:
+    """Test SSE delivery, heartbeats, reconnection and cross-worker refresh"""
+
+    def test_subscriber_receives_state_then_changes(self):
+        """Test that a connection gets the current version, then each published version"""
+        hub = VersionBroadcastHub(poll_seconds=0)
+
+        async def scenario():
+            stream = hub.subscribe("p1", version("1.0"), current_version="1.0")
+            chunks = [await stream.__anext__(), await stream.__anext__()]
+            next_chunk = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0.01)
+            hub.publish("p1", version("1.1"))
+            chunks.append(await next_chunk)
+            await stream.aclose()
+            return chunks
+
+        retry, first, second = asyncio.run(scenario())
+
+        assert retry.startswith("retry: ")
+        assert parse(first) == ("version", {
+            "project_id": "p1", "version": "1.0", "version_check_enabled": True, "update_available": False
+        })
+        event, data = parse(second)
+        assert event == "version" and data["version"] == "1.1" and data["update_available"]
+        assert hub.connections == 0
+
+    def test_idle_connection_gets_heartbeats(self):
+        """Test that a comment line is sent when nothing changes"""
+        hub = VersionBroadcastHub(heartbeat_seconds=0.01, poll_seconds=0)
+
+        async def scenario():
+            stream = hub.subscribe("p1", version("1.0"))
+            chunks = [await stream.__anext__() for _ in range(3)]
+            await stream.aclose()
+            return chunks
+
+        assert asyncio.run(scenario())[2] == ": ping\n\n"
+
+    def test_reconnection_skips_state_already_received(self):
+        """Test that Last-Event-ID matching the current version suppresses the initial event"""
+        hub = VersionBroadcastHub(heartbeat_seconds=0.01, poll_seconds=0)
+
+        async def scenario():
+            stream = hub.subscribe("p1", version("1.0"), last_event_id=version("1.0").fingerprint())
+            chunks = [await stream.__anext__() for _ in range(2)]
+            await stream.aclose()
+            return chunks
+
+        assert asyncio.run(scenario())[1] == ": ping\n\n"
+
+    def test_one_publish_wakes_every_subscriber(self):
+        """Test that thousands of idle connections share one wake-up per change"""
+        hub = VersionBroadcastHub(poll_seconds=0)
+
+        async def scenario():
+            streams = [hub.subscribe("p1", version("1.0")) for _ in range(2000)]
+            for stream in streams:
+                await stream.__anext__()
+                await stream.__anext__()
+            pending = [asyncio.ensure_future(stream.__anext__()) for stream in streams]
+            await asyncio.sleep(0.01)
+            assert hub.connections == 2000 and len(hub._channels) == 1
+            hub.publish("p1", version("2.0"))
+            results = await asyncio.gather(*pending)
+            for stream in streams:
+                await stream.aclose()
+            return results
+
+        results = asyncio.run(scenario())
+
+        assert all(parse(chunk)[1]["version"] == "2.0" for chunk in results)
+        assert hub.connections == 0 and not hub._channels
+
+    def test_changes_from_other_workers_are_polled(self):
+        """Test that watched projects are re-read and deletions end the stream"""
+        state = {"p1": version("1.0")}
+        reads = []
+
+        async def fetch(project_id):
+            reads.append(project_id)
+            return state.get(project_id)
+
+        hub = VersionBroadcastHub(fetch=fetch, poll_seconds=0.01)
+
+        async def scenario():
+            stream = hub.subscribe("p1", version("1.0"))
+            await stream.__anext__()
+            await stream.__anext__()
+            state["p1"] = version("1.2")
+            changed = await stream.__anext__()
+            del state["p1"]
+            deleted = await stream.__anext__()
+            rest = [chunk async for chunk in stream]
+            return changed, deleted, rest
+
+        changed, deleted, rest = asyncio.run(scenario())
+
+        assert parse(changed)[1]["version"] == "1.2"
+        assert parse(deleted)[0] == "deleted" and rest == []
+        assert reads
+
+    def test_close_ends_streams_and_refuses_connections(self):
+        """Test worker shutdown and the connection limit"""
+        hub = VersionBroadcastHub(poll_seconds=0, max_connections=1)
+
+        async def scenario():
+            stream = hub.subscribe("p1", version("1.0"))
+            await stream.__anext__()
+            await stream.__anext__()
+            assert not hub.has_capacity()
+            pending = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0.01)
+            hub.close()
+            with pytest.raises(StopAsyncIteration):
+                await pending
+
+        asyncio.run(scenario())
+        assert hub.connections == 0 and not hub.has_capacity()